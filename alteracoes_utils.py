@@ -0,0 +1,92 @@
+import pandas as pd
+from sqlalchemy import text
+from db_utils import get_db_connection, para_python
+
+# --- Gravação em Lote das Alterações do st.data_editor ---
+# A comparação entre o DataFrame original e o editado é feita de forma vetorizada e todas as
+# alterações são gravadas numa única transação: um DELETE ... = ANY(:ids) para as linhas
+# removidas e um UPDATE ... FROM (VALUES ...) para as editadas, em vez de um commit por linha.
+
+LINHAS_POR_COMANDO = 1000
+
+def calcular_alteracoes(original_df, edited_df, colunas, chave="id"):
+    """
+    Compara os dois DataFrames nas colunas indicadas.
+    Devolve (lista de IDs removidos, DataFrame com as linhas editadas que mudaram, incluindo a chave).
+    Linhas novas (sem chave) são ignoradas.
+    """
+    original = original_df.dropna(subset=[chave]).set_index(chave)[colunas]
+    editado = edited_df.dropna(subset=[chave]).set_index(chave)[colunas]
+
+    ids_excluidos = [para_python(i) for i in original.index.difference(editado.index)]
+
+    comuns = original.index.intersection(editado.index)
+    antes, depois = original.loc[comuns], editado.loc[comuns]
+    iguais = (antes == depois) | (antes.isna() & depois.isna())
+    alterados = depois[~iguais.all(axis=1)]
+    return ids_excluidos, alterados.reset_index()
+
+def _registos(df, colunas):
+    return [{c: para_python(v) for c, v in zip(colunas, linha)} for linha in df[colunas].itertuples(index=False, name=None)]
+
+def excluir_em_lote(s, tabela, ids, chave="id"):
+    """Exclui todas as linhas cujos IDs estão na lista, num único comando. Devolve o total excluído."""
+    ids = [para_python(i) for i in ids]
+    if not ids:
+        return 0
+    return s.execute(text(f"DELETE FROM {tabela} WHERE {chave} = ANY(:ids)"), {"ids": ids}).rowcount
+
+def atualizar_em_lote(s, tabela, colunas_tipos, alterados_df, chave="id"):
+    """
+    Atualiza as linhas do DataFrame com UPDATE ... FROM (VALUES ...).
+    colunas_tipos mapeia cada coluna a gravar para o seu tipo SQL (ex.: {"valor": "NUMERIC"});
+    os CASTs evitam que o PostgreSQL deduza o tipo das colunas do VALUES a partir de NULLs.
+    """
+    if alterados_df is None or alterados_df.empty:
+        return 0
+    colunas = list(colunas_tipos)
+    registos = _registos(alterados_df, [chave] + colunas)
+    set_sql = ", ".join(f"{c} = v.{c}" for c in colunas)
+
+    total = 0
+    for inicio in range(0, len(registos), LINHAS_POR_COMANDO):
+        lote = registos[inicio:inicio + LINHAS_POR_COMANDO]
+        linhas_sql, params = [], {}
+        for i, registo in enumerate(lote):
+            valores = [f"CAST(:{chave}_{i} AS BIGINT)"] + [f"CAST(:{c}_{i} AS {colunas_tipos[c]})" for c in colunas]
+            linhas_sql.append("(" + ", ".join(valores) + ")")
+            params.update({f"{c}_{i}": v for c, v in registo.items()})
+        query = f"""
+            UPDATE {tabela} AS t SET {set_sql}
+            FROM (VALUES {", ".join(linhas_sql)}) AS v({chave}, {", ".join(colunas)})
+            WHERE t.{chave} = v.{chave}
+        """
+        total += s.execute(text(query), params).rowcount
+    return total
+
+def salvar_alteracoes(tabela, colunas_tipos, alterados_df=None, ids_excluidos=(), validar=None, chave="id", conn=None):
+    """
+    Grava o conjunto de alterações numa única transação.
+    validar(s, alterados_df, ids_excluidos), se indicado, corre na mesma transação e devolve
+    {id: mensagem} para as linhas rejeitadas; as restantes são gravadas normalmente.
+    Devolve {"atualizados": n, "excluidos": n, "erros": {id: mensagem}}.
+    """
+    if alterados_df is None:
+        alterados_df = pd.DataFrame(columns=[chave] + list(colunas_tipos))
+    ids_excluidos = [para_python(i) for i in ids_excluidos]
+    conn = conn or get_db_connection()
+
+    with conn.session as s:
+        s.begin()
+        erros = validar(s, alterados_df, ids_excluidos) if validar else {}
+        erros = erros or {}
+        excluidos = excluir_em_lote(s, tabela, [i for i in ids_excluidos if i not in erros], chave)
+        atualizados = atualizar_em_lote(s, tabela, colunas_tipos, alterados_df[~alterados_df[chave].isin(list(erros))], chave)
+        s.commit()
+    return {"atualizados": atualizados, "excluidos": excluidos, "erros": erros}
+
+def duplicados_no_lote(df, colunas, chave="id"):
+    """IDs das linhas do lote que repetem um valor (não vazio) já usado por outra linha do mesmo lote."""
+    colunas = [colunas] if isinstance(colunas, str) else list(colunas)
+    preenchidos = df[(df[colunas].notna() & (df[colunas].astype(str) != "")).all(axis=1)]
+    return [para_python(i) for i in preenchidos.loc[preenchidos.duplicated(subset=colunas, keep="first"), chave]]
@@ -2,8 +2,11 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from auth import show_login_form, logout
-from datetime import datetime, timedelta
+from db_utils import get_db_connection
+from perfil_utils import iniciar_perfil, concluir_perfil
 from sqlalchemy import text
+import dashboard_utils
+from cache_utils import cache_tabelas, estatisticas_cache
 
 # --- Configuração inicial da página e do estado da sessão ---
 st.set_page_config(page_title="AssetFlow", layout="wide")
@@ -115,84 +118,13 @@ else:
         if st.button("Logout", key="app_logout"):
             logout()
         st.markdown("---")
+        iniciar_perfil()
 
     # --- Funções do Banco de Dados para o Dashboard ---
-    def get_db_connection():
-        return st.connection("supabase", type="sql")
-
-    @st.cache_data(ttl=600)
+    @cache_tabelas("aparelhos", "status", "colaboradores", "historico_movimentacoes", "setores", "modelos", "marcas", "manutencoes", ttl=600)
     def carregar_dados_dashboard():
         try:
-            conn = get_db_connection()
-            
-            kpis_ativos = conn.query("SELECT COUNT(a.id), COALESCE(SUM(a.valor), 0) FROM aparelhos a JOIN status s ON a.status_id = s.id WHERE s.nome_status != 'Baixado/Inutilizado'").iloc[0]
-            kpis_manutencao = conn.query("SELECT COUNT(a.id), COALESCE(SUM(a.valor), 0) FROM aparelhos a JOIN status s ON a.status_id = s.id WHERE s.nome_status = 'Em manutenção'").iloc[0]
-            aparelhos_estoque = conn.query("SELECT COUNT(a.id) FROM aparelhos a JOIN status s ON a.status_id = s.id WHERE s.nome_status = 'Em estoque'").iloc[0, 0] or 0
-            total_colaboradores = conn.query("SELECT COUNT(id) FROM colaboradores").iloc[0, 0] or 0
-
-            df_multiplos_ids = conn.query("""
-                WITH AparelhosPorColaborador AS (
-                    SELECT h.colaborador_id FROM aparelhos a JOIN status s ON a.status_id = s.id
-                    JOIN (SELECT aparelho_id, colaborador_id, ROW_NUMBER() OVER(PARTITION BY aparelho_id ORDER BY data_movimentacao DESC) as rn FROM historico_movimentacoes WHERE colaborador_id IS NOT NULL) h ON a.id = h.aparelho_id AND h.rn = 1
-                    WHERE s.nome_status = 'Em uso'
-                )
-                SELECT colaborador_id FROM AparelhosPorColaborador GROUP BY colaborador_id HAVING COUNT(*) > 1;
-            """)
-            colaboradores_multiplos_aparelhos_count = len(df_multiplos_ids)
-
-            df_detalhes_multiplos = pd.DataFrame()
-            if not df_multiplos_ids.empty:
-                ids_colaboradores_list = df_multiplos_ids['colaborador_id'].tolist()
-                if ids_colaboradores_list:
-                    if len(ids_colaboradores_list) == 1:
-                        ids_colaboradores = f"({ids_colaboradores_list[0]})"
-                    else:
-                        ids_colaboradores = tuple(ids_colaboradores_list)
-
-                    df_detalhes_multiplos = conn.query(f"""
-                        SELECT c.nome_completo, setor.nome_setor, ma.nome_marca || ' - ' || mo.nome_modelo as modelo_completo, a.numero_serie, h.data_movimentacao
-                        FROM aparelhos a JOIN status s ON a.status_id = s.id
-                        JOIN (SELECT aparelho_id, colaborador_id, data_movimentacao, ROW_NUMBER() OVER(PARTITION BY aparelho_id ORDER BY data_movimentacao DESC) as rn FROM historico_movimentacoes WHERE colaborador_id IS NOT NULL) h ON a.id = h.aparelho_id AND h.rn = 1
-                        JOIN colaboradores c ON h.colaborador_id = c.id JOIN setores setor ON c.setor_id = setor.id JOIN modelos mo ON a.modelo_id = mo.id JOIN marcas ma ON mo.marca_id = ma.id
-                        WHERE s.nome_status = 'Em uso' AND c.id IN {ids_colaboradores}
-                        ORDER BY c.nome_completo, h.data_movimentacao;
-                    """)
-            
-            df_detalhes_manutencao = conn.query("""
-                SELECT a.numero_serie, mo.nome_modelo, m.fornecedor, m.data_envio, m.defeito_reportado
-                FROM manutencoes m
-                JOIN aparelhos a ON m.aparelho_id = a.id
-                JOIN modelos mo ON a.modelo_id = mo.id
-                WHERE m.status_manutencao = 'Em Andamento'
-                ORDER BY m.data_envio ASC;
-            """)
-
-            df_status = conn.query("SELECT s.nome_status, COUNT(a.id) as quantidade FROM aparelhos a JOIN status s ON a.status_id = s.id GROUP BY s.nome_status")
-            df_setor = conn.query("""
-                SELECT s.nome_setor, COUNT(a.id) as quantidade
-                FROM aparelhos a
-                JOIN (SELECT aparelho_id, colaborador_id, ROW_NUMBER() OVER(PARTITION BY aparelho_id ORDER BY data_movimentacao DESC) as rn FROM historico_movimentacoes WHERE colaborador_id IS NOT NULL) h ON a.id = h.aparelho_id AND h.rn = 1
-                JOIN colaboradores c ON h.colaborador_id = c.id JOIN setores s ON c.setor_id = s.id JOIN status st ON a.status_id = st.id
-                WHERE st.nome_status = 'Em uso' GROUP BY s.nome_setor
-            """)
-
-            data_limite = datetime.now() - timedelta(days=5)
-            df_manut_atrasadas = conn.query("SELECT a.numero_serie, mo.nome_modelo, m.fornecedor, m.data_envio FROM manutencoes m JOIN aparelhos a ON m.aparelho_id = a.id JOIN modelos mo ON a.modelo_id = mo.id WHERE m.status_manutencao = 'Em Andamento' AND m.data_envio < :data_limite", params={"data_limite": data_limite})
-            df_ultimas_mov = conn.query("SELECT h.data_movimentacao, h.colaborador_snapshot as nome_completo, s.nome_status, a.numero_serie FROM historico_movimentacoes h JOIN status s ON h.status_id = s.id JOIN aparelhos a ON h.aparelho_id = a.id ORDER BY h.data_movimentacao DESC LIMIT 5")
-
-            return {
-                "kpis": {
-                    "total_aparelhos": kpis_ativos[0] or 0, "valor_total": kpis_ativos[1] or 0,
-                    "total_colaboradores": total_colaboradores, "aparelhos_manutencao": kpis_manutencao[0] or 0,
-                    "aparelhos_estoque": aparelhos_estoque, "colaboradores_multiplos": colaboradores_multiplos_aparelhos_count
-                },
-                "graficos": {"status": df_status, "setor": df_setor},
-                "acao_rapida": {"manut_atrasadas": df_manut_atrasadas, "ultimas_mov": df_ultimas_mov},
-                "detalhes": {
-                    "multiplos_aparelhos": df_detalhes_multiplos,
-                    "manutencoes_em_andamento": df_detalhes_manutencao
-                }
-            }
+            return dashboard_utils.carregar_dados_dashboard(get_db_connection())
         except Exception as e:
             st.error(f"Erro ao carregar dados do dashboard: {e}")
             return None
@@ -205,7 +137,7 @@ else:
         st.write("") 
         st.write("") 
         if st.button("Atualizar Dados", use_container_width=True):
-            st.cache_data.clear()
+            carregar_dados_dashboard.limpar()
             st.rerun()
 
     st.markdown("---")
@@ -326,5 +258,22 @@ else:
                           "nome_completo": "Colaborador"
                       })
 
+    # --- Estatísticas do Cache (apenas Administradores) ---
+    if st.session_state.get('user_role') == 'Administrador':
+        with st.expander("Estatísticas do Cache"):
+            estatisticas = estatisticas_cache()
+            totais = estatisticas['totais']
+            ccol1, ccol2, ccol3, ccol4 = st.columns(4)
+            ccol1.metric("Hits", totais['hits'])
+            ccol2.metric("Misses", totais['misses'])
+            ccol3.metric("Evictions", totais['evictions'])
+            ccol4.metric("Entradas em Cache", totais['entradas'])
+            if estatisticas['por_funcao']:
+                df_cache = pd.DataFrame.from_dict(estatisticas['por_funcao'], orient='index').fillna(0).astype(int)
+                df_cache.index.name = "Função"
+                st.dataframe(df_cache.sort_index(), use_container_width=True)
+
+    concluir_perfil()
+
 # Forçando a reconstrução do cache - v1.3
 
@@ -4,18 +4,15 @@ from sqlalchemy import text
 import secrets
 from datetime import datetime, timedelta
 from email_utils import enviar_email_de_redefinicao
-
-def get_db_connection():
-    return st.connection("supabase", type="sql")
+from db_utils import consultar, get_db_connection
 
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
 def check_login(username, password):
-    conn = get_db_connection()
     hashed_password = hash_password(password)
     query = "SELECT * FROM usuarios WHERE login = :login AND senha = :senha"
-    user_df = conn.query(query, params={"login": username, "senha": hashed_password})
+    user_df = consultar(query, params={"login": username, "senha": hashed_password})
     if not user_df.empty:
         user = user_df.iloc[0].to_dict()
         st.session_state['logged_in'] = True
@@ -45,7 +42,7 @@ def iniciar_redefinicao_de_senha(login):
         s.execute(query_insert_token, {"user_id": user.id, "token": token, "expires": expires_at})
         s.commit()
         if enviar_email_de_redefinicao(destinatario_email=login, destinatario_nome=user.nome, token=token):
-            st.success("Um e-mail com as instruções para redefinir a sua senha foi enviado. Verifique sua caixa de entrada/spam.")
+            st.success("Um e-mail com as instruções para redefinir a sua senha será enviado dentro de instantes. Verifique sua caixa de entrada/spam.")
             st.info("O link é válido por 15 minutos.")
         else:
             st.warning("Não foi possível enviar o e-mail. Verifique as configurações e tente novamente.")
@@ -0,0 +1,215 @@
+"""
+Benchmark das funções de carregamento das páginas contra um PostgreSQL local com dados sintéticos.
+
+Por omissão inicia um PostgreSQL temporário (initdb/pg_ctl têm de estar no PATH), cria o esquema,
+gera a frota e mede, sem cache, cada função decorada com @cache_tabelas nas páginas que possa ser
+chamada sem argumentos, além do dashboard e da paginação do inventário. O resultado é um relatório
+JSON (com o commit atual) que pode ser comparado com o de outro commit através de --comparar.
+
+As funções são extraídas das páginas sem executar a interface: do ficheiro da página só correm os
+imports, as constantes literais e as definições de funções (sem o decorador de cache).
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/bench_carregadores.py --escala media --repeticoes 5 --saida resultado.json
+    python benchmarks/bench_carregadores.py --url postgresql://localhost/bench --recriar --movimentacoes 50000
+    python benchmarks/bench_carregadores.py --escala pequena --comparar resultado_anterior.json
+"""
+import argparse
+import ast
+import glob
+import inspect
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import nullcontext
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+import db_utils
+import dashboard_utils
+import inventario_utils
+from frota_sintetica import ESCALAS, PostgresLocal, criar_esquema, semear, verificar_banco_local
+
+DECORADORES_CACHE = {"cache_tabelas", "cache_data", "cache_resource"}
+
+def _nome_decorador(no):
+    alvo = no.func if isinstance(no, ast.Call) else no
+    return alvo.attr if isinstance(alvo, ast.Attribute) else getattr(alvo, "id", None)
+
+def _eh_literal(no):
+    try:
+        ast.literal_eval(no)
+        return True
+    except ValueError:
+        return False
+
+def carregar_funcoes_pagina(caminho):
+    """
+    Devolve ({nome: função}, [nomes das funções de carregamento]) de uma página, executando apenas os
+    imports, as constantes literais e as definições de funções. As funções de carregamento são as que
+    tinham um decorador de cache, que é removido para que cada chamada vá ao banco.
+    """
+    with open(caminho, encoding="utf-8") as f:
+        arvore = ast.parse(f.read(), filename=caminho)
+    corpo, carregadores = [], []
+    for no in arvore.body:
+        if isinstance(no, (ast.Import, ast.ImportFrom)):
+            corpo.append(no)
+        elif isinstance(no, ast.Assign) and _eh_literal(no.value):
+            corpo.append(no)
+        elif isinstance(no, ast.FunctionDef):
+            com_cache = [d for d in no.decorator_list if _nome_decorador(d) in DECORADORES_CACHE]
+            if com_cache:
+                carregadores.append(no.name)
+            no.decorator_list = [d for d in no.decorator_list if d not in com_cache]
+            corpo.append(no)
+    namespace = {"__name__": "bench_" + os.path.splitext(os.path.basename(caminho))[0], "__file__": caminho}
+    exec(compile(ast.Module(body=corpo, type_ignores=[]), caminho, "exec"), namespace)
+    namespace["get_db_connection"] = db_utils.get_db_connection
+    return namespace, carregadores
+
+def casos_de_benchmark():
+    """Lista de (nome, função sem argumentos) a medir, e lista de (nome, motivo) das ignoradas."""
+    casos = [
+        ("app.py:carregar_dados_dashboard", lambda: dashboard_utils.carregar_dados_dashboard(db_utils.get_db_connection())),
+        ("inventario_utils.py:carregar_pagina_inventario", lambda: inventario_utils.carregar_pagina_inventario.__wrapped__("Data de Entrada (Mais Recente)")),
+        ("inventario_utils.py:carregar_pagina_inventario[responsavel]", lambda: inventario_utils.carregar_pagina_inventario.__wrapped__("Responsável (A-Z)")),
+        ("inventario_utils.py:estimar_total_inventario[filtro]", lambda: inventario_utils.estimar_total_inventario.__wrapped__(ns_search="NS00000001")),
+    ]
+    ignoradas = []
+    for caminho in sorted(glob.glob(os.path.join(RAIZ, "pages", "*.py"))):
+        pagina = os.path.basename(caminho)
+        try:
+            namespace, carregadores = carregar_funcoes_pagina(caminho)
+        except Exception as e:
+            ignoradas.append((pagina, f"não foi possível carregar a página: {e}"))
+            continue
+        for nome in carregadores:
+            funcao = namespace[nome]
+            obrigatorios = [p for p in inspect.signature(funcao).parameters.values()
+                            if p.default is p.empty and p.kind not in (p.VAR_POSITIONAL, p.VAR_KEYWORD)]
+            if obrigatorios:
+                ignoradas.append((f"{pagina}:{nome}", "exige argumentos"))
+            else:
+                casos.append((f"{pagina}:{nome}", funcao))
+    return casos, ignoradas
+
+def _linhas(resultado):
+    if isinstance(resultado, tuple) and resultado:
+        resultado = resultado[0]
+    if isinstance(resultado, pd.DataFrame):
+        return len(resultado)
+    return None
+
+def medir(funcao, repeticoes, aquecimento=1):
+    for _ in range(aquecimento):
+        funcao()
+    tempos = []
+    resultado = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return {
+        "min_ms": round(min(tempos), 2),
+        "mediana_ms": round(statistics.median(tempos), 2),
+        "media_ms": round(statistics.mean(tempos), 2),
+        "max_ms": round(max(tempos), 2),
+        "linhas": _linhas(resultado),
+    }
+
+def _commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def comparar(atual, caminho_anterior):
+    with open(caminho_anterior, encoding="utf-8") as f:
+        anterior = json.load(f)
+    print(f"\nComparação com {caminho_anterior} (commit {anterior.get('commit')}, {anterior['dimensoes']['movimentacoes']} movimentações):")
+    print(f"{'função':70} {'antes (ms)':>12} {'agora (ms)':>12} {'variação':>10}")
+    for nome, dados in atual["resultados"].items():
+        antes = anterior["resultados"].get(nome)
+        if not antes or "mediana_ms" not in antes or "mediana_ms" not in dados:
+            continue
+        variacao = (dados["mediana_ms"] / antes["mediana_ms"] - 1) * 100 if antes["mediana_ms"] else 0
+        print(f"{nome:70} {antes['mediana_ms']:12.2f} {dados['mediana_ms']:12.2f} {variacao:+9.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das funções de carregamento contra um PostgreSQL local.")
+    parser.add_argument("--escala", choices=list(ESCALAS), default="pequena", help="pequena=10k, media=100k, grande=1M movimentações.")
+    parser.add_argument("--movimentacoes", type=int, help="Número exato de movimentações (substitui --escala).")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--url", help="Usa um PostgreSQL local já em execução em vez de iniciar um temporário.")
+    parser.add_argument("--recriar", action="store_true", help="Com --url: apaga e recria o esquema e os dados.")
+    parser.add_argument("--filtro", help="Mede apenas as funções cujo nome contém este texto.")
+    parser.add_argument("--saida", default="bench_carregadores.json", help="Ficheiro do relatório JSON.")
+    parser.add_argument("--comparar", help="Relatório JSON anterior para comparação.")
+    args = parser.parse_args()
+
+    movimentacoes = args.movimentacoes or ESCALAS[args.escala]
+    if args.url:
+        verificar_banco_local(args.url)
+
+    with (nullcontext() if args.url else PostgresLocal()) as pg:
+        engine = create_engine(args.url or pg.url)
+        dimensoes = None
+        if not args.url or args.recriar:
+            print(f"A criar o esquema e a gerar {movimentacoes} movimentações...")
+            inicio = time.perf_counter()
+            criar_esquema(engine)
+            dimensoes = semear(engine, movimentacoes)
+            print(f"Dados gerados em {time.perf_counter() - inicio:.1f}s: {dimensoes}")
+        else:
+            with engine.connect() as conexao:
+                total = conexao.execute(text("SELECT COUNT(*) FROM historico_movimentacoes")).scalar_one()
+            dimensoes = {"movimentacoes": total, "reutilizado": True}
+
+        # Todas as consultas das páginas passam a usar o banco local.
+        db_utils.get_db_connection = lambda: engine
+
+        casos, ignoradas = casos_de_benchmark()
+        if args.filtro:
+            casos = [(nome, funcao) for nome, funcao in casos if args.filtro in nome]
+
+        with engine.connect() as conexao:
+            versao_pg = conexao.execute(text("SHOW server_version")).scalar_one()
+
+        relatorio = {
+            "commit": _commit_atual(),
+            "gerado_em": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "postgres": versao_pg,
+            "repeticoes": args.repeticoes,
+            "dimensoes": dimensoes,
+            "resultados": {},
+            "ignoradas": dict(ignoradas),
+        }
+        for nome, funcao in casos:
+            try:
+                relatorio["resultados"][nome] = medir(funcao, args.repeticoes)
+                r = relatorio["resultados"][nome]
+                print(f"{nome:70} mediana {r['mediana_ms']:9.2f} ms  ({r['linhas']} linhas)")
+            except Exception as e:
+                relatorio["resultados"][nome] = {"erro": str(e)}
+                print(f"{nome:70} ERRO: {e}")
+        engine.dispose()
+
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2, default=str)
+    print(f"\nRelatório gravado em {args.saida}.")
+    if args.comparar:
+        comparar(relatorio, args.comparar)
+
+if __name__ == "__main__":
+    main()
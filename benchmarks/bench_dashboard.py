@@ -0,0 +1,131 @@
+"""
+Benchmark do carregamento a frio do dashboard (app.py).
+
+Compara a versão anterior, com dez consultas em sequência, com a atual
+(dashboard_utils.carregar_dados_dashboard: um comando para KPIs e agregados e as
+listas de detalhe em paralelo). Antes de cada execução o pool de conexões é
+descartado, para que o tempo inclua o estabelecimento das conexões, como num
+primeiro acesso sem cache.
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/bench_dashboard.py --repeticoes 10
+A connection string vem de DATABASE_URL ou de .streamlit/secrets.toml.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+import dashboard_utils
+from db_utils import consultar, criar_engine_cli
+
+def carregar_dados_dashboard_sequencial(conn):
+    """Versão anterior do carregamento do dashboard, mantida apenas como referência."""
+    def q(sql, params=None):
+        return consultar(sql, params=params, conn=conn)
+
+    kpis_ativos = q("SELECT COUNT(a.id), COALESCE(SUM(a.valor), 0) FROM aparelhos a JOIN status s ON a.status_id = s.id WHERE s.nome_status != 'Baixado/Inutilizado'").iloc[0]
+    kpis_manutencao = q("SELECT COUNT(a.id), COALESCE(SUM(a.valor), 0) FROM aparelhos a JOIN status s ON a.status_id = s.id WHERE s.nome_status = 'Em manutenção'").iloc[0]
+    aparelhos_estoque = q("SELECT COUNT(a.id) FROM aparelhos a JOIN status s ON a.status_id = s.id WHERE s.nome_status = 'Em estoque'").iloc[0, 0] or 0
+    total_colaboradores = q("SELECT COUNT(id) FROM colaboradores").iloc[0, 0] or 0
+
+    df_multiplos_ids = q("""
+        WITH AparelhosPorColaborador AS (
+            SELECT p.colaborador_id FROM aparelhos a JOIN status s ON a.status_id = s.id
+            JOIN aparelho_posse_atual p ON a.id = p.aparelho_id
+            WHERE s.nome_status = 'Em uso' AND p.colaborador_id IS NOT NULL
+        )
+        SELECT colaborador_id FROM AparelhosPorColaborador GROUP BY colaborador_id HAVING COUNT(*) > 1;
+    """)
+    colaboradores_multiplos_aparelhos_count = len(df_multiplos_ids)
+
+    df_detalhes_multiplos = pd.DataFrame()
+    if not df_multiplos_ids.empty:
+        ids_colaboradores_list = df_multiplos_ids['colaborador_id'].tolist()
+        if ids_colaboradores_list:
+            if len(ids_colaboradores_list) == 1:
+                ids_colaboradores = f"({ids_colaboradores_list[0]})"
+            else:
+                ids_colaboradores = tuple(ids_colaboradores_list)
+
+            df_detalhes_multiplos = q(f"""
+                SELECT c.nome_completo, setor.nome_setor, ma.nome_marca || ' - ' || mo.nome_modelo as modelo_completo, a.numero_serie, h.data_movimentacao
+                FROM aparelhos a JOIN status s ON a.status_id = s.id
+                JOIN aparelho_posse_atual h ON a.id = h.aparelho_id
+                JOIN colaboradores c ON h.colaborador_id = c.id JOIN setores setor ON c.setor_id = setor.id JOIN modelos mo ON a.modelo_id = mo.id JOIN marcas ma ON mo.marca_id = ma.id
+                WHERE s.nome_status = 'Em uso' AND c.id IN {ids_colaboradores}
+                ORDER BY c.nome_completo, h.data_movimentacao;
+            """)
+    
+    df_detalhes_manutencao = q("""
+        SELECT a.numero_serie, mo.nome_modelo, m.fornecedor, m.data_envio, m.defeito_reportado
+        FROM manutencoes m
+        JOIN aparelhos a ON m.aparelho_id = a.id
+        JOIN modelos mo ON a.modelo_id = mo.id
+        WHERE m.status_manutencao = 'Em Andamento'
+        ORDER BY m.data_envio ASC;
+    """)
+
+    df_status = q("SELECT s.nome_status, COUNT(a.id) as quantidade FROM aparelhos a JOIN status s ON a.status_id = s.id GROUP BY s.nome_status")
+    df_setor = q("""
+        SELECT s.nome_setor, COUNT(a.id) as quantidade
+        FROM aparelhos a
+        JOIN aparelho_posse_atual h ON a.id = h.aparelho_id
+        JOIN colaboradores c ON h.colaborador_id = c.id JOIN setores s ON c.setor_id = s.id JOIN status st ON a.status_id = st.id
+        WHERE st.nome_status = 'Em uso' GROUP BY s.nome_setor
+    """)
+
+    data_limite = datetime.now() - timedelta(days=5)
+    df_manut_atrasadas = q("SELECT a.numero_serie, mo.nome_modelo, m.fornecedor, m.data_envio FROM manutencoes m JOIN aparelhos a ON m.aparelho_id = a.id JOIN modelos mo ON a.modelo_id = mo.id WHERE m.status_manutencao = 'Em Andamento' AND m.data_envio < :data_limite", params={"data_limite": data_limite})
+    df_ultimas_mov = q("SELECT h.data_movimentacao, h.colaborador_snapshot as nome_completo, s.nome_status, a.numero_serie FROM historico_movimentacoes h JOIN status s ON h.status_id = s.id JOIN aparelhos a ON h.aparelho_id = a.id ORDER BY h.data_movimentacao DESC LIMIT 5")
+
+    return {
+        "kpis": {
+            "total_aparelhos": kpis_ativos[0] or 0, "valor_total": kpis_ativos[1] or 0,
+            "total_colaboradores": total_colaboradores, "aparelhos_manutencao": kpis_manutencao[0] or 0,
+            "aparelhos_estoque": aparelhos_estoque, "colaboradores_multiplos": colaboradores_multiplos_aparelhos_count
+        },
+        "graficos": {"status": df_status, "setor": df_setor},
+        "acao_rapida": {"manut_atrasadas": df_manut_atrasadas, "ultimas_mov": df_ultimas_mov},
+        "detalhes": {
+            "multiplos_aparelhos": df_detalhes_multiplos,
+            "manutencoes_em_andamento": df_detalhes_manutencao
+        }
+    }
+
+def medir(nome, funcao, engine, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        engine.dispose()
+        inicio = time.perf_counter()
+        funcao(engine)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    print(f"{nome:<12} mín {min(tempos):8.1f} ms | mediana {statistics.median(tempos):8.1f} ms | média {statistics.mean(tempos):8.1f} ms")
+    return statistics.median(tempos)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara o carregamento a frio do dashboard antes e depois da consolidação das consultas.")
+    parser.add_argument("--repeticoes", type=int, default=5, help="Execuções de cada versão (padrão: 5).")
+    parser.add_argument("--url", help="Connection string (por padrão, DATABASE_URL ou secrets.toml).")
+    args = parser.parse_args()
+
+    engine = criar_engine_cli(args.url)
+
+    # Confere que as duas versões devolvem os mesmos indicadores antes de medir.
+    kpis_antes = carregar_dados_dashboard_sequencial(engine)["kpis"]
+    kpis_depois = dashboard_utils.carregar_dados_dashboard(engine)["kpis"]
+    divergentes = [k for k in kpis_antes if float(kpis_antes[k]) != float(kpis_depois[k])]
+    if divergentes:
+        print(f"Aviso: indicadores divergentes entre as versões: {divergentes}")
+
+    mediana_antes = medir("sequencial", carregar_dados_dashboard_sequencial, engine, args.repeticoes)
+    mediana_depois = medir("consolidado", dashboard_utils.carregar_dados_dashboard, engine, args.repeticoes)
+    print(f"Ganho (mediana): {mediana_antes / mediana_depois:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark da renderização dos documentos em PDF (documentos_utils).
+
+Compara, por documento, a versão anterior (HTML com o <style> e a logo em Base64 embutidos,
+analisados de novo a cada renderização) com a atual (folhas de estilos já analisadas, uma
+FontConfiguration partilhada e a logo servida pelo url_fetcher a partir da memória), para o
+termo de responsabilidade e para a etiqueta. Não usa o banco.
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/bench_documentos.py --repeticoes 20
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from weasyprint import HTML
+import documentos_utils
+from documentos_utils import (
+    html_termo, html_etiqueta, gerar_pdf_termo, gerar_pdf_etiqueta, checklist_padrao,
+    CSS_TERMO, CSS_ETIQUETA, URL_LOGO, ARQUIVO_LOGO,
+)
+
+DADOS = {
+    "nome_completo": "Maria da Silva Santos", "cpf": "123.456.789-00", "nome_setor": "Comercial",
+    "gmail": "maria.santos@exemplo.com", "codigo_colaborador": "C1234",
+    "nome_marca": "Samsung", "nome_modelo": "Galaxy A54", "imei1": "351234567890123", "imei2": "351234567890124",
+    "numero_serie": "R58T123ABC", "protocolo": 1, "data_movimentacao": datetime(2024, 5, 2, 9, 30),
+}
+
+def html_anterior(html_documento, css, logo_data_uri):
+    """HTML como era gerado antes: <style> no cabeçalho e a logo como data URI."""
+    return (html_documento
+            .replace('<head><meta charset="UTF-8"></head>', f'<head><meta charset="UTF-8"><style>{css}</style></head>')
+            .replace(URL_LOGO, logo_data_uri))
+
+def medir(funcao, repeticoes):
+    funcao()  # aquecimento (importações e, na versão atual, a análise das folhas de estilos)
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return {"mediana_ms": round(statistics.median(tempos), 2), "min_ms": round(min(tempos), 2),
+            "documentos_por_segundo": round(1000 / statistics.median(tempos), 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de renderização por documento, antes e depois das folhas de estilos pré-analisadas.")
+    parser.add_argument("--repeticoes", type=int, default=20)
+    parser.add_argument("--saida", help="Ficheiro JSON onde gravar o relatório.")
+    args = parser.parse_args()
+
+    with open(ARQUIVO_LOGO, "r") as f:
+        logo_data_uri = f.read().strip()
+    checklist = checklist_padrao()
+    termo_anterior = html_anterior(html_termo(DADOS, checklist), CSS_TERMO, logo_data_uri)
+    etiqueta_anterior = html_anterior(html_etiqueta(DADOS), CSS_ETIQUETA, logo_data_uri)
+
+    inicio = time.perf_counter()
+    documentos_utils.folha_estilos("termo")
+    documentos_utils.folha_estilos("etiqueta")
+    print(f"Folhas de estilos analisadas em {(time.perf_counter() - inicio) * 1000:.1f} ms (uma vez por processo).")
+
+    resultados = {
+        "termo": {
+            "anterior": medir(lambda: HTML(string=termo_anterior).write_pdf(), args.repeticoes),
+            "atual": medir(lambda: gerar_pdf_termo(DADOS, checklist), args.repeticoes),
+        },
+        "etiqueta": {
+            "anterior": medir(lambda: HTML(string=etiqueta_anterior).write_pdf(), args.repeticoes),
+            "atual": medir(lambda: gerar_pdf_etiqueta(DADOS), args.repeticoes),
+        },
+    }
+
+    print(f"\n{'documento':12} {'anterior (ms)':>14} {'atual (ms)':>11} {'ganho':>8} {'docs/s atual':>13}")
+    for nome, r in resultados.items():
+        a, d = r["anterior"]["mediana_ms"], r["atual"]["mediana_ms"]
+        print(f"{nome:12} {a:14.2f} {d:11.2f} {a / d:7.2f}x {r['atual']['documentos_por_segundo']:13.1f}")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump({"gerado_em": datetime.now().isoformat(timespec="seconds"), "repeticoes": args.repeticoes,
+                       "resultados": resultados}, f, ensure_ascii=False, indent=2)
+        print(f"\nRelatório gravado em {args.saida}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Benchmark dos filtros de pesquisa antes e depois das migrações de índices (migracoes_utils.py).
+
+Inicia um PostgreSQL temporário (ou usa um local com --url), cria o esquema sem índices além das
+chaves, gera a frota sintética e mede as pesquisas das páginas; depois aplica as migrações, corre
+ANALYZE e volta a medir. Para as consultas SQL mostra também os índices escolhidos pelo planeador.
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/bench_indices.py --escala media --repeticoes 5
+    python benchmarks/bench_indices.py --url postgresql://localhost/bench --saida bench_indices.json
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from contextlib import nullcontext
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, text
+import db_utils
+import inventario_utils
+import pesquisa_utils
+from migracoes_utils import aplicar_migracoes
+from frota_sintetica import ESCALAS, PostgresLocal, criar_esquema, semear, verificar_banco_local
+from bench_carregadores import medir, _commit_atual
+
+# Pesquisas das páginas, com termos que existem na frota sintética. As consultas SQL reproduzem os
+# filtros de pages/2_Colaboradores.py, 4_Movimentacoes.py, 5_Contas_Gmail.py e 8_Manutencoes.py.
+CONSULTAS_SQL = {
+    "colaboradores: nome/código/gmail": (
+        """SELECT c.id, c.nome_completo FROM colaboradores c
+           WHERE (c.nome_completo ILIKE :search OR c.codigo ILIKE :search OR c.gmail ILIKE :search)
+           ORDER BY c.nome_completo LIMIT 50""",
+        {"search": "%aborador 1234%"},
+    ),
+    "contas gmail: e-mail/colaborador": (
+        """SELECT cg.id, cg.email FROM contas_gmail cg LEFT JOIN colaboradores c ON cg.colaborador_id = c.id
+           WHERE (cg.email ILIKE :search OR c.nome_completo ILIKE :search) ORDER BY cg.email LIMIT 50""",
+        {"search": "%conta123%"},
+    ),
+    "movimentações: colaborador_snapshot": (
+        """SELECT h.id, h.data_movimentacao FROM historico_movimentacoes h
+           WHERE h.colaborador_snapshot ILIKE :colab ORDER BY h.data_movimentacao DESC LIMIT 50""",
+        {"colab": "%Colaborador 4321%"},
+    ),
+    "movimentações: histórico do aparelho": (
+        """SELECT h.id, h.data_movimentacao FROM historico_movimentacoes h
+           WHERE h.aparelho_id = :aparelho_id ORDER BY h.data_movimentacao DESC LIMIT 20""",
+        {"aparelho_id": 1234},
+    ),
+    "manutenções: em andamento": (
+        """SELECT m.id, m.data_envio FROM manutencoes m
+           WHERE m.status_manutencao = 'Em Andamento' ORDER BY m.data_envio LIMIT 100""",
+        {},
+    ),
+    "colaboradores: código e setor": (
+        "SELECT id FROM colaboradores WHERE codigo = :codigo AND setor_id = :setor_id",
+        {"codigo": "2234", "setor_id": 5},
+    ),
+}
+
+CONSULTAS_FUNCAO = {
+    "inventário: número de série/IMEI": lambda: inventario_utils.carregar_pagina_inventario.__wrapped__(
+        "Data de Entrada (Mais Recente)", ns_search="00001234"),
+    "inventário: responsável": lambda: inventario_utils.carregar_pagina_inventario.__wrapped__(
+        "Data de Entrada (Mais Recente)", responsavel_search="Colaborador 321"),
+    "sugestões: aparelhos": lambda: pesquisa_utils.pesquisar.__wrapped__("aparelhos", "00001234"),
+    "sugestões: colaboradores": lambda: pesquisa_utils.pesquisar.__wrapped__("colaboradores", "Colaborador 321"),
+    "sugestões: contas gmail": lambda: pesquisa_utils.pesquisar.__wrapped__("contas_gmail", "conta123"),
+}
+
+def indices_do_plano(engine, sql, params):
+    with engine.connect() as conexao:
+        plano = "\n".join(conexao.execute(text("EXPLAIN " + sql), params).scalars())
+    return sorted({a or b for a, b in re.findall(r"Index(?: Only)? Scan using (\w+)|Bitmap Index Scan on (\w+)", plano)})
+
+def medir_todas(engine, repeticoes):
+    resultados = {}
+    for nome, (sql, params) in CONSULTAS_SQL.items():
+        resultados[nome] = medir(lambda: db_utils.consultar(sql, params, conn=engine), repeticoes)
+        resultados[nome]["indices"] = indices_do_plano(engine, sql, params)
+    for nome, funcao in CONSULTAS_FUNCAO.items():
+        resultados[nome] = medir(funcao, repeticoes)
+    return resultados
+
+def main():
+    parser = argparse.ArgumentParser(description="Pesquisas antes e depois das migrações de índices, num PostgreSQL local.")
+    parser.add_argument("--escala", choices=list(ESCALAS), default="media", help="pequena=10k, media=100k, grande=1M movimentações.")
+    parser.add_argument("--movimentacoes", type=int, help="Número exato de movimentações (substitui --escala).")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--url", help="Usa um PostgreSQL local já em execução (o esquema é sempre recriado).")
+    parser.add_argument("--saida", help="Ficheiro JSON onde gravar o relatório.")
+    args = parser.parse_args()
+
+    movimentacoes = args.movimentacoes or ESCALAS[args.escala]
+    if args.url:
+        verificar_banco_local(args.url)
+
+    with (nullcontext() if args.url else PostgresLocal()) as pg:
+        engine = create_engine(args.url or pg.url)
+        print(f"A criar o esquema e a gerar {movimentacoes} movimentações...")
+        criar_esquema(engine)
+        dimensoes = semear(engine, movimentacoes)
+        db_utils.get_db_connection = lambda: engine
+
+        print("A medir sem os índices das migrações...")
+        antes = medir_todas(engine, args.repeticoes)
+
+        inicio = time.perf_counter()
+        aplicadas = aplicar_migracoes(engine)
+        pesquisa_utils.trigramas_disponiveis.limpar()
+        duracao_migracoes = time.perf_counter() - inicio
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conexao:
+            conexao.execute(text("ANALYZE"))
+        print(f"Migrações {aplicadas} aplicadas em {duracao_migracoes:.1f}s. A medir novamente...")
+        depois = medir_todas(engine, args.repeticoes)
+        engine.dispose()
+
+    print(f"\n{'pesquisa':42} {'antes (ms)':>11} {'depois (ms)':>12} {'ganho':>8}  índices usados")
+    for nome in antes:
+        a, d = antes[nome]["mediana_ms"], depois[nome]["mediana_ms"]
+        ganho = f"{a / d:.1f}x" if d else "-"
+        print(f"{nome:42} {a:11.2f} {d:12.2f} {ganho:>8}  {', '.join(depois[nome].get('indices', [])) or '-'}")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump({
+                "commit": _commit_atual(), "gerado_em": datetime.now().isoformat(timespec="seconds"),
+                "dimensoes": dimensoes, "repeticoes": args.repeticoes, "duracao_migracoes_s": round(duracao_migracoes, 2),
+                "antes": antes, "depois": depois,
+            }, f, ensure_ascii=False, indent=2, default=str)
+        print(f"\nRelatório gravado em {args.saida}.")
+
+if __name__ == "__main__":
+    main()
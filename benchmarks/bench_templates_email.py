@@ -0,0 +1,88 @@
+"""
+Micro-benchmark dos templates de e-mail (templates_email_utils).
+
+Mede a compilação a frio de todos os templates (com o CSS em linha) e, para os e-mails de
+redefinição de senha, devolução e relatório de manutenções, as renderizações por segundo com os
+templates já compilados (em cache) e sem cache (compilados a cada envio). Não usa o banco.
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/bench_templates_email.py --repeticoes 2000 --linhas 50
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import templates_email_utils
+from templates_email_utils import compilar_todos, regras_css
+
+def contextos(linhas):
+    agora = datetime.now()
+    manutencoes = [{
+        "id": i, "nome_marca": "Samsung", "nome_modelo": "Galaxy A54", "numero_serie": f"SN{i:06d}",
+        "setor": "Comercial" if i % 3 else None, "colaborador": f"Colaborador {i}", "fornecedor": "Assistência Técnica",
+        "data_envio": agora - timedelta(days=10 + i), "data_retorno": None if i % 4 == 0 else agora - timedelta(days=i),
+        "defeito_reportado": "Ecrã partido <após queda>", "solucao_aplicada": "Troca do ecrã",
+        "responsabilidade_custo": "Empresa", "custo_reparo": 350.0 + i,
+    } for i in range(linhas)]
+    return {
+        "redefinicao_senha": {"nome": "Maria Silva", "link": "https://assetflow.exemplo/?token=abc123", "validade_minutos": 15},
+        "devolucao": {
+            "titulo": "Devolução de Ativo - Maria Silva", "data_devolucao": agora,
+            "aparelho": {"colaborador_nome": "Maria Silva", "nome_marca": "Apple", "nome_modelo": "iPhone 13", "numero_serie": "SN000001"},
+            "checklist": {"Tela": {"entregue": True, "estado": "Bom"}, "Carregador": {"entregue": False, "estado": "Não entregue"}},
+            "destino_final": "Em estoque", "observacoes": "Sem riscos.",
+        },
+        "relatorio_manutencoes": {"registos": manutencoes, "nome": "Maria Silva", "total": sum(r["custo_reparo"] for r in manutencoes)},
+    }
+
+def medir(ambiente, nome, contexto, repeticoes):
+    template = f"{nome}.html"
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        ambiente.get_template(template).render(ano=2024, **contexto)
+    duracao = time.perf_counter() - inicio
+    return {"renderizacoes_por_segundo": round(repeticoes / duracao, 1), "ms_por_renderizacao": round(duracao / repeticoes * 1000, 4)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Renderizações por segundo dos templates de e-mail.")
+    parser.add_argument("--repeticoes", type=int, default=2000)
+    parser.add_argument("--linhas", type=int, default=50, help="Ordens de serviço no relatório de manutenções.")
+    parser.add_argument("--saida", help="Ficheiro JSON onde gravar o relatório.")
+    args = parser.parse_args()
+
+    ambiente = templates_email_utils._ambiente
+    inicio = time.perf_counter()
+    compilados = compilar_todos()
+    duracao_compilacao = time.perf_counter() - inicio
+    print(f"{compilados} templates compilados a frio em {duracao_compilacao * 1000:.1f} ms ({len(regras_css())} regras CSS em linha).")
+
+    # Sem cache: cada pedido lê o template, aplica o CSS e compila, como se não houvesse cache.
+    sem_cache = ambiente.overlay(cache_size=0)
+    repeticoes_sem_cache = max(1, args.repeticoes // 20)
+    resultados = {}
+    for nome, contexto in contextos(args.linhas).items():
+        resultados[nome] = {
+            "em_cache": medir(ambiente, nome, contexto, args.repeticoes),
+            "sem_cache": medir(sem_cache, nome, contexto, repeticoes_sem_cache),
+        }
+
+    print(f"\n{'template':24} {'em cache (/s)':>14} {'sem cache (/s)':>15} {'ganho':>8}")
+    for nome, r in resultados.items():
+        c, s = r["em_cache"]["renderizacoes_por_segundo"], r["sem_cache"]["renderizacoes_por_segundo"]
+        print(f"{nome:24} {c:14.1f} {s:15.1f} {c / s:7.1f}x")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump({
+                "gerado_em": datetime.now().isoformat(timespec="seconds"), "repeticoes": args.repeticoes,
+                "linhas": args.linhas, "compilacao_ms": round(duracao_compilacao * 1000, 2), "resultados": resultados,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\nRelatório gravado em {args.saida}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Banco PostgreSQL local e frota sintética para os benchmarks.
+
+PostgresLocal cria uma instância temporária (initdb + pg_ctl, num diretório temporário que é
+apagado no fim), para que os benchmarks nunca toquem no Supabase de produção.
+criar_esquema() aplica benchmarks/schema.sql e semear() preenche o banco com uma frota
+proporcional ao número de movimentações pedido, gerada no próprio servidor com generate_series
+(1M de movimentações demora segundos, não minutos). Com a mesma semente os dados são sempre os mesmos.
+"""
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from posse_utils import DDL_POSSE_ATUAL, reconstruir_posse_atual
+
+CAMINHO_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema.sql")
+
+ESCALAS = {"pequena": 10_000, "media": 100_000, "grande": 1_000_000}
+HOSTS_LOCAIS = {"localhost", "127.0.0.1", "::1", ""}
+
+class PostgresLocal:
+    """Instância temporária do PostgreSQL para benchmarks. Use com `with PostgresLocal() as pg: pg.url`."""
+
+    def __init__(self, porta=None, banco="assetflow_bench"):
+        self.porta = porta
+        self.banco = banco
+        self.diretorio = None
+        self.url = None
+
+    def __enter__(self):
+        for binario in ("initdb", "pg_ctl"):
+            if shutil.which(binario) is None:
+                raise RuntimeError(f"'{binario}' não encontrado no PATH. Instale o PostgreSQL ou indique um banco local com --url.")
+        self.diretorio = tempfile.mkdtemp(prefix="assetflow_pg_")
+        dados = os.path.join(self.diretorio, "dados")
+        try:
+            subprocess.run(["initdb", "-D", dados, "-U", "bench", "--auth=trust", "--encoding=UTF8", "--no-locale"],
+                           check=True, capture_output=True)
+            self.porta = self.porta or _porta_livre()
+            # fsync desligado: os dados são descartáveis e o foco dos benchmarks são as leituras.
+            opcoes = f"-p {self.porta} -k {self.diretorio} -c listen_addresses=127.0.0.1 -c fsync=off"
+            subprocess.run(["pg_ctl", "-D", dados, "-l", os.path.join(self.diretorio, "postgres.log"), "-w", "-o", opcoes, "start"],
+                           check=True, capture_output=True)
+        except Exception:
+            shutil.rmtree(self.diretorio, ignore_errors=True)
+            raise
+
+        administracao = create_engine(f"postgresql+psycopg2://bench@127.0.0.1:{self.porta}/postgres", isolation_level="AUTOCOMMIT")
+        with administracao.connect() as conexao:
+            conexao.execute(text(f"CREATE DATABASE {self.banco}"))
+        administracao.dispose()
+        self.url = f"postgresql+psycopg2://bench@127.0.0.1:{self.porta}/{self.banco}"
+        return self
+
+    def __exit__(self, *exc):
+        subprocess.run(["pg_ctl", "-D", os.path.join(self.diretorio, "dados"), "-m", "fast", "stop"], capture_output=True)
+        shutil.rmtree(self.diretorio, ignore_errors=True)
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def verificar_banco_local(url):
+    """Recusa URLs que não apontem para um servidor local, já que o esquema é apagado e recriado."""
+    host = urlparse(url).hostname or ""
+    if host not in HOSTS_LOCAIS:
+        raise RuntimeError(f"O benchmark só recria o esquema em servidores locais (host '{host}' recusado).")
+
+def criar_esquema(engine):
+    """Apaga e recria o esquema public com as tabelas da aplicação."""
+    with open(CAMINHO_SCHEMA, encoding="utf-8") as f:
+        schema_sql = f.read()
+    with engine.begin() as conexao:
+        conexao.execute(text("DROP SCHEMA IF EXISTS public CASCADE"))
+        conexao.execute(text("CREATE SCHEMA public"))
+        conexao.execute(text(schema_sql))
+        conexao.execute(text(DDL_POSSE_ATUAL))
+
+def dimensoes(movimentacoes):
+    """Tamanho de cada tabela em função do número de movimentações (aprox. 10 movimentações por aparelho)."""
+    aparelhos = max(movimentacoes // 10, 100)
+    colaboradores = max(int(aparelhos * 0.6), 50)
+    return {
+        "movimentacoes": movimentacoes,
+        "aparelhos": aparelhos,
+        "colaboradores": colaboradores,
+        "setores": 15,
+        "manutencoes": max(movimentacoes // 20, 10),
+        "contas_gmail": colaboradores // 2,
+        "logs_documentos": max(movimentacoes // 10, 10),
+        "colaboradores_desligados": max(colaboradores // 50, 1),
+        "compras_ativos": 200,
+    }
+
+SQL_SEMEAR = [
+    """INSERT INTO status (nome_status) VALUES ('Em uso'), ('Em estoque'), ('Em manutenção'), ('Baixado/Inutilizado')""",
+    """INSERT INTO setores (nome_setor) SELECT 'Setor ' || g FROM generate_series(1, :setores) g""",
+    """INSERT INTO marcas (nome_marca) SELECT unnest(ARRAY['Samsung', 'Apple', 'Motorola', 'Xiaomi', 'Asus', 'LG', 'Nokia', 'Positivo'])""",
+    """INSERT INTO modelos (nome_modelo, marca_id) SELECT 'Modelo ' || g, m.id FROM marcas m CROSS JOIN generate_series(1, 5) g""",
+    """
+    INSERT INTO colaboradores (codigo, nome_completo, cpf, gmail, setor_id, data_cadastro, status)
+    SELECT (1000 + g)::TEXT, 'Colaborador ' || g, lpad(g::TEXT, 11, '0'), 'colaborador' || g || '@gmail.com',
+           (SELECT id FROM setores ORDER BY id OFFSET (g % :setores) LIMIT 1),
+           CURRENT_DATE - (g % 1500), CASE WHEN g % 25 = 0 THEN 'Inativo' ELSE 'Ativo' END
+    FROM generate_series(1, :colaboradores) g
+    """,
+    """
+    INSERT INTO aparelhos (numero_serie, imei1, imei2, valor, modelo_id, status_id, data_cadastro)
+    SELECT 'NS' || lpad(g::TEXT, 10, '0'),
+           lpad((floor(random() * 1e15))::BIGINT::TEXT, 15, '0'), lpad((floor(random() * 1e15))::BIGINT::TEXT, 15, '0'),
+           round((800 + random() * 6000)::NUMERIC, 2),
+           (SELECT MIN(id) FROM modelos) + floor(random() * (SELECT COUNT(*) FROM modelos))::BIGINT,
+           (SELECT id FROM status WHERE nome_status = 'Em estoque'),
+           CURRENT_DATE - floor(random() * 1500)::INT
+    FROM generate_series(1, :aparelhos) g
+    """,
+    # Distribuição das movimentações: 60% entregas, 15% devoluções com checklist, 10% entradas em
+    # estoque, 10% envios para manutenção e 5% baixas.
+    """
+    INSERT INTO historico_movimentacoes
+        (data_movimentacao, aparelho_id, colaborador_id, status_id, localizacao_atual, observacoes, colaborador_snapshot, checklist_devolucao)
+    SELECT x.data,
+           x.aparelho_id,
+           CASE WHEN x.r < 0.75 THEN x.colaborador_id END,
+           (SELECT id FROM status WHERE nome_status = CASE
+                WHEN x.r < 0.60 THEN 'Em uso' WHEN x.r < 0.85 THEN 'Em estoque'
+                WHEN x.r < 0.95 THEN 'Em manutenção' ELSE 'Baixado/Inutilizado' END),
+           CASE WHEN x.r < 0.60 THEN 'Com o colaborador' ELSE 'Estoque Interno' END,
+           'Movimentação sintética ' || x.g,
+           CASE WHEN x.r < 0.75 THEN 'Colaborador ' || x.colaborador_id END,
+           CASE WHEN x.r >= 0.60 AND x.r < 0.75
+                THEN jsonb_build_object('Tela', 'OK', 'Carregador', CASE WHEN x.g % 3 = 0 THEN 'Ausente' ELSE 'OK' END) END
+    FROM (
+        SELECT g, random() AS r,
+               NOW() - random() * INTERVAL '1095 days' AS data,
+               (SELECT MIN(id) FROM aparelhos) + floor(random() * :aparelhos)::BIGINT AS aparelho_id,
+               (SELECT MIN(id) FROM colaboradores) + floor(random() * :colaboradores)::BIGINT AS colaborador_id
+        FROM generate_series(1, :movimentacoes) g
+    ) x
+    """,
+    # O status de cada aparelho passa a ser o da sua última movimentação.
+    """
+    UPDATE aparelhos a SET status_id = ultima.status_id
+    FROM (
+        SELECT DISTINCT ON (aparelho_id) aparelho_id, status_id
+        FROM historico_movimentacoes ORDER BY aparelho_id, data_movimentacao DESC, id DESC
+    ) ultima
+    WHERE a.id = ultima.aparelho_id
+    """,
+    """
+    INSERT INTO manutencoes (aparelho_id, colaborador_id_no_envio, colaborador_snapshot, fornecedor, data_envio, data_retorno,
+                             defeito_reportado, solucao_aplicada, custo_reparo, responsabilidade_custo, status_manutencao)
+    SELECT x.aparelho_id, x.colaborador_id, 'Colaborador ' || x.colaborador_id, 'Fornecedor ' || (x.g % 6 + 1), x.envio,
+           CASE WHEN x.concluida THEN x.envio + (1 + floor(random() * 20))::INT END,
+           'Defeito sintético ' || (x.g % 12),
+           CASE WHEN x.concluida THEN 'Reparo realizado' END,
+           CASE WHEN x.concluida THEN round((random() * 900)::NUMERIC, 2) END,
+           CASE WHEN x.concluida THEN (ARRAY['Empresa', 'Colaborador'])[1 + x.g % 2] END,
+           CASE WHEN x.concluida THEN 'Concluída' ELSE 'Em Andamento' END
+    FROM (
+        SELECT g, random() < 0.8 AS concluida, CURRENT_DATE - floor(random() * 730)::INT AS envio,
+               (SELECT MIN(id) FROM aparelhos) + floor(random() * :aparelhos)::BIGINT AS aparelho_id,
+               (SELECT MIN(id) FROM colaboradores) + floor(random() * :colaboradores)::BIGINT AS colaborador_id
+        FROM generate_series(1, :manutencoes) g
+    ) x
+    """,
+    """
+    INSERT INTO contas_gmail (email, senha, telefone_recuperacao, email_recuperacao, setor_id, colaborador_id)
+    SELECT 'conta' || c.id || '@gmail.com', 'senha' || c.id, '1199999' || lpad(c.id::TEXT, 4, '0'), 'recuperacao' || c.id || '@email.com',
+           c.setor_id, c.id
+    FROM colaboradores c ORDER BY c.id LIMIT :contas_gmail
+    """,
+    """
+    INSERT INTO logs_documentos (data_geracao, tipo_documento, usuario_responsavel, alvo_documento, detalhes)
+    SELECT NOW() - random() * INTERVAL '730 days', (ARRAY['Termo de Responsabilidade', 'Termo de Devolução', 'Etiqueta'])[1 + g % 3],
+           'Administrador', 'Colaborador ' || g, 'Documento sintético ' || g
+    FROM generate_series(1, :logs_documentos) g
+    """,
+    """
+    INSERT INTO colaboradores_desligados (id, codigo, nome_completo, cpf, gmail, setor_nome, data_cadastro, data_exclusao)
+    SELECT :colaboradores + g, (5000 + g)::TEXT, 'Desligado ' || g, lpad((:colaboradores + g)::TEXT, 11, '0'),
+           'desligado' || g || '@gmail.com', 'Setor ' || (g % :setores + 1), CURRENT_DATE - 1500 + g % 1000,
+           NOW() - random() * INTERVAL '365 days'
+    FROM generate_series(1, :colaboradores_desligados) g
+    """,
+    """
+    INSERT INTO compras_ativos (data_compra, modelo_id, quantidade, valor_unitario, comprador_nome, loja)
+    SELECT CURRENT_DATE - g * 5, (SELECT MIN(id) FROM modelos) + g % 40, 1 + g % 20, round((800 + random() * 6000)::NUMERIC, 2),
+           'Comprador ' || g, 'Loja ' || (g % 4 + 1)
+    FROM generate_series(1, :compras_ativos) g
+    """,
+    """INSERT INTO usuarios (nome, login, senha, cargo) VALUES ('Benchmark', 'bench@assetflow.local', 'x', 'Administrador')""",
+]
+
+def semear(engine, movimentacoes, semente=0.42):
+    """Preenche o banco (já com o esquema criado) e devolve as dimensões usadas."""
+    params = dimensoes(movimentacoes)
+    with engine.begin() as conexao:
+        conexao.execute(text("SELECT setseed(:semente)"), {"semente": semente})
+        for sql in SQL_SEMEAR:
+            conexao.execute(text(sql), params)
+        reconstruir_posse_atual(conexao)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conexao:
+        conexao.execute(text("ANALYZE"))
+    return params
@@ -0,0 +1,134 @@
+-- Esquema das tabelas usadas pelas páginas, reconstruído a partir das consultas da aplicação.
+-- Usado pelos benchmarks locais (benchmarks/frota_sintetica.py); não substitui o banco do Supabase.
+-- A tabela aparelho_posse_atual é criada por posse_utils.DDL_POSSE_ATUAL.
+
+CREATE TABLE setores (
+    id BIGSERIAL PRIMARY KEY,
+    nome_setor TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE marcas (
+    id BIGSERIAL PRIMARY KEY,
+    nome_marca TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE modelos (
+    id BIGSERIAL PRIMARY KEY,
+    nome_modelo TEXT NOT NULL,
+    marca_id BIGINT NOT NULL REFERENCES marcas(id),
+    UNIQUE (marca_id, nome_modelo)
+);
+
+CREATE TABLE status (
+    id BIGSERIAL PRIMARY KEY,
+    nome_status TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE colaboradores (
+    id BIGSERIAL PRIMARY KEY,
+    codigo TEXT,
+    nome_completo TEXT NOT NULL,
+    cpf TEXT UNIQUE,
+    gmail TEXT,
+    setor_id BIGINT REFERENCES setores(id),
+    data_cadastro DATE DEFAULT CURRENT_DATE,
+    status TEXT NOT NULL DEFAULT 'Ativo'
+);
+
+CREATE TABLE colaboradores_desligados (
+    id BIGINT PRIMARY KEY,
+    codigo TEXT,
+    nome_completo TEXT,
+    cpf TEXT,
+    gmail TEXT,
+    setor_nome TEXT,
+    data_cadastro DATE,
+    data_exclusao TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE aparelhos (
+    id BIGSERIAL PRIMARY KEY,
+    numero_serie TEXT NOT NULL UNIQUE,
+    imei1 TEXT,
+    imei2 TEXT,
+    valor NUMERIC(12, 2),
+    modelo_id BIGINT REFERENCES modelos(id),
+    status_id BIGINT REFERENCES status(id),
+    data_cadastro DATE DEFAULT CURRENT_DATE
+);
+
+CREATE TABLE historico_movimentacoes (
+    id BIGSERIAL PRIMARY KEY,
+    data_movimentacao TIMESTAMP NOT NULL DEFAULT NOW(),
+    aparelho_id BIGINT NOT NULL REFERENCES aparelhos(id) ON DELETE CASCADE,
+    colaborador_id BIGINT REFERENCES colaboradores(id),
+    status_id BIGINT NOT NULL REFERENCES status(id),
+    localizacao_atual TEXT,
+    observacoes TEXT,
+    colaborador_snapshot TEXT,
+    checklist_devolucao JSONB
+);
+
+CREATE TABLE manutencoes (
+    id BIGSERIAL PRIMARY KEY,
+    aparelho_id BIGINT NOT NULL REFERENCES aparelhos(id) ON DELETE CASCADE,
+    colaborador_id_no_envio BIGINT REFERENCES colaboradores(id),
+    colaborador_snapshot TEXT,
+    fornecedor TEXT,
+    data_envio DATE NOT NULL DEFAULT CURRENT_DATE,
+    data_retorno DATE,
+    defeito_reportado TEXT,
+    solucao_aplicada TEXT,
+    custo_reparo NUMERIC(12, 2),
+    responsabilidade_custo TEXT,
+    status_manutencao TEXT NOT NULL DEFAULT 'Em Andamento'
+);
+
+CREATE TABLE contas_gmail (
+    id BIGSERIAL PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    senha TEXT,
+    telefone_recuperacao TEXT,
+    email_recuperacao TEXT,
+    setor_id BIGINT REFERENCES setores(id),
+    colaborador_id BIGINT REFERENCES colaboradores(id)
+);
+
+CREATE TABLE logs_documentos (
+    id BIGSERIAL PRIMARY KEY,
+    data_geracao TIMESTAMP NOT NULL DEFAULT NOW(),
+    tipo_documento TEXT,
+    usuario_responsavel TEXT,
+    alvo_documento TEXT,
+    detalhes TEXT
+);
+
+CREATE TABLE usuarios (
+    id BIGSERIAL PRIMARY KEY,
+    nome TEXT NOT NULL,
+    login TEXT NOT NULL UNIQUE,
+    senha TEXT NOT NULL,
+    cargo TEXT NOT NULL
+);
+
+CREATE TABLE password_resets (
+    id BIGSERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
+    reset_token TEXT NOT NULL UNIQUE,
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE TABLE compras_ativos (
+    id BIGSERIAL PRIMARY KEY,
+    data_compra DATE NOT NULL,
+    modelo_id BIGINT REFERENCES modelos(id),
+    quantidade INTEGER NOT NULL,
+    valor_unitario NUMERIC(12, 2),
+    imeis_texto TEXT,
+    comprador_nome TEXT,
+    comprador_cpf TEXT,
+    loja TEXT,
+    loja_login TEXT,
+    loja_senha TEXT,
+    nota_fiscal_path TEXT
+);
@@ -0,0 +1,210 @@
+import atexit
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+# --- Cache de Documentos Gerados (endereçada pelo conteúdo) ---
+# A chave de cada documento é o SHA-256 da versão dos templates, do tipo de documento e de todos os
+# argumentos da geração (dados, checklist e logo). Um pedido idêntico devolve o PDF já gerado sem
+# voltar a renderizar; qualquer alteração nos dados, no checklist, na logo ou nos templates gera
+# uma chave nova, por isso nunca é preciso invalidar entradas.
+# As entradas ficam em memória até MAX_MEMORIA_BYTES; as menos usadas recentemente passam para o
+# disco, que por sua vez descarta as menos usadas acima de MAX_DISCO_BYTES. Uma entrada lida do
+# disco volta para a memória. A cache vive no processo e é partilhada por todas as sessões.
+# No disco cada entrada é o PDF (ou ZIP) tal como foi gerado e, nos lotes, um .json ao lado com as
+# estatísticas; nada é desserializado a partir do disco. Os termos trazem nomes e CPFs, por isso a
+# pasta de cada processo (dentro de PASTA_CACHE, só acessível ao utilizador da aplicação) é apagada
+# quando o processo termina e as pastas de processos que já não existem são apagadas no arranque;
+# entradas de execuções anteriores nunca são reaproveitadas.
+
+MAX_MEMORIA_BYTES = int(os.environ.get("ASSETFLOW_PDF_CACHE_MEMORIA_MB", 64)) * 1024 * 1024
+MAX_DISCO_BYTES = int(os.environ.get("ASSETFLOW_PDF_CACHE_DISCO_MB", 512)) * 1024 * 1024
+PASTA_CACHE = os.environ.get("ASSETFLOW_PDF_CACHE_PASTA") or os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "assetflow", "pdf")
+EXTENSAO = ".pdf"
+EXTENSAO_ESTATISTICAS = ".json"
+
+def chave_documento(versao, tarefa, argumentos):
+    """SHA-256 (hex) da versão dos templates, da tarefa e dos argumentos (textos, como a logo, entram tal como estão)."""
+    h = hashlib.sha256()
+    for parte in (versao, tarefa, *argumentos):
+        if isinstance(parte, str):
+            dados = parte.encode("utf-8")
+        else:
+            dados = json.dumps(parte, sort_keys=True, default=str, ensure_ascii=False).encode("utf-8")
+        # O tamanho antes de cada parte evita que partes diferentes produzam o mesmo fluxo de bytes.
+        h.update(len(dados).to_bytes(8, "big"))
+        h.update(dados)
+    return h.hexdigest()
+
+def _processo_ativo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # existe, mas pertence a outro utilizador
+    return True
+
+def _criar_pasta_processo(base):
+    """Cria base (0700) e, dentro dela, a pasta deste processo; apaga as pastas de processos terminados."""
+    os.makedirs(base, mode=0o700, exist_ok=True)
+    os.chmod(base, 0o700)  # makedirs não altera uma pasta que já existia
+    for entrada in os.scandir(base):
+        pid = entrada.name.split("-", 1)[0]
+        if entrada.is_dir(follow_symlinks=False) and pid.isdigit() and not _processo_ativo(int(pid)):
+            shutil.rmtree(entrada.path, ignore_errors=True)
+    return tempfile.mkdtemp(prefix=f"{os.getpid()}-", dir=base)  # criada com o modo 0700
+
+class CacheDocumentos:
+    def __init__(self, max_memoria=MAX_MEMORIA_BYTES, max_disco=MAX_DISCO_BYTES, pasta=PASTA_CACHE):
+        self._lock = threading.Lock()
+        self.max_memoria = max_memoria
+        self.max_disco = max_disco
+        self._memoria = OrderedDict()       # chave -> (conteúdo, estatísticas ou None), do menos para o mais recente
+        self._bytes_memoria = 0
+        self._disco = OrderedDict()         # chave -> bytes ocupados no disco, do menos para o mais recente
+        self._bytes_disco = 0
+        self.contadores = {"hits_memoria": 0, "hits_disco": 0, "misses": 0, "guardados": 0,
+                           "para_disco": 0, "descartados": 0}
+        try:
+            self.pasta = _criar_pasta_processo(pasta)
+        except OSError:
+            self.pasta = None  # sem disco: a cache fica só em memória
+        else:
+            atexit.register(shutil.rmtree, self.pasta, True)
+
+    def _caminho(self, chave, extensao=EXTENSAO):
+        return os.path.join(self.pasta, chave + extensao)
+
+    @staticmethod
+    def _separar(valor):
+        # As tarefas devolvem os bytes do documento ou (bytes, estatísticas).
+        if isinstance(valor, tuple):
+            conteudo, estatisticas = valor
+            return conteudo, json.dumps(estatisticas, default=str).encode("utf-8")
+        return valor, None
+
+    @staticmethod
+    def _juntar(conteudo, estatisticas):
+        return conteudo if estatisticas is None else (conteudo, json.loads(estatisticas))
+
+    @staticmethod
+    def _tamanho(entrada):
+        conteudo, estatisticas = entrada
+        return len(conteudo) + len(estatisticas or b"")
+
+    def _escrever(self, caminho, dados):
+        temporario = f"{caminho}.tmp"
+        descritor = os.open(temporario, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descritor, "wb") as f:
+            f.write(dados)
+        os.replace(temporario, caminho)  # nunca fica um ficheiro incompleto com o nome da chave
+
+    def _remover_disco(self, chave):
+        self._bytes_disco -= self._disco.pop(chave)
+        for extensao in (EXTENSAO, EXTENSAO_ESTATISTICAS):
+            try:
+                os.remove(self._caminho(chave, extensao))
+            except OSError:
+                pass
+
+    def _limitar_disco(self):
+        while self._disco and self._bytes_disco > self.max_disco:
+            self._remover_disco(next(iter(self._disco)))
+            self.contadores["descartados"] += 1
+
+    def _para_disco(self, chave, entrada):
+        if self.pasta is None:
+            self.contadores["descartados"] += 1
+            return
+        conteudo, estatisticas = entrada
+        try:
+            if estatisticas is not None:
+                self._escrever(self._caminho(chave, EXTENSAO_ESTATISTICAS), estatisticas)
+            self._escrever(self._caminho(chave), conteudo)
+        except OSError:
+            self.contadores["descartados"] += 1
+            return
+        if chave in self._disco:
+            self._bytes_disco -= self._disco.pop(chave)
+        self._disco[chave] = self._tamanho(entrada)
+        self._bytes_disco += self._disco[chave]
+        self.contadores["para_disco"] += 1
+        self._limitar_disco()
+
+    def _ler_disco(self, chave):
+        try:
+            with open(self._caminho(chave), "rb") as f:
+                conteudo = f.read()
+            estatisticas = None
+            if os.path.exists(self._caminho(chave, EXTENSAO_ESTATISTICAS)):
+                with open(self._caminho(chave, EXTENSAO_ESTATISTICAS), "rb") as f:
+                    estatisticas = f.read()
+        except OSError:
+            return None
+        return conteudo, estatisticas
+
+    def _guardar_memoria(self, chave, entrada):
+        if chave in self._memoria:
+            self._bytes_memoria -= self._tamanho(self._memoria.pop(chave))
+        self._memoria[chave] = entrada
+        self._bytes_memoria += self._tamanho(entrada)
+        while self._bytes_memoria > self.max_memoria and len(self._memoria) > 1:
+            antiga, valor = self._memoria.popitem(last=False)
+            self._bytes_memoria -= self._tamanho(valor)
+            self._para_disco(antiga, valor)
+
+    def obter(self, chave):
+        """Devolve (True, valor) se o documento estiver na cache (memória ou disco); (False, None) caso contrário."""
+        with self._lock:
+            entrada = self._memoria.get(chave)
+            if entrada is not None:
+                self._memoria.move_to_end(chave)
+                self.contadores["hits_memoria"] += 1
+                return True, self._juntar(*entrada)
+            if chave in self._disco:
+                entrada = self._ler_disco(chave)
+                # Volta para a memória; o ficheiro sai do disco para não contar duas vezes.
+                self._remover_disco(chave)
+                if entrada is not None:
+                    self._guardar_memoria(chave, entrada)
+                    self.contadores["hits_disco"] += 1
+                    return True, self._juntar(*entrada)
+            self.contadores["misses"] += 1
+            return False, None
+
+    def guardar(self, chave, valor):
+        entrada = self._separar(valor)
+        with self._lock:
+            if chave in self._disco:
+                # A cópia no disco seria contada duas vezes (e ficaria para trás se a chave voltasse à memória).
+                self._remover_disco(chave)
+            if self._tamanho(entrada) > self.max_memoria:
+                self._para_disco(chave, entrada)
+            else:
+                self._guardar_memoria(chave, entrada)
+            self.contadores["guardados"] += 1
+
+    def estatisticas(self):
+        with self._lock:
+            c = dict(self.contadores)
+            pedidos = c["hits_memoria"] + c["hits_disco"] + c["misses"]
+            c.update(
+                pedidos=pedidos,
+                taxa_acerto=(c["hits_memoria"] + c["hits_disco"]) / pedidos if pedidos else None,
+                entradas_memoria=len(self._memoria), bytes_memoria=self._bytes_memoria,
+                entradas_disco=len(self._disco), bytes_disco=self._bytes_disco,
+            )
+            return c
+
+    def limpar(self):
+        with self._lock:
+            for chave in list(self._disco):
+                self._remover_disco(chave)
+            self._memoria.clear()
+            self._bytes_memoria = 0
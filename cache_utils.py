@@ -0,0 +1,163 @@
+import contextvars
+import copy
+import functools
+import threading
+import time
+from collections import defaultdict
+
+# --- Cache por Tabelas (invalidação seletiva) ---
+# Cada função de carregamento declara as tabelas que lê e cada operação de escrita declara as
+# tabelas que altera. Uma escrita remove apenas as entradas que dependem dessas tabelas, em vez
+# de limpar todo o cache do servidor com st.cache_data.clear().
+# O cache vive no processo e é partilhado por todas as sessões, tal como o st.cache_data.
+
+MAX_ENTRADAS = 2000
+
+class CacheTabelas:
+    def __init__(self, max_entradas=MAX_ENTRADAS):
+        self._lock = threading.RLock()
+        self._max_entradas = max_entradas
+        self._entradas = {}                     # chave -> (valor, expira_em, tabelas)
+        self._chaves_por_tabela = defaultdict(set)
+        self._geracao_tabela = defaultdict(int)  # incrementa a cada invalidação da tabela
+        self._ouvintes = []
+        self._contadores = defaultdict(lambda: {"hits": 0, "misses": 0, "evictions": 0})
+
+    def _remover(self, chave):
+        valor, expira_em, tabelas = self._entradas.pop(chave)
+        for tabela in tabelas:
+            self._chaves_por_tabela[tabela].discard(chave)
+
+    def obter(self, chave):
+        """Devolve (True, valor) se a chave estiver em cache e válida; (False, None) caso contrário."""
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None and entrada[1] is not None and entrada[1] <= time.monotonic():
+                self._remover(chave)
+                entrada = None
+            if entrada is None:
+                self._contadores[chave[0]]["misses"] += 1
+                return False, None
+            self._contadores[chave[0]]["hits"] += 1
+            return True, entrada[0]
+
+    def geracoes(self, tabelas):
+        with self._lock:
+            return tuple(self._geracao_tabela[t] for t in tabelas)
+
+    def guardar(self, chave, valor, tabelas, ttl, geracoes_iniciais):
+        with self._lock:
+            # Se alguma tabela foi alterada enquanto o valor era calculado, o resultado já nasceu desatualizado.
+            if self.geracoes(tabelas) != geracoes_iniciais:
+                return
+            if chave in self._entradas:
+                self._remover(chave)
+            while len(self._entradas) >= self._max_entradas:
+                self._remover(next(iter(self._entradas)))
+            expira_em = time.monotonic() + ttl if ttl else None
+            self._entradas[chave] = (valor, expira_em, tabelas)
+            for tabela in tabelas:
+                self._chaves_por_tabela[tabela].add(chave)
+
+    def invalidar_tabelas(self, tabelas):
+        with self._lock:
+            for tabela in tabelas:
+                self._geracao_tabela[tabela] += 1
+                for chave in list(self._chaves_por_tabela.get(tabela, ())):
+                    if chave in self._entradas:
+                        self._remover(chave)
+                        self._contadores[chave[0]]["evictions"] += 1
+            ouvintes = list(self._ouvintes)
+        for ouvinte in ouvintes:
+            ouvinte(tabelas)
+
+    def limpar_funcao(self, nome_funcao):
+        with self._lock:
+            for chave in [c for c in self._entradas if c[0] == nome_funcao]:
+                self._remover(chave)
+                self._contadores[nome_funcao]["evictions"] += 1
+
+    def limpar(self):
+        with self._lock:
+            for tabela in list(self._chaves_por_tabela):
+                self._geracao_tabela[tabela] += 1
+            self._entradas.clear()
+            self._chaves_por_tabela.clear()
+
+    def adicionar_ouvinte(self, ouvinte):
+        """Regista uma função chamada com a lista de tabelas sempre que houver uma invalidação."""
+        with self._lock:
+            if ouvinte not in self._ouvintes:
+                self._ouvintes.append(ouvinte)
+
+    def estatisticas(self):
+        with self._lock:
+            por_funcao = {nome: dict(c) for nome, c in self._contadores.items()}
+            entradas_por_funcao = defaultdict(int)
+            for chave in self._entradas:
+                entradas_por_funcao[chave[0]] += 1
+            for nome, total in entradas_por_funcao.items():
+                por_funcao.setdefault(nome, {"hits": 0, "misses": 0, "evictions": 0})["entradas"] = total
+            totais = {k: sum(c[k] for c in self._contadores.values()) for k in ("hits", "misses", "evictions")}
+            totais["entradas"] = len(self._entradas)
+            return {"totais": totais, "por_funcao": por_funcao}
+
+_cache = CacheTabelas()
+
+# Função de carregamento em cálculo (após um miss); usada pelo diagnóstico para atribuir as consultas.
+_carregador_atual = contextvars.ContextVar("carregador_atual", default=None)
+
+def carregador_atual():
+    """Nome ("ficheiro:função") da função com cache_tabelas que está a ser calculada, ou None."""
+    return _carregador_atual.get()
+
+def _nome_funcao(func):
+    # Os scripts das páginas correm todos como "__main__"; o ficheiro distingue funções homónimas.
+    ficheiro = func.__code__.co_filename.replace("\\", "/").rsplit("/", 1)[-1]
+    return f"{ficheiro}:{func.__qualname__}"
+
+def cache_tabelas(*tabelas, ttl=None):
+    """
+    Decorador que guarda o resultado da função em cache até que uma das tabelas declaradas seja
+    invalidada com invalidar_tabelas() ou que o ttl (em segundos) expire.
+    Tal como o st.cache_data, devolve sempre uma cópia, para que a página possa alterar o resultado.
+    """
+    tabelas = tuple(tabelas)
+
+    def decorador(func):
+        nome = _nome_funcao(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            chave = (nome, repr(args), repr(sorted(kwargs.items())))
+            encontrado, valor = _cache.obter(chave)
+            if encontrado:
+                return copy.deepcopy(valor)
+            geracoes_iniciais = _cache.geracoes(tabelas)
+            token = _carregador_atual.set(nome)
+            try:
+                valor = func(*args, **kwargs)
+            finally:
+                _carregador_atual.reset(token)
+            _cache.guardar(chave, copy.deepcopy(valor), tabelas, ttl, geracoes_iniciais)
+            return valor
+
+        wrapper.tabelas = tabelas
+        wrapper.limpar = lambda: _cache.limpar_funcao(nome)
+        return wrapper
+    return decorador
+
+def invalidar_tabelas(*tabelas):
+    """Remove do cache todas as entradas que leem alguma das tabelas indicadas."""
+    _cache.invalidar_tabelas(tabelas)
+
+def limpar_cache():
+    """Esvazia todo o cache (equivalente ao antigo st.cache_data.clear())."""
+    _cache.limpar()
+
+def ao_invalidar(ouvinte):
+    _cache.adicionar_ouvinte(ouvinte)
+
+def estatisticas_cache():
+    """Contadores de hits, misses e evictions, totais e por função."""
+    return _cache.estatisticas()
@@ -0,0 +1,129 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import pandas as pd
+from db_utils import consultar
+
+# --- Consultas do Dashboard ---
+# Todos os indicadores e agregados (contagens, valores, distribuição por status e por setor)
+# vêm de um único comando; as listas de detalhe correm em paralelo num pequeno pool de threads.
+# Assim o carregamento custa uma ida ao banco em vez de dez em sequência.
+
+DIAS_MANUTENCAO_ATRASADA = 5
+
+QUERY_KPIS = """
+    WITH ap AS (
+        SELECT a.id, a.valor, s.nome_status, p.colaborador_id
+        FROM aparelhos a
+        JOIN status s ON a.status_id = s.id
+        LEFT JOIN aparelho_posse_atual p ON a.id = p.aparelho_id
+    ), multiplos AS (
+        SELECT colaborador_id FROM ap
+        WHERE nome_status = 'Em uso' AND colaborador_id IS NOT NULL
+        GROUP BY colaborador_id HAVING COUNT(*) > 1
+    )
+    SELECT
+        COUNT(*) FILTER (WHERE nome_status != 'Baixado/Inutilizado') AS total_aparelhos,
+        COALESCE(SUM(valor) FILTER (WHERE nome_status != 'Baixado/Inutilizado'), 0) AS valor_total,
+        COUNT(*) FILTER (WHERE nome_status = 'Em manutenção') AS aparelhos_manutencao,
+        COUNT(*) FILTER (WHERE nome_status = 'Em estoque') AS aparelhos_estoque,
+        (SELECT COUNT(*) FROM colaboradores) AS total_colaboradores,
+        (SELECT COUNT(*) FROM multiplos) AS colaboradores_multiplos,
+        (
+            SELECT COALESCE(json_agg(json_build_object('nome_status', nome_status, 'quantidade', quantidade)), '[]'::json)
+            FROM (SELECT nome_status, COUNT(*) AS quantidade FROM ap GROUP BY nome_status) por_status
+        ) AS por_status,
+        (
+            SELECT COALESCE(json_agg(json_build_object('nome_setor', nome_setor, 'quantidade', quantidade)), '[]'::json)
+            FROM (
+                SELECT se.nome_setor, COUNT(*) AS quantidade
+                FROM ap
+                JOIN colaboradores c ON ap.colaborador_id = c.id
+                JOIN setores se ON c.setor_id = se.id
+                WHERE ap.nome_status = 'Em uso'
+                GROUP BY se.nome_setor
+            ) por_setor
+        ) AS por_setor
+    FROM ap;
+"""
+
+QUERY_MULTIPLOS_APARELHOS = """
+    WITH em_uso AS (
+        SELECT p.colaborador_id, a.numero_serie, a.modelo_id, p.data_movimentacao
+        FROM aparelhos a
+        JOIN status s ON a.status_id = s.id
+        JOIN aparelho_posse_atual p ON a.id = p.aparelho_id
+        WHERE s.nome_status = 'Em uso' AND p.colaborador_id IS NOT NULL
+    ), multiplos AS (
+        SELECT colaborador_id FROM em_uso GROUP BY colaborador_id HAVING COUNT(*) > 1
+    )
+    SELECT c.nome_completo, setor.nome_setor, ma.nome_marca || ' - ' || mo.nome_modelo as modelo_completo, e.numero_serie, e.data_movimentacao
+    FROM em_uso e
+    JOIN multiplos USING (colaborador_id)
+    JOIN colaboradores c ON e.colaborador_id = c.id
+    JOIN setores setor ON c.setor_id = setor.id
+    JOIN modelos mo ON e.modelo_id = mo.id
+    JOIN marcas ma ON mo.marca_id = ma.id
+    ORDER BY c.nome_completo, e.data_movimentacao;
+"""
+
+QUERY_MANUTENCOES_EM_ANDAMENTO = """
+    SELECT a.numero_serie, mo.nome_modelo, m.fornecedor, m.data_envio, m.defeito_reportado
+    FROM manutencoes m
+    JOIN aparelhos a ON m.aparelho_id = a.id
+    JOIN modelos mo ON a.modelo_id = mo.id
+    WHERE m.status_manutencao = 'Em Andamento'
+    ORDER BY m.data_envio ASC;
+"""
+
+QUERY_ULTIMAS_MOVIMENTACOES = """
+    SELECT h.data_movimentacao, h.colaborador_snapshot as nome_completo, s.nome_status, a.numero_serie
+    FROM historico_movimentacoes h
+    JOIN status s ON h.status_id = s.id
+    JOIN aparelhos a ON h.aparelho_id = a.id
+    ORDER BY h.data_movimentacao DESC LIMIT 5
+"""
+
+# Partilhado entre sessões: no máximo 4 consultas do dashboard em simultâneo por processo.
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="dashboard")
+
+def carregar_dados_dashboard(conn):
+    """
+    Carrega todos os dados do dashboard. A conexão deve ser obtida na thread do script
+    (st.connection não pode ser chamado a partir das threads do pool).
+    """
+    futuros = {
+        # copy_context leva para a thread a função de carregamento atual (usada no diagnóstico).
+        nome: _executor.submit(contextvars.copy_context().run, consultar, query, conn=conn)
+        for nome, query in (
+            ("kpis", QUERY_KPIS),
+            ("multiplos", QUERY_MULTIPLOS_APARELHOS),
+            ("manutencao", QUERY_MANUTENCOES_EM_ANDAMENTO),
+            ("ultimas_mov", QUERY_ULTIMAS_MOVIMENTACOES),
+        )
+    }
+    resultados = {nome: futuro.result() for nome, futuro in futuros.items()}
+
+    kpis = resultados["kpis"].iloc[0]
+    df_status = pd.DataFrame(kpis["por_status"] or [], columns=["nome_status", "quantidade"])
+    df_setor = pd.DataFrame(kpis["por_setor"] or [], columns=["nome_setor", "quantidade"])
+
+    # As manutenções atrasadas são um subconjunto das que estão em andamento; filtra-se aqui sem nova consulta.
+    df_detalhes_manutencao = resultados["manutencao"]
+    data_limite = datetime.now() - timedelta(days=DIAS_MANUTENCAO_ATRASADA)
+    atrasadas = pd.to_datetime(df_detalhes_manutencao["data_envio"]) < data_limite
+    df_manut_atrasadas = df_detalhes_manutencao.loc[atrasadas, ["numero_serie", "nome_modelo", "fornecedor", "data_envio"]].reset_index(drop=True)
+
+    return {
+        "kpis": {
+            "total_aparelhos": kpis["total_aparelhos"] or 0, "valor_total": kpis["valor_total"] or 0,
+            "total_colaboradores": kpis["total_colaboradores"] or 0, "aparelhos_manutencao": kpis["aparelhos_manutencao"] or 0,
+            "aparelhos_estoque": kpis["aparelhos_estoque"] or 0, "colaboradores_multiplos": kpis["colaboradores_multiplos"] or 0
+        },
+        "graficos": {"status": df_status, "setor": df_setor},
+        "acao_rapida": {"manut_atrasadas": df_manut_atrasadas, "ultimas_mov": resultados["ultimas_mov"]},
+        "detalhes": {
+            "multiplos_aparelhos": resultados["multiplos"],
+            "manutencoes_em_andamento": df_detalhes_manutencao
+        }
+    }
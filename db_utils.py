@@ -0,0 +1,72 @@
+import logging
+import os
+import tomllib
+import pandas as pd
+import streamlit as st
+from sqlalchemy import create_engine, text
+from diagnostico_utils import instrumentar_engine
+
+# --- Utilitários partilhados de acesso ao banco de dados ---
+
+logger = logging.getLogger("assetflow.db")
+
+CAMINHO_SECRETS = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".streamlit", "secrets.toml")
+
+def get_db_connection():
+    """
+    Conexão partilhada por todas as páginas. O engine é instrumentado na primeira chamada, para que
+    todas as instruções (consultar() e conn.session) entrem nas estatísticas da página de Diagnóstico,
+    e as migrações de arranque (tabelas de que as páginas dependem) são aplicadas se faltarem.
+    """
+    conn = st.connection("supabase", type="sql")
+    instrumentar_engine(conn.engine)
+    try:
+        from migracoes_utils import garantir_migracoes_arranque
+        garantir_migracoes_arranque(conn.engine)
+    except Exception as e:
+        # Sem banco disponível as próprias consultas da página mostram o erro; tenta de novo na próxima chamada.
+        logger.warning("Não foi possível verificar as migrações de arranque: %s", e)
+    return conn
+
+def consultar(sql, params=None, conn=None):
+    """
+    Executa uma consulta e devolve um DataFrame.
+    Ao contrário do conn.query, não guarda o resultado no cache do Streamlit (que, sem ttl, nunca
+    expira); o cache das páginas é feito pelas funções de carregamento com cache_tabelas.
+    Aceita tanto a conexão do Streamlit como um engine SQLAlchemy.
+    """
+    conn = conn or get_db_connection()
+    with conn.engine.connect() as conexao:
+        resultado = conexao.execute(text(sql), params or {})
+        return pd.DataFrame.from_records(resultado.fetchall(), columns=list(resultado.keys()), coerce_float=True)
+
+def para_python(valor):
+    """Converte valores do pandas/numpy (NaN, NaT, numpy.int64, Timestamp) em tipos aceites pelo driver."""
+    if valor is None or (not isinstance(valor, (str, list, dict)) and pd.isna(valor)):
+        return None
+    if isinstance(valor, pd.Timestamp):
+        return valor.to_pydatetime()
+    return valor.item() if hasattr(valor, "item") else valor
+
+def obter_url_banco():
+    """
+    Devolve a connection string do banco usada fora do Streamlit (linha de comando, benchmarks).
+    Dá prioridade à variável de ambiente DATABASE_URL e, na falta dela, lê [connections.supabase]
+    do ficheiro .streamlit/secrets.toml.
+    """
+    url = os.environ.get("DATABASE_URL")
+    if url:
+        return url
+    try:
+        with open(CAMINHO_SECRETS, "rb") as f:
+            secrets = tomllib.load(f)
+        return secrets["connections"]["supabase"]["url"]
+    except (FileNotFoundError, KeyError):
+        raise RuntimeError(
+            "Connection string não encontrada. Defina DATABASE_URL ou configure "
+            "[connections.supabase] em .streamlit/secrets.toml."
+        )
+
+def criar_engine_cli(url=None):
+    """Cria um engine SQLAlchemy para comandos executados fora da aplicação Streamlit."""
+    return create_engine(url or obter_url_banco(), pool_pre_ping=True)
@@ -0,0 +1,162 @@
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import weakref
+from collections import deque
+from datetime import datetime
+from sqlalchemy import event
+from cache_utils import carregador_atual
+
+# --- Instrumentação das Consultas ---
+# Os eventos do SQLAlchemy no engine da conexão "supabase" medem cada instrução executada (leituras
+# com consultar() e escritas com conn.session), com o número de linhas, a página que a originou e a
+# função de carregamento com cache que estava a ser calculada. As estatísticas vivem no processo,
+# tal como o cache, e são mostradas aos administradores na página de Diagnóstico.
+# As instruções acima do limite vão para o registo de consultas lentas (logger "assetflow.consultas_lentas").
+# Os parâmetros nunca são guardados, pois podem conter senhas ou dados pessoais.
+
+LIMITE_LENTA_MS = float(os.environ.get("ASSETFLOW_CONSULTA_LENTA_MS", 500))
+MAX_CONSULTAS = 500         # instruções distintas acompanhadas
+MAX_REGISTO_LENTAS = 200    # entradas mantidas em memória do registo de consultas lentas
+TAMANHO_MAX_SQL = 2000
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+PASTA_PAGINAS = os.path.join(RAIZ, "pages")
+
+logger_lentas = logging.getLogger("assetflow.consultas_lentas")
+
+_lock = threading.Lock()
+_consultas = {}     # sql normalizado -> estatísticas
+_registo_lentas = deque(maxlen=MAX_REGISTO_LENTAS)
+_descartadas = 0
+_limite_ms = LIMITE_LENTA_MS
+_engines = weakref.WeakSet()
+_ouvintes = []
+
+def normalizar_sql(sql):
+    """Remove espaços repetidos para que a mesma instrução, escrita em várias linhas, conte como uma."""
+    return re.sub(r"\s+", " ", sql).strip()[:TAMANHO_MAX_SQL]
+
+def _pagina_da_pilha():
+    """Ficheiro da página (app.py ou pages/*.py) mais próximo na pilha de chamadas, ou None."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        ficheiro = frame.f_code.co_filename
+        if os.path.dirname(ficheiro) == PASTA_PAGINAS or ficheiro == os.path.join(RAIZ, "app.py"):
+            return os.path.basename(ficheiro)
+        frame = frame.f_back
+    return None
+
+def _antes(conexao, cursor, sql, parametros, contexto, executemany):
+    carregador = carregador_atual()
+    # Nas threads do dashboard a pilha não inclui a página; usa-se o ficheiro da função de carregamento.
+    pagina = _pagina_da_pilha() or (carregador.split(":", 1)[0] if carregador else "-")
+    conexao.info.setdefault("diagnostico", []).append((time.perf_counter(), pagina, carregador))
+
+def _depois(conexao, cursor, sql, parametros, contexto, executemany):
+    pilha = conexao.info.get("diagnostico")
+    if not pilha:
+        return
+    inicio, pagina, carregador = pilha.pop()
+    duracao_ms = (time.perf_counter() - inicio) * 1000
+    # Com cursores do lado do servidor (stream_results) o total só é conhecido no fim da leitura.
+    linhas = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount >= 0 else None
+    registar(sql, duracao_ms, linhas, pagina, carregador)
+    for ouvinte in _ouvintes:
+        ouvinte(duracao_ms, linhas)
+
+def registar(sql, duracao_ms, linhas=None, pagina="-", carregador=None):
+    """Acumula a medição de uma instrução e envia-a para o registo de lentas se passar do limite."""
+    global _descartadas
+    chave = normalizar_sql(sql)
+    lenta = duracao_ms >= _limite_ms
+    with _lock:
+        estatistica = _consultas.get(chave)
+        if estatistica is None:
+            if len(_consultas) >= MAX_CONSULTAS:
+                _descartadas += 1
+            else:
+                estatistica = _consultas[chave] = {
+                    "execucoes": 0, "tempo_total_ms": 0.0, "tempo_max_ms": 0.0, "linhas": 0,
+                    "lentas": 0, "paginas": set(), "carregadores": set(),
+                }
+        if estatistica is not None:
+            estatistica["execucoes"] += 1
+            estatistica["tempo_total_ms"] += duracao_ms
+            estatistica["tempo_max_ms"] = max(estatistica["tempo_max_ms"], duracao_ms)
+            estatistica["linhas"] += linhas or 0
+            estatistica["lentas"] += lenta
+            estatistica["paginas"].add(pagina)
+            if carregador:
+                estatistica["carregadores"].add(carregador)
+        if lenta:
+            _registo_lentas.append({
+                "momento": datetime.now(), "duracao_ms": round(duracao_ms, 1), "linhas": linhas,
+                "pagina": pagina, "carregador": carregador, "sql": chave,
+            })
+    if lenta:
+        logger_lentas.warning("Consulta lenta (%.0f ms, %s linhas, página %s, função %s): %s",
+                              duracao_ms, linhas, pagina, carregador or "-", chave)
+
+def instrumentar_engine(engine):
+    """Regista os eventos de medição no engine (uma única vez por engine)."""
+    if engine in _engines:
+        return engine
+    with _lock:
+        if engine not in _engines:
+            event.listen(engine, "before_cursor_execute", _antes)
+            event.listen(engine, "after_cursor_execute", _depois)
+            _engines.add(engine)
+    return engine
+
+def ao_medir(ouvinte):
+    """Regista uma função chamada com (duração em ms, linhas) no fim de cada instrução medida."""
+    if ouvinte not in _ouvintes:
+        _ouvintes.append(ouvinte)
+
+def definir_limite_lentas(limite_ms):
+    global _limite_ms
+    _limite_ms = float(limite_ms)
+
+def limite_lentas():
+    return _limite_ms
+
+def estatisticas_consultas():
+    """
+    Lista de dicts, uma por instrução distinta, com execuções, tempos (total, médio e máximo), linhas,
+    número de execuções lentas, páginas e funções de carregamento que a executaram.
+    """
+    with _lock:
+        resultado = []
+        for sql, e in _consultas.items():
+            resultado.append({
+                "sql": sql,
+                "execucoes": e["execucoes"],
+                "tempo_total_ms": round(e["tempo_total_ms"], 1),
+                "tempo_medio_ms": round(e["tempo_total_ms"] / e["execucoes"], 1),
+                "tempo_max_ms": round(e["tempo_max_ms"], 1),
+                "linhas": e["linhas"],
+                "lentas": e["lentas"],
+                "paginas": ", ".join(sorted(e["paginas"])),
+                "carregadores": sorted(e["carregadores"]),
+            })
+        return resultado
+
+def registo_lentas():
+    """Consultas lentas mais recentes primeiro."""
+    with _lock:
+        return list(reversed(_registo_lentas))
+
+def instrucoes_descartadas():
+    """Execuções não contabilizadas por já haver MAX_CONSULTAS instruções distintas."""
+    return _descartadas
+
+def repor_estatisticas():
+    global _descartadas
+    with _lock:
+        _consultas.clear()
+        _registo_lentas.clear()
+        _descartadas = 0
@@ -0,0 +1,588 @@
+import base64
+import functools
+import hashlib
+import html
+import io
+import math
+import os
+import time
+import zipfile
+from datetime import datetime
+from weasyprint import HTML, CSS, default_url_fetcher
+from weasyprint.text.fonts import FontConfiguration
+
+# --- Documentos em PDF (Termo de Responsabilidade e Etiqueta do Ativo) ---
+# O HTML e a folha de estilos de cada documento ficam separados. As folhas de estilos são
+# analisadas uma única vez por processo (objetos CSS com uma FontConfiguration partilhada) e
+# aplicadas a cada documento; o HTML não traz <style> nem a logo em Base64, apenas a referência
+# "assetflow:logo.png", servida por um url_fetcher próprio a partir de logo.b64 (descodificada uma
+# vez) e guardada na cache de recursos do WeasyPrint, partilhada entre renderizações.
+# Um lote gera um único PDF com todas as páginas (cada documento é paginado à parte e as páginas
+# são juntas no fim, sem nova paginação) ou um ZIP com um PDF por documento.
+
+ITENS_CHECKLIST = ["Tela", "Carcaça", "Bateria", "Botões", "USB", "Chip", "Carregador", "Cabo USB", "Capa", "Película"]
+ESTADOS_CHECKLIST = ["NOVO", "BOM", "REGULAR", "AVARIADO", "JÁ DISPÕE", "NÃO ENTREGUE"]
+
+TIPOS_DOCUMENTO = {
+    "termo": "Termo de Responsabilidade",
+    "etiqueta": "Etiqueta de Ativo",
+}
+
+FORMATOS_LOTE = {
+    "PDF único (várias páginas)": "pdf",
+    "ZIP (um PDF por documento)": "zip",
+}
+
+CSS_TERMO = """
+    @page { size: A4; margin: 1cm; }
+    body {
+        font-family: Arial, sans-serif;
+        font-size: 9.5pt;
+        line-height: 1.3;
+        color: #333;
+    }
+
+    .header {
+        text-align: center;
+        margin-bottom: 20px;
+        padding-top: 20px;
+    }
+
+    .header h1 {
+        margin-top: 3em; /* ajustável */
+    }
+
+    h1 {
+        color: #003366;
+        font-size: 16pt;
+        margin: 0;
+        letter-spacing: 1px;
+    }
+
+    .logo {
+        position: absolute;
+        top: 0.5cm;
+        left: 0.5cm;
+        width: 140px;
+    }
+
+    .section {
+        margin-bottom: 12px;
+    }
+    .section-title {
+        background-color: #003366;
+        color: white;
+        padding: 4px 8px;
+        font-weight: bold;
+        font-size: 10pt;
+        border-radius: 4px;
+        margin-bottom: 6px;
+    }
+
+    .info-table { width: 100%; border-collapse: collapse; }
+    .info-table td {
+        padding: 4px 6px;
+        border-bottom: 1px solid #f0f0f0;
+    }
+    .info-table td:first-child {
+        font-weight: bold;
+        width: 28%;
+        color: #555;
+    }
+
+    /* Estilos para o Checklist em Colunas */
+    .checklist-container {
+        display: flex;
+        justify-content: space-between;
+        align-items: flex-start;
+        width: 100%;
+    }
+    .checklist-column {
+        width: 49%;
+    }
+    .checklist-table { width: 100%; border-collapse: collapse; margin-top: 0; }
+    .checklist-table th, .checklist-table td {
+        border-bottom: 1px solid #ddd;
+        padding: 4px;
+        text-align: left;
+        font-size: 9pt;
+    }
+    .checklist-table th {
+        background-color: #f9f9f9;
+        text-align: center;
+        border-bottom: 2px solid #003366;
+        font-weight: bold;
+    }
+    .checklist-table td:nth-child(2), .checklist-table td:nth-child(3) { text-align: center; }
+
+    .terms-container { margin-top: 8px; font-size: 8.5pt; text-align: justify; }
+    .disclaimer { margin-bottom: 8px; }
+
+    /* Checkboxes */
+    .check-item {
+        margin-top: 8px;
+        display: flex;
+        align-items: flex-start;
+        padding: 2px 0;
+    }
+    .box {
+        display: inline-block;
+        width: 10px; height: 10px;
+        border: 1px solid #003366;
+        margin-right: 8px;
+        flex-shrink: 0;
+        position: relative; top: 3px;
+    }
+    .check-text { flex-grow: 1; line-height: 1.2; }
+
+    .signature { margin-top: 80px; text-align: center; page-break-inside: avoid; }
+    .signature-line {
+        border-top: 1px solid #333;
+        width: 350px;
+        margin: 0 auto;
+        padding-top: 5px;
+        font-weight: bold;
+    }
+"""
+
+CSS_ETIQUETA = """
+    @page {
+        size: 100mm 40mm;
+        margin: 0;
+    }
+    body {
+        font-family: Arial, sans-serif;
+        font-size: 6pt; /* Fonte base muito pequena */
+        color: #000;
+        margin: 0;
+        padding: 1.5mm; /* Margem interna mínima */
+        box-sizing: border-box;
+        height: 40mm;
+        width: 100mm;
+        line-height: 1.05; /* Linha compacta */
+        overflow: hidden;
+    }
+    .header {
+        display: flex;
+        justify-content: space-between;
+        align-items: center;
+        padding-bottom: 1mm;
+        border-bottom: 0.5px solid #000;
+        margin-bottom: 1mm;
+    }
+    .logo {
+        width: 25mm; /* Logo bem pequena */
+        height: auto;
+    }
+    .date {
+        font-size: 6.5pt;
+        font-weight: bold;
+    }
+    .content {
+        display: flex;
+        width: 100%;
+    }
+    .column {
+        width: 50%;
+        padding-right: 1.5mm;
+    }
+    .column:last-child {
+        padding-right: 0;
+        padding-left: 1.5mm;
+        border-left: 0.5px solid #ccc;
+    }
+    .field {
+        margin-bottom: 1.5mm; /* Espaçamento mínimo */
+    }
+    .field-label {
+        font-weight: bold;
+        display: block;
+        font-size: 6pt; /* Rótulo minúsculo */
+        margin-bottom: 0.1mm;
+        text-transform: uppercase;
+    }
+    .field-value {
+        font-size: 6.5pt;
+        word-wrap: break-word;
+        white-space: nowrap;
+        overflow: hidden;
+        text-overflow: ellipsis;
+    }
+"""
+
+# --- Folhas de Etiquetas (A4 com várias etiquetas por página) ---
+# Medidas em mm das folhas de etiquetas autocolantes mais comuns; as posições de cada etiqueta são
+# calculadas a partir delas (css_folha_etiquetas) e a folha inteira é renderizada de uma só vez.
+MODELOS_FOLHA = {
+    "A4 - 21 etiquetas (3 x 7, 63,5 x 38,1 mm)": {
+        "colunas": 3, "linhas": 7, "largura_mm": 63.5, "altura_mm": 38.1,
+        "margem_superior_mm": 15.15, "margem_esquerda_mm": 7.25, "espaco_horizontal_mm": 2.5, "espaco_vertical_mm": 0,
+    },
+    "A4 - 24 etiquetas (3 x 8, 70 x 37 mm)": {
+        "colunas": 3, "linhas": 8, "largura_mm": 70, "altura_mm": 37,
+        "margem_superior_mm": 0.5, "margem_esquerda_mm": 0, "espaco_horizontal_mm": 0, "espaco_vertical_mm": 0,
+    },
+}
+
+# Conteúdo de cada etiqueta: lista de (rótulo, campo do registo).
+CONTEUDOS_ETIQUETA = {
+    "Ativo (N/S, modelo e IMEIs)": [("N°/S", "numero_serie"), ("Modelo", "modelo"), ("IMEI 1", "imei1"), ("IMEI 2", "imei2")],
+    "Ativo e responsável": [("N°/S", "numero_serie"), ("Modelo", "modelo"), ("IMEI 1", "imei1"), ("Nome", "responsavel"), ("Função", "nome_setor")],
+}
+
+CSS_FOLHA_ETIQUETAS = """
+    @page { size: A4; margin: 0; }
+    body { margin: 0; font-family: Arial, sans-serif; color: #000; }
+    .folha {
+        position: relative;
+        width: 210mm;
+        height: 297mm;
+        overflow: hidden;
+        page-break-after: always;
+    }
+    .folha:last-child { page-break-after: auto; }
+    .etiqueta {
+        position: absolute;
+        box-sizing: border-box;
+        padding: 2mm 2.5mm;
+        overflow: hidden;
+        font-size: 6.5pt;
+        line-height: 1.15;
+    }
+    .contornos .etiqueta { outline: 0.2mm dashed #999; } /* para acertar a impressora numa folha normal */
+    .header {
+        display: flex;
+        justify-content: space-between;
+        align-items: center;
+        padding-bottom: 0.8mm;
+        border-bottom: 0.5px solid #000;
+        margin-bottom: 1mm;
+    }
+    .logo { width: 20mm; height: auto; }
+    .date { font-weight: bold; }
+    .field {
+        white-space: nowrap;
+        overflow: hidden;
+        text-overflow: ellipsis;
+        margin-bottom: 0.6mm;
+    }
+    .field-label { font-weight: bold; text-transform: uppercase; }
+"""
+
+ARQUIVO_LOGO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logo.b64")
+URL_LOGO = "assetflow:logo.png"
+
+@functools.lru_cache(maxsize=None)
+def _logo_png():
+    """Bytes PNG da logo (logo.b64 guarda um data URI), lidos e descodificados uma vez por processo."""
+    try:
+        with open(ARQUIVO_LOGO, "r") as f:
+            conteudo = f.read().strip()
+    except FileNotFoundError:
+        return b""
+    return base64.b64decode(conteudo.split(",", 1)[-1])
+
+def logo_disponivel():
+    return bool(_logo_png())
+
+def _buscar_recurso(url, *args, **kwargs):
+    """url_fetcher do WeasyPrint: serve a logo da memória; os outros endereços seguem o caminho normal."""
+    if url == URL_LOGO:
+        return {"string": _logo_png(), "mime_type": "image/png", "redirected_url": url}
+    return default_url_fetcher(url, *args, **kwargs)
+
+# Faz parte da chave da cache de documentos (cache_documentos_utils): incremente VERSAO_TEMPLATES
+# ao alterar o HTML dos documentos; as alterações ao CSS e à logo mudam a versão automaticamente.
+VERSAO_TEMPLATES = 2
+_ESTILOS_VERSAO = CSS_TERMO + CSS_ETIQUETA + CSS_FOLHA_ETIQUETAS + repr(MODELOS_FOLHA) + repr(CONTEUDOS_ETIQUETA)
+VERSAO_DOCUMENTOS = f"{VERSAO_TEMPLATES}-{hashlib.sha256(_ESTILOS_VERSAO.encode() + _logo_png()).hexdigest()[:12]}"
+
+def _t(valor):
+    """Texto seguro para o HTML (None fica vazio)."""
+    return "" if valor is None else html.escape(str(valor))
+
+def _data_termo(data_mov):
+    # No formulário de checkout a data chega como texto editado; num lote, como datetime.
+    if isinstance(data_mov, str):
+        try:
+            return datetime.strptime(data_mov, '%d/%m/%Y %H:%M').strftime('%d/%m/%Y %H:%M')
+        except ValueError:
+            return data_mov
+    if isinstance(data_mov, datetime):
+        return data_mov.strftime('%d/%m/%Y %H:%M')
+    return "N/A"
+
+def checklist_padrao():
+    """Checklist com todos os itens entregues e no primeiro estado (o mesmo padrão do formulário)."""
+    return {item: {'entregue': True, 'estado': ESTADOS_CHECKLIST[0]} for item in ITENS_CHECKLIST}
+
+def html_termo(dados, checklist_data):
+    """HTML do Termo de Responsabilidade (Layout com Checklist em 2 Colunas), sem a folha de estilos."""
+    items_list = list(checklist_data.items())
+    mid_point = math.ceil(len(items_list) / 2)
+
+    def build_checklist_rows(items):
+        rows = ""
+        for item, detalhes in items:
+            entregue_str = 'SIM' if detalhes['entregue'] else 'NÃO'
+            rows += f"<tr><td>{_t(item)}</td><td>{entregue_str}</td><td>{_t(detalhes['estado'])}</td></tr>"
+        return rows
+
+    checklist_html_col1 = build_checklist_rows(items_list[:mid_point])
+    checklist_html_col2 = build_checklist_rows(items_list[mid_point:])
+
+    return f"""
+    <!DOCTYPE html>
+    <html>
+    <head><meta charset="UTF-8"></head>
+    <body>
+        <img src="{URL_LOGO}" class="logo">
+        <div class="header">
+            <h1>TERMO DE RESPONSABILIDADE</h1>
+        </div>
+        <div class="section">
+            <div class="section-title">DADOS DA MOVIMENTAÇÃO</div>
+            <table class="info-table">
+                <tr><td>CÓDIGO:</td><td>{_t(dados.get('codigo_colaborador'))}</td></tr>
+                <tr><td>DATA:</td><td>{_t(_data_termo(dados.get('data_movimentacao')))}</td></tr>
+            </table>
+        </div>
+        <div class="section">
+            <div class="section-title">DADOS DO COLABORADOR</div>
+            <table class="info-table">
+                <tr><td>NOME:</td><td>{_t(dados.get('nome_completo'))}</td></tr>
+                <tr><td>CPF:</td><td>{_t(dados.get('cpf'))}</td></tr>
+                <tr><td>SETOR:</td><td>{_t(dados.get('nome_setor'))}</td></tr>
+            </table>
+        </div>
+        <div class="section">
+            <div class="section-title">DADOS DO EQUIPAMENTO</div>
+            <table class="info-table">
+                <tr><td>TIPO:</td><td>SMARTPHONE</td></tr>
+                <tr><td>MARCA:</td><td>{_t(dados.get('nome_marca'))}</td></tr>
+                <tr><td>MODELO:</td><td>{_t(dados.get('nome_modelo'))}</td></tr>
+                <tr><td>NÚMERO DE SÉRIE:</td><td>{_t(dados.get('numero_serie'))}</td></tr>
+                <tr><td>IMEI 1:</td><td>{_t(dados.get('imei1'))}</td></tr>
+                <tr><td>IMEI 2:</td><td>{_t(dados.get('imei2'))}</td></tr>
+            </table>
+        </div>
+        <div class="section">
+            <div class="section-title">CHECKLIST DE ITENS ENTREGUES</div>
+            <div class="checklist-container">
+                <div class="checklist-column">
+                    <table class="checklist-table">
+                        <thead><tr><th>ITEM</th><th>ENTREGUE</th><th>ESTADO</th></tr></thead>
+                        <tbody>{checklist_html_col1}</tbody>
+                    </table>
+                </div>
+                <div class="checklist-column">
+                    <table class="checklist-table">
+                        <thead><tr><th>ITEM</th><th>ENTREGUE</th><th>ESTADO</th></tr></thead>
+                        <tbody>{checklist_html_col2}</tbody>
+                    </table>
+                </div>
+            </div>
+        </div>
+        <div class="section">
+            <div class="section-title">TERMOS E CONDIÇÕES</div>
+            <div class="terms-container">
+                <p class="disclaimer">
+                    Declaro receber o equipamento descrito para uso profissional, sendo responsável pela sua guarda e conservação.
+                    Comprometo-me a devolvê-lo nas mesmas condições em que o recebi. Danos por mau uso serão de minha responsabilidade
+                    (Art. 462, § 1º da CLT). Autorizo o uso dos meus dados para este fim, de acordo com a LGPD.
+                </p>
+                <div class="check-item">
+                    <span class="box"></span>
+                    <span class="check-text">Ciente da proibição da utilização da ferramenta de roteamento dos dados móveis corporativos.</span>
+                </div>
+                <div class="check-item">
+                    <span class="box"></span>
+                    <span class="check-text">Ciente da proibição de cadastrar contas pessoais, armazenar dados particulares ou vínculos neste aparelho corporativo.</span>
+                </div>
+            </div>
+        </div>
+        <div class="signature">
+            <div class="signature-line">{_t(dados.get('nome_completo'))}</div>
+        </div>
+    </body>
+    </html>
+    """
+
+def html_etiqueta(dados):
+    """HTML da Etiqueta (100x40mm) - Layout Compacto para 1 Página, sem a folha de estilos."""
+    data_formatada = dados.get('data_movimentacao').strftime('%d/%m/%Y') if dados.get('data_movimentacao') else "N/A"
+    return f"""
+    <!DOCTYPE html>
+    <html>
+    <head><meta charset="UTF-8"></head>
+    <body>
+        <div class="header">
+            <img src="{URL_LOGO}" class="logo">
+            <span class="date">{data_formatada}</span>
+        </div>
+        <div class="content">
+            <div class="column">
+                <div class="field"><span class="field-label">N°/S:</span><span class="field-value">{_t(dados.get('numero_serie'))}</span></div>
+                <div class="field"><span class="field-label">MODELO:</span><span class="field-value">{_t(dados.get('nome_marca'))} {_t(dados.get('nome_modelo'))}</span></div>
+                <div class="field"><span class="field-label">IMEI 1:</span><span class="field-value">{_t(dados.get('imei1'))}</span></div>
+                <div class="field"><span class="field-label">IMEI 2:</span><span class="field-value">{_t(dados.get('imei2'))}</span></div>
+            </div>
+            <div class="column">
+                <div class="field"><span class="field-label">FUNÇÃO:</span><span class="field-value">{_t(dados.get('nome_setor'))}</span></div>
+                <div class="field"><span class="field-label">CÓDIGO:</span><span class="field-value">{_t(dados.get('codigo_colaborador'))}</span></div>
+                <div class="field"><span class="field-label">NOME:</span><span class="field-value">{_t(dados.get('nome_completo'))}</span></div>
+                <div class="field"><span class="field-label">GMAIL:</span><span class="field-value">{_t(dados.get('gmail'))}</span></div>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+
+_ESTILOS = {"termo": CSS_TERMO, "etiqueta": CSS_ETIQUETA}
+_FONTES = FontConfiguration()
+_CACHE_RECURSOS = {}   # imagens já carregadas (a logo), partilhadas entre renderizações
+
+@functools.lru_cache(maxsize=None)
+def folha_estilos(tipo):
+    """Objeto CSS do documento, analisado na primeira utilização e reutilizado depois."""
+    return CSS(string=_ESTILOS[tipo], font_config=_FONTES, url_fetcher=_buscar_recurso)
+
+def _html_documento(tipo, dados, checklist_data):
+    if tipo == "termo":
+        return html_termo(dados, checklist_data)
+    return html_etiqueta(dados)
+
+def _renderizar(html_documento, folha):
+    return HTML(string=html_documento, url_fetcher=_buscar_recurso).render(
+        stylesheets=[folha], font_config=_FONTES, cache=_CACHE_RECURSOS,
+    )
+
+def renderizar_documento(tipo, html_documento):
+    """Paginação (weasyprint Document) do HTML com a folha de estilos do tipo de documento."""
+    return _renderizar(html_documento, folha_estilos(tipo))
+
+def gerar_pdf_termo(dados, checklist_data):
+    """Gera o PDF do Termo de Responsabilidade."""
+    return renderizar_documento("termo", html_termo(dados, checklist_data)).write_pdf()
+
+def gerar_pdf_etiqueta(dados):
+    """Gera o PDF da Etiqueta (100x40mm)."""
+    return renderizar_documento("etiqueta", html_etiqueta(dados)).write_pdf()
+
+def nome_ficheiro(tipo, dados, sufixo=None):
+    """Nome do PDF como no download individual (Termo_Nome_AAAAMMDD.pdf / Etiqueta_NS_AAAAMMDD.pdf)."""
+    sufixo = sufixo or datetime.now().strftime('%Y%m%d')
+    if tipo == "termo":
+        safe_name = "".join(c for c in (dados.get('nome_completo') or 'termo') if c.isalnum() or c in " ").rstrip()
+        return f"Termo_{safe_name.replace(' ', '_')}_{sufixo}.pdf"
+    safe_ns = "".join(c for c in (dados.get('numero_serie') or 'etiqueta') if c.isalnum()).rstrip()
+    return f"Etiqueta_{safe_ns}_{sufixo}.pdf"
+
+def gerar_lote(tipo, registos, checklist_data=None, formato="pdf"):
+    """
+    Gera o documento `tipo` ("termo" ou "etiqueta") para cada registo (dicts como os de
+    buscar_dados_completos). formato "pdf": um único PDF com todas as páginas; "zip": um PDF por
+    documento, com o protocolo da movimentação no nome. Os termos usam o mesmo checklist.
+    Devolve (bytes, estatísticas com documentos, duracao_s e documentos_por_segundo).
+    """
+    if not registos:
+        raise ValueError("Nenhum documento para gerar.")
+    checklist_data = checklist_data or checklist_padrao()
+    inicio = time.perf_counter()
+
+    def documento(dados):
+        return renderizar_documento(tipo, _html_documento(tipo, dados, checklist_data))
+
+    if formato == "zip":
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            for dados in registos:
+                zf.writestr(nome_ficheiro(tipo, dados, sufixo=dados.get('protocolo')), documento(dados).write_pdf())
+        conteudo = buffer.getvalue()
+    else:
+        documentos = [documento(dados) for dados in registos]
+        paginas = [pagina for documento in documentos for pagina in documento.pages]
+        conteudo = documentos[0].copy(paginas).write_pdf()
+
+    duracao = time.perf_counter() - inicio
+    return conteudo, {
+        "documentos": len(registos),
+        "duracao_s": duracao,
+        "documentos_por_segundo": len(registos) / duracao,
+    }
+
+# --- Folha de Etiquetas ---
+def css_folha_etiquetas(modelo):
+    """CSS da folha: o estilo base mais o tamanho das etiquetas e a posição de cada uma na página."""
+    m = MODELOS_FOLHA[modelo]
+    regras = [CSS_FOLHA_ETIQUETAS, f".etiqueta {{ width: {m['largura_mm']}mm; height: {m['altura_mm']}mm; }}"]
+    for posicao in range(m["colunas"] * m["linhas"]):
+        linha, coluna = divmod(posicao, m["colunas"])
+        topo = m["margem_superior_mm"] + linha * (m["altura_mm"] + m["espaco_vertical_mm"])
+        esquerda = m["margem_esquerda_mm"] + coluna * (m["largura_mm"] + m["espaco_horizontal_mm"])
+        regras.append(f".pos-{posicao} {{ top: {topo:.2f}mm; left: {esquerda:.2f}mm; }}")
+    return "\n".join(regras)
+
+@functools.lru_cache(maxsize=None)
+def folha_estilos_etiquetas(modelo):
+    return CSS(string=css_folha_etiquetas(modelo), font_config=_FONTES, url_fetcher=_buscar_recurso)
+
+def _html_etiqueta_folha(dados, posicao, campos):
+    valores = dict(dados, modelo=f"{dados.get('nome_marca') or ''} {dados.get('nome_modelo') or ''}".strip())
+    data = valores.get('data_cadastro')
+    linhas = "".join(
+        f'<div class="field"><span class="field-label">{rotulo}:</span> {_t(valores.get(campo))}</div>'
+        for rotulo, campo in campos
+    )
+    return f"""
+        <div class="etiqueta pos-{posicao}">
+            <div class="header">
+                <img src="{URL_LOGO}" class="logo">
+                <span class="date">{data.strftime('%d/%m/%Y') if hasattr(data, 'strftime') else ''}</span>
+            </div>
+            {linhas}
+        </div>"""
+
+def html_folha_etiquetas(registos, modelo, conteudo, inicio=0, contornos=False):
+    """
+    HTML de todas as páginas da folha: `inicio` posições da primeira página ficam em branco (para
+    aproveitar uma folha já começada). Devolve (html, número de páginas).
+    """
+    m = MODELOS_FOLHA[modelo]
+    por_pagina = m["colunas"] * m["linhas"]
+    campos = CONTEUDOS_ETIQUETA[conteudo]
+    posicoes = [None] * (inicio % por_pagina) + list(registos)
+    paginas = []
+    for i in range(0, len(posicoes), por_pagina):
+        etiquetas = "".join(
+            _html_etiqueta_folha(dados, posicao, campos)
+            for posicao, dados in enumerate(posicoes[i:i + por_pagina]) if dados is not None
+        )
+        paginas.append(f'<div class="folha">{etiquetas}</div>')
+    return f"""
+    <!DOCTYPE html>
+    <html>
+    <head><meta charset="UTF-8"></head>
+    <body class="{'contornos' if contornos else ''}">{"".join(paginas)}</body>
+    </html>
+    """, len(paginas)
+
+def gerar_folha_etiquetas(registos, modelo, conteudo, inicio=0, contornos=False):
+    """
+    Gera num só PDF (uma única renderização) as etiquetas de todos os aparelhos do registo (dicts com
+    numero_serie, nome_marca, nome_modelo, imei1, imei2, responsavel, nome_setor e data_cadastro).
+    Devolve (bytes, estatísticas com documentos, paginas, duracao_s e documentos_por_segundo).
+    """
+    if not registos:
+        raise ValueError("Nenhum aparelho para gerar etiquetas.")
+    inicio_t = time.perf_counter()
+    html_documento, paginas = html_folha_etiquetas(registos, modelo, conteudo, inicio, contornos)
+    conteudo_pdf = _renderizar(html_documento, folha_estilos_etiquetas(modelo)).write_pdf()
+    duracao = time.perf_counter() - inicio_t
+    return conteudo_pdf, {
+        "documentos": len(registos),
+        "unidade": "etiqueta(s)",
+        "paginas": paginas,
+        "duracao_s": duracao,
+        "documentos_por_segundo": len(registos) / duracao,
+    }
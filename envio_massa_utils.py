@@ -0,0 +1,111 @@
+import pandas as pd
+import streamlit as st
+from db_utils import get_db_connection
+from email_utils import enviar_emails_em_massa
+from templates_email_utils import renderizar_email
+from fila_email_utils import estatisticas_lote
+
+# --- Envio em Massa dos Relatórios de Manutenção e Devolução ---
+# Em vez de um único relatório para uma lista de destinatários, cada colaborador recebe o seu
+# próprio e-mail, só com os seus registos (no Gmail registado no cadastro e/ou numa lista de cópia).
+# Os e-mails vêm dos templates compilados (templates_email/relatorio_manutencoes e resumo_devolucoes),
+# preenchidos a partir dos registos (dicts), sem iterrows(); todos entram na fila de uma só vez, num lote, e
+# o remetente envia-os em sequência pela mesma conexão SMTP. O progresso do lote (enviados,
+# pendentes, falhados e e-mails por segundo) é mostrado com mostrar_estado_envio().
+
+def _vazio(valor):
+    return valor is None or (not isinstance(valor, (str, list, dict)) and pd.isna(valor))
+
+def _valor(valor):
+    return 0.0 if _vazio(valor) else float(valor)
+
+def email_relatorio_manutencoes(registos, nome=None):
+    """(html, texto) do relatório de manutenções (lista de dicts do histórico), com saudação se nome for indicado."""
+    return renderizar_email("relatorio_manutencoes", registos=registos, nome=nome,
+                            total=sum(_valor(r['custo_reparo']) for r in registos))
+
+def email_resumo_devolucoes(registos, nome=None):
+    """(html, texto) do resumo de devoluções (lista de dicts do histórico de devoluções)."""
+    return renderizar_email("resumo_devolucoes", registos=registos, nome=nome)
+
+def html_relatorio_manutencoes(registos, nome=None):
+    return email_relatorio_manutencoes(registos, nome)[0]
+
+def _agrupar_por_colaborador(df, coluna_nome, coluna_email, coluna_id="colaborador_id"):
+    """
+    Agrupa os registos pelo ID do colaborador (o nome registado no momento pode repetir-se entre
+    colaboradores diferentes); os registos sem colaborador no cadastro ficam agrupados pelo nome.
+    """
+    grupos = {}
+    for registo in df.to_dict("records"):
+        nome = registo.get(coluna_nome) or "Sem colaborador"
+        id_colaborador = registo.get(coluna_id)
+        chave = ("nome", nome) if _vazio(id_colaborador) else ("id", int(id_colaborador))
+        grupo = grupos.setdefault(chave, {"nome": nome, "email": None, "registos": []})
+        grupo["registos"].append(registo)
+        if not grupo["email"] and not _vazio(registo.get(coluna_email)) and registo.get(coluna_email):
+            grupo["email"] = registo[coluna_email]
+    return grupos
+
+def _montar_emails(grupos, copia, para_colaborador, assunto, montar):
+    """Devolve (e-mails, nomes dos colaboradores sem destinatário); montar(registos, nome) -> (html, texto)."""
+    emails, sem_destinatario = [], []
+    for grupo in grupos.values():
+        nome = grupo["nome"]
+        destinatarios = ([grupo["email"]] if para_colaborador and grupo["email"] else []) + list(copia)
+        if not destinatarios:
+            sem_destinatario.append(nome)
+            continue
+        corpo_html, corpo_texto = montar(grupo["registos"], nome)
+        emails.append({
+            "destinatarios": destinatarios,
+            "assunto": f"{assunto} - {nome}",
+            "corpo_html": corpo_html,
+            "corpo_texto": corpo_texto,
+        })
+    return emails, sem_destinatario
+
+def emails_manutencoes_por_colaborador(df, copia=(), para_colaborador=True):
+    """Um e-mail por colaborador no envio, com as suas O.S. (df do histórico de manutenções)."""
+    return _montar_emails(
+        _agrupar_por_colaborador(df, "colaborador", "colaborador_gmail"), copia, para_colaborador,
+        "AssetFlow - Relatório de Manutenções", email_relatorio_manutencoes,
+    )
+
+def emails_devolucoes_por_colaborador(df, copia=(), para_colaborador=True):
+    """Um e-mail por colaborador que devolveu aparelhos, com as suas devoluções (df do histórico de devoluções)."""
+    return _montar_emails(
+        _agrupar_por_colaborador(df, "colaborador_devolveu", "colaborador_gmail"), copia, para_colaborador,
+        "AssetFlow - Resumo de Devoluções", email_resumo_devolucoes,
+    )
+
+def enviar_por_colaborador(emails, sem_destinatario, origem, chave_sessao):
+    """Coloca o lote na fila, guarda o seu identificador na sessão e informa quantos e-mails foram gerados."""
+    if sem_destinatario:
+        st.warning(f"Sem destinatário (sem Gmail no cadastro e sem cópia): {', '.join(sem_destinatario)}.")
+    if not emails:
+        return False
+    lote = enviar_emails_em_massa(emails, origem)
+    if lote:
+        st.session_state[chave_sessao] = lote
+        st.success(f"{len(emails)} e-mail(s) personalizados colocados na fila de envio.")
+    return lote
+
+def mostrar_estado_envio(chave_sessao):
+    """Progresso do último envio em massa feito nesta sessão (guardado em session_state[chave_sessao])."""
+    lote = st.session_state.get(chave_sessao)
+    if not lote:
+        return
+    try:
+        e = estatisticas_lote(get_db_connection(), lote)
+    except Exception as erro:
+        st.error(f"Erro ao consultar o estado do envio: {erro}")
+        return
+    st.markdown("###### Estado do Último Envio em Massa")
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Enviados", f"{e['enviados']}/{e['total']}")
+    c2.metric("Pendentes", e["pendentes"])
+    c3.metric("Falhados", e["falhados"])
+    c4.metric("E-mails/s", f"{e['emails_por_segundo']:.2f}" if e["emails_por_segundo"] else "-")
+    if e["pendentes"]:
+        st.button("Atualizar Estado", key=f"{chave_sessao}_atualizar")
@@ -0,0 +1,219 @@
+import atexit
+import csv
+import gzip
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from itertools import zip_longest
+from sqlalchemy import text
+from db_utils import consultar, get_db_connection
+
+# --- Exportação em Streaming ---
+# Os relatórios são lidos com um cursor do lado do servidor (stream_results), em lotes, e escritos
+# diretamente num ficheiro temporário em disco: XLSX com o modo write_only do openpyxl ou CSV
+# compactado com gzip. Os sumários são calculados em SQL. Nenhum DataFrame com o relatório inteiro é
+# criado, por isso a memória usada não depende do número de linhas exportadas.
+# Os ficheiros prontos ficam numa pasta privada do processo e são servidos a partir do disco: a sessão
+# guarda apenas o caminho, e o ficheiro é apagado depois do download, na exportação seguinte ou ao fim
+# de TTL_EXPORTACAO_S.
+
+TAMANHO_LOTE = 2000
+TTL_EXPORTACAO_S = 3600
+LIMITE_LINHAS_XLSX = 1048576 - 1  # limite de linhas de uma folha do Excel, sem o cabeçalho
+COLUNAS_ENTRE_TABELAS = 2  # colunas vazias entre o relatório e cada sumário, como no layout anterior
+
+FORMATOS_EXPORTACAO = {
+    "Excel (.xlsx)": ".xlsx",
+    "CSV compactado (.csv.gz)": ".csv.gz",
+}
+
+MIME_EXPORTACAO = {
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".csv.gz": "application/gzip",
+    ".zip": "application/zip",
+}
+
+QUERY_EXPORTAR_INVENTARIO = """
+    SELECT
+        a.id, a.numero_serie, ma.nome_marca, mo.nome_modelo, s.nome_status,
+        CASE WHEN s.nome_status = 'Em uso' THEN COALESCE(ur.colaborador_snapshot, c.nome_completo) ELSE NULL END as responsavel_atual,
+        CASE WHEN s.nome_status = 'Em uso' THEN setor.nome_setor ELSE NULL END as setor_atual,
+        a.valor, a.imei1, a.imei2, a.data_cadastro
+    FROM aparelhos a
+    LEFT JOIN modelos mo ON a.modelo_id = mo.id
+    LEFT JOIN marcas ma ON mo.marca_id = ma.id
+    LEFT JOIN status s ON a.status_id = s.id
+    LEFT JOIN aparelho_posse_atual ur ON a.id = ur.aparelho_id
+    LEFT JOIN colaboradores c ON ur.colaborador_id = c.id
+    LEFT JOIN setores setor ON c.setor_id = setor.id
+    ORDER BY a.id
+"""
+
+QUERY_SUMARIO_STATUS = """
+    SELECT s.nome_status, COUNT(*) AS "Aparelhos"
+    FROM aparelhos a
+    JOIN status s ON a.status_id = s.id
+    GROUP BY s.nome_status
+    ORDER BY COUNT(*) DESC, s.nome_status
+"""
+
+QUERY_SUMARIO_SETOR = """
+    SELECT setor.nome_setor AS setor_atual, COUNT(*) AS "Aparelhos"
+    FROM aparelhos a
+    JOIN status s ON a.status_id = s.id
+    JOIN aparelho_posse_atual ur ON a.id = ur.aparelho_id
+    JOIN colaboradores c ON ur.colaborador_id = c.id
+    JOIN setores setor ON c.setor_id = setor.id
+    WHERE s.nome_status = 'Em uso'
+    GROUP BY setor.nome_setor
+    ORDER BY COUNT(*) DESC, setor.nome_setor
+"""
+
+QUERY_EXPORTAR_HISTORICO = """
+    SELECT
+        h.id, h.data_movimentacao, a.numero_serie, mo.nome_modelo,
+        h.colaborador_snapshot as colaborador, s.nome_status,
+        h.localizacao_atual, h.observacoes
+    FROM historico_movimentacoes h
+    JOIN aparelhos a ON h.aparelho_id = a.id
+    JOIN status s ON h.status_id = s.id
+    LEFT JOIN modelos mo ON a.modelo_id = mo.id
+    WHERE (CAST(:data_inicio AS DATE) IS NULL OR h.data_movimentacao >= CAST(:data_inicio AS DATE))
+      AND (CAST(:data_fim AS DATE) IS NULL OR h.data_movimentacao < CAST(:data_fim AS DATE) + 1)
+    ORDER BY h.data_movimentacao DESC
+"""
+
+@contextmanager
+def cursor_servidor(sql, params=None, conn=None):
+    """
+    Executa a consulta com um cursor do lado do servidor e devolve (colunas, resultado).
+    O resultado é iterável e vai buscando as linhas em lotes de TAMANHO_LOTE.
+    """
+    conn = conn or get_db_connection()
+    with conn.engine.connect() as conexao:
+        resultado = conexao.execution_options(stream_results=True, max_row_buffer=TAMANHO_LOTE).execute(text(sql), params or {})
+        try:
+            yield list(resultado.keys()), resultado
+        finally:
+            resultado.close()
+
+def _sumario(sql, conn):
+    df = consultar(sql, conn=conn)
+    return [list(df.columns)] + df.astype(object).where(df.notna(), None).values.tolist()
+
+def escrever_xlsx(caminho, sql, params=None, nome_folha="Relatorio", sumarios=(), conn=None):
+    """
+    Escreve o resultado da consulta num XLSX em modo write_only, linha a linha.
+    sumarios é uma lista de consultas pequenas cujos resultados ficam à direita do relatório.
+    Devolve o número de linhas exportadas (sem o cabeçalho).
+    """
+    from openpyxl import Workbook
+
+    conn = conn or get_db_connection()
+    tabelas_sumario = [_sumario(sql_sumario, conn) for sql_sumario in sumarios]
+
+    livro = Workbook(write_only=True)
+    folha = livro.create_sheet(nome_folha)
+    total = 0
+    separador = [None] * COLUNAS_ENTRE_TABELAS
+    with cursor_servidor(sql, params, conn=conn) as (colunas, resultado):
+        # Relatório e sumários lado a lado (cada um com o seu cabeçalho), como no layout anterior.
+        fontes = [_com_cabecalho(colunas, resultado)] + [iter(tabela) for tabela in tabelas_sumario]
+        larguras = [len(colunas)] + [len(tabela[0]) for tabela in tabelas_sumario]
+        for grupo in zip_longest(*fontes):
+            linha = []
+            for indice, (parte, largura) in enumerate(zip(grupo, larguras)):
+                if indice:
+                    linha += separador
+                linha += list(parte) if parte is not None else [None] * largura
+            folha.append(linha)
+            if grupo[0] is not None:
+                total += 1
+    livro.save(caminho)
+    return max(total - 1, 0)
+
+def _com_cabecalho(colunas, linhas):
+    yield colunas
+    yield from linhas
+
+def escrever_csv_gz(caminho, sql, params=None, conn=None):
+    """Escreve o resultado da consulta num CSV (separador ';', UTF-8 com BOM para o Excel) compactado com gzip."""
+    total = 0
+    with cursor_servidor(sql, params, conn=conn) as (colunas, resultado), \
+            gzip.open(caminho, "wt", encoding="utf-8-sig", newline="") as arquivo:
+        escritor = csv.writer(arquivo, delimiter=";")
+        escritor.writerow(colunas)
+        for lote in resultado.partitions(TAMANHO_LOTE):
+            escritor.writerows(lote)
+            total += len(lote)
+    return total
+
+def contar_linhas(sql, params=None, conn=None):
+    return int(consultar(f"SELECT COUNT(*) FROM ({sql}) t", params=params, conn=conn).iloc[0, 0])
+
+def gerar_exportacao(relatorio, extensao, conn=None, **params):
+    """
+    Gera o relatório ("inventario" ou "historico") num ficheiro temporário.
+    Devolve (caminho do ficheiro, total de linhas). Quem chama é responsável por apagar o ficheiro.
+    """
+    descritor, caminho = tempfile.mkstemp(prefix=f"assetflow_{relatorio}_", suffix=extensao)
+    os.close(descritor)
+    try:
+        if relatorio == "inventario":
+            sql, nome_folha, sumarios = QUERY_EXPORTAR_INVENTARIO, "Inventario_Completo", [QUERY_SUMARIO_STATUS, QUERY_SUMARIO_SETOR]
+        else:
+            sql, nome_folha, sumarios = QUERY_EXPORTAR_HISTORICO, "Relatorio", []
+            params = {"data_inicio": params.get("data_inicio"), "data_fim": params.get("data_fim")}
+        if extensao == ".xlsx":
+            # Verifica antes de escrever: o openpyxl só falharia a meio, depois de ler o limite da folha.
+            linhas = contar_linhas(sql, params, conn=conn)
+            if linhas > LIMITE_LINHAS_XLSX:
+                raise ValueError(
+                    f"O relatório tem {linhas} linhas e excede o limite de {LIMITE_LINHAS_XLSX} linhas de uma folha do Excel. "
+                    "Exporte em CSV compactado (.csv.gz) ou reduza o período."
+                )
+            total = escrever_xlsx(caminho, sql, params, nome_folha=nome_folha, sumarios=sumarios, conn=conn)
+        else:
+            total = escrever_csv_gz(caminho, sql, params, conn=conn)
+    except Exception:
+        os.remove(caminho)
+        raise
+    return caminho, total
+
+# --- Ficheiros à espera de download ---
+_pasta_downloads = None
+_pasta_downloads_lock = threading.Lock()
+
+def pasta_downloads():
+    """Pasta privada (0700) deste processo para as exportações prontas; é apagada quando o processo termina."""
+    global _pasta_downloads
+    with _pasta_downloads_lock:
+        if _pasta_downloads is None:
+            _pasta_downloads = tempfile.mkdtemp(prefix="assetflow_downloads_")
+            atexit.register(shutil.rmtree, _pasta_downloads, True)
+    return _pasta_downloads
+
+def limpar_downloads_expirados(ttl=TTL_EXPORTACAO_S):
+    """Apaga as exportações geradas há mais de ttl segundos (sessões que terminaram sem as descarregar)."""
+    limite = time.time() - ttl
+    for entrada in os.scandir(pasta_downloads()):
+        try:
+            if entrada.stat().st_mtime < limite:
+                os.remove(entrada.path)
+        except FileNotFoundError:
+            pass
+
+def preparar_download(caminho):
+    """Move o ficheiro gerado para a pasta de downloads e devolve o novo caminho."""
+    limpar_downloads_expirados()
+    destino = os.path.join(pasta_downloads(), os.path.basename(caminho))
+    shutil.move(caminho, destino)
+    os.utime(destino)  # o TTL conta a partir do momento em que o ficheiro fica disponível
+    return destino
+
+def apagar_download(caminho):
+    if caminho and os.path.exists(caminho):
+        os.remove(caminho)
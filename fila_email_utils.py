@@ -0,0 +1,375 @@
+import argparse
+import logging
+import os
+import smtplib
+import threading
+import time
+import uuid
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from sqlalchemy import text
+
+# --- Fila de Envio de E-mails (outbox) ---
+# As páginas não falam com o servidor SMTP: gravam o e-mail na tabela email_outbox e voltam logo.
+# Um remetente em segundo plano (uma thread por processo do servidor, ou o comando da linha de
+# comando) reclama os e-mails pendentes com FOR UPDATE SKIP LOCKED, para que vários processos possam
+# trabalhar sobre a mesma fila sem enviar duas vezes, e envia-os por uma única conexão SMTP
+# autenticada, reutilizada entre envios. Uma falha temporária volta a ser tentada com espera
+# exponencial; ao fim de MAX_TENTATIVAS (ou num erro definitivo, ex.: destinatário recusado) o
+# e-mail fica como "falhou", com o erro registado, e pode ser reenviado na página de Diagnóstico.
+# Um e-mail reclamado por um processo que terminou a meio do envio volta à fila após TEMPO_BLOQUEIO_S.
+# A tabela é criada pela migração 6 (migracoes_utils), aplicada no arranque; nenhuma transação das
+# páginas executa DDL (um ALTER TABLE bloquearia a fila inteira a cada e-mail).
+
+# Migração 6 de migracoes_utils.
+DDL_EMAIL_OUTBOX = """
+    CREATE TABLE IF NOT EXISTS email_outbox (
+        id BIGSERIAL PRIMARY KEY,
+        destinatarios TEXT[] NOT NULL,
+        assunto TEXT NOT NULL,
+        corpo_html TEXT NOT NULL,
+        corpo_texto TEXT,
+        origem TEXT,
+        lote TEXT,
+        estado TEXT NOT NULL DEFAULT 'pendente',
+        tentativas INTEGER NOT NULL DEFAULT 0,
+        proxima_tentativa_em TIMESTAMP NOT NULL DEFAULT NOW(),
+        bloqueado_em TIMESTAMP,
+        ultimo_erro TEXT,
+        criado_em TIMESTAMP NOT NULL DEFAULT NOW(),
+        enviado_em TIMESTAMP
+    );
+    ALTER TABLE email_outbox ADD COLUMN IF NOT EXISTS lote TEXT;
+    CREATE INDEX IF NOT EXISTS idx_email_outbox_fila ON email_outbox (proxima_tentativa_em)
+        WHERE estado IN ('pendente', 'enviando');
+    CREATE INDEX IF NOT EXISTS idx_email_outbox_lote ON email_outbox (lote) WHERE lote IS NOT NULL;
+"""
+
+ESTADO_PENDENTE = "pendente"
+ESTADO_ENVIANDO = "enviando"
+ESTADO_ENVIADO = "enviado"
+ESTADO_FALHOU = "falhou"
+
+MAX_TENTATIVAS = 5
+ESPERA_BASE_S = 30          # 30 s, 1 min, 2 min, 4 min... entre tentativas
+ESPERA_MAX_S = 3600
+TEMPO_BLOQUEIO_S = 600
+TAMANHO_LOTE = 20
+INTERVALO_VERIFICACAO_S = 15  # o remetente também acorda logo que um e-mail é colocado na fila
+OCIOSIDADE_MAX_S = 60         # conexão SMTP parada há mais tempo é fechada antes do próximo envio
+
+logger = logging.getLogger("assetflow.email")
+
+def configuracao_smtp(credenciais=None):
+    """
+    Servidor e credenciais do envio. Por omissão usa o Gmail (SSL, porta 465) com as credenciais de
+    [email_credentials]; ASSETFLOW_SMTP_HOST, ASSETFLOW_SMTP_PORTA e ASSETFLOW_SMTP_SSL apontam o envio
+    para outro servidor (ex.: um SMTP local de testes: python -m aiosmtpd -n -l localhost:1025, com
+    ASSETFLOW_SMTP_SSL=0). Sem senha, o remetente não faz login.
+    """
+    credenciais = credenciais or {}
+    remetente = credenciais.get("sender_email") or os.environ.get("ASSETFLOW_SMTP_REMETENTE", "")
+    return {
+        "host": os.environ.get("ASSETFLOW_SMTP_HOST", "smtp.gmail.com"),
+        "porta": int(os.environ.get("ASSETFLOW_SMTP_PORTA", 465)),
+        "ssl": os.environ.get("ASSETFLOW_SMTP_SSL", "1") not in ("0", "false", "nao", "não"),
+        "remetente": remetente,
+        "senha": credenciais.get("sender_password") or os.environ.get("ASSETFLOW_SMTP_SENHA", ""),
+    }
+
+def montar_mensagem(remetente, destinatarios, assunto, corpo_html, corpo_texto=""):
+    mensagem = MIMEMultipart("alternative")
+    mensagem["Subject"] = assunto
+    mensagem["From"] = f"AssetFlow <{remetente}>"
+    mensagem["To"] = ", ".join(destinatarios)
+    if corpo_texto:
+        mensagem.attach(MIMEText(corpo_texto, "plain"))
+    mensagem.attach(MIMEText(corpo_html, "html"))
+    return mensagem.as_string()
+
+def _erro_definitivo(erro):
+    """Erros que não se resolvem a tentar de novo (endereços recusados, mensagem rejeitada com 5xx)."""
+    if isinstance(erro, (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused)):
+        return True
+    return isinstance(erro, smtplib.SMTPDataError) and erro.smtp_code >= 500
+
+class ConexaoSMTP:
+    """Conexão SMTP autenticada reutilizada entre envios; volta a abrir-se se o servidor a fechar."""
+
+    def __init__(self, config):
+        self.config = config
+        self._smtp = None
+        self._usada_em = 0.0
+
+    def _abrir(self):
+        c = self.config
+        classe = smtplib.SMTP_SSL if c["ssl"] else smtplib.SMTP
+        smtp = classe(c["host"], c["porta"], timeout=30)
+        try:
+            if c["senha"]:
+                smtp.login(c["remetente"], c["senha"])
+        except Exception:
+            # Uma conexão sem autenticação não pode ficar guardada: os envios seguintes seriam recusados.
+            try:
+                smtp.close()
+            except Exception:
+                pass
+            raise
+        self._smtp = smtp
+
+    def fechar(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+    def fechar_se_ociosa(self):
+        if self._smtp is not None and time.monotonic() - self._usada_em > OCIOSIDADE_MAX_S:
+            self.fechar()
+
+    def enviar(self, destinatarios, mensagem):
+        self.fechar_se_ociosa()
+        for tentativa in range(2):
+            if self._smtp is None:
+                self._abrir()
+            try:
+                self._smtp.sendmail(self.config["remetente"], destinatarios, mensagem)
+                self._usada_em = time.monotonic()
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                # O servidor fechou a conexão reutilizada (ociosidade, limite de mensagens); abre-se outra.
+                self.fechar()
+                if tentativa:
+                    raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+def enfileirar_email(conn, destinatarios, assunto, corpo_html, corpo_texto="", origem=None):
+    """Grava o e-mail na fila (estado "pendente") e devolve o seu ID. conn: conexão do Streamlit ou engine."""
+    with conn.engine.begin() as conexao:
+        id_email = conexao.execute(text("""
+            INSERT INTO email_outbox (destinatarios, assunto, corpo_html, corpo_texto, origem)
+            VALUES (:destinatarios, :assunto, :corpo_html, :corpo_texto, :origem)
+            RETURNING id
+        """), {"destinatarios": list(destinatarios), "assunto": assunto, "corpo_html": corpo_html,
+               "corpo_texto": corpo_texto or None, "origem": origem}).scalar_one()
+    acordar_remetente()
+    return id_email
+
+def enfileirar_emails(conn, emails, origem=None):
+    """
+    Envio em massa: grava vários e-mails (dicts com destinatarios, assunto, corpo_html e corpo_texto)
+    numa única instrução, todos com o mesmo identificador de lote, e devolve esse identificador.
+    """
+    lote = uuid.uuid4().hex
+    with conn.engine.begin() as conexao:
+        conexao.execute(text("""
+            INSERT INTO email_outbox (destinatarios, assunto, corpo_html, corpo_texto, origem, lote)
+            VALUES (:destinatarios, :assunto, :corpo_html, :corpo_texto, :origem, :lote)
+        """), [
+            {"destinatarios": list(e["destinatarios"]), "assunto": e["assunto"], "corpo_html": e["corpo_html"],
+             "corpo_texto": e.get("corpo_texto") or None, "origem": origem, "lote": lote}
+            for e in emails
+        ])
+    acordar_remetente()
+    return lote
+
+def estatisticas_lote(conn, lote):
+    """
+    Progresso de um envio em massa: total, enviados, pendentes, falhados, segundos desde a entrada na
+    fila até ao último envio e débito em e-mails por segundo nesse intervalo.
+    """
+    with conn.engine.begin() as conexao:
+        linha = conexao.execute(text("""
+            SELECT COUNT(*) AS total,
+                   COUNT(*) FILTER (WHERE estado = 'enviado') AS enviados,
+                   COUNT(*) FILTER (WHERE estado IN ('pendente', 'enviando')) AS pendentes,
+                   COUNT(*) FILTER (WHERE estado = 'falhou') AS falhados,
+                   EXTRACT(EPOCH FROM MAX(enviado_em) - MIN(criado_em)) AS duracao_s
+            FROM email_outbox WHERE lote = :lote
+        """), {"lote": lote}).mappings().one()
+    estatisticas = dict(linha)
+    duracao_s = float(estatisticas["duracao_s"] or 0)
+    estatisticas["duracao_s"] = round(duracao_s, 1)
+    estatisticas["emails_por_segundo"] = round(estatisticas["enviados"] / duracao_s, 2) if duracao_s else None
+    return estatisticas
+
+def _reclamar_lote(engine, tamanho_lote):
+    with engine.begin() as conexao:
+        return conexao.execute(text("""
+            UPDATE email_outbox SET estado = 'enviando', bloqueado_em = NOW(), tentativas = tentativas + 1
+            WHERE id IN (
+                SELECT id FROM email_outbox
+                WHERE (estado = 'pendente' AND proxima_tentativa_em <= NOW())
+                   OR (estado = 'enviando' AND bloqueado_em < NOW() - make_interval(secs => :bloqueio_s))
+                ORDER BY id LIMIT :lote
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, destinatarios, assunto, corpo_html, corpo_texto, tentativas
+        """), {"bloqueio_s": TEMPO_BLOQUEIO_S, "lote": tamanho_lote}).mappings().all()
+
+def _marcar_enviado(engine, id_email):
+    with engine.begin() as conexao:
+        conexao.execute(text("""
+            UPDATE email_outbox SET estado = 'enviado', enviado_em = NOW(), bloqueado_em = NULL, ultimo_erro = NULL
+            WHERE id = :id
+        """), {"id": id_email})
+
+def _marcar_falha(engine, email, erro):
+    definitivo = _erro_definitivo(erro) or email["tentativas"] >= MAX_TENTATIVAS
+    espera_s = min(ESPERA_BASE_S * 2 ** (email["tentativas"] - 1), ESPERA_MAX_S)
+    with engine.begin() as conexao:
+        conexao.execute(text("""
+            UPDATE email_outbox SET estado = :estado, bloqueado_em = NULL, ultimo_erro = :erro,
+                proxima_tentativa_em = NOW() + make_interval(secs => :espera_s)
+            WHERE id = :id
+        """), {"id": email["id"], "estado": ESTADO_FALHOU if definitivo else ESTADO_PENDENTE,
+               "erro": f"{type(erro).__name__}: {erro}"[:1000], "espera_s": espera_s})
+    logger.warning("E-mail %s não enviado (tentativa %s%s): %s", email["id"], email["tentativas"],
+                   ", desistido" if definitivo else f", nova tentativa em {espera_s} s", erro)
+
+def processar_fila(engine, smtp, tamanho_lote=TAMANHO_LOTE):
+    """
+    Envia um lote de e-mails pendentes pela conexão smtp (ConexaoSMTP) e devolve (enviados, falhados).
+    Cada e-mail é marcado na sua própria transação, logo a seguir ao envio.
+    """
+    enviados = falhados = 0
+    for email in _reclamar_lote(engine, tamanho_lote):
+        try:
+            mensagem = montar_mensagem(smtp.config["remetente"], email["destinatarios"], email["assunto"],
+                                       email["corpo_html"], email["corpo_texto"])
+            smtp.enviar(email["destinatarios"], mensagem)
+        except Exception as e:
+            if not isinstance(e, smtplib.SMTPException):
+                smtp.fechar()
+            _marcar_falha(engine, email, e)
+            falhados += 1
+            continue
+        _marcar_enviado(engine, email["id"])
+        enviados += 1
+    return enviados, falhados
+
+class RemetenteEmails(threading.Thread):
+    """Thread que esvazia a fila enquanto o processo do servidor estiver ativo."""
+
+    def __init__(self, engine, config):
+        super().__init__(name="assetflow-remetente-emails", daemon=True)
+        self.engine = engine
+        self.smtp = ConexaoSMTP(config)
+        self.acordar = threading.Event()
+        self.metricas = {"enviados": 0, "falhados": 0, "tempo_envio_s": 0.0, "ultimo_lote": None}
+
+    def run(self):
+        from migracoes_utils import garantir_migracoes_arranque
+
+        garantir_migracoes_arranque(self.engine)
+        while True:
+            inicio = time.perf_counter()
+            try:
+                enviados, falhados = processar_fila(self.engine, self.smtp)
+            except Exception:
+                logger.exception("Erro no remetente de e-mails.")
+                enviados = falhados = 0
+            if enviados or falhados:
+                self._registar_lote(enviados, falhados, time.perf_counter() - inicio)
+                continue  # pode haver mais na fila
+            self.smtp.fechar_se_ociosa()
+            self.acordar.wait(INTERVALO_VERIFICACAO_S)
+            self.acordar.clear()
+
+    def _registar_lote(self, enviados, falhados, duracao_s):
+        por_segundo = enviados / duracao_s if duracao_s else 0.0
+        self.metricas["enviados"] += enviados
+        self.metricas["falhados"] += falhados
+        self.metricas["tempo_envio_s"] += duracao_s
+        self.metricas["ultimo_lote"] = {"enviados": enviados, "falhados": falhados,
+                                        "duracao_s": round(duracao_s, 2), "emails_por_segundo": round(por_segundo, 2)}
+        logger.info("Lote de e-mails: %s enviado(s), %s falhado(s) em %.2f s (%.1f e-mails/s).",
+                    enviados, falhados, duracao_s, por_segundo)
+
+_remetente = None
+_lock_remetente = threading.Lock()
+
+def iniciar_remetente(engine, config):
+    """Inicia (uma vez por processo) o remetente em segundo plano; chamadas seguintes apenas o acordam."""
+    global _remetente
+    with _lock_remetente:
+        if _remetente is None or not _remetente.is_alive():
+            _remetente = RemetenteEmails(engine, config)
+            _remetente.start()
+        else:
+            _remetente.smtp.config = config
+    _remetente.acordar.set()
+    return _remetente
+
+def metricas_remetente():
+    """Totais do remetente deste processo (e-mails enviados, falhados e débito do último lote) ou None."""
+    if _remetente is None:
+        return None
+    metricas = dict(_remetente.metricas)
+    tempo = metricas.pop("tempo_envio_s")
+    metricas["emails_por_segundo"] = round(metricas["enviados"] / tempo, 2) if tempo else None
+    metricas["ativo"] = _remetente.is_alive()
+    return metricas
+
+def acordar_remetente():
+    if _remetente is not None:
+        _remetente.acordar.set()
+
+def resumo_fila(conn):
+    """Número de e-mails por estado."""
+    with conn.engine.connect() as conexao:
+        return dict(conexao.execute(text("SELECT estado, COUNT(*) FROM email_outbox GROUP BY estado")).all())
+
+def emails_recentes(conn, estados=(ESTADO_PENDENTE, ESTADO_ENVIANDO, ESTADO_FALHOU), limite=50):
+    with conn.engine.connect() as conexao:
+        return [dict(linha) for linha in conexao.execute(text("""
+            SELECT id, origem, array_to_string(destinatarios, ', ') AS destinatarios, assunto, estado, tentativas,
+                   proxima_tentativa_em, ultimo_erro, criado_em
+            FROM email_outbox WHERE estado = ANY(:estados) ORDER BY id DESC LIMIT :limite
+        """), {"estados": list(estados), "limite": limite}).mappings()]
+
+def reenviar_falhados(conn, ids=None):
+    """Volta a colocar na fila os e-mails que falharam (todos ou apenas os IDs indicados) e devolve quantos."""
+    with conn.engine.begin() as conexao:
+        resultado = conexao.execute(text("""
+            UPDATE email_outbox SET estado = 'pendente', tentativas = 0, proxima_tentativa_em = NOW()
+            WHERE estado = 'falhou' AND (CAST(:ids AS BIGINT[]) IS NULL OR id = ANY(:ids))
+        """), {"ids": list(ids) if ids is not None else None})
+    acordar_remetente()
+    return resultado.rowcount
+
+if __name__ == "__main__":
+    from db_utils import criar_engine_cli
+
+    parser = argparse.ArgumentParser(description="Envia os e-mails da fila (email_outbox) fora do servidor Streamlit.")
+    parser.add_argument("--continuo", action="store_true", help="Continua a verificar a fila em vez de sair quando ela estiver vazia.")
+    parser.add_argument("--reenviar-falhados", action="store_true", help="Volta a colocar na fila os e-mails que falharam.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    from migracoes_utils import garantir_migracoes_arranque
+
+    engine = criar_engine_cli()
+    garantir_migracoes_arranque(engine)  # cria email_outbox, se faltar
+    if args.reenviar_falhados:
+        print(f"{reenviar_falhados(engine)} e-mail(s) de volta à fila.")
+    # Credenciais por variáveis de ambiente (ASSETFLOW_SMTP_REMETENTE e ASSETFLOW_SMTP_SENHA).
+    with ConexaoSMTP(configuracao_smtp()) as smtp:
+        while True:
+            inicio = time.perf_counter()
+            enviados, falhados = processar_fila(engine, smtp)
+            if enviados or falhados:
+                duracao = time.perf_counter() - inicio
+                print(f"{enviados} enviado(s), {falhados} falhado(s) em {duracao:.1f}s ({enviados / duracao:.1f} e-mails/s).")
+            elif args.continuo:
+                time.sleep(INTERVALO_VERIFICACAO_S)
+            else:
+                break
+    print(resumo_fila(engine))
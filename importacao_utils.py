@@ -0,0 +1,338 @@
+import io
+from datetime import date, datetime
+import pandas as pd
+from sqlalchemy import text
+from db_utils import get_db_connection
+from referencias_utils import id_referencia
+from posse_utils import atualizar_posse_aparelhos
+from planilha_utils import TAMANHO_BLOCO, ler_em_blocos, hash_arquivo
+
+# --- Importação em Lote (staging + COPY) ---
+# A planilha é carregada numa tabela temporária com COPY; a validação e a resolução das chaves
+# estrangeiras são feitas com comandos SQL sobre todo o lote, e as linhas válidas entram na tabela
+# final num único INSERT ... SELECT. Cada linha rejeitada fica com a sua mensagem na coluna "erro"
+# da staging, que no fim é devolvida como relatório (as mesmas mensagens que a página mostrava).
+
+TABELA_STAGING = "importacao_staging"
+
+# Progresso das importações em blocos: cada bloco é gravado na sua própria transação, junto com a
+# atualização do progresso e das rejeições, para que uma importação interrompida possa ser retomada
+# a partir do último bloco confirmado. A planilha é identificada pelo SHA-256 do conteúdo.
+# As tabelas são criadas pela migração 7 (migracoes_utils), aplicada no arranque.
+DDL_IMPORTACOES = """
+    CREATE TABLE IF NOT EXISTS importacoes_progresso (
+        hash_arquivo TEXT NOT NULL,
+        tipo TEXT NOT NULL,
+        nome_arquivo TEXT,
+        linhas_processadas INTEGER NOT NULL DEFAULT 0,
+        importados INTEGER NOT NULL DEFAULT 0,
+        concluida BOOLEAN NOT NULL DEFAULT FALSE,
+        atualizado_em TIMESTAMP NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (hash_arquivo, tipo)
+    );
+    CREATE TABLE IF NOT EXISTS importacoes_rejeicoes (
+        hash_arquivo TEXT NOT NULL,
+        tipo TEXT NOT NULL,
+        linha INTEGER NOT NULL,
+        mensagem TEXT NOT NULL,
+        PRIMARY KEY (hash_arquivo, tipo, linha)
+    );
+"""
+
+COLUNAS_IMPORTACAO = {
+    "colaboradores": ["codigo", "nome_completo", "cpf", "gmail", "nome_setor"],
+    "aparelhos": ["numero_serie", "imei1", "imei2", "valor", "modelo_completo", "status_inicial"],
+    "marcas": ["nome_marca"],
+    "contas_gmail": ["email", "senha", "telefone_recuperacao", "email_recuperacao", "nome_colaborador"],
+    "movimentacoes": ["numero_serie_aparelho", "nome_colaborador", "localizacao", "observacoes"],
+}
+
+def colunas_em_falta(tipo, df):
+    return [c for c in COLUNAS_IMPORTACAO[tipo] if c not in df.columns]
+
+def _copiar_para_staging(s, df, colunas):
+    """Envia o DataFrame para a staging com COPY (psycopg2); noutros drivers recorre a um INSERT em lote."""
+    dados = df[colunas].fillna("").astype(str)
+    dados.insert(0, "linha", df.index + 2)  # linha 1 é o cabeçalho da planilha
+    lista_colunas = ", ".join(["linha"] + colunas)
+
+    cursor = s.connection().connection.cursor()
+    if hasattr(cursor, "copy_expert"):
+        buffer = io.StringIO()
+        dados.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        # FORCE_NOT_NULL mantém as células vazias como '' (tal como o fillna('') da leitura).
+        cursor.copy_expert(
+            f"COPY {TABELA_STAGING} ({lista_colunas}) FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL ({', '.join(colunas)}))",
+            buffer
+        )
+    else:
+        valores = ", ".join(f":{c}" for c in ["linha"] + colunas)
+        s.execute(text(f"INSERT INTO {TABELA_STAGING} ({lista_colunas}) VALUES ({valores})"), dados.to_dict("records"))
+
+def _criar_staging(s, df, colunas, extras=None):
+    """Cria a tabela temporária (descartada no fim da transação) e carrega nela as colunas da planilha."""
+    definicoes = ["linha INTEGER PRIMARY KEY"] + [f"{c} TEXT" for c in colunas]
+    definicoes += [f"{c} {tipo}" for c, tipo in (extras or {}).items()]
+    definicoes += ["erro TEXT", "novo_id BIGINT"]
+    s.execute(text(f"CREATE TEMP TABLE {TABELA_STAGING} ({', '.join(definicoes)}) ON COMMIT DROP"))
+    _copiar_para_staging(s, df, colunas)
+
+def _rejeitar(s, condicao, mensagem_sql, params=None):
+    """Marca com a mensagem as linhas ainda válidas que cumprem a condição (a primeira falha de cada linha prevalece)."""
+    s.execute(text(f"""
+        UPDATE {TABELA_STAGING} stg SET erro = 'Linha ' || stg.linha || ': ' || {mensagem_sql}
+        WHERE stg.erro IS NULL AND ({condicao})
+    """), params or {})
+
+def _rejeitar_repetidos_no_lote(s, coluna, mensagem_sql):
+    """Rejeita as linhas que repetem o valor da coluna de uma linha anterior do mesmo lote."""
+    _rejeitar(s, f"""
+        EXISTS (SELECT 1 FROM {TABELA_STAGING} anterior
+                WHERE anterior.{coluna} = stg.{coluna} AND anterior.linha < stg.linha AND anterior.erro IS NULL)
+    """, mensagem_sql)
+
+def _inserir_validos(s, insert_sql, coluna_chave, mensagem_conflito, params=None):
+    """
+    Executa o INSERT ... SELECT das linhas válidas (que deve terminar em RETURNING id, <coluna_chave>) e
+    guarda em novo_id o ID criado. Linhas ignoradas pelo ON CONFLICT DO NOTHING recebem a mensagem de conflito.
+    """
+    s.execute(text(f"""
+        WITH inseridos AS ({insert_sql})
+        UPDATE {TABELA_STAGING} stg SET novo_id = i.id
+        FROM inseridos i
+        WHERE stg.erro IS NULL AND stg.{coluna_chave} = i.{coluna_chave}
+    """), params or {})
+    _rejeitar(s, "stg.novo_id IS NULL", mensagem_conflito)
+
+def _relatorio(s):
+    """Devolve (total importado, DataFrame com as linhas rejeitadas e as respetivas mensagens)."""
+    importados = s.execute(text(f"SELECT COUNT(*) FROM {TABELA_STAGING} WHERE erro IS NULL")).scalar_one()
+    rejeitados = s.execute(text(f"SELECT linha, erro FROM {TABELA_STAGING} WHERE erro IS NOT NULL ORDER BY linha")).fetchall()
+    return importados, pd.DataFrame(rejeitados, columns=["linha", "mensagem"])
+
+def _importar_colaboradores(s, df):
+    colunas = COLUNAS_IMPORTACAO["colaboradores"]
+    _criar_staging(s, df, colunas, extras={"setor_id": "BIGINT"})
+    s.execute(text(f"UPDATE {TABELA_STAGING} stg SET setor_id = se.id FROM setores se WHERE se.nome_setor = TRIM(stg.nome_setor)"))
+
+    _rejeitar(s, "stg.setor_id IS NULL", "'Setor ''' || stg.nome_setor || ''' não encontrado. Pulando registo.'")
+    mensagem_existe = "'Colaborador com código, CPF ou setor já existe. Pulando registo.'"
+    _rejeitar(s, "EXISTS (SELECT 1 FROM colaboradores c WHERE c.cpf = stg.cpf)", mensagem_existe)
+    _rejeitar_repetidos_no_lote(s, "cpf", mensagem_existe)
+
+    _inserir_validos(s, f"""
+        INSERT INTO colaboradores (codigo, nome_completo, cpf, gmail, setor_id, data_cadastro)
+        SELECT codigo, nome_completo, cpf, gmail, setor_id, :data FROM {TABELA_STAGING}
+        WHERE erro IS NULL ORDER BY linha
+        ON CONFLICT DO NOTHING
+        RETURNING id, cpf
+    """, "cpf", mensagem_existe, {"data": date.today()})
+
+def _importar_aparelhos(s, df):
+    colunas = COLUNAS_IMPORTACAO["aparelhos"]
+    _criar_staging(s, df, colunas, extras={"modelo_id": "BIGINT", "status_id": "BIGINT"})
+    s.execute(text(f"""
+        UPDATE {TABELA_STAGING} stg SET modelo_id = mo.id
+        FROM modelos mo JOIN marcas ma ON mo.marca_id = ma.id
+        WHERE ma.nome_marca || ' - ' || mo.nome_modelo = TRIM(stg.modelo_completo)
+    """))
+    s.execute(text(f"UPDATE {TABELA_STAGING} stg SET status_id = st.id FROM status st WHERE st.nome_status = TRIM(stg.status_inicial)"))
+    s.execute(text(f"UPDATE {TABELA_STAGING} SET valor = REPLACE(TRIM(valor), ',', '.')"))
+
+    _rejeitar(s, "stg.modelo_id IS NULL OR stg.status_id IS NULL", "'Modelo ou Status inválido. Pulando registo.'")
+    _rejeitar(s, "stg.valor !~ '^-?[0-9]+([.][0-9]+)?$'", "'Valor ''' || stg.valor || ''' inválido. Pulando registo.'")
+    mensagem_existe = "'Aparelho com N/S já existe. Pulando registo.'"
+    _rejeitar(s, "EXISTS (SELECT 1 FROM aparelhos a WHERE a.numero_serie = stg.numero_serie)", mensagem_existe)
+    _rejeitar_repetidos_no_lote(s, "numero_serie", mensagem_existe)
+
+    _inserir_validos(s, f"""
+        INSERT INTO aparelhos (numero_serie, imei1, imei2, valor, modelo_id, status_id, data_cadastro)
+        SELECT numero_serie, imei1, imei2, CAST(valor AS NUMERIC), modelo_id, status_id, :data FROM {TABELA_STAGING}
+        WHERE erro IS NULL ORDER BY linha
+        ON CONFLICT DO NOTHING
+        RETURNING id, numero_serie
+    """, "numero_serie", mensagem_existe, {"data": date.today()})
+
+    # Movimentação de entrada de cada aparelho criado, seguida da atualização da posse atual em lote.
+    s.execute(text(f"""
+        INSERT INTO historico_movimentacoes (data_movimentacao, aparelho_id, status_id, localizacao_atual, observacoes)
+        SELECT :agora, novo_id, status_id, 'Estoque Interno', 'Entrada via importação.' FROM {TABELA_STAGING}
+        WHERE erro IS NULL ORDER BY linha
+    """), {"agora": datetime.now()})
+    novos_ids = s.execute(text(f"SELECT novo_id FROM {TABELA_STAGING} WHERE erro IS NULL")).scalars().all()
+    atualizar_posse_aparelhos(s, novos_ids)
+
+def _importar_marcas(s, df):
+    colunas = COLUNAS_IMPORTACAO["marcas"]
+    _criar_staging(s, df, colunas)
+    s.execute(text(f"UPDATE {TABELA_STAGING} SET nome_marca = TRIM(nome_marca)"))
+
+    _rejeitar(s, "stg.nome_marca = ''", "'Nome da marca vazio. Pulando registo.'")
+    mensagem_existe = "'Marca ''' || stg.nome_marca || ''' já existe. Pulando registo.'"
+    _rejeitar(s, "EXISTS (SELECT 1 FROM marcas m WHERE m.nome_marca = stg.nome_marca)", mensagem_existe)
+    _rejeitar_repetidos_no_lote(s, "nome_marca", mensagem_existe)
+
+    _inserir_validos(s, f"""
+        INSERT INTO marcas (nome_marca)
+        SELECT nome_marca FROM {TABELA_STAGING} WHERE erro IS NULL ORDER BY linha
+        ON CONFLICT DO NOTHING
+        RETURNING id, nome_marca
+    """, "nome_marca", mensagem_existe)
+
+def _importar_contas_gmail(s, df):
+    colunas = COLUNAS_IMPORTACAO["contas_gmail"]
+    _criar_staging(s, df, colunas, extras={"colaborador_id": "BIGINT"})
+    # Colaborador não encontrado não é erro: a conta fica apenas sem colaborador associado.
+    s.execute(text(f"""
+        UPDATE {TABELA_STAGING} stg SET colaborador_id = (
+            SELECT MAX(c.id) FROM colaboradores c WHERE c.nome_completo = TRIM(stg.nome_colaborador)
+        )
+        WHERE stg.nome_colaborador <> ''
+    """))
+
+    mensagem_existe = "'E-mail ''' || stg.email || ''' já existe. Pulando registo.'"
+    _rejeitar(s, "EXISTS (SELECT 1 FROM contas_gmail g WHERE g.email = stg.email)", mensagem_existe)
+    _rejeitar_repetidos_no_lote(s, "email", mensagem_existe)
+
+    _inserir_validos(s, f"""
+        INSERT INTO contas_gmail (email, senha, telefone_recuperacao, email_recuperacao, colaborador_id)
+        SELECT email, senha, telefone_recuperacao, email_recuperacao, colaborador_id FROM {TABELA_STAGING}
+        WHERE erro IS NULL ORDER BY linha
+        ON CONFLICT DO NOTHING
+        RETURNING id, email
+    """, "email", mensagem_existe)
+
+def _importar_movimentacoes(s, df):
+    colunas = COLUNAS_IMPORTACAO["movimentacoes"]
+    _criar_staging(s, df, colunas, extras={"aparelho_id": "BIGINT", "colaborador_id": "BIGINT"})
+    status_em_uso_id = id_referencia("status", "Em uso", conn=s.get_bind())
+    s.execute(text(f"""
+        UPDATE {TABELA_STAGING} stg SET
+            aparelho_id = (SELECT MAX(a.id) FROM aparelhos a WHERE a.numero_serie = TRIM(stg.numero_serie_aparelho)),
+            colaborador_id = (SELECT MAX(c.id) FROM colaboradores c WHERE c.nome_completo = TRIM(stg.nome_colaborador))
+    """))
+
+    _rejeitar(
+        s, "stg.aparelho_id IS NULL OR stg.colaborador_id IS NULL OR CAST(:status_id AS BIGINT) IS NULL",
+        "'Aparelho ou Colaborador não encontrado/disponível. Pulando registo.'", {"status_id": status_em_uso_id}
+    )
+
+    # Mesma data para todo o lote; em caso de empate a posse fica com a última linha da planilha (maior ID).
+    params = {"agora": datetime.now(), "status_id": status_em_uso_id}
+    s.execute(text(f"""
+        INSERT INTO historico_movimentacoes
+            (data_movimentacao, aparelho_id, colaborador_id, status_id, localizacao_atual, observacoes, colaborador_snapshot)
+        SELECT :agora, aparelho_id, colaborador_id, :status_id, localizacao, observacoes, TRIM(nome_colaborador)
+        FROM {TABELA_STAGING} WHERE erro IS NULL ORDER BY linha
+    """), params)
+    s.execute(text(f"""
+        UPDATE aparelhos SET status_id = :status_id
+        WHERE id IN (SELECT aparelho_id FROM {TABELA_STAGING} WHERE erro IS NULL)
+    """), params)
+    aparelho_ids = s.execute(text(f"SELECT DISTINCT aparelho_id FROM {TABELA_STAGING} WHERE erro IS NULL")).scalars().all()
+    atualizar_posse_aparelhos(s, aparelho_ids)
+
+_IMPORTADORES = {
+    "colaboradores": _importar_colaboradores,
+    "aparelhos": _importar_aparelhos,
+    "marcas": _importar_marcas,
+    "contas_gmail": _importar_contas_gmail,
+    "movimentacoes": _importar_movimentacoes,
+}
+
+def importar_planilha(tipo, df, conn=None):
+    """
+    Importa o DataFrame lido da planilha (tipo é uma das chaves de COLUNAS_IMPORTACAO) numa única transação.
+    As linhas válidas são gravadas e as restantes devolvidas no relatório.
+    Devolve {"importados": n, "rejeitados": DataFrame com as colunas linha e mensagem}.
+    """
+    conn = conn or get_db_connection()
+    with conn.session as s:
+        s.begin()
+        _IMPORTADORES[tipo](s, df.reset_index(drop=True))
+        importados, rejeitados = _relatorio(s)
+        s.commit()
+    return {"importados": importados, "rejeitados": rejeitados}
+
+def obter_progresso(hash_planilha, tipo, conn=None):
+    """Progresso registado para a planilha (dict) ou None se ela nunca foi importada."""
+    conn = conn or get_db_connection()
+    with conn.session as s:
+        s.begin()
+        linha = s.execute(text("""
+            SELECT nome_arquivo, linhas_processadas, importados, concluida, atualizado_em
+            FROM importacoes_progresso WHERE hash_arquivo = :hash AND tipo = :tipo
+        """), {"hash": hash_planilha, "tipo": tipo}).mappings().first()
+        s.commit()
+    return dict(linha) if linha else None
+
+def importar_em_blocos(tipo, arquivo, nome_arquivo, conn=None, tamanho_bloco=TAMANHO_BLOCO, ao_progredir=None):
+    """
+    Importa a planilha bloco a bloco, com um commit por bloco. Se a mesma planilha tiver uma importação
+    interrompida, continua a partir da primeira linha ainda não confirmada; se já tiver sido concluída,
+    importa-a de novo desde o início.
+    ao_progredir(linhas_processadas, importados), se indicado, é chamado após cada bloco.
+    Devolve {"importados": n, "rejeitados": DataFrame, "retomada_em": linha inicial ou 0}.
+    """
+    conn = conn or get_db_connection()
+    hash_planilha = hash_arquivo(arquivo)
+    chave = {"hash": hash_planilha, "tipo": tipo}
+
+    with conn.session as s:
+        s.begin()
+        progresso = s.execute(text("""
+            SELECT linhas_processadas, importados, concluida FROM importacoes_progresso
+            WHERE hash_arquivo = :hash AND tipo = :tipo FOR UPDATE
+        """), chave).mappings().first()
+        if progresso is None or progresso["concluida"]:
+            s.execute(text("DELETE FROM importacoes_rejeicoes WHERE hash_arquivo = :hash AND tipo = :tipo"), chave)
+            s.execute(text("""
+                INSERT INTO importacoes_progresso (hash_arquivo, tipo, nome_arquivo)
+                VALUES (:hash, :tipo, :nome)
+                ON CONFLICT (hash_arquivo, tipo) DO UPDATE SET
+                    nome_arquivo = EXCLUDED.nome_arquivo, linhas_processadas = 0, importados = 0,
+                    concluida = FALSE, atualizado_em = NOW()
+            """), {**chave, "nome": nome_arquivo})
+            linhas_processadas, importados = 0, 0
+        else:
+            linhas_processadas, importados = progresso["linhas_processadas"], progresso["importados"]
+        s.commit()
+    retomada_em = linhas_processadas
+
+    for bloco in ler_em_blocos(arquivo, nome_arquivo, tamanho_bloco, pular=linhas_processadas):
+        with conn.session as s:
+            s.begin()
+            _IMPORTADORES[tipo](s, bloco)
+            importados_bloco = s.execute(text(f"SELECT COUNT(*) FROM {TABELA_STAGING} WHERE erro IS NULL")).scalar_one()
+            s.execute(text(f"""
+                INSERT INTO importacoes_rejeicoes (hash_arquivo, tipo, linha, mensagem)
+                SELECT :hash, :tipo, linha, erro FROM {TABELA_STAGING} WHERE erro IS NOT NULL
+                ON CONFLICT DO NOTHING
+            """), chave)
+            linhas_processadas += len(bloco)
+            importados += importados_bloco
+            s.execute(text("""
+                UPDATE importacoes_progresso SET linhas_processadas = :linhas, importados = :importados, atualizado_em = NOW()
+                WHERE hash_arquivo = :hash AND tipo = :tipo
+            """), {**chave, "linhas": linhas_processadas, "importados": importados})
+            s.commit()
+        if ao_progredir:
+            ao_progredir(linhas_processadas, importados)
+
+    with conn.session as s:
+        s.begin()
+        s.execute(text("""
+            UPDATE importacoes_progresso SET concluida = TRUE, atualizado_em = NOW()
+            WHERE hash_arquivo = :hash AND tipo = :tipo
+        """), chave)
+        rejeitados = s.execute(text("""
+            SELECT linha, mensagem FROM importacoes_rejeicoes
+            WHERE hash_arquivo = :hash AND tipo = :tipo ORDER BY linha
+        """), chave).fetchall()
+        s.commit()
+    return {
+        "importados": importados,
+        "rejeitados": pd.DataFrame(rejeitados, columns=["linha", "mensagem"]),
+        "retomada_em": retomada_em,
+    }
@@ -0,0 +1,205 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from sqlalchemy import text
+from db_utils import get_db_connection
+from exportacao_utils import escrever_csv_gz
+
+# --- Exportação Incremental (marcas de água) ---
+# Para cada consumidor (ex.: o data warehouse) e cada tabela guarda-se a marca de água da última
+# exportação confirmada: o valor da coluna de referência e o ID da última linha enviada. Cada
+# exportação emite apenas as linhas entre essa marca e um ponto seguro; a marca só avança quando o
+# lote é confirmado, para que um ficheiro perdido possa ser gerado de novo. Só são detetadas linhas
+# novas, não alterações a linhas já exportadas. A tabela das marcas é criada pela migração 5
+# (migracoes_utils).
+# A ordem dos IDs (sequências) e das datas gravadas com NOW() não é a ordem dos commits: uma
+# transação em curso pode ainda gravar uma linha abaixo da última linha visível, que ficaria para
+# trás da marca. Por isso o lote pára antes da primeira linha que não é garantidamente mais antiga
+# do que todas as transações em curso (_condicao_segura): nas tabelas por ID, a primeira linha
+# gravada por uma transação igual ou mais recente do que o horizonte das transações em curso
+# (backend_xid/backend_xmin de pg_stat_activity); nas tabelas por data, o início da transação em
+# curso mais antiga. As linhas retidas saem na exportação seguinte.
+
+CONSUMIDOR_PADRAO = "data_warehouse"
+
+# Tabela -> (coluna de referência, tipo SQL). O ID dos desligados é o do colaborador original
+# (não segue a ordem de exclusão), por isso a referência dessa tabela é a data de exclusão (NOW()).
+TABELAS_INCREMENTAIS = {
+    "historico_movimentacoes": ("id", "BIGINT"),
+    "manutencoes": ("id", "BIGINT"),
+    "logs_documentos": ("id", "BIGINT"),
+    "colaboradores_desligados": ("data_exclusao", "TIMESTAMP"),
+}
+
+FORMATOS_INCREMENTAIS = {"csv.gz": ".csv.gz", "parquet": ".parquet"}
+
+# Migração 5 de migracoes_utils.
+DDL_MARCAS_AGUA = """
+    CREATE TABLE IF NOT EXISTS exportacao_marcas_agua (
+        consumidor TEXT NOT NULL,
+        tabela TEXT NOT NULL,
+        valor TEXT NOT NULL,
+        ultimo_id BIGINT NOT NULL,
+        linhas_exportadas BIGINT NOT NULL DEFAULT 0,
+        atualizado_em TIMESTAMP NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (consumidor, tabela)
+    );
+"""
+
+def obter_marcas(consumidor=CONSUMIDOR_PADRAO, conn=None):
+    """Marcas de água confirmadas do consumidor: {tabela: {"valor", "ultimo_id", "linhas_exportadas", "atualizado_em"}}."""
+    conn = conn or get_db_connection()
+    with conn.engine.connect() as conexao:
+        linhas = conexao.execute(text("""
+            SELECT tabela, valor, ultimo_id, linhas_exportadas, atualizado_em
+            FROM exportacao_marcas_agua WHERE consumidor = :consumidor
+        """), {"consumidor": consumidor}).mappings().all()
+    return {linha["tabela"]: dict(linha) for linha in linhas}
+
+def _condicao_segura(tabela, coluna, de):
+    """Condição que exclui as linhas a partir da primeira que uma transação em curso ainda pode anteceder."""
+    if coluna == "id":
+        # age() é relativa ao mesmo XID em toda a instrução; quanto maior a idade, mais antiga a transação.
+        return f"""id < COALESCE((
+            SELECT MIN(r.id) FROM {tabela} r
+            WHERE r.id > :de_id AND age(r.xmin) <= (
+                SELECT MAX(GREATEST(age(backend_xid), age(backend_xmin)))
+                FROM pg_stat_activity WHERE pid <> pg_backend_pid()
+            )
+        ), 9223372036854775807)""", {"de_id": de["ultimo_id"] if de else 0}
+    return f"""{coluna} < COALESCE((
+        SELECT CAST(MIN(xact_start) AS TIMESTAMP) FROM pg_stat_activity
+        WHERE pid <> pg_backend_pid() AND xact_start IS NOT NULL
+    ), 'infinity')""", {}
+
+def _condicao_intervalo(coluna, tipo, de, ate):
+    """Condição (coluna, id) > de AND (coluna, id) <= ate; de é None na primeira exportação."""
+    condicoes = [f"({coluna}, id) <= (CAST(:ate_valor AS {tipo}), :ate_id)"]
+    params = {"ate_valor": ate["valor"], "ate_id": ate["ultimo_id"]}
+    if de:
+        condicoes.append(f"({coluna}, id) > (CAST(:de_valor AS {tipo}), :de_id)")
+        params.update({"de_valor": de["valor"], "de_id": de["ultimo_id"]})
+    return " AND ".join(condicoes), params
+
+def exportar_incremental(destino, consumidor=CONSUMIDOR_PADRAO, formato="csv.gz", conn=None):
+    """
+    Escreve em destino um ficheiro por tabela com as linhas criadas desde a última marca confirmada,
+    mais um lote.json com o intervalo exportado. Não avança as marcas: chame confirmar_lote() depois
+    de o lote ter sido entregue. Devolve o lote (dict).
+    """
+    conn = conn or get_db_connection()
+    marcas = obter_marcas(consumidor, conn=conn)
+    os.makedirs(destino, exist_ok=True)
+    lote = {"consumidor": consumidor, "gerado_em": datetime.now().isoformat(timespec="seconds"), "formato": formato, "tabelas": {}}
+
+    for tabela, (coluna, tipo) in TABELAS_INCREMENTAIS.items():
+        de = marcas.get(tabela)
+        de = {"valor": de["valor"], "ultimo_id": de["ultimo_id"]} if de else None
+        seguro, params = _condicao_segura(tabela, coluna, de)
+        if de:
+            seguro += f" AND ({coluna}, id) > (CAST(:de_valor AS {tipo}), :de_ultimo_id)"
+            params.update({"de_valor": de["valor"], "de_ultimo_id": de["ultimo_id"]})
+        with conn.engine.connect() as conexao:
+            ultima = conexao.execute(text(f"""
+                SELECT CAST({coluna} AS TEXT) AS valor, id AS ultimo_id FROM {tabela}
+                WHERE {coluna} IS NOT NULL AND {seguro}
+                ORDER BY {coluna} DESC, id DESC LIMIT 1
+            """), params).mappings().first()
+        if ultima is None:
+            lote["tabelas"][tabela] = {"de": de, "ate": de, "linhas": 0, "arquivo": None}
+            continue
+
+        ate = dict(ultima)
+        condicao, params = _condicao_intervalo(coluna, tipo, de, ate)
+        sql = f"SELECT * FROM {tabela} WHERE {condicao} ORDER BY {coluna}, id"
+        if formato == "parquet":
+            from snapshot_utils import escrever_tabela_colunar
+
+            (arquivo, linhas), = escrever_tabela_colunar(tabela, sql, params, destino, tabela, ["parquet"], conn=conn).values()
+        else:
+            arquivo = tabela + FORMATOS_INCREMENTAIS[formato]
+            linhas = escrever_csv_gz(os.path.join(destino, arquivo), sql, params, conn=conn)
+        lote["tabelas"][tabela] = {"de": de, "ate": ate, "linhas": linhas, "arquivo": arquivo}
+
+    with open(os.path.join(destino, "lote.json"), "w", encoding="utf-8") as f:
+        json.dump(lote, f, ensure_ascii=False, indent=2, default=str)
+    return lote
+
+def confirmar_lote(lote, conn=None):
+    """
+    Avança as marcas de água do consumidor para o fim do lote exportado.
+    Uma tabela só avança se a marca atual ainda for a do início do lote (evita confirmar duas vezes
+    ou confirmar um lote antigo depois de um mais recente). Devolve a lista das tabelas avançadas.
+    """
+    conn = conn or get_db_connection()
+    avancadas = []
+    with conn.engine.begin() as conexao:
+        for tabela, dados in lote["tabelas"].items():
+            if not dados["linhas"]:
+                continue
+            de, ate = dados["de"], dados["ate"]
+            params = {
+                "consumidor": lote["consumidor"], "tabela": tabela, "valor": ate["valor"], "ultimo_id": ate["ultimo_id"],
+                "linhas": dados["linhas"], "de_valor": de["valor"] if de else None, "de_id": de["ultimo_id"] if de else None,
+            }
+            resultado = conexao.execute(text("""
+                INSERT INTO exportacao_marcas_agua (consumidor, tabela, valor, ultimo_id, linhas_exportadas)
+                VALUES (:consumidor, :tabela, :valor, :ultimo_id, :linhas)
+                ON CONFLICT (consumidor, tabela) DO UPDATE SET
+                    valor = EXCLUDED.valor, ultimo_id = EXCLUDED.ultimo_id,
+                    linhas_exportadas = exportacao_marcas_agua.linhas_exportadas + EXCLUDED.linhas_exportadas,
+                    atualizado_em = NOW()
+                WHERE exportacao_marcas_agua.valor = CAST(:de_valor AS TEXT)
+                  AND exportacao_marcas_agua.ultimo_id = CAST(:de_id AS BIGINT)
+            """), params)
+            if resultado.rowcount:
+                avancadas.append(tabela)
+    return avancadas
+
+def reiniciar_marcas(consumidor=CONSUMIDOR_PADRAO, conn=None):
+    """Apaga as marcas do consumidor; a próxima exportação volta a emitir todas as linhas."""
+    conn = conn or get_db_connection()
+    with conn.engine.begin() as conexao:
+        conexao.execute(text("DELETE FROM exportacao_marcas_agua WHERE consumidor = :consumidor"), {"consumidor": consumidor})
+
+def exportar_incremental_zip(consumidor=CONSUMIDOR_PADRAO, formato="csv.gz", conn=None):
+    """Gera o lote num diretório temporário e devolve (caminho do .zip, lote)."""
+    diretorio = tempfile.mkdtemp(prefix="assetflow_incremental_")
+    try:
+        lote = exportar_incremental(diretorio, consumidor, formato, conn=conn)
+        return shutil.make_archive(diretorio, "zip", diretorio), lote
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+if __name__ == "__main__":
+    from db_utils import criar_engine_cli
+
+    parser = argparse.ArgumentParser(description="Exportação incremental (linhas novas desde a última execução) para o data warehouse.")
+    parser.add_argument("--destino", help="Diretório onde o lote é escrito (um subdiretório por execução).")
+    parser.add_argument("--consumidor", default=CONSUMIDOR_PADRAO, help="Nome do consumidor dono das marcas de água.")
+    parser.add_argument("--formato", choices=list(FORMATOS_INCREMENTAIS), default="csv.gz")
+    parser.add_argument("--sem-confirmar", action="store_true", help="Gera o lote sem avançar as marcas de água.")
+    parser.add_argument("--reiniciar", action="store_true", help="Apaga as marcas do consumidor antes de exportar.")
+    args = parser.parse_args()
+
+    if not args.destino:
+        parser.print_help()
+    else:
+        from migracoes_utils import garantir_migracoes_arranque
+
+        engine = criar_engine_cli()
+        garantir_migracoes_arranque(engine)  # cria exportacao_marcas_agua, se faltar
+        if args.reiniciar:
+            reiniciar_marcas(args.consumidor, conn=engine)
+        destino = os.path.join(args.destino, datetime.now().strftime("lote_%Y%m%d_%H%M%S"))
+        lote = exportar_incremental(destino, args.consumidor, args.formato, conn=engine)
+        for tabela, dados in lote["tabelas"].items():
+            print(f"{tabela}: {dados['linhas']} linhas novas")
+        if args.sem_confirmar:
+            print(f"Lote gravado em {destino} (marcas de água não avançadas).")
+        else:
+            avancadas = confirmar_lote(lote, conn=engine)
+            print(f"Lote gravado em {destino}; marcas avançadas: {', '.join(avancadas) or 'nenhuma'}.")
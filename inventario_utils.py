@@ -0,0 +1,159 @@
+import pandas as pd
+from db_utils import consultar, para_python
+from cache_utils import cache_tabelas
+
+# --- Inventário Paginado (keyset pagination) ---
+# Em vez de carregar todo o inventário, cada página é lida a partir do último registo da
+# anterior (o "cursor": valor da coluna de ordenação + ID), sem o OFFSET que relia todas as
+# páginas anteriores. Só as ordenações por colunas de aparelhos com índice compatível leem apenas
+# as linhas da página, independentemente da posição e do tamanho da frota: a Data de Entrada
+# (índice (data_cadastro DESC NULLS FIRST, id DESC), migração 8) e o Número de Série (índice único).
+# As ordenações por colunas calculadas ou de outras tabelas (modelo, status, responsável e setor)
+# continuam a ordenar todo o resultado filtrado da junção antes do LIMIT.
+
+TAMANHOS_PAGINA = [25, 50, 100, 200]
+LIMITE_CONTAGEM = 10000  # acima disto, a contagem com filtros é apresentada como "10.000+"
+
+# Rótulo -> (coluna do resultado, direção). Em ASC os nulos ficam no fim e em DESC no início,
+# tal como no ORDER BY padrão do PostgreSQL.
+ORDENACOES_INVENTARIO = {
+    "Data de Entrada (Mais Recente)": ("data_cadastro", "DESC"),
+    "Número de Série (A-Z)": ("numero_serie", "ASC"),
+    "Modelo (A-Z)": ("modelo_completo", "ASC"),
+    "Status (A-Z)": ("nome_status", "ASC"),
+    "Responsável (A-Z)": ("responsavel_atual", "ASC"),
+    "Setor (A-Z)": ("setor_atual", "ASC"),
+}
+
+_FROM_INVENTARIO = """
+    FROM aparelhos a
+    LEFT JOIN modelos mo ON a.modelo_id = mo.id
+    LEFT JOIN marcas ma ON mo.marca_id = ma.id
+    LEFT JOIN status s ON a.status_id = s.id
+    LEFT JOIN aparelho_posse_atual ur ON a.id = ur.aparelho_id
+    LEFT JOIN colaboradores c ON ur.colaborador_id = c.id
+    LEFT JOIN setores setor ON c.setor_id = setor.id
+"""
+
+_SELECT_INVENTARIO = """
+    SELECT
+        a.id,
+        a.numero_serie,
+        ma.nome_marca || ' - ' || mo.nome_modelo as modelo_completo,
+        s.nome_status,
+        CASE
+            WHEN s.nome_status = 'Em uso' THEN c.codigo || ' - ' || COALESCE(ur.colaborador_snapshot, c.nome_completo)
+            ELSE NULL
+        END as responsavel_atual,
+        CASE
+            WHEN s.nome_status = 'Em uso' THEN setor.nome_setor
+            ELSE NULL
+        END as setor_atual,
+        a.valor,
+        a.imei1,
+        a.imei2,
+        a.data_cadastro
+"""
+
+def _filtros_inventario(status_id=None, modelo_id=None, setor_id=None, responsavel_search=None, ns_search=None):
+    params = {}
+    where_clauses = []
+
+    if status_id:
+        where_clauses.append("a.status_id = :status_id")
+        params["status_id"] = status_id
+    if modelo_id:
+        where_clauses.append("a.modelo_id = :modelo_id")
+        params["modelo_id"] = modelo_id
+    if setor_id:
+        # Se filtrar por setor, implicitamente busca apenas aparelhos 'Em uso' naquele setor
+        where_clauses.append("c.setor_id = :setor_id AND s.nome_status = 'Em uso'")
+        params["setor_id"] = setor_id
+    if ns_search:
+        where_clauses.append("(a.numero_serie ILIKE :ns_search OR a.imei1 ILIKE :ns_search OR a.imei2 ILIKE :ns_search)")
+        params["ns_search"] = f"%{ns_search}%"
+    if responsavel_search:
+        where_clauses.append("""
+            (s.nome_status = 'Em uso' AND
+             (c.codigo ILIKE :responsavel_search OR COALESCE(ur.colaborador_snapshot, c.nome_completo) ILIKE :responsavel_search))
+        """)
+        params["responsavel_search"] = f"%{responsavel_search}%"
+
+    where_sql = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+    return where_sql, params
+
+def _condicao_cursor(coluna, direcao, cursor):
+    """Condição que seleciona as linhas posteriores ao cursor (valor, id) na ordenação indicada."""
+    valor, _ = cursor
+    col = f"inv.{coluna}"
+    if direcao == "ASC":  # NULLS LAST
+        if valor is None:
+            return f"{col} IS NULL AND inv.id > :cursor_id"
+        return f"(({col}, inv.id) > (:cursor_valor, :cursor_id) OR {col} IS NULL)"
+    # DESC NULLS FIRST
+    if valor is None:
+        return f"({col} IS NOT NULL OR inv.id < :cursor_id)"
+    return f"({col}, inv.id) < (:cursor_valor, :cursor_id)"
+
+@cache_tabelas("aparelhos", "historico_movimentacoes", "colaboradores", "setores", "modelos", "marcas", "status", ttl=30)
+def carregar_pagina_inventario(ordenacao, cursor=None, tamanho_pagina=50, **filtros):
+    """
+    Carrega uma página do inventário a seguir ao cursor (None para a primeira página).
+    Devolve (DataFrame da página, cursor da próxima página ou None se for a última).
+    """
+    coluna, direcao = ORDENACOES_INVENTARIO[ordenacao]
+    where_sql, params = _filtros_inventario(**filtros)
+
+    cursor_sql = ""
+    if cursor is not None:
+        cursor_sql = "WHERE " + _condicao_cursor(coluna, direcao, cursor)
+        params["cursor_valor"], params["cursor_id"] = cursor
+    nulos = "NULLS LAST" if direcao == "ASC" else "NULLS FIRST"
+
+    # Lê uma linha a mais apenas para saber se existe próxima página.
+    params["limite"] = int(tamanho_pagina) + 1
+    query = f"""
+        SELECT inv.* FROM (
+            {_SELECT_INVENTARIO}
+            {_FROM_INVENTARIO}
+            {where_sql}
+        ) inv
+        {cursor_sql}
+        ORDER BY inv.{coluna} {direcao} {nulos}, inv.id {direcao}
+        LIMIT :limite
+    """
+    df = consultar(query, params=params)
+
+    proximo_cursor = None
+    if len(df) > tamanho_pagina:
+        df = df.iloc[:tamanho_pagina]
+        ultima = df.iloc[-1]
+        proximo_cursor = (para_python(ultima[coluna]), int(ultima["id"]))
+
+    # Preenche Nulos para exibição
+    for col in ['responsavel_atual', 'setor_atual', 'imei1', 'imei2', 'numero_serie', 'modelo_completo', 'nome_status']:
+        if col in df.columns:
+            df[col] = df[col].fillna('')
+    if 'valor' in df.columns:
+        df['valor'] = pd.to_numeric(df['valor'].fillna(0))
+    return df.reset_index(drop=True), proximo_cursor
+
+@cache_tabelas("aparelhos", "historico_movimentacoes", "colaboradores", "setores", "status", ttl=60)
+def estimar_total_inventario(**filtros):
+    """
+    Estimativa do total de aparelhos para a paginação. Devolve (total, exato).
+    Sem filtros usa as estatísticas do PostgreSQL (pg_class.reltuples); com filtros conta até LIMITE_CONTAGEM.
+    """
+    where_sql, params = _filtros_inventario(**filtros)
+    if not where_sql:
+        estimativa = consultar("SELECT reltuples::BIGINT AS total FROM pg_class WHERE oid = 'aparelhos'::regclass").iloc[0, 0]
+        if estimativa is not None and estimativa > 0:
+            return int(estimativa), False
+
+    params["limite_contagem"] = LIMITE_CONTAGEM + 1
+    total = consultar(f"""
+        SELECT COUNT(*) FROM (
+            SELECT 1 {_FROM_INVENTARIO} {where_sql} LIMIT :limite_contagem
+        ) t
+    """, params=params).iloc[0, 0]
+    return min(int(total), LIMITE_CONTAGEM), total <= LIMITE_CONTAGEM
@@ -0,0 +1,231 @@
+import argparse
+import logging
+import re
+import threading
+import time
+from sqlalchemy import text
+from db_utils import get_db_connection
+from cache_utils import invalidar_tabelas
+import posse_utils
+from incremental_utils import DDL_MARCAS_AGUA
+from fila_email_utils import DDL_EMAIL_OUTBOX
+from importacao_utils import DDL_IMPORTACOES
+
+# --- Migrações Versionadas do Esquema ---
+# A aplicação assume um esquema já existente no Supabase; as migrações acrescentam o que as consultas
+# precisam (extensões, índices e tabelas auxiliares) e registam na tabela schema_migrations as versões
+# aplicadas, para que cada uma corra uma única vez. Podem ser aplicadas pela linha de comando ou pela
+# página de Diagnóstico. Um advisory lock impede que duas execuções corram em simultâneo.
+# As migrações marcadas com "arranque" criam tabelas de que as páginas dependem: são aplicadas
+# automaticamente na primeira conexão de cada processo (garantir_migracoes_arranque), se faltarem.
+# Os índices são criados com CREATE INDEX CONCURRENTLY (sem bloquear escritas nas tabelas), o que
+# não pode correr dentro de uma transação: essas migrações executam instrução a instrução em
+# autocommit e, por usarem IF NOT EXISTS, podem ser repetidas se forem interrompidas a meio.
+
+DDL_SCHEMA_MIGRATIONS = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        versao INTEGER PRIMARY KEY,
+        descricao TEXT NOT NULL,
+        aplicada_em TIMESTAMP NOT NULL DEFAULT NOW(),
+        duracao_ms INTEGER
+    );
+"""
+
+CHAVE_LOCK = "assetflow_migracoes"
+
+def _indices_trigrama(tabela, colunas):
+    return [
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_{tabela}_{coluna}_trgm ON {tabela} USING gin ({coluna} gin_trgm_ops)"
+        for coluna in colunas
+    ]
+
+MIGRACOES = [
+    {
+        "versao": 1,
+        "descricao": "Extensão pg_trgm (pesquisas ILIKE '%...%' com índices)",
+        "transacional": True,
+        "instrucoes": ["CREATE EXTENSION IF NOT EXISTS pg_trgm"],
+    },
+    {
+        "versao": 2,
+        "descricao": "Índices B-tree dos filtros e junções mais usados",
+        "transacional": False,
+        "instrucoes": [
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_historico_aparelho_data ON historico_movimentacoes (aparelho_id, data_movimentacao DESC)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_manutencoes_status_envio ON manutencoes (status_manutencao, data_envio)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_colaboradores_codigo_setor ON colaboradores (codigo, setor_id)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_password_resets_token ON password_resets (reset_token)",
+        ],
+    },
+    {
+        "versao": 3,
+        "descricao": "Índices de trigramas (GIN) das caixas de pesquisa",
+        "transacional": False,
+        "instrucoes": (
+            _indices_trigrama("aparelhos", ["numero_serie", "imei1", "imei2"])
+            + _indices_trigrama("colaboradores", ["nome_completo", "codigo", "gmail"])
+            + _indices_trigrama("contas_gmail", ["email"])
+            + _indices_trigrama("historico_movimentacoes", ["colaborador_snapshot"])
+        ),
+    },
+    {
+        "versao": 4,
+        "descricao": "Tabela aparelho_posse_atual (posse atual de cada aparelho) e gatilho de remoção",
+        "transacional": True,
+        "arranque": True,
+        "instrucoes": posse_utils.INSTRUCOES_MIGRACAO,
+    },
+    {
+        "versao": 5,
+        "descricao": "Tabela exportacao_marcas_agua (marcas de água da exportação incremental)",
+        "transacional": True,
+        "arranque": True,
+        "instrucoes": [DDL_MARCAS_AGUA],
+    },
+    {
+        "versao": 6,
+        "descricao": "Tabela email_outbox (fila de envio de e-mails) e índices da fila e dos lotes",
+        "transacional": True,
+        "arranque": True,
+        "instrucoes": [DDL_EMAIL_OUTBOX],
+    },
+    {
+        "versao": 7,
+        "descricao": "Tabelas importacoes_progresso e importacoes_rejeicoes (retoma das importações em blocos)",
+        "transacional": True,
+        "arranque": True,
+        "instrucoes": [DDL_IMPORTACOES],
+    },
+    {
+        "versao": 8,
+        "descricao": "Índice da ordenação padrão do inventário (data de entrada + ID)",
+        "transacional": False,
+        "instrucoes": [
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_aparelhos_data_cadastro_id ON aparelhos (data_cadastro DESC NULLS FIRST, id DESC)",
+        ],
+    },
+]
+
+logger = logging.getLogger("assetflow.migracoes")
+_engines_verificados = set()
+_lock_arranque = threading.Lock()
+
+def _engine(conn):
+    return (conn or get_db_connection()).engine
+
+def estado_migracoes(conn=None):
+    """Lista de dicts (versao, descricao, aplicada_em, duracao_ms) de todas as migrações conhecidas; aplicada_em é None nas pendentes."""
+    with _engine(conn).begin() as conexao:
+        conexao.execute(text(DDL_SCHEMA_MIGRATIONS))
+        aplicadas = {
+            linha["versao"]: linha
+            for linha in conexao.execute(text("SELECT versao, aplicada_em, duracao_ms FROM schema_migrations")).mappings()
+        }
+    return [
+        {
+            "versao": m["versao"], "descricao": m["descricao"],
+            "aplicada_em": aplicadas.get(m["versao"], {}).get("aplicada_em"),
+            "duracao_ms": aplicadas.get(m["versao"], {}).get("duracao_ms"),
+        }
+        for m in MIGRACOES
+    ]
+
+def migracoes_pendentes(conn=None):
+    return [m for m in estado_migracoes(conn) if m["aplicada_em"] is None]
+
+def _remover_indice_invalido(conexao, instrucao):
+    """Um CREATE INDEX CONCURRENTLY interrompido deixa um índice inválido que o IF NOT EXISTS não recria."""
+    nome = re.search(r"IF NOT EXISTS (\w+)", instrucao)
+    if not nome:
+        return
+    invalido = conexao.execute(text("""
+        SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :nome
+    """), {"nome": nome.group(1)}).scalar()
+    if invalido:
+        conexao.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {nome.group(1)}"))
+
+def _executar_instrucoes(conexao, migracao, ao_progredir):
+    instrucoes = migracao["instrucoes"]
+    for i, instrucao in enumerate(instrucoes):
+        if ao_progredir:
+            ao_progredir(migracao, i, len(instrucoes))
+        if not migracao["transacional"]:
+            _remover_indice_invalido(conexao, instrucao)
+        conexao.execute(text(instrucao))
+
+def _registar_versao(conexao, migracao, inicio):
+    conexao.execute(text("""
+        INSERT INTO schema_migrations (versao, descricao, duracao_ms) VALUES (:versao, :descricao, :duracao_ms)
+    """), {"versao": migracao["versao"], "descricao": migracao["descricao"],
+           "duracao_ms": int((time.perf_counter() - inicio) * 1000)})
+
+def aplicar_migracoes(conn=None, ate=None, ao_progredir=None, apenas_arranque=False):
+    """
+    Aplica, por ordem, as migrações pendentes (até à versão ate, se indicada; só as de arranque, se
+    apenas_arranque) e devolve a lista das versões aplicadas. ao_progredir(migração, índice da
+    instrução, total de instruções) é chamado antes de cada instrução.
+    """
+    engine = _engine(conn)
+    aplicadas = []
+    # A conexão do lock, em autocommit, executa também os CREATE INDEX CONCURRENTLY; as migrações
+    # transacionais usam uma transação própria, para serem aplicadas por inteiro ou não serem aplicadas.
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conexao:
+        conexao.execute(text("SELECT pg_advisory_lock(hashtext(:chave))"), {"chave": CHAVE_LOCK})
+        try:
+            conexao.execute(text(DDL_SCHEMA_MIGRATIONS))
+            ja_aplicadas = set(conexao.execute(text("SELECT versao FROM schema_migrations")).scalars())
+            for migracao in MIGRACOES:
+                if migracao["versao"] in ja_aplicadas or (ate is not None and migracao["versao"] > ate):
+                    continue
+                if apenas_arranque and not migracao.get("arranque"):
+                    continue
+                inicio = time.perf_counter()
+                if migracao["transacional"]:
+                    with engine.begin() as transacao:
+                        _executar_instrucoes(transacao, migracao, ao_progredir)
+                        _registar_versao(transacao, migracao, inicio)
+                else:
+                    _executar_instrucoes(conexao, migracao, ao_progredir)
+                    _registar_versao(conexao, migracao, inicio)
+                aplicadas.append(migracao["versao"])
+        finally:
+            conexao.execute(text("SELECT pg_advisory_unlock(hashtext(:chave))"), {"chave": CHAVE_LOCK})
+            if aplicadas:
+                # Ex.: trigramas_disponiveis() (pesquisa_utils) passa a usar os índices de imediato.
+                invalidar_tabelas("schema_migrations")
+    return aplicadas
+
+def garantir_migracoes_arranque(engine):
+    """
+    Aplica as migrações de arranque que faltarem, uma única vez por engine. Só toma o advisory lock
+    se alguma estiver pendente, para não esperar por uma criação de índices em curso.
+    """
+    if engine in _engines_verificados:
+        return
+    with _lock_arranque:
+        if engine in _engines_verificados:
+            return
+        arranque = {m["versao"] for m in MIGRACOES if m.get("arranque")}
+        if not arranque <= {m["versao"] for m in estado_migracoes(engine) if m["aplicada_em"] is not None}:
+            versoes = aplicar_migracoes(engine, apenas_arranque=True)
+            logger.info("Migrações de arranque aplicadas: %s", versoes)
+        _engines_verificados.add(engine)
+
+if __name__ == "__main__":
+    from db_utils import criar_engine_cli
+
+    parser = argparse.ArgumentParser(description="Migrações versionadas do esquema (extensões, tabelas auxiliares e índices).")
+    parser.add_argument("--aplicar", action="store_true", help="Aplica as migrações pendentes (sem esta opção apenas mostra o estado).")
+    parser.add_argument("--ate", type=int, help="Aplica apenas até esta versão.")
+    args = parser.parse_args()
+
+    engine = criar_engine_cli()
+    if args.aplicar:
+        aplicadas = aplicar_migracoes(
+            engine, ate=args.ate,
+            ao_progredir=lambda m, i, total: print(f"[{m['versao']}] {m['descricao']} ({i + 1}/{total})"),
+        )
+        print(f"Migrações aplicadas: {', '.join(map(str, aplicadas)) or 'nenhuma'}.")
+    for m in estado_migracoes(engine):
+        estado = f"aplicada em {m['aplicada_em']:%Y-%m-%d %H:%M} ({m['duracao_ms']} ms)" if m["aplicada_em"] else "pendente"
+        print(f"{m['versao']:>4}  {m['descricao']:60} {estado}")
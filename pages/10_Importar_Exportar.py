@@ -1,9 +1,18 @@
 import streamlit as st
 import pandas as pd
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 import io
+import os
 from auth import show_login_form, logout
-from sqlalchemy import text
+from importacao_utils import importar_em_blocos, obter_progresso, colunas_em_falta
+from planilha_utils import amostra_planilha, estimar_linhas, hash_arquivo
+from exportacao_utils import gerar_exportacao, preparar_download, apagar_download, FORMATOS_EXPORTACAO, MIME_EXPORTACAO
+from snapshot_utils import gerar_snapshot_zip
+from incremental_utils import CONSUMIDOR_PADRAO, FORMATOS_INCREMENTAIS, obter_marcas, exportar_incremental_zip, confirmar_lote
+from db_utils import consultar, get_db_connection
+from perfil_utils import iniciar_perfil, concluir_perfil
+from cache_utils import cache_tabelas, invalidar_tabelas
+from referencias_utils import mapa_ids
 
 # --- Autenticação e Permissão ---
 if 'logged_in' not in st.session_state or not st.session_state['logged_in']:
@@ -74,18 +83,144 @@ with st.sidebar:
     if st.button("Logout", key="import_export_logout"):
         logout()
     st.markdown("---")
+    iniciar_perfil()
 
 # --- Funções do DB ---
-def get_db_connection():
-    return st.connection("supabase", type="sql")
-
-@st.cache_data(ttl=60)
+@cache_tabelas("setores", "modelos", "marcas", "status", "aparelhos", "colaboradores", ttl=60)
 def get_foreign_key_map(table_name, name_column, key_column='id', join_clause=""):
-    conn = get_db_connection()
     query = f"SELECT {key_column} as key_col, {name_column} as name_col FROM {table_name} {join_clause}"
-    df = conn.query(query)
+    df = consultar(query)
     return pd.Series(df['key_col'].values, index=df['name_col']).to_dict()
 
+# --- Importação ---
+MAX_AVISOS_IMPORTACAO = 50
+
+def executar_importacao(tipo, uploaded_file, rotulo_botao, tabelas_alteradas, mensagem_spinner="Importando dados...", rotulo="registos importados"):
+    """Pré-visualiza a planilha e importa-a em blocos, com barra de progresso e retoma de importações interrompidas."""
+    try:
+        amostra = amostra_planilha(uploaded_file, uploaded_file.name)
+        total_estimado = estimar_linhas(uploaded_file, uploaded_file.name)
+    except Exception as e:
+        st.error(f"Não foi possível ler a planilha: {e}")
+        return
+
+    legenda = f"Pré-visualização das primeiras {len(amostra)} linhas"
+    if total_estimado:
+        legenda += f" (total estimado: {total_estimado} linhas)"
+    st.caption(legenda + ".")
+    st.dataframe(amostra)
+
+    faltam = colunas_em_falta(tipo, amostra)
+    if faltam:
+        st.error(f"A planilha não tem as colunas obrigatórias: {', '.join(faltam)}. Use a planilha modelo.")
+        return
+
+    progresso = obter_progresso(hash_arquivo(uploaded_file), tipo, conn=get_db_connection())
+    if progresso and not progresso["concluida"]:
+        st.info(
+            f"Esta planilha tem uma importação interrompida em {progresso['atualizado_em']:%d/%m/%Y %H:%M} "
+            f"({progresso['linhas_processadas']} linhas processadas, {progresso['importados']} {rotulo}). "
+            "A importação continuará a partir da linha seguinte."
+        )
+        rotulo_botao = "Retomar Importação"
+    elif progresso:
+        st.warning(f"Esta planilha já foi importada em {progresso['atualizado_em']:%d/%m/%Y %H:%M}. Importá-la de novo processará todas as linhas.")
+
+    if not st.button(rotulo_botao, use_container_width=True, type="primary"):
+        return
+
+    barra = st.progress(0.0, text=mensagem_spinner)
+    def ao_progredir(linhas_processadas, importados):
+        fracao = min(linhas_processadas / total_estimado, 1.0) if total_estimado else 0.0
+        barra.progress(fracao, text=f"{mensagem_spinner} {linhas_processadas} linhas processadas, {importados} {rotulo}.")
+
+    try:
+        resultado = importar_em_blocos(tipo, uploaded_file, uploaded_file.name, conn=get_db_connection(), ao_progredir=ao_progredir)
+    except Exception as e:
+        invalidar_tabelas(*tabelas_alteradas)  # os blocos anteriores ao erro já foram gravados
+        st.error(f"Erro inesperado durante a importação - {e}. Os blocos já gravados foram mantidos; envie a mesma planilha para retomar.")
+        return
+    barra.progress(1.0, text="Importação concluída.")
+
+    if resultado["retomada_em"]:
+        st.info(f"Importação retomada a partir da linha {resultado['retomada_em'] + 2} da planilha.")
+    st.success(f"Importação concluída! {resultado['importados']} {rotulo} com sucesso.")
+    rejeitados = resultado["rejeitados"]
+    if not rejeitados.empty:
+        st.error(f"{len(rejeitados)} registos continham erros e não foram importados.")
+        for mensagem in rejeitados["mensagem"].head(MAX_AVISOS_IMPORTACAO):
+            st.warning(mensagem)
+        if len(rejeitados) > MAX_AVISOS_IMPORTACAO:
+            st.info(f"A mostrar os primeiros {MAX_AVISOS_IMPORTACAO} avisos. O relatório completo está disponível para download.")
+        st.download_button(
+            label="Baixar Relatório de Linhas Rejeitadas",
+            data=rejeitados.to_csv(index=False).encode("utf-8"),
+            file_name=f"rejeitados_{tipo}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            mime="text/csv",
+            key=f"rejeitados_{tipo}"
+        )
+    if resultado["importados"]:
+        invalidar_tabelas(*tabelas_alteradas)
+
+# --- Exportação ---
+def guardar_exportacao(chave, caminho, nome, extensao, total, **extra):
+    """
+    Guarda na sessão apenas o caminho do ficheiro gerado; o conteúdo é servido a partir do disco.
+    O ficheiro é apagado depois do download, na exportação seguinte ou ao fim de TTL_EXPORTACAO_S.
+    """
+    descartar_exportacao(chave)
+    st.session_state[f"exportacao_{chave}"] = {"caminho": preparar_download(caminho), "nome": nome, "extensao": extensao, "total": total, **extra}
+
+def descartar_exportacao(chave):
+    exportacao = st.session_state.pop(f"exportacao_{chave}", None)
+    if exportacao:
+        apagar_download(exportacao["caminho"])
+
+def apagar_ficheiro_exportacao(chave):
+    """Apaga o ficheiro já descarregado, mantendo os metadados (o lote incremental ainda pode ser confirmado)."""
+    exportacao = st.session_state.get(f"exportacao_{chave}")
+    if exportacao:
+        apagar_download(exportacao["caminho"])
+        exportacao["caminho"] = None
+
+def gerar_relatorio(relatorio, extensao, nome_base, **params):
+    """Gera o ficheiro do relatório em disco e guarda o seu caminho na sessão (substituindo o anterior)."""
+    descartar_exportacao(relatorio)
+    with st.spinner("Gerando relatório..."):
+        try:
+            caminho, total = gerar_exportacao(relatorio, extensao, conn=get_db_connection(), **params)
+        except ValueError as e:  # p. ex. acima do limite de linhas do Excel
+            st.warning(str(e))
+            return
+    guardar_exportacao(relatorio, caminho, nome_base + extensao, extensao, total)
+
+def mostrar_download(relatorio, rotulo):
+    exportacao = st.session_state.get(f"exportacao_{relatorio}")
+    if not exportacao:
+        return
+    if exportacao["total"] == 0:
+        st.info("Não há dados para exportar com os filtros selecionados.")
+        return
+    if exportacao["caminho"] is None:
+        st.caption("Ficheiro já descarregado. Gere-o novamente para o voltar a descarregar.")
+        return
+    if not os.path.exists(exportacao["caminho"]):
+        st.info("O ficheiro gerado expirou. Gere-o novamente para o descarregar.")
+        return
+    if exportacao["total"] is not None:
+        rotulo += f" ({exportacao['total']} linhas)"
+    with open(exportacao["caminho"], "rb") as arquivo:
+        st.download_button(
+            label=rotulo,
+            data=arquivo,
+            file_name=exportacao["nome"],
+            mime=MIME_EXPORTACAO[exportacao["extensao"]],
+            use_container_width=True,
+            key=f"download_{relatorio}",
+            on_click=apagar_ficheiro_exportacao,
+            args=(relatorio,)
+        )
+
 # --- UI ---
 st.title("Importar e Exportar Dados")
 st.markdown("---")
@@ -110,7 +245,7 @@ if option == "Importar em Lote":
     try:
         if tabela_selecionada == "Importar Colaboradores":
             st.subheader("Importar Novos Colaboradores")
-            setores_map = get_foreign_key_map("setores", "nome_setor")
+            setores_map = mapa_ids("setores")
             exemplo_setor = list(setores_map.keys())[0] if setores_map else "TI"
             df_modelo = pd.DataFrame({"codigo": ["1001"], "nome_completo": ["Nome Sobrenome Exemplo"], "cpf": ["123.456.789-00"], "gmail": ["exemplo.email@gmail.com"], "nome_setor": [exemplo_setor]})
             
@@ -120,41 +255,14 @@ if option == "Importar em Lote":
             
             st.download_button(label="Baixar Planilha Modelo", data=output, file_name="modelo_colaboradores.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
 
-            uploaded_file = st.file_uploader("Escolha a planilha de Colaboradores (.xlsx)", type="xlsx", key="upload_colab")
+            uploaded_file = st.file_uploader("Escolha a planilha de Colaboradores (.xlsx ou .csv)", type=["xlsx", "csv"], key="upload_colab")
             if uploaded_file:
-                df_upload = pd.read_excel(uploaded_file, dtype=str).fillna('')
-                st.dataframe(df_upload)
-                if st.button("Importar Dados dos Colaboradores", use_container_width=True, type="primary"):
-                    conn = get_db_connection()
-                    sucesso, erros = 0, 0
-                    with st.spinner("Importando dados..."), conn.session as s:
-                        for index, row in df_upload.iterrows():
-                            try:
-                                setor_id = setores_map.get(row['nome_setor'].strip())
-                                if setor_id is None:
-                                    st.warning(f"Linha {index+2}: Setor '{row['nome_setor']}' não encontrado. Pulando registo.")
-                                    erros += 1; continue
-                                
-                                query = text("INSERT INTO colaboradores (codigo, nome_completo, cpf, gmail, setor_id, data_cadastro) VALUES (:codigo, :nome, :cpf, :gmail, :setor_id, :data)")
-                                s.execute(query, {"codigo": row['codigo'], "nome": row['nome_completo'], "cpf": row['cpf'], "gmail": row['gmail'], "setor_id": setor_id, "data": date.today()})
-                                sucesso += 1
-                            except Exception as e:
-                                s.rollback() # Garante que a transação falha seja desfeita
-                                if 'unique constraint' in str(e).lower():
-                                    st.warning(f"Linha {index+2}: Colaborador com código, CPF ou setor já existe. Pulando registo.")
-                                else:
-                                    st.error(f"Linha {index+2}: Erro inesperado - {e}. Pulando registo.")
-                                erros += 1
-                        if erros == 0:
-                            s.commit()
-                    st.success(f"Importação concluída! {sucesso} registos importados com sucesso.")
-                    if erros > 0: st.error(f"{erros} registos continham erros e não foram importados.")
-                    st.cache_data.clear()
+                executar_importacao("colaboradores", uploaded_file, "Importar Dados dos Colaboradores", ["colaboradores"])
 
         elif tabela_selecionada == "Importar Aparelhos":
             st.subheader("Importar Novos Aparelhos")
-            modelos_map = get_foreign_key_map("modelos", "ma.nome_marca || ' - ' || mo.nome_modelo", key_column="mo.id", join_clause="mo JOIN marcas ma ON mo.marca_id = ma.id")
-            status_map = get_foreign_key_map("status", "nome_status")
+            modelos_map = mapa_ids("modelos")
+            status_map = mapa_ids("status")
             exemplo_modelo = list(modelos_map.keys())[0] if modelos_map else "Samsung - Galaxy S24"
             exemplo_status = 'Em estoque' if 'Em estoque' in status_map else (list(status_map.keys())[0] if status_map else "")
             df_modelo = pd.DataFrame({"numero_serie": ["ABC123456789"], "imei1": ["111111111111111"], "imei2": ["222222222222222"], "valor": [4999.90], "modelo_completo": [exemplo_modelo], "status_inicial": [exemplo_status]})
@@ -164,41 +272,9 @@ if option == "Importar em Lote":
             output.seek(0)
             st.download_button(label="Baixar Planilha Modelo", data=output, file_name="modelo_aparelhos.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
             
-            uploaded_file = st.file_uploader("Escolha a planilha de Aparelhos (.xlsx)", type="xlsx", key="upload_aparelho")
+            uploaded_file = st.file_uploader("Escolha a planilha de Aparelhos (.xlsx ou .csv)", type=["xlsx", "csv"], key="upload_aparelho")
             if uploaded_file:
-                df_upload = pd.read_excel(uploaded_file).fillna('')
-                st.dataframe(df_upload)
-                if st.button("Importar Dados dos Aparelhos", use_container_width=True, type="primary"):
-                    conn = get_db_connection()
-                    sucesso, erros = 0, 0
-                    with st.spinner("Importando dados..."), conn.session as s:
-                        for index, row in df_upload.iterrows():
-                            try:
-                                s.begin()
-                                modelo_id = modelos_map.get(str(row['modelo_completo']).strip())
-                                status_id = status_map.get(str(row['status_inicial']).strip())
-                                if not all([modelo_id, status_id]):
-                                    st.warning(f"Linha {index+2}: Modelo ou Status inválido. Pulando registo.")
-                                    erros += 1; s.rollback(); continue
-                                
-                                q_aparelho = text("INSERT INTO aparelhos (numero_serie, imei1, imei2, valor, modelo_id, status_id, data_cadastro) VALUES (:ns, :i1, :i2, :val, :mid, :sid, :data) RETURNING id")
-                                result = s.execute(q_aparelho, {"ns": str(row['numero_serie']), "i1": str(row['imei1']), "i2": str(row['imei2']), "val": float(row['valor']), "mid": modelo_id, "sid": status_id, "data": date.today()})
-                                aparelho_id = result.scalar_one()
-                                
-                                q_hist = text("INSERT INTO historico_movimentacoes (data_movimentacao, aparelho_id, status_id, localizacao_atual, observacoes) VALUES (:data, :apid, :sid, :loc, :obs)")
-                                s.execute(q_hist, {"data": datetime.now(), "apid": aparelho_id, "sid": status_id, "loc": "Estoque Interno", "obs": "Entrada via importação."})
-                                s.commit()
-                                sucesso += 1
-                            except Exception as e:
-                                s.rollback()
-                                if 'unique constraint' in str(e).lower():
-                                    st.warning(f"Linha {index+2}: Aparelho com N/S já existe. Pulando registo.")
-                                else:
-                                    st.error(f"Linha {index+2}: Erro inesperado - {e}. Pulando registo.")
-                                erros += 1
-                    st.success(f"Importação concluída! {sucesso} registos importados com sucesso.")
-                    if erros > 0: st.error(f"{erros} registos continham erros.")
-                    st.cache_data.clear()
+                executar_importacao("aparelhos", uploaded_file, "Importar Dados dos Aparelhos", ["aparelhos", "historico_movimentacoes"])
 
         elif tabela_selecionada == "Importar Marcas":
             st.subheader("Importar Novas Marcas")
@@ -209,29 +285,9 @@ if option == "Importar em Lote":
             output.seek(0)
             st.download_button(label="Baixar Planilha Modelo", data=output, file_name="modelo_marcas.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
             
-            uploaded_file = st.file_uploader("Escolha a planilha de Marcas (.xlsx)", type="xlsx", key="upload_marca")
+            uploaded_file = st.file_uploader("Escolha a planilha de Marcas (.xlsx ou .csv)", type=["xlsx", "csv"], key="upload_marca")
             if uploaded_file:
-                df_upload = pd.read_excel(uploaded_file, dtype=str).fillna('')
-                st.dataframe(df_upload)
-                if st.button("Importar Dados de Marcas", use_container_width=True, type="primary"):
-                    conn = get_db_connection()
-                    sucesso, erros = 0, 0
-                    with st.spinner("Importando dados..."), conn.session as s:
-                        for index, row in df_upload.iterrows():
-                            try:
-                                query = text("INSERT INTO marcas (nome_marca) VALUES (:nome)")
-                                s.execute(query, {"nome": row['nome_marca'].strip()})
-                                sucesso += 1
-                            except Exception as e:
-                                if 'unique constraint' in str(e).lower():
-                                    st.warning(f"Linha {index+2}: Marca '{row['nome_marca']}' já existe. Pulando registo.")
-                                else:
-                                    st.error(f"Linha {index+2}: Erro inesperado - {e}. Pulando registo.")
-                                erros += 1
-                        s.commit()
-                    st.success(f"Importação concluída! {sucesso} registos importados com sucesso.")
-                    if erros > 0: st.error(f"{erros} registos continham erros.")
-                    st.cache_data.clear()
+                executar_importacao("marcas", uploaded_file, "Importar Dados de Marcas", ["marcas"])
         
         elif tabela_selecionada == "Importar Contas Gmail":
             st.subheader("Importar Novas Contas Gmail")
@@ -245,31 +301,9 @@ if option == "Importar em Lote":
             
             st.download_button(label="Baixar Planilha Modelo", data=output, file_name="modelo_contas_gmail.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
             
-            uploaded_file = st.file_uploader("Escolha a planilha de Contas Gmail (.xlsx)", type="xlsx", key="upload_gmail")
+            uploaded_file = st.file_uploader("Escolha a planilha de Contas Gmail (.xlsx ou .csv)", type=["xlsx", "csv"], key="upload_gmail")
             if uploaded_file:
-                df_upload = pd.read_excel(uploaded_file, dtype=str).fillna('')
-                st.dataframe(df_upload)
-                if st.button("Importar Dados de Contas Gmail", use_container_width=True, type="primary"):
-                    conn = get_db_connection()
-                    sucesso, erros = 0, 0
-                    with st.spinner("Importando dados..."), conn.session as s:
-                        for index, row in df_upload.iterrows():
-                            try:
-                                colaborador_id = colaboradores_map.get(row['nome_colaborador'].strip()) if row['nome_colaborador'] else None
-                                
-                                query = text("INSERT INTO contas_gmail (email, senha, telefone_recuperacao, email_recuperacao, colaborador_id) VALUES (:email, :senha, :tel, :email_rec, :cid)")
-                                s.execute(query, {"email": row['email'], "senha": row['senha'], "tel": row['telefone_recuperacao'], "email_rec": row['email_recuperacao'], "cid": colaborador_id})
-                                sucesso += 1
-                            except Exception as e:
-                                if 'unique constraint' in str(e).lower():
-                                    st.warning(f"Linha {index+2}: E-mail '{row['email']}' já existe. Pulando registo.")
-                                else:
-                                    st.error(f"Linha {index+2}: Erro inesperado - {e}. Pulando registo.")
-                                erros += 1
-                        s.commit()
-                    st.success(f"Importação concluída! {sucesso} registos importados com sucesso.")
-                    if erros > 0: st.error(f"{erros} registos continham erros.")
-                    st.cache_data.clear()
+                executar_importacao("contas_gmail", uploaded_file, "Importar Dados de Contas Gmail", ["contas_gmail"])
 
         elif tabela_selecionada == "Importar Movimentações":
             st.subheader("Importar Novas Movimentações (Entregas)")
@@ -277,8 +311,6 @@ if option == "Importar em Lote":
 
             aparelhos_map = get_foreign_key_map("aparelhos", "numero_serie")
             colaboradores_map = get_foreign_key_map("colaboradores", "nome_completo")
-            status_map = get_foreign_key_map("status", "nome_status")
-            status_em_uso_id = status_map.get("Em uso")
 
             exemplo_ns = list(aparelhos_map.keys())[0] if aparelhos_map else "NUMERO_DE_SERIE_DO_APARELHO"
             exemplo_colab = list(colaboradores_map.keys())[0] if colaboradores_map else "Nome Completo do Colaborador"
@@ -290,39 +322,9 @@ if option == "Importar em Lote":
             
             st.download_button(label="Baixar Planilha Modelo de Movimentações", data=output, file_name="modelo_movimentacoes.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
 
-            uploaded_file = st.file_uploader("Escolha a planilha de Movimentações (.xlsx)", type="xlsx", key="upload_mov")
+            uploaded_file = st.file_uploader("Escolha a planilha de Movimentações (.xlsx ou .csv)", type=["xlsx", "csv"], key="upload_mov")
             if uploaded_file:
-                df_upload = pd.read_excel(uploaded_file, dtype=str).fillna('')
-                st.dataframe(df_upload)
-                if st.button("Importar Movimentações", use_container_width=True, type="primary"):
-                    conn = get_db_connection()
-                    sucesso, erros = 0, 0
-                    with st.spinner("Processando movimentações..."), conn.session as s:
-                        for index, row in df_upload.iterrows():
-                            try:
-                                s.begin()
-                                aparelho_id = aparelhos_map.get(row['numero_serie_aparelho'].strip())
-                                nome_colaborador_snapshot = row['nome_colaborador'].strip()
-                                colaborador_id = colaboradores_map.get(nome_colaborador_snapshot)
-
-                                if not all([aparelho_id, colaborador_id, status_em_uso_id]):
-                                    st.warning(f"Linha {index+2}: Aparelho ou Colaborador não encontrado/disponível. Pulando registo.")
-                                    erros += 1; s.rollback(); continue
-                                
-                                q_hist = text("INSERT INTO historico_movimentacoes (data_movimentacao, aparelho_id, colaborador_id, status_id, localizacao_atual, observacoes, colaborador_snapshot) VALUES (:data, :apid, :cid, :sid, :loc, :obs, :snap)")
-                                s.execute(q_hist, {"data": datetime.now(), "apid": aparelho_id, "cid": colaborador_id, "sid": status_em_uso_id, "loc": row['localizacao'], "obs": row['observacoes'], "snap": nome_colaborador_snapshot})
-                                
-                                q_update = text("UPDATE aparelhos SET status_id = :sid WHERE id = :apid")
-                                s.execute(q_update, {"sid": status_em_uso_id, "apid": aparelho_id})
-                                s.commit()
-                                sucesso += 1
-                            except Exception as e:
-                                s.rollback()
-                                st.error(f"Linha {index+2}: Erro inesperado - {e}. Pulando registo.")
-                                erros += 1
-                    st.success(f"Importação concluída! {sucesso} movimentações registadas com sucesso.")
-                    if erros > 0: st.error(f"{erros} registos continham erros.")
-                    st.cache_data.clear()
+                executar_importacao("movimentacoes", uploaded_file, "Importar Movimentações", ["historico_movimentacoes", "aparelhos"], mensagem_spinner="Processando movimentações...", rotulo="movimentações registadas")
 
     except Exception as e:
         st.error(f"Ocorreu um erro ao carregar a página de importação: {e}")
@@ -330,106 +332,90 @@ if option == "Importar em Lote":
 
 elif option == "Exportar Relatórios":
     st.header("Exportar Relatórios Completos")
-    st.write("Exporte os dados completos do sistema para uma planilha Excel (.xlsx).")
-
-    conn = get_db_connection()
-
-    def to_excel_single_sheet(df):
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Relatorio')
-        processed_data = output.getvalue()
-        return processed_data
-    
-    # --- NOVA FUNÇÃO PARA EXPORTAR COM SUMÁRIOS ---
-    def to_excel_with_summaries(main_df, status_summary_df, setor_summary_df):
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            # Escreve o relatório principal
-            main_df.to_excel(writer, index=False, sheet_name='Inventario_Completo')
-            
-            # Calcula a posição inicial para o primeiro sumário (2 colunas à direita do principal)
-            start_col_status = main_df.shape[1] + 2
-            status_summary_df.to_excel(writer, index=False, sheet_name='Inventario_Completo', startcol=start_col_status)
-
-            # Calcula a posição para o segundo sumário (2 colunas à direita do primeiro sumário)
-            start_col_setor = start_col_status + status_summary_df.shape[1] + 2
-            setor_summary_df.to_excel(writer, index=False, sheet_name='Inventario_Completo', startcol=start_col_setor)
-            
-        processed_data = output.getvalue()
-        return processed_data
+    st.write("Exporte os dados completos do sistema para uma planilha Excel (.xlsx) ou um CSV compactado (.csv.gz).")
+    st.caption("Os relatórios são gerados em disco, em lotes, e só depois disponibilizados para download.")
 
     try:
         # Exportar Inventário Completo
         st.subheader("Inventário Geral de Aparelhos")
-        inventario_df = conn.query("""
-            WITH UltimoResponsavel AS (
-                SELECT
-                    h.aparelho_id, h.colaborador_id, h.colaborador_snapshot,
-                    ROW_NUMBER() OVER(PARTITION BY h.aparelho_id ORDER BY h.data_movimentacao DESC) as rn
-                FROM historico_movimentacoes h
+        formato_inventario = st.radio("Formato:", list(FORMATOS_EXPORTACAO), horizontal=True, key="formato_inventario")
+        if st.button("Gerar Relatório de Inventário com Sumários", use_container_width=True):
+            gerar_relatorio("inventario", FORMATOS_EXPORTACAO[formato_inventario], f"relatorio_inventario_completo_{datetime.now().strftime('%Y%m%d')}")
+        mostrar_download("inventario", "Baixar Relatório de Inventário com Sumários")
+
+        # Exportar Histórico de Movimentações
+        st.subheader("Histórico de Movimentações")
+        todo_periodo = st.checkbox("Exportar todo o período", value=False, key="historico_todo_periodo")
+        periodo = st.date_input(
+            "Período das movimentações:",
+            value=(date.today() - timedelta(days=365), date.today()),
+            format="DD/MM/YYYY",
+            disabled=todo_periodo,
+            key="historico_periodo"
+        )
+        formato_historico = st.radio("Formato:", list(FORMATOS_EXPORTACAO), horizontal=True, key="formato_historico")
+        if st.button("Gerar Histórico de Movimentações", use_container_width=True):
+            if todo_periodo:
+                data_inicio, data_fim = None, None
+            elif len(periodo) == 2:
+                data_inicio, data_fim = periodo
+            else:
+                data_inicio = data_fim = periodo[0]
+            gerar_relatorio(
+                "historico", FORMATOS_EXPORTACAO[formato_historico], f"relatorio_movimentacoes_{datetime.now().strftime('%Y%m%d')}",
+                data_inicio=data_inicio, data_fim=data_fim
             )
-            SELECT 
-                a.id, a.numero_serie, ma.nome_marca, mo.nome_modelo, s.nome_status,
-                CASE WHEN s.nome_status = 'Em uso' THEN COALESCE(ur.colaborador_snapshot, c.nome_completo) ELSE NULL END as responsavel_atual,
-                CASE WHEN s.nome_status = 'Em uso' THEN setor.nome_setor ELSE NULL END as setor_atual,
-                a.valor, a.imei1, a.imei2, a.data_cadastro
-            FROM aparelhos a
-            LEFT JOIN modelos mo ON a.modelo_id = mo.id
-            LEFT JOIN marcas ma ON mo.marca_id = ma.id
-            LEFT JOIN status s ON a.status_id = s.id
-            LEFT JOIN UltimoResponsavel ur ON a.id = ur.aparelho_id AND ur.rn = 1
-            LEFT JOIN colaboradores c ON ur.colaborador_id = c.id
-            LEFT JOIN setores setor ON c.setor_id = setor.id
-            ORDER BY a.id;
-        """)
-        if not inventario_df.empty:
-            # --- LÓGICA PARA CRIAR OS SUMÁRIOS ---
-            # 1. Sumário por Status
-            status_summary = inventario_df['nome_status'].value_counts().reset_index()
-            status_summary.columns = ['nome_status', 'Aparelhos']
-
-            # 2. Sumário por Setor (apenas para aparelhos 'Em uso')
-            setor_summary = inventario_df[inventario_df['nome_status'] == 'Em uso']['setor_atual'].value_counts().reset_index()
-            setor_summary.columns = ['setor_atual', 'Aparelhos']
-
-            st.download_button(
-                label="Baixar Relatório de Inventário com Sumários",
-                data=to_excel_with_summaries(inventario_df, status_summary, setor_summary),
-                file_name=f"relatorio_inventario_completo_{datetime.now().strftime('%Y%m%d')}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                use_container_width=True
+        mostrar_download("historico", "Baixar Histórico de Movimentações")
+
+        # Snapshot colunar para a equipa de BI
+        st.subheader("Snapshot para BI (Parquet / Arrow)")
+        st.caption("Aparelhos, colaboradores, manutenções e histórico (particionado por mês) com os tipos do banco, acompanhados de um manifest.json.")
+        formatos_snapshot = st.multiselect("Formatos:", ["parquet", "arrow"], default=["parquet"], key="formatos_snapshot")
+        if st.button("Gerar Snapshot", use_container_width=True, disabled=not formatos_snapshot):
+            descartar_exportacao("snapshot")
+            with st.spinner("Gerando snapshot..."):
+                caminho = gerar_snapshot_zip(formatos_snapshot, conn=get_db_connection())
+            guardar_exportacao("snapshot", caminho, f"snapshot_assetflow_{datetime.now().strftime('%Y%m%d')}.zip", ".zip", None)
+        mostrar_download("snapshot", "Baixar Snapshot")
+
+        # Exportação incremental (apenas linhas novas desde a última exportação confirmada)
+        st.subheader("Exportação Incremental")
+        st.caption("Movimentações, manutenções, logs de documentos e colaboradores desligados criados desde a última exportação confirmada do consumidor.")
+        consumidor = st.text_input("Consumidor:", value=CONSUMIDOR_PADRAO, key="consumidor_incremental").strip() or CONSUMIDOR_PADRAO
+        marcas = obter_marcas(consumidor, conn=get_db_connection())
+        if marcas:
+            st.dataframe(
+                pd.DataFrame([{"Tabela": tabela, "Última marca": m["valor"], "Último ID": m["ultimo_id"], "Linhas exportadas": m["linhas_exportadas"], "Atualizado em": m["atualizado_em"]} for tabela, m in marcas.items()]),
+                hide_index=True, use_container_width=True
             )
         else:
-            st.info("Não há dados de inventário para exportar.")
-
-        # Exportar Histórico de Movimentações (sem alterações)
-        st.subheader("Histórico Completo de Movimentações")
-        historico_df = conn.query("""
-            SELECT 
-                h.id, h.data_movimentacao, a.numero_serie, mo.nome_modelo,
-                h.colaborador_snapshot as colaborador, s.nome_status,
-                h.localizacao_atual, h.observacoes
-            FROM historico_movimentacoes h
-            JOIN aparelhos a ON h.aparelho_id = a.id
-            JOIN status s ON h.status_id = s.id
-            LEFT JOIN modelos mo ON a.modelo_id = mo.id
-            ORDER BY h.data_movimentacao DESC;
-        """)
-        if not historico_df.empty:
-            st.download_button(
-                label="Baixar Histórico de Movimentações",
-                data=to_excel_single_sheet(historico_df),
-                file_name=f"relatorio_movimentacoes_{datetime.now().strftime('%Y%m%d')}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                use_container_width=True
+            st.info("Este consumidor ainda não tem exportações confirmadas; a primeira exportação incluirá todas as linhas.")
+
+        formato_incremental = st.radio("Formato:", list(FORMATOS_INCREMENTAIS), horizontal=True, key="formato_incremental")
+        if st.button("Gerar Exportação Incremental", use_container_width=True):
+            descartar_exportacao("incremental")
+            with st.spinner("Gerando exportação incremental..."):
+                caminho, lote = exportar_incremental_zip(consumidor, formato_incremental, conn=get_db_connection())
+            guardar_exportacao(
+                "incremental", caminho, f"incremental_{consumidor}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
+                ".zip", sum(t["linhas"] for t in lote["tabelas"].values()), lote=lote
             )
-        else:
-            st.info("Não há dados de movimentações para exportar.")
+
+        exportacao = st.session_state.get("exportacao_incremental")
+        mostrar_download("incremental", "Baixar Exportação Incremental")
+        if exportacao and exportacao["total"] and exportacao["lote"]["consumidor"] == consumidor:
+            st.warning("Depois de carregar o ficheiro no destino, confirme a exportação para avançar as marcas de água.")
+            if st.button("Confirmar Exportação", use_container_width=True, type="primary"):
+                avancadas = confirmar_lote(exportacao["lote"], conn=get_db_connection())
+                descartar_exportacao("incremental")
+                if avancadas:
+                    st.success(f"Marcas de água avançadas: {', '.join(avancadas)}.")
+                else:
+                    st.warning("Nenhuma marca foi avançada (o lote já tinha sido confirmado ou é anterior a outro lote confirmado).")
+                st.rerun()
 
     except Exception as e:
         st.error(f"Ocorreu um erro ao gerar os relatórios para exportação: {e}")
         st.info("Verifique se o banco de dados está inicializado na página 'Configurações'.")
 
-
-
+concluir_perfil()
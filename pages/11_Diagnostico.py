@@ -0,0 +1,258 @@
+import streamlit as st
+import pandas as pd
+from auth import show_login_form, logout
+from cache_utils import estatisticas_cache
+from perfil_utils import iniciar_perfil, concluir_perfil
+from migracoes_utils import estado_migracoes, aplicar_migracoes
+from db_utils import get_db_connection
+from fila_email_utils import resumo_fila, emails_recentes, reenviar_falhados, metricas_remetente, ESTADO_FALHOU
+from servico_pdf_utils import metricas_servico_pdf
+from diagnostico_utils import (
+    estatisticas_consultas, registo_lentas, instrucoes_descartadas, repor_estatisticas,
+    limite_lentas, definir_limite_lentas, MAX_CONSULTAS,
+)
+
+# --- Autenticação e Permissão ---
+if 'logged_in' not in st.session_state or not st.session_state['logged_in']:
+    st.switch_page("app.py")
+
+if st.session_state.get('user_role') != 'Administrador':
+    st.error("Acesso negado. Apenas administradores podem aceder a esta página.")
+    st.stop()
+
+# --- Configuração de Layout (Header, Footer e CSS) ---
+st.markdown("""
+<style>
+    /* --- Início do Bloco da Logo --- */
+	.logo-text {
+		font-family: 'Courier New', monospace;
+		font-size: 28px; /* Ajuste o tamanho se necessário para as páginas internas */
+		font-weight: bold;
+		padding-top: 20px;
+	}
+	/* Estilos para o tema claro (light) */
+	.logo-asset {
+		color: #FFFFFF; /* Fonte branca */
+		text-shadow: 1px 1px 3px rgba(0, 0, 0, 0.7); /* Sombra preta */
+	}
+	.logo-flow {
+		color: #E30613; /* Fonte vermelha */
+		text-shadow: 1px 1px 3px rgba(0, 0, 0, 0.7); /* Sombra preta */
+	}
+
+	/* Estilos para o tema escuro (dark) */
+	@media (prefers-color-scheme: dark) {
+		.logo-asset {
+			color: #FFFFFF;
+			text-shadow: 1px 1px 3px rgba(0, 0, 0, 0.7); /* Mantém a sombra preta para contraste */
+		}
+		.logo-flow {
+			color: #FF4B4B; /* Um vermelho mais vibrante para o tema escuro */
+			text-shadow: 1px 1px 3px rgba(0, 0, 0, 0.7); /* Sombra preta */
+		}
+	}
+	/* --- Fim do Bloco da Logo --- */
+    /* Estilos para o footer na barra lateral */
+    .sidebar-footer { text-align: center; padding-top: 20px; padding-bottom: 20px; }
+    .sidebar-footer a { margin-right: 15px; text-decoration: none; }
+    .sidebar-footer img { width: 25px; height: 25px; filter: grayscale(1) opacity(0.5); transition: filter 0.3s; }
+    .sidebar-footer img:hover { filter: grayscale(0) opacity(1); }
+    @media (prefers-color-scheme: dark) {
+        .sidebar-footer img { filter: grayscale(1) opacity(0.6) invert(1); }
+        .sidebar-footer img:hover { filter: opacity(1) invert(1); }
+    }
+</style>
+""", unsafe_allow_html=True)
+
+# --- Header (Logo no canto superior esquerdo) ---
+st.markdown(
+    """
+    <div class="logo-text">
+        <span class="logo-text"><span class="logo-asset">ASSET</span><span class="logo-flow">FLOW</span>
+    </div>
+    """,
+    unsafe_allow_html=True
+)
+
+# --- Barra Lateral ---
+with st.sidebar:
+    st.write(f"Bem-vindo, **{st.session_state['user_name']}**!")
+    st.write(f"Cargo: **{st.session_state['user_role']}**")
+    if st.button("Logout", key="diagnostico_logout"):
+        logout()
+    st.markdown("---")
+    iniciar_perfil()
+
+# --- Conteúdo da Página ---
+st.title("Diagnóstico de Consultas")
+st.info(
+    "Estatísticas das instruções SQL executadas por este processo do servidor desde o arranque "
+    "(ou desde a última reposição). Os parâmetros das consultas não são registados."
+)
+
+consultas = estatisticas_consultas()
+lentas = registo_lentas()
+
+col_top, col_limite, col_repor = st.columns([1, 1, 1])
+with col_top:
+    top_n = st.number_input("Mostrar as N primeiras", min_value=5, max_value=100, value=15, step=5)
+with col_limite:
+    novo_limite = st.number_input("Limite de consulta lenta (ms)", min_value=10, max_value=60000, value=int(limite_lentas()), step=50)
+    if novo_limite != int(limite_lentas()):
+        definir_limite_lentas(novo_limite)
+        st.rerun()
+with col_repor:
+    st.write("")
+    st.write("")
+    if st.button("Repor Estatísticas", use_container_width=True):
+        repor_estatisticas()
+        st.rerun()
+
+total_execucoes = sum(c['execucoes'] for c in consultas)
+tempo_total = sum(c['tempo_total_ms'] for c in consultas)
+mcol1, mcol2, mcol3, mcol4 = st.columns(4)
+mcol1.metric("Instruções distintas", len(consultas))
+mcol2.metric("Execuções", total_execucoes)
+mcol3.metric("Tempo total no banco", f"{tempo_total / 1000:.1f} s")
+mcol4.metric("Execuções lentas", sum(c['lentas'] for c in consultas))
+if instrucoes_descartadas():
+    st.warning(f"{instrucoes_descartadas()} execuções não foram contabilizadas por já haver {MAX_CONSULTAS} instruções distintas em acompanhamento.")
+
+if not consultas:
+    st.info("Ainda não foram executadas consultas neste processo.")
+else:
+    # Cache: hits e misses das funções de carregamento que executaram cada instrução.
+    cache_por_funcao = estatisticas_cache()['por_funcao']
+    for consulta in consultas:
+        contadores = [cache_por_funcao.get(nome, {}) for nome in consulta['carregadores']]
+        consulta['cache_hits'] = sum(c.get('hits', 0) for c in contadores)
+        consulta['cache_misses'] = sum(c.get('misses', 0) for c in contadores)
+        consulta['carregadores'] = ", ".join(consulta['carregadores']) or "(sem cache)"
+    df_consultas = pd.DataFrame(consultas)
+
+    colunas = {
+        "sql": "Instrução", "execucoes": "Execuções", "tempo_medio_ms": "Médio (ms)", "tempo_max_ms": "Máximo (ms)",
+        "tempo_total_ms": "Total (ms)", "linhas": "Linhas", "lentas": "Lentas", "paginas": "Páginas",
+        "carregadores": "Função de Carregamento", "cache_hits": "Cache Hits", "cache_misses": "Cache Misses",
+    }
+    config_sql = {"Instrução": st.column_config.TextColumn(width="large")}
+
+    tab_lentas, tab_frequentes, tab_total, tab_registo = st.tabs(
+        ["Mais Lentas", "Mais Frequentes", "Maior Tempo Total", f"Registo de Lentas ({len(lentas)})"]
+    )
+    with tab_lentas:
+        st.dataframe(df_consultas.sort_values("tempo_medio_ms", ascending=False).head(top_n).rename(columns=colunas),
+                     hide_index=True, use_container_width=True, column_config=config_sql)
+    with tab_frequentes:
+        st.dataframe(df_consultas.sort_values("execucoes", ascending=False).head(top_n).rename(columns=colunas),
+                     hide_index=True, use_container_width=True, column_config=config_sql)
+    with tab_total:
+        st.dataframe(df_consultas.sort_values("tempo_total_ms", ascending=False).head(top_n).rename(columns=colunas),
+                     hide_index=True, use_container_width=True, column_config=config_sql)
+    with tab_registo:
+        st.caption(f"Execuções acima de {limite_lentas():.0f} ms (também enviadas para o logger 'assetflow.consultas_lentas').")
+        if lentas:
+            df_lentas = pd.DataFrame(lentas).rename(columns={
+                "momento": "Momento", "duracao_ms": "Duração (ms)", "linhas": "Linhas", "pagina": "Página",
+                "carregador": "Função de Carregamento", "sql": "Instrução",
+            })
+            st.dataframe(df_lentas, hide_index=True, use_container_width=True, column_config=config_sql)
+        else:
+            st.info("Nenhuma consulta lenta registada.")
+
+    st.subheader("Tempo no Banco por Página")
+    df_paginas = (df_consultas.assign(Página=df_consultas['paginas'].str.split(", ")).explode("Página")
+                  .groupby("Página")[["execucoes", "tempo_total_ms"]].sum()
+                  .sort_values("tempo_total_ms", ascending=False)
+                  .rename(columns={"execucoes": "Execuções", "tempo_total_ms": "Total (ms)"}))
+    st.dataframe(df_paginas, use_container_width=True)
+
+# --- Migrações do Banco ---
+st.markdown("---")
+st.subheader("Migrações do Banco (Tabelas e Índices)")
+try:
+    migracoes = estado_migracoes()
+    df_migracoes = pd.DataFrame(migracoes).rename(columns={
+        "versao": "Versão", "descricao": "Descrição", "aplicada_em": "Aplicada em", "duracao_ms": "Duração (ms)",
+    })
+    st.dataframe(df_migracoes, hide_index=True, use_container_width=True)
+    pendentes = [m for m in migracoes if m['aplicada_em'] is None]
+    if not pendentes:
+        st.success("Todas as migrações estão aplicadas.")
+    else:
+        st.warning(f"{len(pendentes)} migração(ões) pendente(s). Os índices são criados sem bloquear as escritas, mas podem demorar em tabelas grandes.")
+        if st.button("Aplicar Migrações Pendentes", type="primary"):
+            with st.spinner("A aplicar migrações..."):
+                progresso = st.empty()
+                aplicar_migracoes(
+                    ao_progredir=lambda m, i, total: progresso.text(f"Versão {m['versao']}: {m['descricao']} ({i + 1}/{total})")
+                )
+            st.rerun()
+except Exception as e:
+    st.error(f"Erro ao consultar ou aplicar as migrações: {e}")
+
+# --- Fila de E-mails ---
+st.markdown("---")
+st.subheader("Fila de E-mails")
+try:
+    conn = get_db_connection()
+    resumo = resumo_fila(conn)
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Pendentes", resumo.get("pendente", 0))
+    c2.metric("A enviar", resumo.get("enviando", 0))
+    c3.metric("Enviados", resumo.get("enviado", 0))
+    c4.metric("Falhados", resumo.get(ESTADO_FALHOU, 0))
+    metricas = metricas_remetente()
+    if metricas is None:
+        st.caption("O remetente deste processo ainda não foi iniciado (inicia-se no primeiro envio).")
+    else:
+        ultimo = metricas["ultimo_lote"]
+        st.caption(
+            f"Remetente deste processo ({'ativo' if metricas['ativo'] else 'parado'}): {metricas['enviados']} enviado(s), "
+            f"{metricas['falhados']} falhado(s), {metricas['emails_por_segundo'] or 0:.2f} e-mails/s em média"
+            + (f"; último lote: {ultimo['enviados']} em {ultimo['duracao_s']} s ({ultimo['emails_por_segundo']} e-mails/s)." if ultimo else ".")
+        )
+    recentes = emails_recentes(conn)
+    if recentes:
+        st.dataframe(pd.DataFrame(recentes).rename(columns={
+            "id": "ID", "origem": "Origem", "destinatarios": "Destinatários", "assunto": "Assunto", "estado": "Estado",
+            "tentativas": "Tentativas", "proxima_tentativa_em": "Próxima tentativa", "ultimo_erro": "Último erro",
+            "criado_em": "Criado em",
+        }), hide_index=True, use_container_width=True)
+    else:
+        st.success("Não há e-mails pendentes nem falhados.")
+    if resumo.get(ESTADO_FALHOU) and st.button("Reenviar E-mails Falhados"):
+        st.toast(f"{reenviar_falhados(conn)} e-mail(s) de volta à fila.", icon="📧")
+        st.rerun()
+except Exception as e:
+    st.error(f"Erro ao consultar a fila de e-mails: {e}")
+
+# --- Geração de PDF ---
+st.markdown("---")
+st.subheader("Geração de PDF")
+metricas_pdf = metricas_servico_pdf()
+if metricas_pdf is None:
+    st.caption("O serviço de PDF deste processo ainda não foi iniciado (inicia-se no primeiro documento).")
+else:
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Na fila", metricas_pdf["na_fila"])
+    c2.metric("A gerar", f"{metricas_pdf['em_curso']}/{metricas_pdf['max_processos']}")
+    c3.metric("Concluídos", metricas_pdf["concluidos"])
+    c4.metric("Falhados/Expirados", metricas_pdf["falhados"] + metricas_pdf["expirados"])
+    st.caption(
+        f"{metricas_pdf['segundos_por_documento'] or 0:.2f} s por trabalho em média; "
+        f"{metricas_pdf['rejeitados']} pedido(s) rejeitado(s) com a fila cheia; "
+        f"{metricas_pdf['reinicios_pool']} reinício(s) do pool de processos."
+    )
+    cache_pdf = metricas_pdf["cache"]
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Taxa de acerto da cache", f"{cache_pdf['taxa_acerto']:.0%}" if cache_pdf["taxa_acerto"] is not None else "-")
+    c2.metric("Acertos (memória/disco)", f"{cache_pdf['hits_memoria']}/{cache_pdf['hits_disco']}")
+    c3.metric("Em memória", f"{cache_pdf['entradas_memoria']} ({cache_pdf['bytes_memoria'] / 1024 / 1024:.1f} MB)")
+    c4.metric("Em disco", f"{cache_pdf['entradas_disco']} ({cache_pdf['bytes_disco'] / 1024 / 1024:.1f} MB)")
+    st.caption(
+        f"Cache de documentos: {cache_pdf['misses']} falha(s), {cache_pdf['para_disco']} documento(s) passados para o disco "
+        f"e {cache_pdf['descartados']} descartado(s) pelo limite de tamanho."
+    )
+
+concluir_perfil()
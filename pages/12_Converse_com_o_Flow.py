@@ -6,6 +6,10 @@ import asyncio
 import httpx
 from datetime import date, datetime
 from sqlalchemy import text
+from db_utils import consultar, get_db_connection
+from perfil_utils import iniciar_perfil, concluir_perfil
+from cache_utils import cache_tabelas, invalidar_tabelas
+from referencias_utils import id_referencia
 
 # --- Autenticação e Configuração da Página ---
 if 'logged_in' not in st.session_state or not st.session_state['logged_in']:
@@ -83,15 +87,12 @@ with st.sidebar:
     if st.button("Logout", key="flow_logout"):
         logout()
     st.markdown("---")
+    iniciar_perfil()
 
 # --- Funções do Executor de Ações ---
-def get_db_connection():
-    return st.connection("supabase", type="sql")
-
-@st.cache_data(ttl=30)
+@cache_tabelas("colaboradores", "setores", ttl=30)
 def consultar_colaborador(filtros):
     if not filtros: return "Por favor, especifique o colaborador (nome, CPF ou Gmail)."
-    conn = get_db_connection()
     params, where_clauses = {}, []
     if filtros.get("nome_colaborador"):
         where_clauses.append("c.nome_completo ILIKE :valor")
@@ -104,12 +105,11 @@ def consultar_colaborador(filtros):
         params['valor'] = f"%{filtros['gmail']}%"
     else: return "Critério de pesquisa de colaborador inválido."
     query = f"SELECT c.nome_completo, c.cpf, c.gmail, s.nome_setor as funcao, c.status FROM colaboradores c LEFT JOIN setores s ON c.setor_id = s.id WHERE {' AND '.join(where_clauses)}"
-    return conn.query(query, params=params)
+    return consultar(query, params=params)
 
-@st.cache_data(ttl=30)
+@cache_tabelas("aparelhos", "modelos", "marcas", "status", "historico_movimentacoes", "colaboradores", ttl=30)
 def consultar_aparelho_completo(filtros):
     if not filtros: return "Por favor, especifique o aparelho (N/S ou IMEI)."
-    conn = get_db_connection()
     params, where_clauses = {}, []
     if filtros.get("numero_serie"):
         where_clauses.append("a.numero_serie ILIKE :valor")
@@ -125,10 +125,10 @@ def consultar_aparelho_completo(filtros):
         FROM aparelhos a
         LEFT JOIN modelos mo ON a.modelo_id = mo.id LEFT JOIN marcas ma ON mo.marca_id = ma.id
         LEFT JOIN status s ON a.status_id = s.id
-        LEFT JOIN (SELECT aparelho_id, colaborador_snapshot, ROW_NUMBER() OVER(PARTITION BY aparelho_id ORDER BY data_movimentacao DESC) as rn FROM historico_movimentacoes) h ON a.id = h.aparelho_id AND h.rn = 1
+        LEFT JOIN aparelho_posse_atual h ON a.id = h.aparelho_id
         WHERE {' AND '.join(where_clauses)};
     """
-    info_df = conn.query(query_info, params=params)
+    info_df = consultar(query_info, params=params)
     
     if info_df.empty: return pd.DataFrame()
 
@@ -137,13 +137,12 @@ def consultar_aparelho_completo(filtros):
         FROM historico_movimentacoes h JOIN status s ON h.status_id = s.id JOIN aparelhos a ON h.aparelho_id = a.id
         WHERE {' AND '.join(where_clauses)} ORDER BY h.data_movimentacao DESC;
     """
-    hist_df = conn.query(query_hist, params=params)
+    hist_df = consultar(query_hist, params=params)
     return {"info": info_df, "historico": hist_df}
 
-@st.cache_data(ttl=30)
+@cache_tabelas("historico_movimentacoes", "aparelhos", "status", ttl=30)
 def consultar_movimentacoes(filtros):
     if not filtros: return "Por favor, forneça um critério de pesquisa (colaborador, N/S, IMEI ou data)."
-    conn = get_db_connection()
     params, where_clauses = {}, []
     if filtros.get("nome_colaborador"):
         where_clauses.append("h.colaborador_snapshot ILIKE :colab")
@@ -165,12 +164,11 @@ def consultar_movimentacoes(filtros):
     if not where_clauses: return "Critério de pesquisa de movimentações inválido."
     
     query = f"SELECT h.data_movimentacao, h.colaborador_snapshot, a.numero_serie, s.nome_status, h.observacoes FROM historico_movimentacoes h JOIN aparelhos a ON h.aparelho_id = a.id JOIN status s ON h.status_id = s.id WHERE {' AND '.join(where_clauses)} ORDER BY h.data_movimentacao DESC"
-    return conn.query(query, params=params)
+    return consultar(query, params=params)
 
-@st.cache_data(ttl=30)
+@cache_tabelas("contas_gmail", "colaboradores", ttl=30)
 def consultar_gmail(filtros):
     if not filtros: return "Por favor, especifique o Gmail ou o colaborador."
-    conn = get_db_connection()
     params, where_clauses = {}, []
     if filtros.get("email"):
         where_clauses.append("cg.email ILIKE :valor")
@@ -182,7 +180,7 @@ def consultar_gmail(filtros):
         return "Critério de pesquisa de Gmail inválido."
 
     query = f"SELECT cg.email, cg.senha, c.nome_completo as vinculado_a FROM contas_gmail cg LEFT JOIN colaboradores c ON cg.colaborador_id = c.id WHERE {' AND '.join(where_clauses)}"
-    return conn.query(query, params=params)
+    return consultar(query, params=params)
 
 def executar_criar_colaborador(dados):
     req_keys = ['nome_completo', 'codigo', 'cpf', 'nome_setor']
@@ -193,11 +191,9 @@ def executar_criar_colaborador(dados):
     with conn.session as s:
         try:
             s.begin()
-            query_setor = text("SELECT id FROM setores WHERE nome_setor ILIKE :nome_setor")
-            setor_result = s.execute(query_setor, {"nome_setor": dados['nome_setor']}).fetchone()
-            if not setor_result:
+            setor_id = id_referencia("setores", dados['nome_setor'])
+            if setor_id is None:
                 return f"Setor '{dados['nome_setor']}' não encontrado. Cadastro cancelado."
-            setor_id = setor_result[0]
 
             query_insert = text("""
                 INSERT INTO colaboradores (nome_completo, cpf, gmail, setor_id, data_cadastro, codigo, status) 
@@ -208,7 +204,7 @@ def executar_criar_colaborador(dados):
                 "setor_id": setor_id, "data": date.today(), "codigo": dados['codigo']
             })
             s.commit()
-            st.cache_data.clear() # Limpa o cache para refletir o novo cadastro
+            invalidar_tabelas("colaboradores") # Invalida o cache para refletir o novo cadastro
             return f"Colaborador '{dados['nome_completo']}' criado com sucesso!"
         except Exception as e:
             s.rollback()
@@ -248,7 +244,7 @@ def executar_criar_conta_gmail(dados):
                 "col_id": colaborador_id
             })
             s.commit()
-            st.cache_data.clear()
+            invalidar_tabelas("contas_gmail")
             return f"Conta Gmail '{dados['email']}' criada com sucesso!"
         except Exception as e:
             s.rollback()
@@ -483,4 +479,4 @@ for message in st.session_state.messages:
 if prompt := st.chat_input("Como posso ajudar?"):
     asyncio.run(handle_prompt(prompt))
 
-
+concluir_perfil()
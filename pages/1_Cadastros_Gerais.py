@@ -6,6 +6,10 @@ from datetime import date, datetime
 import uuid
 from supabase import create_client, Client
 import os
+from db_utils import consultar, get_db_connection
+from perfil_utils import iniciar_perfil, concluir_perfil
+from cache_utils import cache_tabelas, invalidar_tabelas
+from referencias_utils import mapa_ids
 
 # --- Autenticação e Permissão ---
 if 'logged_in' not in st.session_state or not st.session_state['logged_in']:
@@ -76,11 +80,9 @@ with st.sidebar:
     if st.button("Logout", key="cadastros_logout"):
         logout()
     st.markdown("---")
+    iniciar_perfil()
 
 # --- Funções de Banco de Dados e Storage ---
-def get_db_connection():
-    return st.connection("supabase", type="sql")
-
 def init_supabase_client():
     try:
         url = st.secrets["connections"]["supabase_storage"]["url"]
@@ -91,18 +93,10 @@ def init_supabase_client():
         st.info("Por favor, adicione [connections.supabase_storage] com 'url' e 'key' (service_role) ao seu ficheiro secrets.toml.")
         return None
 
-@st.cache_data(ttl=60)
-def get_foreign_key_map(table_name, name_column, key_column='id', join_clause=""):
-    conn = get_db_connection()
-    query = f"SELECT {key_column} as key_col, {name_column} as name_col FROM {table_name} {join_clause}"
-    df = conn.query(query)
-    return pd.Series(df['key_col'].values, index=df['name_col']).to_dict()
-
 # Funções para Marcas, Modelos, Setores (sem alterações)
-@st.cache_data(ttl=30)
+@cache_tabelas("marcas", ttl=30)
 def carregar_marcas():
-    conn = get_db_connection()
-    df = conn.query("SELECT id, nome_marca FROM marcas ORDER BY nome_marca;")
+    df = consultar("SELECT id, nome_marca FROM marcas ORDER BY nome_marca;")
     return df
 def adicionar_marca(nome_marca):
     if not nome_marca or not nome_marca.strip(): st.error("O nome da marca não pode ser vazio."); return
@@ -114,37 +108,36 @@ def adicionar_marca(nome_marca):
                 st.warning(f"A marca '{nome_marca}' já existe."); return
             query_insert = text("INSERT INTO marcas (nome_marca) VALUES (:nome)")
             s.execute(query_insert, {"nome": nome_marca.strip()}); s.commit()
-        st.success(f"Marca '{nome_marca}' adicionada com sucesso!"); st.cache_data.clear()
+        st.success(f"Marca '{nome_marca}' adicionada com sucesso!"); invalidar_tabelas("marcas")
     except Exception as e: st.error(f"Ocorreu um erro ao adicionar a marca: {e}")
 def atualizar_marca(marca_id, nome_marca):
     try:
         conn = get_db_connection();
         with conn.session as s:
             query = text("UPDATE marcas SET nome_marca = :nome WHERE id = :id"); s.execute(query, {"nome": nome_marca, "id": marca_id}); s.commit()
-        st.cache_data.clear(); return True
+        invalidar_tabelas("marcas"); return True
     except Exception as e: st.error(f"Erro ao atualizar marca: {e}"); return False
-@st.cache_data(ttl=30)
+@cache_tabelas("modelos", "marcas", ttl=30)
 def carregar_modelos():
-    conn = get_db_connection()
-    return conn.query("SELECT m.id, m.nome_modelo, ma.nome_marca FROM modelos m JOIN marcas ma ON m.marca_id = ma.id ORDER BY ma.nome_marca, m.nome_modelo;")
+    return consultar("SELECT m.id, m.nome_modelo, ma.nome_marca FROM modelos m JOIN marcas ma ON m.marca_id = ma.id ORDER BY ma.nome_marca, m.nome_modelo;")
 def adicionar_modelo(nome_modelo, marca_id):
     if not nome_modelo or not nome_modelo.strip() or not marca_id: st.error("O nome do modelo e a marca são obrigatórios."); return
     try:
         conn = get_db_connection();
         with conn.session as s:
             query = text("INSERT INTO modelos (nome_modelo, marca_id) VALUES (:nome, :marca_id)"); s.execute(query, {"nome": nome_modelo.strip(), "marca_id": marca_id}); s.commit()
-        st.success(f"Modelo '{nome_modelo}' adicionado com sucesso!"); st.cache_data.clear()
+        st.success(f"Modelo '{nome_modelo}' adicionado com sucesso!"); invalidar_tabelas("modelos")
     except Exception as e: st.error(f"Ocorreu um erro ao adicionar o modelo: {e}")
 def atualizar_modelo(modelo_id, nome_modelo, marca_id):
     try:
         conn = get_db_connection();
         with conn.session as s:
             query = text("UPDATE modelos SET nome_modelo = :nome, marca_id = :marca_id WHERE id = :id"); s.execute(query, {"nome": nome_modelo, "marca_id": marca_id, "id": modelo_id}); s.commit()
-        st.cache_data.clear(); return True
+        invalidar_tabelas("modelos"); return True
     except Exception as e: st.error(f"Erro ao atualizar modelo: {e}"); return False
-@st.cache_data(ttl=30)
+@cache_tabelas("setores", ttl=30)
 def carregar_setores():
-    conn = get_db_connection(); return conn.query("SELECT id, nome_setor FROM setores ORDER BY nome_setor;")
+    return consultar("SELECT id, nome_setor FROM setores ORDER BY nome_setor;")
 def adicionar_setor(nome_setor):
     if not nome_setor or not nome_setor.strip(): st.error("O nome do setor não pode ser vazio."); return
     try:
@@ -154,14 +147,14 @@ def adicionar_setor(nome_setor):
             if s.execute(query_check, {"nome": nome_setor.strip().lower()}).fetchone():
                 st.warning(f"O setor '{nome_setor}' já existe."); return
             query_insert = text("INSERT INTO setores (nome_setor) VALUES (:nome)"); s.execute(query_insert, {"nome": nome_setor.strip()}); s.commit()
-        st.success(f"Setor '{nome_setor}' adicionado com sucesso!"); st.cache_data.clear()
+        st.success(f"Setor '{nome_setor}' adicionado com sucesso!"); invalidar_tabelas("setores")
     except Exception as e: st.error(f"Ocorreu um erro ao adicionar o setor: {e}")
 def atualizar_setor(setor_id, nome_setor):
     try:
         conn = get_db_connection();
         with conn.session as s:
             query = text("UPDATE setores SET nome_setor = :nome WHERE id = :id"); s.execute(query, {"nome": nome_setor, "id": setor_id}); s.commit()
-        st.cache_data.clear(); return True
+        invalidar_tabelas("setores"); return True
     except Exception as e: st.error(f"Erro ao atualizar setor: {e}"); return False
 
 # Funções para Gestão de Compras
@@ -190,14 +183,13 @@ def registrar_compra(dados, anexo):
             """)
             s.execute(query, {**dados, "nota_fiscal_path": path_anexo})
             s.commit()
-            st.success("Registo de compra adicionado com sucesso!"); st.cache_data.clear(); return True
+            st.success("Registo de compra adicionado com sucesso!"); invalidar_tabelas("compras_ativos"); return True
         except Exception as e:
             s.rollback(); st.error(f"Erro ao registar a compra na base de dados: {e}"); return False
 
-@st.cache_data(ttl=30)
+@cache_tabelas("compras_ativos", "modelos", "marcas", ttl=30)
 def carregar_compras():
-    conn = get_db_connection()
-    return conn.query("""
+    return consultar("""
         SELECT 
             ca.id, ca.data_compra, ma.nome_marca || ' - ' || mo.nome_modelo as modelo, ca.quantidade, 
             ca.valor_unitario, ca.comprador_nome, ca.loja, ca.nota_fiscal_path
@@ -237,7 +229,7 @@ try:
         st.header("Registar Compra de Ativos em Lote")
         with st.form("form_nova_compra", clear_on_submit=True):
             st.subheader("Dados da Mercadoria")
-            modelos_map = get_foreign_key_map("modelos", "ma.nome_marca || ' - ' || mo.nome_modelo", key_column="mo.id", join_clause="mo JOIN marcas ma ON mo.marca_id = ma.id")
+            modelos_map = mapa_ids("modelos")
             
             c1, c2 = st.columns(2)
             data_compra = c1.date_input("Data da Compra*", value=date.today())
@@ -341,7 +333,7 @@ try:
                         if index < len(original_df) and not row.equals(original_df.loc[index]):
                             if atualizar_marca(row['id'], row['nome_marca']):
                                 st.toast(f"Marca '{row['nome_marca']}' atualizada!", icon="✅"); changes_made = True
-                    if changes_made: st.cache_data.clear(); del st.session_state[session_key_marcas]; st.rerun()
+                    if changes_made: del st.session_state[session_key_marcas]; st.rerun()
                     else: st.info("Nenhuma alteração detetada.")
         with col2:
             st.subheader("Modelos")
@@ -364,7 +356,7 @@ try:
                             nova_marca_id = marcas_dict[row['nome_marca']]
                             if atualizar_modelo(row['id'], row['nome_modelo'], nova_marca_id):
                                 st.toast(f"Modelo '{row['nome_modelo']}' atualizado!", icon="✅"); changes_made = True
-                    if changes_made: st.cache_data.clear(); del st.session_state[session_key_modelos]; st.rerun()
+                    if changes_made: del st.session_state[session_key_modelos]; st.rerun()
                     else: st.info("Nenhuma alteração detetada.")
 
     elif option == "Setores":
@@ -387,12 +379,11 @@ try:
                         if index < len(original_df) and not row.equals(original_df.loc[index]):
                             if atualizar_setor(row['id'], row['nome_setor']):
                                 st.toast(f"Setor '{row['nome_setor']}' atualizado!", icon="✅"); changes_made = True
-                    if changes_made: st.cache_data.clear(); del st.session_state[session_key_setores]; st.rerun()
+                    if changes_made: del st.session_state[session_key_setores]; st.rerun()
                     else: st.info("Nenhuma alteração detetada.")
 
 except Exception as e:
     st.error(f"Ocorreu um erro ao carregar a página de cadastros: {e}")
     st.info("Verifique se o banco de dados está a funcionar corretamente.")
 
-
-
+concluir_perfil()
@@ -4,6 +4,12 @@ from datetime import date
 from auth import show_login_form, logout
 from sqlalchemy import text
 import numpy as np
+from alteracoes_utils import calcular_alteracoes, salvar_alteracoes, duplicados_no_lote
+from db_utils import consultar, para_python, get_db_connection
+from perfil_utils import iniciar_perfil, concluir_perfil
+from pesquisa_utils import caixa_pesquisa
+from cache_utils import cache_tabelas, invalidar_tabelas
+from referencias_utils import mapa_ids
 
 # --- Verificação de Autenticação ---
 if 'logged_in' not in st.session_state or not st.session_state['logged_in']:
@@ -71,17 +77,9 @@ with st.sidebar:
         from auth import logout
         logout()
     st.markdown("---")
+    iniciar_perfil()
 
 # --- Funções do DB ---
-def get_db_connection():
-    return st.connection("supabase", type="sql")
-
-@st.cache_data(ttl=30)
-def carregar_setores():
-    conn = get_db_connection()
-    setores_df = conn.query("SELECT id, nome_setor FROM setores ORDER BY nome_setor;")
-    return setores_df.to_dict('records')
-
 def verificar_duplicidade_codigo(codigo, setor_id):
     """Verifica se um código já existe no setor e retorna os dados do colaborador existente."""
     conn = get_db_connection()
@@ -124,10 +122,9 @@ def adicionar_colaborador_banco(nome, cpf, gmail, setor_id, codigo):
         st.error(f"Erro ao adicionar colaborador: {e}")
         return False
 
-@st.cache_data(ttl=30)
+@cache_tabelas("colaboradores", ttl=30)
 def contar_codigos_duplicados():
     """Conta quantos grupos de códigos estão duplicados dentro do mesmo setor."""
-    conn = get_db_connection()
     query = """
         SELECT COUNT(*)
         FROM (
@@ -138,13 +135,12 @@ def contar_codigos_duplicados():
             HAVING COUNT(id) > 1
         ) as duplicados;
     """
-    count = conn.query(query, ttl=30).iloc[0, 0]
+    count = consultar(query).iloc[0, 0]
     return count
 
-@st.cache_data(ttl=30)
+@cache_tabelas("colaboradores", "setores", ttl=30)
 def carregar_detalhes_duplicados():
     """Carrega os detalhes dos códigos duplicados para exibição."""
-    conn = get_db_connection()
     query = """
         WITH Duplicados AS (
             SELECT codigo, setor_id
@@ -163,13 +159,12 @@ def carregar_detalhes_duplicados():
         WHERE c.status = 'Ativo'
         ORDER BY s.nome_setor, c.codigo, c.nome_completo;
     """
-    df = conn.query(query, ttl=30)
+    df = consultar(query)
     return df
 
-@st.cache_data(ttl=30)
+@cache_tabelas("colaboradores", "setores", ttl=30)
 def carregar_colaboradores(order_by="c.nome_completo ASC", search_term=None, setor_id=None, status_filter=None):
     # (Função original sem modificações)
-    conn = get_db_connection()
     params = {}
     where_clauses = []
 
@@ -199,7 +194,7 @@ def carregar_colaboradores(order_by="c.nome_completo ASC", search_term=None, set
         {where_sql}
         {order_clause}
     """
-    df = conn.query(query, params=params)
+    df = consultar(query, params=params)
     
     df['Status Visual'] = df['status'].apply(lambda s: '🟢' if s == 'Ativo' else '🔴')
 
@@ -208,123 +203,89 @@ def carregar_colaboradores(order_by="c.nome_completo ASC", search_term=None, set
             df[col] = df[col].fillna('')
     return df
 
-def atualizar_colaborador(col_id, codigo, nome, cpf, gmail, setor_id, status):
-    # (Função original com uma pequena melhoria na mensagem de erro)
-    try:
-        conn = get_db_connection()
-        with conn.session as s:
-            s.begin()
-            
-            query_check_cpf = text("SELECT 1 FROM colaboradores WHERE cpf = :cpf AND id != :id")
-            cpf_existe = s.execute(query_check_cpf, {"cpf": cpf, "id": col_id}).fetchone()
-            if cpf_existe:
-                st.error(f"Erro: O CPF '{cpf}' já pertence a outro colaborador.")
-                s.rollback()
-                return False
-            
-            # A verificação aqui continua, pois ao EDITAR, a intenção não é duplicar.
-            query_check_codigo = text("SELECT nome_completo FROM colaboradores WHERE codigo = :codigo AND setor_id = :setor_id AND id != :id AND status = 'Ativo'")
-            colaborador_existente = s.execute(query_check_codigo, {"codigo": str(codigo), "setor_id": setor_id, "id": col_id}).fetchone()
-            if colaborador_existente:
-                st.error(f"Erro: O código '{codigo}' já está em uso por '{colaborador_existente[0]}' neste setor.")
-                s.rollback()
-                return False
-
-            query = text("""
-                UPDATE colaboradores SET codigo = :codigo, nome_completo = :nome, 
-                cpf = :cpf, gmail = :gmail, setor_id = :setor_id, status = :status 
-                WHERE id = :id
-            """)
-            s.execute(query, {
-                "codigo": str(codigo), "nome": nome, "cpf": cpf, 
-                "gmail": gmail, "setor_id": setor_id, "status": status, "id": col_id
-            })
-            s.commit()
-        return True
-    except Exception as e:
-        st.error(f"Erro ao atualizar o colaborador ID {col_id}: {e}")
-        return False
-
-def inativar_colaborador(col_id):
-    # (Função original sem modificações)
-    try:
-        conn = get_db_connection()
-        with conn.session as s:
-            s.begin()
-            query_check = text("""
-                SELECT 1 FROM aparelhos a
-                JOIN status s ON a.status_id = s.id
-                JOIN (
-                    SELECT aparelho_id, colaborador_id, ROW_NUMBER() OVER(PARTITION BY aparelho_id ORDER BY data_movimentacao DESC) as rn
-                    FROM historico_movimentacoes
-                ) h ON a.id = h.aparelho_id AND h.rn = 1
-                WHERE s.nome_status = 'Em uso' AND h.colaborador_id = :col_id
-            """)
-            tem_aparelho = s.execute(query_check, {"col_id": col_id}).fetchone()
-            if tem_aparelho:
-                st.error(f"Erro: Não é possível inativar o colaborador, pois ele ainda possui aparelhos 'Em uso' associados. Por favor, processe a devolução primeiro.")
-                s.rollback()
-                return False
-
-            query_update = text("UPDATE colaboradores SET status = 'Inativo' WHERE id = :id")
-            s.execute(query_update, {"id": col_id})
-            s.commit()
-        return True
-    except Exception as e:
-        st.error(f"Erro ao inativar o colaborador ID {col_id}: {e}")
-        return False
-
-def excluir_colaborador_permanentemente(col_id):
-    # (Função original sem modificações)
-    try:
-        conn = get_db_connection()
-        with conn.session as s:
-            s.begin()
-            # 1. Pega os dados do colaborador
-            query_select = text("""
-                SELECT c.id, c.codigo, c.nome_completo, c.cpf, c.gmail, s.nome_setor, c.data_cadastro
-                FROM colaboradores c
-                LEFT JOIN setores s ON c.setor_id = s.id
-                WHERE c.id = :id
-            """)
-            colaborador = s.execute(query_select, {"id": col_id}).fetchone()
-            
-            if not colaborador:
-                st.warning(f"Colaborador ID {col_id} não encontrado para exclusão.")
-                s.rollback()
-                return False
-
-            # 2. Insere os dados no log de desligados
-            query_log = text("""
-                INSERT INTO colaboradores_desligados (id, codigo, nome_completo, cpf, gmail, setor_nome, data_cadastro, data_exclusao)
-                VALUES (:id, :codigo, :nome, :cpf, :gmail, :setor, :data_cad, NOW())
-            """)
-            s.execute(query_log, {
-                "id": colaborador.id, "codigo": colaborador.codigo, "nome": colaborador.nome_completo,
-                "cpf": colaborador.cpf, "gmail": colaborador.gmail, "setor": colaborador.nome_setor,
-                "data_cad": colaborador.data_cadastro
-            })
-
-            # 3. Desvincula o colaborador de todas as tabelas referenciadas
-            s.execute(text("UPDATE contas_gmail SET colaborador_id = NULL WHERE colaborador_id = :id"), {"id": col_id})
-            s.execute(text("UPDATE historico_movimentacoes SET colaborador_id = NULL WHERE colaborador_id = :id"), {"id": col_id})
-            s.execute(text("UPDATE manutencoes SET colaborador_id_no_envio = NULL WHERE colaborador_id_no_envio = :id"), {"id": col_id})
-
-            # 4. Exclui o colaborador da tabela principal
-            query_delete = text("DELETE FROM colaboradores WHERE id = :id")
-            s.execute(query_delete, {"id": col_id})
-            
-            s.commit()
-        return True
-    except Exception as e:
-        st.error(f"Erro na exclusão permanente do colaborador ID {col_id}: {e}")
-        return False
-
-@st.cache_data(ttl=30)
+def validar_alteracoes_colaboradores(s, alterados_df, ids_excluidos):
+    """Validação em lote de CPF e código (por setor) repetidos. Devolve {id: mensagem}."""
+    erros = {}
+    if alterados_df.empty:
+        return erros
+    ids_lote = [int(i) for i in alterados_df['id']]
+    mensagem_cpf = "Erro: O CPF '{}' já pertence a outro colaborador."
+
+    for col_id in duplicados_no_lote(alterados_df, 'cpf'):
+        erros[col_id] = mensagem_cpf.format(alterados_df.loc[alterados_df['id'] == col_id, 'cpf'].iloc[0])
+    cpfs_em_uso = s.execute(text("SELECT cpf FROM colaboradores WHERE cpf = ANY(:cpfs) AND id <> ALL(:ids)"), {
+        "cpfs": alterados_df['cpf'].astype(str).tolist(), "ids": ids_lote
+    }).scalars().all()
+    for row in alterados_df[alterados_df['cpf'].isin(cpfs_em_uso)].itertuples():
+        erros[int(row.id)] = mensagem_cpf.format(row.cpf)
+
+    # A verificação aqui continua, pois ao EDITAR, a intenção não é duplicar.
+    for col_id in duplicados_no_lote(alterados_df, ['codigo', 'setor_id']):
+        codigo = alterados_df.loc[alterados_df['id'] == col_id, 'codigo'].iloc[0]
+        erros.setdefault(col_id, f"Erro: O código '{codigo}' está repetido para o mesmo setor nas alterações.")
+    codigos_em_uso = s.execute(text("""
+        SELECT codigo, setor_id, nome_completo FROM colaboradores
+        WHERE codigo = ANY(:codigos) AND status = 'Ativo' AND id <> ALL(:ids)
+    """), {"codigos": alterados_df['codigo'].astype(str).tolist(), "ids": ids_lote}).fetchall()
+    em_uso = {(c.codigo, c.setor_id): c.nome_completo for c in codigos_em_uso}
+    for row in alterados_df.itertuples():
+        nome_existente = em_uso.get((str(row.codigo), para_python(row.setor_id)))
+        if nome_existente:
+            erros.setdefault(int(row.id), f"Erro: O código '{row.codigo}' já está em uso por '{nome_existente}' neste setor.")
+    return erros
+
+def inativar_colaboradores(col_ids):
+    """Inativa os colaboradores em lote. Devolve (total inativado, {id: mensagem} dos que têm aparelhos 'Em uso')."""
+    col_ids = [int(i) for i in col_ids]
+    erros = {}
+    if not col_ids:
+        return 0, erros
+    conn = get_db_connection()
+    with conn.session as s:
+        s.begin()
+        com_aparelho = s.execute(text("""
+            SELECT DISTINCT h.colaborador_id FROM aparelhos a
+            JOIN status s ON a.status_id = s.id
+            JOIN aparelho_posse_atual h ON a.id = h.aparelho_id
+            WHERE s.nome_status = 'Em uso' AND h.colaborador_id = ANY(:ids)
+        """), {"ids": col_ids}).scalars().all()
+        for col_id in com_aparelho:
+            erros[col_id] = f"Erro: Não é possível inativar o colaborador ID {col_id}, pois ele ainda possui aparelhos 'Em uso' associados. Por favor, processe a devolução primeiro."
+
+        inativados = s.execute(text("UPDATE colaboradores SET status = 'Inativo' WHERE id = ANY(:ids)"),
+                               {"ids": [i for i in col_ids if i not in erros]}).rowcount
+        s.commit()
+    return inativados, erros
+
+def excluir_colaboradores_permanentemente(col_ids):
+    """Move os colaboradores para o log de desligados e exclui-os, tudo em lote. Devolve o total excluído."""
+    col_ids = [int(i) for i in col_ids]
+    conn = get_db_connection()
+    with conn.session as s:
+        s.begin()
+        # 1. Copia os dados dos colaboradores para o log de desligados
+        s.execute(text("""
+            INSERT INTO colaboradores_desligados (id, codigo, nome_completo, cpf, gmail, setor_nome, data_cadastro, data_exclusao)
+            SELECT c.id, c.codigo, c.nome_completo, c.cpf, c.gmail, s.nome_setor, c.data_cadastro, NOW()
+            FROM colaboradores c
+            LEFT JOIN setores s ON c.setor_id = s.id
+            WHERE c.id = ANY(:ids)
+        """), {"ids": col_ids})
+
+        # 2. Desvincula os colaboradores de todas as tabelas referenciadas
+        s.execute(text("UPDATE contas_gmail SET colaborador_id = NULL WHERE colaborador_id = ANY(:ids)"), {"ids": col_ids})
+        s.execute(text("UPDATE historico_movimentacoes SET colaborador_id = NULL WHERE colaborador_id = ANY(:ids)"), {"ids": col_ids})
+        s.execute(text("UPDATE manutencoes SET colaborador_id_no_envio = NULL WHERE colaborador_id_no_envio = ANY(:ids)"), {"ids": col_ids})
+
+        # 3. Exclui os colaboradores da tabela principal
+        excluidos = s.execute(text("DELETE FROM colaboradores WHERE id = ANY(:ids)"), {"ids": col_ids}).rowcount
+        s.commit()
+    return excluidos
+
+@cache_tabelas("colaboradores_desligados", ttl=30)
 def carregar_log_desligados():
     """Carrega o log de colaboradores excluídos permanentemente."""
-    conn = get_db_connection()
-    df = conn.query("SELECT * FROM colaboradores_desligados ORDER BY data_exclusao DESC;")
+    df = consultar("SELECT * FROM colaboradores_desligados ORDER BY data_exclusao DESC;")
     return df
 
 # --- UI ---
@@ -332,8 +293,7 @@ st.title("Gestão de Colaboradores")
 st.markdown("---")
 
 try:
-    setores_list = carregar_setores()
-    setores_dict = {s['nome_setor']: s['id'] for s in setores_list}
+    setores_dict = mapa_ids("setores")
     
     option = st.radio(
         "Selecione a operação:",
@@ -354,7 +314,7 @@ try:
             if col1.button("Sim, confirmar cadastro", type="primary", use_container_width=True):
                 data = st.session_state['colab_to_add']
                 if adicionar_colaborador_banco(data['nome'], data['cpf'], data['gmail'], data['setor_id'], data['codigo']):
-                    st.cache_data.clear()
+                    invalidar_tabelas("colaboradores")
                     del st.session_state['show_colab_confirmation']
                     del st.session_state['colab_to_add']
                     st.rerun()
@@ -401,7 +361,7 @@ try:
                             st.rerun()
                         else:
                             if adicionar_colaborador_banco(nome_limpo, cpf_limpo, gmail_limpo, setor_id, codigo_limpo):
-                                st.cache_data.clear()
+                                invalidar_tabelas("colaboradores")
                                 st.rerun()
     
     elif option == "Consultar Colaboradores":
@@ -431,7 +391,7 @@ try:
         with col_filtro2:
             status_filtro = st.selectbox("Filtrar por Status:", ["Todos", "Ativo", "Inativo"])
         with col_filtro3:
-            termo_pesquisa = st.text_input("Pesquisar por Nome, Código ou Gmail:")
+            termo_pesquisa = caixa_pesquisa("colaboradores", "Pesquisar por Nome, Código ou Gmail:", key="colaboradores_pesquisa")
         
         setor_id_filtro = setores_dict.get(setor_filtro_nome) if setor_filtro_nome != "Todos" else None
 
@@ -467,11 +427,15 @@ try:
 
             confirm_col1, confirm_col2 = st.columns(2)
             if confirm_col1.button("Confirmar Exclusão Definitiva", type="primary", use_container_width=True):
-                for col_id_to_delete in st.session_state.colabs_para_excluir:
-                    if excluir_colaborador_permanentemente(col_id_to_delete):
-                        st.toast(f"Colaborador ID {col_id_to_delete} excluído permanentemente.", icon="✅")
+                try:
+                    excluidos = excluir_colaboradores_permanentemente(st.session_state.colabs_para_excluir)
+                    st.toast(f"{excluidos} colaborador(es) excluído(s) permanentemente.", icon="✅")
+                    if excluidos < len(st.session_state.colabs_para_excluir):
+                        st.warning("Alguns colaboradores não foram encontrados para exclusão.")
+                except Exception as e:
+                    st.error(f"Erro na exclusão permanente dos colaboradores: {e}")
                 del st.session_state.colabs_para_excluir
-                st.cache_data.clear()
+                invalidar_tabelas("colaboradores", "colaboradores_desligados", "contas_gmail", "historico_movimentacoes", "manutencoes")
                 del st.session_state[session_state_key]
                 st.rerun()
 
@@ -497,47 +461,49 @@ try:
             if st.button("Salvar Alterações", use_container_width=True, key="save_colabs_changes"):
                 original_df = st.session_state[session_state_key]
                 changes_made = False
-                
-                deleted_ids = set(original_df['id']) - set(edited_df['id'])
-                colabs_para_inativar = []
-                colabs_para_excluir_perm = []
-
-                for col_id in deleted_ids:
-                    original_row = original_df[original_df['id'] == col_id].iloc[0]
-                    if original_row['status'] == 'Ativo':
-                        colabs_para_inativar.append(col_id)
-                    elif original_row['status'] == 'Inativo':
-                        colabs_para_excluir_perm.append(col_id)
-                
-                for col_id in colabs_para_inativar:
-                    if inativar_colaborador(col_id):
-                        st.toast(f"Colaborador ID {col_id} foi inativado!", icon="⚪")
+                erros = []
+
+                ids_removidos, alterados_df = calcular_alteracoes(
+                    original_df, edited_df, ['codigo', 'nome_completo', 'cpf', 'gmail', 'nome_setor', 'status']
+                )
+                status_original = original_df.set_index('id')['status']
+                colabs_para_inativar = [i for i in ids_removidos if status_original[i] == 'Ativo']
+                colabs_para_excluir_perm = [i for i in ids_removidos if status_original[i] == 'Inativo']
+
+                try:
+                    inativados, erros_inativacao = inativar_colaboradores(colabs_para_inativar)
+                    if inativados:
+                        st.toast(f"{inativados} colaborador(es) inativado(s)!", icon="⚪")
                         changes_made = True
+                    erros.extend(erros_inativacao.values())
 
-                if colabs_para_excluir_perm:
-                    st.session_state.colabs_para_excluir = colabs_para_excluir_perm
-                    changes_made = True
-                
-                original_df_indexed = original_df.set_index('id')
-                edited_df_indexed = edited_df.set_index('id')
-                common_ids = original_df_indexed.index.intersection(edited_df_indexed.index)
-                
-                for col_id in common_ids:
-                    original_row = original_df_indexed.loc[col_id]
-                    edited_row = edited_df_indexed.loc[col_id]
-                    original_data = original_row.drop('Status Visual')
-                    edited_data = edited_row.drop('Status Visual')
-                    if not original_data.equals(edited_data):
-                        novo_setor_id = setores_dict.get(edited_row['nome_setor'])
-                        if atualizar_colaborador(col_id, edited_row['codigo'], edited_row['nome_completo'], edited_row['cpf'], edited_row['gmail'], novo_setor_id, edited_row['status']):
-                            st.toast(f"Colaborador '{edited_row['nome_completo']}' atualizado!", icon="✅")
+                    if colabs_para_excluir_perm:
+                        st.session_state.colabs_para_excluir = colabs_para_excluir_perm
+                        changes_made = True
+
+                    if not alterados_df.empty:
+                        alterados_df['setor_id'] = alterados_df['nome_setor'].map(setores_dict)
+                        alterados_df['codigo'] = alterados_df['codigo'].astype(str)
+                        resultado = salvar_alteracoes(
+                            "colaboradores",
+                            {"codigo": "TEXT", "nome_completo": "TEXT", "cpf": "TEXT", "gmail": "TEXT", "setor_id": "BIGINT", "status": "TEXT"},
+                            alterados_df, validar=validar_alteracoes_colaboradores, conn=get_db_connection()
+                        )
+                        if resultado['atualizados']:
+                            st.toast(f"{resultado['atualizados']} colaborador(es) atualizado(s)!", icon="✅")
                             changes_made = True
+                        erros.extend(resultado['erros'].values())
+                except Exception as e:
+                    erros.append(f"Erro ao salvar as alterações dos colaboradores: {e}")
 
+                for mensagem in erros:
+                    st.error(mensagem)
                 if changes_made:
-                    st.cache_data.clear()
+                    invalidar_tabelas("colaboradores")
                     del st.session_state[session_state_key]
-                    st.rerun()
-                else:
+                    if not erros:
+                        st.rerun()
+                elif not erros:
                     st.info("Nenhuma alteração foi detetada.")
 
     elif option == "Log de Excluídos":
@@ -566,4 +532,4 @@ except Exception as e:
     st.error(f"Ocorreu um erro ao carregar a página de colaboradores: {e}")
     st.info("Verifique se o banco de dados está a funcionar corretamente.")
 
-
+concluir_perfil()
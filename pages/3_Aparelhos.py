@@ -4,6 +4,14 @@ from datetime import date, datetime
 from auth import show_login_form  # Assuming auth.py contains show_login_form
 from sqlalchemy import text
 import numpy as np
+from posse_utils import inserir_movimentacao
+from alteracoes_utils import calcular_alteracoes, salvar_alteracoes, duplicados_no_lote
+from inventario_utils import ORDENACOES_INVENTARIO, TAMANHOS_PAGINA, LIMITE_CONTAGEM, carregar_pagina_inventario, estimar_total_inventario
+from db_utils import get_db_connection
+from perfil_utils import iniciar_perfil, concluir_perfil
+from pesquisa_utils import caixa_pesquisa
+from cache_utils import invalidar_tabelas
+from referencias_utils import mapa_ids
 
 # --- Verificação de Autenticação ---
 if 'logged_in' not in st.session_state or not st.session_state['logged_in']:
@@ -71,25 +79,9 @@ with st.sidebar:
         from auth import logout # Import logout here if not already imported globally
         logout()
     st.markdown("---")
+    iniciar_perfil()
 
 # --- Funções de Banco de Dados ---
-def get_db_connection():
-    """Retorna uma conexão ao banco de dados Supabase."""
-    return st.connection("supabase", type="sql")
-
-@st.cache_data(ttl=30)
-def carregar_dados_para_selects():
-    conn = get_db_connection()
-    modelos_df = conn.query("""
-        SELECT m.id, ma.nome_marca || ' - ' || m.nome_modelo as modelo_completo 
-        FROM modelos m 
-        JOIN marcas ma ON m.marca_id = ma.id 
-        ORDER BY modelo_completo;
-    """)
-    status_df = conn.query("SELECT id, nome_status FROM status ORDER BY nome_status;")
-    setores_df = conn.query("SELECT id, nome_setor FROM setores ORDER BY nome_setor;")
-    return modelos_df.to_dict('records'), status_df.to_dict('records'), setores_df.to_dict('records')
-
 def adicionar_aparelho_e_historico(serie, imei1, imei2, valor, modelo_id, status_id):
     conn = get_db_connection()
     try:
@@ -113,14 +105,10 @@ def adicionar_aparelho_e_historico(serie, imei1, imei2, valor, modelo_id, status
             })
             aparelho_id = result.scalar_one()
 
-            query_insert_historico = text("""
-                INSERT INTO historico_movimentacoes (data_movimentacao, aparelho_id, status_id, localizacao_atual, observacoes) 
-                VALUES (:data, :ap_id, :stat_id, :loc, :obs)
-            """)
-            s.execute(query_insert_historico, {
-                "data": datetime.now(), "ap_id": aparelho_id, "stat_id": status_id,
-                "loc": "Estoque Interno", "obs": "Entrada inicial no sistema."
-            })
+            inserir_movimentacao(
+                s, aparelho_id, status_id, datetime.now(),
+                localizacao="Estoque Interno", observacoes="Entrada inicial no sistema."
+            )
             
             s.commit()
             st.success(f"Aparelho N/S '{serie}' cadastrado com sucesso!")
@@ -129,133 +117,40 @@ def adicionar_aparelho_e_historico(serie, imei1, imei2, valor, modelo_id, status
         st.error(f"Ocorreu um erro: {e}")
         return False
 
-@st.cache_data(ttl=30)
-def carregar_inventario_completo(order_by, status_id=None, modelo_id=None, setor_id=None, responsavel_search=None, ns_search=None):
-    """Carrega o inventário com filtros avançados e lógica de responsável corrigida."""
-    conn = get_db_connection()
-    
-    params = {}
-    where_clauses = []
-
-    if status_id:
-        where_clauses.append("a.status_id = :status_id")
-        params["status_id"] = status_id
-    if modelo_id:
-        where_clauses.append("a.modelo_id = :modelo_id")
-        params["modelo_id"] = modelo_id
-    if setor_id:
-        # Se filtrar por setor, implicitamente busca apenas aparelhos 'Em uso' naquele setor
-        where_clauses.append("c.setor_id = :setor_id AND s.nome_status = 'Em uso'")
-        params["setor_id"] = setor_id
-    
-    # --- ALTERAÇÃO AQUI: Filtro específico para N/S ou IMEI ---
-    if ns_search:
-        where_clauses.append("(a.numero_serie ILIKE :ns_search OR a.imei1 ILIKE :ns_search OR a.imei2 ILIKE :ns_search)")
-        params["ns_search"] = f"%{ns_search}%"
-        
-    # Filtro específico para Responsável (Código ou Nome)
-    if responsavel_search:
-        where_clauses.append("""
-            (s.nome_status = 'Em uso' AND 
-             (c.codigo ILIKE :responsavel_search OR COALESCE(ur.colaborador_snapshot, c.nome_completo) ILIKE :responsavel_search))
-        """)
-        params["responsavel_search"] = f"%{responsavel_search}%"
+def validar_alteracoes_aparelhos(s, alterados_df, ids_excluidos):
+    """Validação em lote: N/S repetidos e exclusão de aparelhos com histórico. Devolve {id: mensagem}."""
+    erros = {}
+    mensagem_serie = "Erro: O Número de Série '{}' já pertence a outro aparelho."
+    if not alterados_df.empty:
+        for aparelho_id in duplicados_no_lote(alterados_df, 'numero_serie'):
+            serie = alterados_df.loc[alterados_df['id'] == aparelho_id, 'numero_serie'].iloc[0]
+            erros[int(aparelho_id)] = mensagem_serie.format(serie)
 
-    where_sql = ""
-    if where_clauses:
-        where_sql = "WHERE " + " AND ".join(where_clauses)
-
-    query = f"""
-        WITH UltimoResponsavel AS (
-            SELECT
-                h.aparelho_id,
-                h.colaborador_id,
-                h.colaborador_snapshot,
-                ROW_NUMBER() OVER(PARTITION BY h.aparelho_id ORDER BY h.data_movimentacao DESC) as rn
-            FROM historico_movimentacoes h
-        )
-        SELECT 
-            a.id,
-            a.numero_serie,
-            ma.nome_marca || ' - ' || mo.nome_modelo as modelo_completo,
-            s.nome_status,
-            CASE 
-                WHEN s.nome_status = 'Em uso' THEN c.codigo || ' - ' || COALESCE(ur.colaborador_snapshot, c.nome_completo)
-                ELSE NULL 
-            END as responsavel_atual,
-            CASE 
-                WHEN s.nome_status = 'Em uso' THEN setor.nome_setor
-                ELSE NULL
-            END as setor_atual,
-            a.valor,
-            a.imei1,
-            a.imei2,
-            a.data_cadastro
-        FROM aparelhos a
-        LEFT JOIN modelos mo ON a.modelo_id = mo.id
-        LEFT JOIN marcas ma ON mo.marca_id = ma.id
-        LEFT JOIN status s ON a.status_id = s.id
-        LEFT JOIN UltimoResponsavel ur ON a.id = ur.aparelho_id AND ur.rn = 1
-        LEFT JOIN colaboradores c ON ur.colaborador_id = c.id
-        LEFT JOIN setores setor ON c.setor_id = setor.id
-        {where_sql}
-        ORDER BY {order_by}
-    """
-    df = conn.query(query, params=params)
-    
-    # Preenche Nulos para exibição
-    for col in ['responsavel_atual', 'setor_atual', 'imei1', 'imei2', 'numero_serie', 'modelo_completo', 'nome_status']:
-        if col in df.columns:
-            df[col] = df[col].fillna('')
-    if 'valor' in df.columns:
-        df['valor'] = pd.to_numeric(df['valor'].fillna(0))
-    return df
-
-def atualizar_aparelho_completo(aparelho_id, serie, imei1, imei2, valor, modelo_id):
-    try:
-        conn = get_db_connection()
-        with conn.session as s:
-            query = text("""
-                UPDATE aparelhos SET numero_serie = :serie, imei1 = :imei1, imei2 = :imei2, 
-                valor = :valor, modelo_id = :modelo_id WHERE id = :id
-            """)
-            s.execute(query, {
-                "serie": serie, "imei1": imei1, "imei2": imei2, 
-                "valor": float(valor), "modelo_id": modelo_id, "id": aparelho_id
-            })
-            s.commit()
-        return True
-    except Exception as e:
-        if 'unique constraint' in str(e).lower():
-            st.error(f"Erro: O Número de Série '{serie}' já pertence a outro aparelho.")
-        else:
-            st.error(f"Erro ao atualizar o aparelho ID {aparelho_id}: {e}")
-        return False
+        ids_lote = [int(i) for i in alterados_df['id']] + list(ids_excluidos)
+        series_em_uso = s.execute(text("""
+            SELECT numero_serie FROM aparelhos WHERE numero_serie = ANY(:series) AND id <> ALL(:ids)
+        """), {"series": alterados_df['numero_serie'].astype(str).tolist(), "ids": ids_lote}).scalars().all()
+        for row in alterados_df[alterados_df['numero_serie'].isin(series_em_uso)].itertuples():
+            erros[int(row.id)] = mensagem_serie.format(row.numero_serie)
 
-def excluir_aparelho(aparelho_id):
-    try:
-        conn = get_db_connection()
-        with conn.session as s:
-            query = text("DELETE FROM aparelhos WHERE id = :id")
-            s.execute(query, {"id": aparelho_id})
-            s.commit()
-        return True
-    except Exception as e:
-        if 'foreign key constraint' in str(e).lower():
-            st.error(f"Erro: Não é possível excluir o aparelho ID {aparelho_id}, pois ele possui um histórico de movimentações ou manutenções.")
-        else:
-            st.error(f"Erro ao excluir o aparelho ID {aparelho_id}: {e}")
-        return False
+    if ids_excluidos:
+        com_historico = s.execute(text("""
+            SELECT aparelho_id FROM historico_movimentacoes WHERE aparelho_id = ANY(:ids)
+            UNION
+            SELECT aparelho_id FROM manutencoes WHERE aparelho_id = ANY(:ids)
+        """), {"ids": list(ids_excluidos)}).scalars().all()
+        for aparelho_id in com_historico:
+            erros[aparelho_id] = f"Erro: Não é possível excluir o aparelho ID {aparelho_id}, pois ele possui um histórico de movimentações ou manutenções."
+    return erros
 
 # --- UI ---
 st.title("Gestão de Aparelhos")
 st.markdown("---")
 
 try:
-    modelos_list, status_list, setores_list = carregar_dados_para_selects()
-    modelos_dict = {m['modelo_completo']: m['id'] for m in modelos_list}
-    status_dict = {s['nome_status']: s['id'] for s in status_list}
-    setores_dict = {s['nome_setor']: s['id'] for s in setores_list}
+    modelos_dict = mapa_ids("modelos")
+    status_dict = mapa_ids("status")
+    setores_dict = mapa_ids("setores")
     
     option = st.radio(
         "Selecione a operação:",
@@ -288,7 +183,7 @@ try:
                     modelo_id = modelos_dict[modelo_selecionado_str]
                     status_id = status_dict[status_selecionado_str]
                     if adicionar_aparelho_e_historico(novo_serie, novo_imei1, novo_imei2, novo_valor, modelo_id, status_id):
-                        st.cache_data.clear()
+                        invalidar_tabelas("aparelhos", "historico_movimentacoes")
                         for key in list(st.session_state.keys()):
                             if key.startswith('original_aparelhos_df_'):
                                 del st.session_state[key]
@@ -309,36 +204,59 @@ try:
         filter_cols2 = st.columns(2)
         with filter_cols2[0]:
             # --- ALTERAÇÃO AQUI: Label atualizado ---
-            ns_pesquisa = st.text_input("Pesquisar por N/S ou IMEI:", placeholder="Digite N/S ou IMEI...", key="ns_filter")
+            ns_pesquisa = caixa_pesquisa("aparelhos", "Pesquisar por N/S ou IMEI:", placeholder="Digite N/S ou IMEI...", key="ns_filter")
         with filter_cols2[1]:
-            responsavel_pesquisa = st.text_input("Pesquisar por Responsável (Código ou Nome):", placeholder="Digite código ou nome...", key="responsavel_filter")
+            responsavel_pesquisa = caixa_pesquisa("colaboradores", "Pesquisar por Responsável (Código ou Nome):", placeholder="Digite código ou nome...", key="responsavel_filter")
 
         status_id_filtro = status_dict.get(status_filtro_nome) if status_filtro_nome != "Todos" else None
         modelo_id_filtro = modelos_dict.get(modelo_filtro_nome) if modelo_filtro_nome != "Todos" else None
         setor_id_filtro = setores_dict.get(setor_filtro_nome) if setor_filtro_nome != "Todos" else None
         
-        # --- ORDENAÇÃO ---
-        sort_options = {
-            "Data de Entrada (Mais Recente)": "a.data_cadastro DESC",
-            "Número de Série (A-Z)": "a.numero_serie ASC",
-            "Modelo (A-Z)": "modelo_completo ASC",
-            "Status (A-Z)": "s.nome_status ASC",
-            "Responsável (A-Z)": "responsavel_atual ASC",
-            "Setor (A-Z)": "setor_atual ASC"
+        # --- ORDENAÇÃO E PAGINAÇÃO ---
+        sort_cols = st.columns([3, 1])
+        with sort_cols[0]:
+            sort_selection = st.selectbox("Organizar por:", options=ORDENACOES_INVENTARIO.keys(), key="sort_selection")
+        with sort_cols[1]:
+            tamanho_pagina = st.selectbox("Itens por página:", TAMANHOS_PAGINA, index=1, key="inventario_tamanho_pagina")
+
+        filtros = {
+            "status_id": status_id_filtro, "modelo_id": modelo_id_filtro, "setor_id": setor_id_filtro,
+            "responsavel_search": responsavel_pesquisa, "ns_search": ns_pesquisa
         }
-        sort_selection = st.selectbox("Organizar por:", options=sort_options.keys(), key="sort_selection")
 
-        inventario_df = carregar_inventario_completo(
-            order_by=sort_options[sort_selection],
-            status_id=status_id_filtro,
-            modelo_id=modelo_id_filtro,
-            setor_id=setor_id_filtro,
-            responsavel_search=responsavel_pesquisa,
-            ns_search=ns_pesquisa
+        # A pilha de cursores guarda o início de cada página visitada; volta à primeira página
+        # sempre que os filtros, a ordenação ou o tamanho da página mudam.
+        assinatura_consulta = (sort_selection, tamanho_pagina, tuple(sorted(filtros.items())))
+        if st.session_state.get('inventario_assinatura') != assinatura_consulta:
+            st.session_state.inventario_assinatura = assinatura_consulta
+            st.session_state.inventario_cursores = [None]
+        cursores = st.session_state.inventario_cursores
+        pagina_atual = len(cursores)
+
+        inventario_df, proximo_cursor = carregar_pagina_inventario(
+            sort_selection, cursor=cursores[-1], tamanho_pagina=tamanho_pagina, **filtros
         )
-        
-        # Chave única para o session state baseada nos filtros e ordenação
-        session_state_key = f"original_aparelhos_df_{sort_selection}_{status_filtro_nome}_{modelo_filtro_nome}_{setor_filtro_nome}_{ns_pesquisa}_{responsavel_pesquisa}"
+        total_estimado, total_exato = estimar_total_inventario(**filtros)
+        total_paginas = max(1, -(-total_estimado // tamanho_pagina))
+
+        total_texto = f"{total_estimado:,}".replace(",", ".")
+        if not total_exato:
+            total_texto = f"{total_texto}+" if total_estimado == LIMITE_CONTAGEM else f"~{total_texto}"
+        nav_cols = st.columns([1, 2, 1])
+        if nav_cols[0].button("⬅️ Anterior", use_container_width=True, disabled=pagina_atual == 1, key="inventario_pagina_anterior"):
+            cursores.pop()
+            st.rerun()
+        nav_cols[1].markdown(
+            f"<div style='text-align: center;'>Página {pagina_atual} de {'~' if not total_exato else ''}{total_paginas} · {total_texto} aparelhos</div>",
+            unsafe_allow_html=True
+        )
+        if nav_cols[2].button("Próxima ➡️", use_container_width=True, disabled=proximo_cursor is None, key="inventario_pagina_proxima"):
+            cursores.append(proximo_cursor)
+            st.rerun()
+
+        # Chave única para o session state baseada nos filtros, ordenação e página. Só as linhas
+        # da página visível são comparadas e gravadas ao salvar.
+        session_state_key = f"original_aparelhos_df_{hash(assinatura_consulta)}_{cursores[-1]}"
         if session_state_key not in st.session_state:
             # Limpa chaves antigas para evitar acumulação
             for key in list(st.session_state.keys()):
@@ -368,42 +286,39 @@ try:
         
         if st.button("Salvar Alterações", use_container_width=True, key="save_aparelhos_changes"):
             original_df = st.session_state[session_state_key]
-            changes_made = False
-
-            deleted_ids = set(original_df['id']) - set(edited_df['id'])
-            for aparelho_id in deleted_ids:
-                if excluir_aparelho(aparelho_id):
-                    st.toast(f"Aparelho ID {aparelho_id} excluído!", icon="🗑️")
-                    changes_made = True
+            ids_excluidos, alterados_df = calcular_alteracoes(
+                original_df, edited_df, ['numero_serie', 'modelo_completo', 'valor', 'imei1', 'imei2']
+            )
 
-            original_df_indexed = original_df.set_index('id')
-            edited_df_indexed = edited_df.set_index('id')
-            common_ids = original_df_indexed.index.intersection(edited_df_indexed.index)
-            
-            for aparelho_id in common_ids:
-                original_row = original_df_indexed.loc[aparelho_id]
-                edited_row = edited_df_indexed.loc[aparelho_id]
-                
-                # Compara colunas editáveis
-                cols_to_compare = ['numero_serie', 'modelo_completo', 'valor', 'imei1', 'imei2']
-                if not original_row[cols_to_compare].equals(edited_row[cols_to_compare]):
-                    novo_modelo_id = modelos_dict[edited_row['modelo_completo']]
-                    
-                    if atualizar_aparelho_completo(
-                        aparelho_id, edited_row['numero_serie'], edited_row['imei1'], 
-                        edited_row['imei2'], edited_row['valor'], novo_modelo_id
-                    ):
-                        st.toast(f"Aparelho N/S '{edited_row['numero_serie']}' atualizado!", icon="✅")
-                        changes_made = True
-            
-            if changes_made:
-                st.cache_data.clear()
-                del st.session_state[session_state_key]
-                st.rerun()
-            else:
+            if not ids_excluidos and alterados_df.empty:
                 st.info("Nenhuma alteração foi detetada.")
+            else:
+                alterados_df['modelo_id'] = alterados_df['modelo_completo'].map(modelos_dict)
+                alterados_df['valor'] = pd.to_numeric(alterados_df['valor']).fillna(0)
+                try:
+                    resultado = salvar_alteracoes(
+                        "aparelhos",
+                        {"numero_serie": "TEXT", "imei1": "TEXT", "imei2": "TEXT", "valor": "NUMERIC", "modelo_id": "BIGINT"},
+                        alterados_df, ids_excluidos, validar=validar_alteracoes_aparelhos, conn=get_db_connection()
+                    )
+                except Exception as e:
+                    st.error(f"Erro ao salvar as alterações dos aparelhos: {e}")
+                else:
+                    if resultado['excluidos']:
+                        st.toast(f"{resultado['excluidos']} aparelho(s) excluído(s)!", icon="🗑️")
+                    if resultado['atualizados']:
+                        st.toast(f"{resultado['atualizados']} aparelho(s) atualizado(s)!", icon="✅")
+                    for mensagem in resultado['erros'].values():
+                        st.error(mensagem)
+
+                    if resultado['excluidos'] or resultado['atualizados']:
+                        invalidar_tabelas("aparelhos", "historico_movimentacoes", "manutencoes")
+                        del st.session_state[session_state_key]
+                        if not resultado['erros']:
+                            st.rerun()
 
 except Exception as e:
     st.error(f"Ocorreu um erro ao carregar a página de aparelhos: {e}")
     st.info("Verifique se o banco de dados está a funcionar corretamente.")
 
+concluir_perfil()
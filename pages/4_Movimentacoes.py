@@ -4,6 +4,12 @@ from datetime import datetime, date
 from auth import show_login_form, logout
 from sqlalchemy import text
 from sqlalchemy.engine.base import Connection
+from posse_utils import inserir_movimentacao
+from db_utils import consultar, get_db_connection
+from perfil_utils import iniciar_perfil, concluir_perfil
+from pesquisa_utils import seletor_registo, detalhes_registo
+from cache_utils import cache_tabelas, invalidar_tabelas
+from referencias_utils import mapa_ids
 
 # --- Verificação de Autenticação ---
 if 'logged_in' not in st.session_state or not st.session_state['logged_in']:
@@ -68,11 +74,9 @@ with st.sidebar:
     if st.button("Logout", key="mov_logout"):
         logout()
     st.markdown("---")
+    iniciar_perfil()
 
 # --- Funções do DB ---
-def get_db_connection():
-    return st.connection("supabase", type="sql")
-
 # --- FUNÇÃO DE VALIDAÇÃO APRIMORADA (O "Guarda de Trânsito") ---
 def validar_movimentacao(conn: Connection, aparelho_id: int, novo_status_nome: str):
     """
@@ -87,7 +91,7 @@ def validar_movimentacao(conn: Connection, aparelho_id: int, novo_status_nome: s
             JOIN status s ON a.status_id = s.id
             WHERE a.id = :ap_id
         """
-        resultado = conn.query(query_str, params={"ap_id": aparelho_id})
+        resultado = consultar(query_str, params={"ap_id": aparelho_id}, conn=conn)
         
         if resultado.empty:
             return False, f"Erro: Aparelho com ID {aparelho_id} não encontrado."
@@ -119,23 +123,6 @@ def validar_movimentacao(conn: Connection, aparelho_id: int, novo_status_nome: s
         return False, "Erro de sistema ao validar o aparelho."
 
 
-@st.cache_data(ttl=30)
-def carregar_dados_para_selects():
-    """Carrega aparelhos, colaboradores ATIVOS e status para as caixas de seleção."""
-    conn = get_db_connection()
-    aparelhos_df = conn.query(f"""
-        SELECT a.id, a.numero_serie, mo.nome_modelo, ma.nome_marca, s.nome_status
-        FROM aparelhos a
-        JOIN modelos mo ON a.modelo_id = mo.id
-        JOIN marcas ma ON mo.marca_id = ma.id
-        JOIN status s ON a.status_id = s.id
-        WHERE s.nome_status != '{STATUS_BAIXADO}'
-        ORDER BY ma.nome_marca, mo.nome_modelo, a.numero_serie
-    """)
-    colaboradores_df = conn.query("SELECT id, nome_completo FROM colaboradores WHERE status = 'Ativo' ORDER BY nome_completo")
-    status_df = conn.query("SELECT id, nome_status FROM status ORDER BY nome_status")
-    return aparelhos_df.to_dict('records'), colaboradores_df.to_dict('records'), status_df.to_dict('records')
-
 def registar_movimentacao(aparelho_id, colaborador_id, colaborador_nome, novo_status_id, novo_status_nome, localizacao, observacoes):
     conn = get_db_connection()
     try:
@@ -156,14 +143,10 @@ def registar_movimentacao(aparelho_id, colaborador_id, colaborador_nome, novo_st
                     id_colaborador_final = ultimo_colaborador[0]
                     nome_colaborador_snapshot = ultimo_colaborador[1]
 
-            query_hist = text("""
-                INSERT INTO historico_movimentacoes (data_movimentacao, aparelho_id, colaborador_id, status_id, localizacao_atual, observacoes, colaborador_snapshot) 
-                VALUES (:data, :ap_id, :col_id, :status_id, :loc, :obs, :col_snap)
-            """)
-            s.execute(query_hist, {
-                "data": datetime.now(), "ap_id": aparelho_id, "col_id": id_colaborador_final, "status_id": novo_status_id,
-                "loc": localizacao, "obs": observacoes, "col_snap": nome_colaborador_snapshot
-            })
+            inserir_movimentacao(
+                s, aparelho_id, novo_status_id, datetime.now(), colaborador_id=id_colaborador_final,
+                colaborador_snapshot=nome_colaborador_snapshot, localizacao=localizacao, observacoes=observacoes
+            )
 
             s.execute(text("UPDATE aparelhos SET status_id = :status_id WHERE id = :ap_id"), 
                       {"status_id": novo_status_id, "ap_id": aparelho_id})
@@ -187,10 +170,9 @@ def registar_movimentacao(aparelho_id, colaborador_id, colaborador_nome, novo_st
         st.error(f"Ocorreu um erro ao registar a movimentação: {e}")
         return False
 
-@st.cache_data(ttl=30)
+@cache_tabelas("historico_movimentacoes", "aparelhos", "status", "modelos", ttl=30)
 def carregar_historico_completo(status_filter=None, start_date=None, end_date=None, search_term=None):
     # ... (código da função sem alterações)
-    conn = get_db_connection()
     query = """
         SELECT 
             h.id, h.data_movimentacao, a.numero_serie, mo.nome_modelo,
@@ -220,7 +202,7 @@ def carregar_historico_completo(status_filter=None, start_date=None, end_date=No
     if where_clauses:
         query += " WHERE " + " AND ".join(where_clauses)
     query += " ORDER BY h.data_movimentacao DESC"
-    df = conn.query(query, params=params)
+    df = consultar(query, params=params)
     return df
 
 # --- UI ---
@@ -228,7 +210,7 @@ st.title("Gestão de Movimentações")
 st.markdown("---")
 
 try:
-    aparelhos_list, colaboradores_list, status_list = carregar_dados_para_selects()
+    status_dict = mapa_ids("status")  # aparelhos e colaboradores são pesquisados com seletor_registo
 
     option = st.radio(
         "Selecione a operação:",
@@ -240,30 +222,24 @@ try:
     st.markdown("---")
 
     if option == "Registar Nova Movimentação":
+        st.subheader("Formulário de Movimentação")
+        # Os seletores ficam fora do formulário, pois pesquisam no servidor enquanto se escreve.
+        aparelho_id = seletor_registo("aparelhos_movimentacao", "Selecione o Aparelho* (N/S ou IMEI)", key="mov_aparelho")
+        colaborador_id = seletor_registo("colaboradores_ativos", "Atribuir ao Colaborador (vazio = Nenhum)", key="mov_colaborador")
+
         with st.form("form_movimentacao", clear_on_submit=False):
-            st.subheader("Formulário de Movimentação")
-            aparelhos_dict = {f"{ap['nome_marca']} {ap['nome_modelo']} (S/N: {ap['numero_serie']}) — Status: {ap['nome_status']}": ap['id'] for ap in aparelhos_list}
-            aparelho_selecionado_str = st.selectbox("Selecione o Aparelho*", options=aparelhos_dict.keys(), index=None, placeholder="Selecione...")
-            
-            colaboradores_dict = {col['nome_completo']: col['id'] for col in colaboradores_list}
-            opcoes_colaborador_com_nenhum = {"Nenhum": None}
-            opcoes_colaborador_com_nenhum.update(colaboradores_dict)
-            
-            colaborador_selecionado_str = st.selectbox("Atribuir ao Colaborador", options=opcoes_colaborador_com_nenhum.keys(), index=0)
-            
-            status_dict = {s['nome_status']: s['id'] for s in status_list}
             novo_status_str = st.selectbox("Novo Status do Aparelho*", options=status_dict.keys(), placeholder="Selecione...", index=None)
             nova_localizacao = st.text_input("Nova Localização", placeholder="Ex: Mesa do colaborador, Assistência Técnica XYZ")
             observacoes = st.text_area("Observações", placeholder="Ex: Devolução com tela trincada, Envio para troca de bateria.")
 
             submitted = st.form_submit_button("Registar Movimentação", use_container_width=True, type="primary")
             if submitted:
-                if not aparelho_selecionado_str or not novo_status_str:
+                if not aparelho_id or not novo_status_str:
                     st.error("Aparelho e Novo Status são campos obrigatórios.")
                 else:
-                    aparelho_id = aparelhos_dict[aparelho_selecionado_str]
-                    colaborador_id = opcoes_colaborador_com_nenhum[colaborador_selecionado_str]
-                    colaborador_nome = colaborador_selecionado_str if colaborador_selecionado_str != "Nenhum" else None
+                    colaborador = detalhes_registo("colaboradores_ativos", colaborador_id) if colaborador_id else None
+                    colaborador_id = colaborador['id'] if colaborador else None
+                    colaborador_nome = colaborador['nome_completo'] if colaborador else None
                     novo_status_id = status_dict[novo_status_str]
 
                     # --- MELHORIA 1: LÓGICA DE NEGÓCIO REFORÇADA (O "FORMULÁRIO INTELIGENTE") ---
@@ -283,7 +259,7 @@ try:
                             st.error(msg)
                         else:
                              if registar_movimentacao(aparelho_id, colaborador_id, colaborador_nome, novo_status_id, novo_status_str, nova_localizacao, observacoes):
-                                st.cache_data.clear()
+                                invalidar_tabelas("aparelhos", "historico_movimentacoes", "manutencoes")
                                 st.rerun()
 
                     # Se as regras acima passaram, executa a validação e o registro
@@ -295,7 +271,7 @@ try:
                             st.error(mensagem_validacao)
                         else:
                             if registar_movimentacao(aparelho_id, colaborador_id, colaborador_nome, novo_status_id, novo_status_str, nova_localizacao, observacoes):
-                                st.cache_data.clear()
+                                invalidar_tabelas("aparelhos", "historico_movimentacoes", "manutencoes")
                                 st.rerun()
 
     elif option == "Consultar Histórico":
@@ -304,7 +280,7 @@ try:
         col_filtro1, col_filtro2 = st.columns(2)
         with col_filtro1:
             search_term = st.text_input("Pesquisar por N/S, Modelo, Colaborador ou Obs:")
-            status_options = ["Todos"] + [s['nome_status'] for s in status_list]
+            status_options = ["Todos"] + list(status_dict.keys())
             status_filtro = st.selectbox("Filtrar por Status:", status_options)
         with col_filtro2:
             data_inicio = st.date_input("Período de:", value=None, format="DD/MM/YYYY")
@@ -322,3 +298,4 @@ except Exception as e:
     st.error(f"Ocorreu um erro ao carregar a página: {e}")
     st.info("Verifique se o banco de dados está a funcionar corretamente.")
 
+concluir_perfil()
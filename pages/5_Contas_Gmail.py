@@ -4,6 +4,12 @@ import re
 from auth import show_login_form, logout
 from sqlalchemy import text
 import numpy as np
+from alteracoes_utils import calcular_alteracoes, salvar_alteracoes
+from db_utils import consultar, get_db_connection
+from perfil_utils import iniciar_perfil, concluir_perfil
+from pesquisa_utils import caixa_pesquisa
+from cache_utils import cache_tabelas, invalidar_tabelas
+from referencias_utils import mapa_ids
 
 # --- Autenticação ---
 if 'logged_in' not in st.session_state or not st.session_state['logged_in']:
@@ -70,23 +76,19 @@ with st.sidebar:
     if st.button("Logout", key="gmail_logout"):
         logout()
     st.markdown("---")
+    iniciar_perfil()
 
 # --- Funções do Banco de Dados ---
-def get_db_connection():
-    return st.connection("supabase", type="sql")
-
 def validar_formato_gmail(email):
     if not email: return False
     padrao = r'^[a-zA-Z0-9._%+-]+@gmail\.com$'
     return re.match(padrao, email) is not None
 
-@st.cache_data(ttl=30)
-def carregar_setores_e_colaboradores_ativos():
-    conn = get_db_connection()
-    setores_df = conn.query("SELECT id, nome_setor FROM setores ORDER BY nome_setor;")
+@cache_tabelas("colaboradores", ttl=30)
+def carregar_colaboradores_ativos():
     # --- MUDANÇA AQUI: Carrega apenas colaboradores ativos ---
-    colaboradores_df = conn.query("SELECT id, nome_completo FROM colaboradores WHERE status = 'Ativo' ORDER BY nome_completo;")
-    return setores_df.to_dict('records'), colaboradores_df.to_dict('records')
+    colaboradores_df = consultar("SELECT id, nome_completo FROM colaboradores WHERE status = 'Ativo' ORDER BY nome_completo;")
+    return colaboradores_df.to_dict('records')
 
 def adicionar_conta(email, senha, tel_rec, email_rec, setor_id, col_id):
     if not email:
@@ -121,9 +123,8 @@ def adicionar_conta(email, senha, tel_rec, email_rec, setor_id, col_id):
             st.error(f"Ocorreu um erro: {e}")
         return False
 
-@st.cache_data(ttl=30)
+@cache_tabelas("contas_gmail", "setores", "colaboradores", ttl=30)
 def carregar_contas(order_by="cg.email ASC", search_term=None, setor_id=None):
-    conn = get_db_connection()
     params = {}
     where_clauses = []
     if setor_id:
@@ -146,51 +147,19 @@ def carregar_contas(order_by="cg.email ASC", search_term=None, setor_id=None):
         {where_sql}
         ORDER BY {order_by}
     """
-    df = conn.query(query, params=params)
+    df = consultar(query, params=params)
     for col in ['senha', 'telefone_recuperacao', 'email_recuperacao', 'nome_setor', 'colaborador']:
         if col in df.columns:
             df[col] = df[col].fillna('')
     return df
 
-def atualizar_conta(conta_id, senha, tel_rec, email_rec, setor_id, col_id):
-    try:
-        conn = get_db_connection()
-        with conn.session as s:
-            query = text("""
-                UPDATE contas_gmail 
-                SET senha = :senha, telefone_recuperacao = :tel_rec, email_recuperacao = :email_rec, 
-                    setor_id = :setor_id, colaborador_id = :col_id 
-                WHERE id = :id
-            """)
-            s.execute(query, {
-                "senha": senha, "tel_rec": tel_rec, "email_rec": email_rec,
-                "setor_id": setor_id, "col_id": col_id, "id": conta_id
-            })
-            s.commit()
-        return True
-    except Exception as e:
-        st.error(f"Erro ao atualizar a conta ID {conta_id}: {e}")
-        return False
-
-def excluir_conta(conta_id):
-    try:
-        conn = get_db_connection()
-        with conn.session as s:
-            query = text("DELETE FROM contas_gmail WHERE id = :id")
-            s.execute(query, {"id": conta_id})
-            s.commit()
-        return True
-    except Exception as e:
-        st.error(f"Erro ao excluir a conta ID {conta_id}: {e}")
-        return False
-
 # --- UI ---
 st.title("Gestão de Contas Gmail")
 st.markdown("---")
 
 try:
-    setores_list, colaboradores_list = carregar_setores_e_colaboradores_ativos()
-    setores_dict = {s['nome_setor']: s['id'] for s in setores_list}
+    colaboradores_list = carregar_colaboradores_ativos()
+    setores_dict = mapa_ids("setores")
     colaboradores_dict = {"Nenhum": None}
     colaboradores_dict.update({c['nome_completo']: c['id'] for c in colaboradores_list})
 
@@ -219,7 +188,7 @@ try:
                     setor_id = setores_dict.get(setor_sel)
                     col_id = colaboradores_dict.get(col_sel)
                     if adicionar_conta(email, senha, tel_rec, email_rec, setor_id, col_id):
-                        st.cache_data.clear()
+                        invalidar_tabelas("contas_gmail")
                         for key in list(st.session_state.keys()):
                             if key.startswith('original_contas_df_'):
                                 del st.session_state[key]
@@ -234,7 +203,7 @@ try:
         with col_filtro1:
             setor_filtro_nome = st.selectbox("Filtrar por Setor:", ["Todos"] + list(setores_dict.keys()))
         with col_filtro2:
-            termo_pesquisa = st.text_input("Pesquisar por E-mail ou Colaborador:")
+            termo_pesquisa = caixa_pesquisa("contas_gmail", "Pesquisar por E-mail ou Colaborador:", key="contas_pesquisa")
 
         setor_id_filtro = None
         if setor_filtro_nome != "Todos":
@@ -283,38 +252,33 @@ try:
 
         if st.button("Salvar Alterações", use_container_width=True, key="save_contas_changes"):
             original_df = st.session_state[session_state_key]
-            changes_made = False
-
-            deleted_ids = set(original_df['id']) - set(edited_df['id'])
-            for conta_id in deleted_ids:
-                if excluir_conta(conta_id):
-                    st.toast(f"Conta ID {conta_id} excluída!", icon="🗑️")
-                    changes_made = True
-
-            original_df_indexed = original_df.set_index('id')
-            edited_df_indexed = edited_df.set_index('id')
-            common_ids = original_df_indexed.index.intersection(edited_df_indexed.index)
-            
-            for conta_id in common_ids:
-                original_row = original_df_indexed.loc[conta_id]
-                edited_row = edited_df_indexed.loc[conta_id]
-                if not original_row.equals(edited_row):
-                    novo_setor_id = setores_dict.get(edited_row['nome_setor'])
-                    novo_col_id = colaboradores_dict.get(edited_row['colaborador'])
+            ids_excluidos, alterados_df = calcular_alteracoes(
+                original_df, edited_df, ['senha', 'telefone_recuperacao', 'email_recuperacao', 'nome_setor', 'colaborador']
+            )
 
-                    if atualizar_conta(conta_id, edited_row['senha'], edited_row['telefone_recuperacao'], edited_row['email_recuperacao'], novo_setor_id, novo_col_id):
-                        st.toast(f"Conta '{edited_row['email']}' atualizada!", icon="✅")
-                        changes_made = True
-            
-            if changes_made:
-                st.cache_data.clear()
-                del st.session_state[session_state_key]
-                st.rerun()
-            else:
+            if not ids_excluidos and alterados_df.empty:
                 st.info("Nenhuma alteração foi detetada.")
+            else:
+                alterados_df['setor_id'] = alterados_df['nome_setor'].map(setores_dict)
+                alterados_df['colaborador_id'] = alterados_df['colaborador'].map(colaboradores_dict)
+                try:
+                    resultado = salvar_alteracoes(
+                        "contas_gmail",
+                        {"senha": "TEXT", "telefone_recuperacao": "TEXT", "email_recuperacao": "TEXT", "setor_id": "BIGINT", "colaborador_id": "BIGINT"},
+                        alterados_df, ids_excluidos, conn=get_db_connection()
+                    )
+                    if resultado['excluidos']:
+                        st.toast(f"{resultado['excluidos']} conta(s) excluída(s)!", icon="🗑️")
+                    if resultado['atualizados']:
+                        st.toast(f"{resultado['atualizados']} conta(s) atualizada(s)!", icon="✅")
+                    invalidar_tabelas("contas_gmail")
+                    del st.session_state[session_state_key]
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Erro ao salvar as alterações das contas: {e}")
 
 except Exception as e:
     st.error(f"Ocorreu um erro ao carregar a página de contas: {e}")
     st.info("Verifique se o banco de dados está a funcionar corretamente.")
 
-
+concluir_perfil()
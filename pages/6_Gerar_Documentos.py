@@ -1,10 +1,19 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, date
 from auth import show_login_form, logout
 from sqlalchemy import text
-from weasyprint import HTML, CSS
 import math
+import re
+from documentos_utils import (
+    nome_ficheiro, logo_disponivel, ITENS_CHECKLIST, ESTADOS_CHECKLIST, TIPOS_DOCUMENTO, FORMATOS_LOTE,
+    MODELOS_FOLHA, CONTEUDOS_ETIQUETA,
+)
+from referencias_utils import mapa_ids
+from servico_pdf_utils import submeter_documento, aguardar_documento, ESTADO_CONCLUIDO
+from db_utils import consultar, get_db_connection
+from perfil_utils import iniciar_perfil, concluir_perfil
+from cache_utils import cache_tabelas, invalidar_tabelas
 
 # --- Autenticação ---
 if 'logged_in' not in st.session_state or not st.session_state['logged_in']:
@@ -77,6 +86,7 @@ with st.sidebar:
         from auth import logout
         logout()
     st.markdown("---")
+    iniciar_perfil()
     st.markdown(
         f"""
         <div class="sidebar-footer">
@@ -88,9 +98,6 @@ with st.sidebar:
     )
 
 # --- Funções do DB e Auxiliares ---
-def get_db_connection():
-    return st.connection("supabase", type="sql")
-
 # --- FUNÇÃO DE LOG ---
 def registrar_log(tipo_documento, alvo, detalhes=""):
     """Grava um registo na tabela de logs_documentos."""
@@ -108,13 +115,13 @@ def registrar_log(tipo_documento, alvo, detalhes=""):
                 "detalhes": detalhes
             })
             s.commit()
+        invalidar_tabelas("logs_documentos")
     except Exception as e:
         print(f"Erro ao gravar log: {e}")
 
-@st.cache_data(ttl=5) 
+@cache_tabelas("logs_documentos", ttl=5)
 def carregar_logs_documentos(start_date=None, end_date=None, alvo_search=None, detalhes_search=None):
     """Carrega o histórico de documentos gerados com filtros opcionais."""
-    conn = get_db_connection()
     
     query = """
         SELECT id, data_geracao, tipo_documento, usuario_responsavel, alvo_documento, detalhes
@@ -142,388 +149,137 @@ def carregar_logs_documentos(start_date=None, end_date=None, alvo_search=None, d
 
     query += " ORDER BY data_geracao DESC LIMIT 200;"
     
-    df = conn.query(query, params=params)
+    df = consultar(query, params=params)
     return df
 
-@st.cache_data(ttl=3600)
-def carregar_logo_base64():
-    """Lê a string Base64 da logo a partir de um ficheiro."""
+def pedir_documento(tarefa, argumentos, download, log):
+    """
+    Envia a geração para o serviço de PDF (pool de processos) e guarda o pedido na sessão; o
+    resultado é recolhido no fim da página. `download` tem filename, type e mime; `log` os
+    argumentos de registrar_log, gravado só quando o documento fica pronto.
+    """
     try:
-        with open("logo.b64", "r") as f:
-            return f.read()
-    except FileNotFoundError:
-        st.error("Ficheiro 'logo.b64' não encontrado.")
-        return ""
-
-@st.cache_data(ttl=30)
+        id_trabalho = submeter_documento(tarefa, *argumentos)
+    except Exception as e:
+        st.error(f"Erro ao pedir a geração do documento: {e}")
+        return
+    st.session_state['documento_pendente'] = {"trabalho": id_trabalho, "download": download, "log": log}
+    st.rerun()
+
+def verificar_logo():
+    """A logo dos documentos é lida de logo.b64 pelo documentos_utils; avisa se o ficheiro não existir."""
+    if logo_disponivel():
+        return True
+    st.error("Ficheiro 'logo.b64' não encontrado.")
+    return False
+
+@cache_tabelas("historico_movimentacoes", "aparelhos", "colaboradores", ttl=30)
 def carregar_movimentacoes_entrega():
-    conn = get_db_connection()
     query = """
-        WITH LatestMovements AS (
-            SELECT aparelho_id, MAX(data_movimentacao) as last_move_date
-            FROM historico_movimentacoes
-            GROUP BY aparelho_id
-        )
-        SELECT h.id, h.data_movimentacao, a.numero_serie, c.nome_completo
-        FROM historico_movimentacoes h
-        JOIN LatestMovements lm ON h.aparelho_id = lm.aparelho_id AND h.data_movimentacao = lm.last_move_date
+        SELECT h.movimentacao_id as id, h.data_movimentacao, a.numero_serie, c.nome_completo
+        FROM aparelho_posse_atual h
         JOIN aparelhos a ON h.aparelho_id = a.id
         JOIN status s ON a.status_id = s.id
         LEFT JOIN colaboradores c ON h.colaborador_id = c.id
         WHERE s.nome_status = 'Em uso' AND c.id IS NOT NULL AND c.status = 'Ativo'
         ORDER BY h.data_movimentacao DESC;
     """
-    df = conn.query(query)
+    df = consultar(query)
     return df.to_dict('records')
 
-@st.cache_data(ttl=30)
+@cache_tabelas("historico_movimentacoes", "colaboradores", "setores", "aparelhos", "modelos", "marcas", ttl=30)
 def buscar_dados_completos(mov_id):
-    conn = get_db_connection()
-    query = """
-        SELECT c.nome_completo, c.cpf, s.nome_setor, c.gmail, c.codigo as codigo_colaborador,
-            ma.nome_marca, mo.nome_modelo, a.imei1, a.imei2, a.numero_serie,
-            h.id as protocolo, h.data_movimentacao
-        FROM historico_movimentacoes h
-        JOIN colaboradores c ON h.colaborador_id = c.id
-        JOIN setores s ON c.setor_id = s.id
-        JOIN aparelhos a ON h.aparelho_id = a.id
-        JOIN modelos mo ON a.modelo_id = mo.id
-        JOIN marcas ma ON mo.marca_id = ma.id
-        WHERE h.id = :mov_id;
-    """
-    result_df = conn.query(query, params={"mov_id": mov_id})
+    result_df = consultar(QUERY_DADOS_DOCUMENTO + " WHERE h.id = :mov_id;", params={"mov_id": mov_id})
     return result_df.to_dict('records')[0] if not result_df.empty else None
 
-@st.cache_data(ttl=60)
-def carregar_setores_nomes():
-    conn = get_db_connection()
-    df = conn.query("SELECT nome_setor FROM setores ORDER BY nome_setor;")
-    return df['nome_setor'].tolist()
-
-def gerar_pdf_termo(dados, checklist_data, logo_string):
-    """Gera o PDF do Termo de Responsabilidade (Layout com Checklist em 2 Colunas)."""
-    
-    data_mov = dados.get('data_movimentacao')
-    if isinstance(data_mov, str):
-        try:
-            data_formatada = datetime.strptime(data_mov, '%d/%m/%Y %H:%M').strftime('%d/%m/%Y %H:%M')
-        except ValueError:
-            data_formatada = data_mov 
-    elif isinstance(data_mov, datetime):
-        data_formatada = data_mov.strftime('%d/%m/%Y %H:%M')
-    else:
-        data_formatada = "N/A"
-    
-    dados['data_movimentacao_formatada'] = data_formatada
-
-    items_list = list(checklist_data.items())
-    mid_point = math.ceil(len(items_list) / 2)
-    col1_items = items_list[:mid_point]
-    col2_items = items_list[mid_point:]
-
-    def build_checklist_rows(items):
-        rows = ""
-        for item, detalhes in items:
-            entregue_str = 'SIM' if detalhes['entregue'] else 'NÃO'
-            estado_str = detalhes['estado']
-            rows += f"<tr><td>{item}</td><td>{entregue_str}</td><td>{estado_str}</td></tr>"
-        return rows
-
-    checklist_html_col1 = build_checklist_rows(col1_items)
-    checklist_html_col2 = build_checklist_rows(col2_items)
-
-    html_string = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <style>
-            @page {{ size: A4; margin: 1cm; }}
-            body {{ 
-                font-family: Arial, sans-serif; 
-                font-size: 9.5pt; 
-                line-height: 1.3; 
-                color: #333; 
-            }}
-            
-            .header {{ 
-                text-align: center; 
-                margin-bottom: 20px;
-                padding-top: 20px;
-            }}
-
-            .header h1 {{
-                margin-top: 3em; /* ajustável */
-            }}
-
-            h1 {{ 
-                color: #003366; 
-                font-size: 16pt; 
-                margin: 0; 
-                letter-spacing: 1px;
-            }}
-
-            .logo {{
-                position: absolute;
-                top: 0.5cm;
-                left: 0.5cm; 
-                width: 140px; 
-            }}
-            
-            .section {{ 
-                margin-bottom: 12px; 
-            }}
-            .section-title {{ 
-                background-color: #003366; 
-                color: white; 
-                padding: 4px 8px; 
-                font-weight: bold; 
-                font-size: 10pt; 
-                border-radius: 4px;
-                margin-bottom: 6px;
-            }}
-            
-            .info-table {{ width: 100%; border-collapse: collapse; }}
-            .info-table td {{ 
-                padding: 4px 6px; 
-                border-bottom: 1px solid #f0f0f0; 
-            }}
-            .info-table td:first-child {{ 
-                font-weight: bold; 
-                width: 28%; 
-                color: #555;
-            }}
-            
-            /* Estilos para o Checklist em Colunas */
-            .checklist-container {{
-                display: flex;
-                justify-content: space-between;
-                align-items: flex-start;
-                width: 100%;
-            }}
-            .checklist-column {{
-                width: 49%;
-            }}
-            .checklist-table {{ width: 100%; border-collapse: collapse; margin-top: 0; }}
-            .checklist-table th, .checklist-table td {{ 
-                border-bottom: 1px solid #ddd; 
-                padding: 4px; 
-                text-align: left; 
-                font-size: 9pt;
-            }}
-            .checklist-table th {{ 
-                background-color: #f9f9f9; 
-                text-align: center; 
-                border-bottom: 2px solid #003366;
-                font-weight: bold;
-            }}
-            .checklist-table td:nth-child(2), .checklist-table td:nth-child(3) {{ text-align: center; }}
-            
-            .terms-container {{ margin-top: 8px; font-size: 8.5pt; text-align: justify; }}
-            .disclaimer {{ margin-bottom: 8px; }}
-            
-            /* Checkboxes */
-            .check-item {{ 
-                margin-top: 8px; 
-                display: flex; 
-                align-items: flex-start; 
-                padding: 2px 0;
-            }}
-            .box {{ 
-                display: inline-block; 
-                width: 10px; height: 10px; 
-                border: 1px solid #003366; 
-                margin-right: 8px; 
-                flex-shrink: 0;
-                position: relative; top: 3px;
-            }}
-            .check-text {{ flex-grow: 1; line-height: 1.2; }}
-
-            .signature {{ margin-top: 80px; text-align: center; page-break-inside: avoid; }} 
-            .signature-line {{ 
-                border-top: 1px solid #333; 
-                width: 350px; 
-                margin: 0 auto; 
-                padding-top: 5px; 
-                font-weight: bold;
-            }}
-        </style>
-    </head>
-    <body>
-        <img src="{logo_string}" class="logo">
-        <div class="header">
-            <h1>TERMO DE RESPONSABILIDADE</h1>
-        </div>
-        <div class="section">
-            <div class="section-title">DADOS DA MOVIMENTAÇÃO</div>
-            <table class="info-table">
-                <tr><td>CÓDIGO:</td><td>{dados.get('codigo_colaborador', '')}</td></tr>
-                <tr><td>DATA:</td><td>{dados.get('data_movimentacao_formatada', '')}</td></tr>
-            </table>
-        </div>
-        <div class="section">
-            <div class="section-title">DADOS DO COLABORADOR</div>
-            <table class="info-table">
-                <tr><td>NOME:</td><td>{dados.get('nome_completo', '')}</td></tr>
-                <tr><td>CPF:</td><td>{dados.get('cpf', '')}</td></tr>
-                <tr><td>SETOR:</td><td>{dados.get('nome_setor', '')}</td></tr>
-            </table>
-        </div>
-        <div class="section">
-            <div class="section-title">DADOS DO EQUIPAMENTO</div>
-            <table class="info-table">
-                <tr><td>TIPO:</td><td>SMARTPHONE</td></tr>
-                <tr><td>MARCA:</td><td>{dados.get('nome_marca', '')}</td></tr>
-                <tr><td>MODELO:</td><td>{dados.get('nome_modelo', '')}</td></tr>
-                <tr><td>NÚMERO DE SÉRIE:</td><td>{dados.get('numero_serie', '')}</td></tr>
-                <tr><td>IMEI 1:</td><td>{dados.get('imei1', '')}</td></tr>
-                <tr><td>IMEI 2:</td><td>{dados.get('imei2', '')}</td></tr>
-            </table>
-        </div>
-        <div class="section">
-            <div class="section-title">CHECKLIST DE ITENS ENTREGUES</div>
-            <div class="checklist-container">
-                <div class="checklist-column">
-                    <table class="checklist-table">
-                        <thead><tr><th>ITEM</th><th>ENTREGUE</th><th>ESTADO</th></tr></thead>
-                        <tbody>{checklist_html_col1}</tbody>
-                    </table>
-                </div>
-                <div class="checklist-column">
-                    <table class="checklist-table">
-                        <thead><tr><th>ITEM</th><th>ENTREGUE</th><th>ESTADO</th></tr></thead>
-                        <tbody>{checklist_html_col2}</tbody>
-                    </table>
-                </div>
-            </div>
-        </div>
-        <div class="section">
-            <div class="section-title">TERMOS E CONDIÇÕES</div>
-            <div class="terms-container">
-                <p class="disclaimer">
-                    Declaro receber o equipamento descrito para uso profissional, sendo responsável pela sua guarda e conservação. 
-                    Comprometo-me a devolvê-lo nas mesmas condições em que o recebi. Danos por mau uso serão de minha responsabilidade 
-                    (Art. 462, § 1º da CLT). Autorizo o uso dos meus dados para este fim, de acordo com a LGPD.
-                </p>
-                <div class="check-item">
-                    <span class="box"></span> 
-                    <span class="check-text">Ciente da proibição da utilização da ferramenta de roteamento dos dados móveis corporativos.</span>
-                </div>
-                <div class="check-item">
-                    <span class="box"></span> 
-                    <span class="check-text">Ciente da proibição de cadastrar contas pessoais, armazenar dados particulares ou vínculos neste aparelho corporativo.</span>
-                </div>
-            </div>
-        </div>
-        <div class="signature">
-            <div class="signature-line">{dados.get('nome_completo', '')}</div>
-        </div>
-    </body>
-    </html>
+QUERY_DADOS_DOCUMENTO = """
+    SELECT c.nome_completo, c.cpf, s.nome_setor, c.gmail, c.codigo as codigo_colaborador,
+        ma.nome_marca, mo.nome_modelo, a.imei1, a.imei2, a.numero_serie,
+        h.id as protocolo, h.data_movimentacao
+    FROM historico_movimentacoes h
+    JOIN colaboradores c ON h.colaborador_id = c.id
+    JOIN setores s ON c.setor_id = s.id
+    JOIN aparelhos a ON h.aparelho_id = a.id
+    JOIN modelos mo ON a.modelo_id = mo.id
+    JOIN marcas ma ON mo.marca_id = ma.id
+"""
+
+@cache_tabelas("historico_movimentacoes", "colaboradores", "setores", "aparelhos", "modelos", "marcas", "status", ttl=30)
+def buscar_dados_lote(ids=None, data_inicio=None, data_fim=None):
     """
-    
-    pdf_bytes = HTML(string=html_string).write_pdf()
-    return pdf_bytes
-
-def gerar_pdf_etiqueta(dados, logo_string):
-    """Gera o PDF da Etiqueta (100x40mm) - Layout Compacto para 1 Página."""
-    data_formatada = dados.get('data_movimentacao').strftime('%d/%m/%Y') if dados.get('data_movimentacao') else "N/A"
-
-    html_string = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-      <style>
-            @page {{
-                size: 100mm 40mm;
-                margin: 0;
-            }}
-            body {{
-                font-family: Arial, sans-serif;
-                font-size: 6pt; /* Fonte base muito pequena */
-                color: #000;
-                margin: 0;
-                padding: 1.5mm; /* Margem interna mínima */
-                box-sizing: border-box;
-                height: 40mm;
-                width: 100mm;
-                line-height: 1.05; /* Linha compacta */
-                overflow: hidden;
-            }}
-            .header {{
-                display: flex;
-                justify-content: space-between;
-                align-items: center;
-                padding-bottom: 1mm;
-                border-bottom: 0.5px solid #000;
-                margin-bottom: 1mm;
-            }}
-            .logo {{
-                width: 25mm; /* Logo bem pequena */
-                height: auto;
-            }}
-            .date {{
-                font-size: 6.5pt;
-                font-weight: bold;
-            }}
-            .content {{
-                display: flex;
-                width: 100%;
-            }}
-            .column {{
-                width: 50%;
-                padding-right: 1.5mm;
-            }}
-            .column:last-child {{
-                padding-right: 0;
-                padding-left: 1.5mm;
-                border-left: 0.5px solid #ccc;
-            }}
-            .field {{
-                margin-bottom: 1.5mm; /* Espaçamento mínimo */
-            }}
-            .field-label {{
-                font-weight: bold;
-                display: block;
-                font-size: 6pt; /* Rótulo minúsculo */
-                margin-bottom: 0.1mm;
-                text-transform: uppercase;
-            }}
-            .field-value {{
-                font-size: 6.5pt;
-                word-wrap: break-word;
-                white-space: nowrap; 
-                overflow: hidden;
-                text-overflow: ellipsis;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <img src="{logo_string}" class="logo">
-            <span class="date">{data_formatada}</span>
-        </div>
-        <div class="content">
-            <div class="column">
-                <div class="field"><span class="field-label">N°/S:</span><span class="field-value">{dados.get('numero_serie', '')}</span></div>
-                <div class="field"><span class="field-label">MODELO:</span><span class="field-value">{dados.get('nome_marca', '')} {dados.get('nome_modelo', '')}</span></div>
-                <div class="field"><span class="field-label">IMEI 1:</span><span class="field-value">{dados.get('imei1', '')}</span></div>
-                <div class="field"><span class="field-label">IMEI 2:</span><span class="field-value">{dados.get('imei2', '')}</span></div>
-            </div>
-            <div class="column">
-                <div class="field"><span class="field-label">FUNÇÃO:</span><span class="field-value">{dados.get('nome_setor', '')}</span></div>
-                <div class="field"><span class="field-label">CÓDIGO:</span><span class="field-value">{dados.get('codigo_colaborador', '')}</span></div>
-                <div class="field"><span class="field-label">NOME:</span><span class="field-value">{dados.get('nome_completo', '')}</span></div>
-                <div class="field"><span class="field-label">GMAIL:</span><span class="field-value">{dados.get('gmail', '')}</span></div>
-            </div>
-        </div>
-    </body>
-    </html>
+    Dados de todas as movimentações do lote numa única consulta: as indicadas em `ids` (tuplo) ou
+    as entregas ('Em uso') feitas entre data_inicio e data_fim. Lista de dicts como buscar_dados_completos.
     """
-    
-    pdf_bytes = HTML(string=html_string).write_pdf()
-    return pdf_bytes
+    if ids:
+        query = QUERY_DADOS_DOCUMENTO + " WHERE h.id = ANY(:ids) ORDER BY h.data_movimentacao, h.id;"
+        params = {"ids": list(ids)}
+    else:
+        query = QUERY_DADOS_DOCUMENTO + """
+            JOIN status st ON h.status_id = st.id
+            WHERE st.nome_status = 'Em uso'
+              AND CAST(h.data_movimentacao AS DATE) BETWEEN :data_inicio AND :data_fim
+            ORDER BY h.data_movimentacao, h.id;
+        """
+        params = {"data_inicio": data_inicio, "data_fim": data_fim}
+    return consultar(query, params=params).to_dict('records')
+
+@cache_tabelas("compras_ativos", "modelos", "marcas", ttl=30)
+def carregar_compras_etiquetas():
+    df = consultar("""
+        SELECT ca.id, ca.data_compra, ma.nome_marca || ' - ' || mo.nome_modelo as modelo, ca.quantidade, ca.loja
+        FROM compras_ativos ca
+        JOIN modelos mo ON ca.modelo_id = mo.id
+        JOIN marcas ma ON mo.marca_id = ma.id
+        ORDER BY ca.data_compra DESC, ca.id DESC;
+    """)
+    return df.to_dict('records')
+
+QUERY_APARELHOS_ETIQUETAS = """
+    SELECT a.id, a.numero_serie, a.imei1, a.imei2, a.data_cadastro, ma.nome_marca, mo.nome_modelo, s.nome_status,
+        CASE WHEN s.nome_status = 'Em uso' THEN COALESCE(p.colaborador_snapshot, c.nome_completo) END as responsavel,
+        CASE WHEN s.nome_status = 'Em uso' THEN se.nome_setor END as nome_setor
+    FROM aparelhos a
+    JOIN modelos mo ON a.modelo_id = mo.id
+    JOIN marcas ma ON mo.marca_id = ma.id
+    JOIN status s ON a.status_id = s.id
+    LEFT JOIN aparelho_posse_atual p ON a.id = p.aparelho_id
+    LEFT JOIN colaboradores c ON p.colaborador_id = c.id
+    LEFT JOIN setores se ON c.setor_id = se.id
+"""
+
+# Os aparelhos de uma compra são os do mesmo modelo cujo IMEI (ou N/S) consta no texto de IMEIs da
+# compra; se a compra não tiver IMEIs registados, os primeiros aparelhos desse modelo cadastrados a
+# partir da data da compra, até à quantidade comprada.
+FILTRO_COMPRA = """
+    JOIN compras_ativos ca ON ca.id = :compra_id AND a.modelo_id = ca.modelo_id
+    LEFT JOIN LATERAL (
+        SELECT array_agg(x) as imeis FROM regexp_split_to_table(COALESCE(ca.imeis_texto, ''), '[^0-9A-Za-z]+') x WHERE x <> ''
+    ) ci ON TRUE
+    WHERE (ci.imeis IS NOT NULL AND (a.imei1 = ANY(ci.imeis) OR a.imei2 = ANY(ci.imeis) OR a.numero_serie = ANY(ci.imeis)))
+       OR (ci.imeis IS NULL AND a.data_cadastro >= ca.data_compra)
+    ORDER BY a.data_cadastro, a.id
+    LIMIT (SELECT CASE WHEN COALESCE(imeis_texto, '') !~ '[0-9A-Za-z]' THEN quantidade END FROM compras_ativos WHERE id = :compra_id)
+"""
+
+@cache_tabelas("aparelhos", "modelos", "marcas", "status", "compras_ativos", "historico_movimentacoes", "colaboradores", "setores", ttl=30)
+def carregar_aparelhos_etiquetas(compra_id=None, modelo_id=None, status_id=None, numeros_serie=None):
+    """Aparelhos de uma compra, de um modelo, de um status ou de uma lista de N/S (tuplo), numa única consulta."""
+    if compra_id:
+        query, params = QUERY_APARELHOS_ETIQUETAS + FILTRO_COMPRA, {"compra_id": compra_id}
+    elif modelo_id:
+        query, params = QUERY_APARELHOS_ETIQUETAS + " WHERE a.modelo_id = :modelo_id ORDER BY a.numero_serie", {"modelo_id": modelo_id}
+    elif status_id:
+        query, params = QUERY_APARELHOS_ETIQUETAS + " WHERE a.status_id = :status_id ORDER BY ma.nome_marca, mo.nome_modelo, a.numero_serie", {"status_id": status_id}
+    elif numeros_serie:
+        query, params = QUERY_APARELHOS_ETIQUETAS + " WHERE a.numero_serie = ANY(:series) ORDER BY a.numero_serie", {"series": list(numeros_serie)}
+    else:
+        return []
+    return consultar(query, params=params).to_dict('records')
+
+@cache_tabelas("setores", ttl=60)
+def carregar_setores_nomes():
+    df = consultar("SELECT nome_setor FROM setores ORDER BY nome_setor;")
+    return df['nome_setor'].tolist()
 
 # --- UI PRINCIPAL COM RADIO BUTTONS ---
 st.title("Geração de Documentos")
@@ -531,7 +287,7 @@ st.markdown("---")
 
 option = st.radio(
     "Selecione a operação:",
-    ("Termo de Responsabilidade", "Gerar Etiquetas", "Histórico de Documentos"),
+    ("Termo de Responsabilidade", "Gerar Etiquetas", "Documentos em Lote", "Folha de Etiquetas", "Histórico de Documentos"),
     horizontal=True,
     label_visibility="collapsed",
     key="docs_selector"
@@ -594,8 +350,8 @@ try:
                         st.subheader("3. Preencha o Checklist")
                         
                         checklist_data = {}
-                        itens_checklist = ["Tela", "Carcaça", "Bateria", "Botões", "USB", "Chip", "Carregador", "Cabo USB", "Capa", "Película"]
-                        opcoes_estado = ["NOVO", "BOM", "REGULAR", "AVARIADO", "JÁ DISPÕE", "NÃO ENTREGUE"]
+                        itens_checklist = ITENS_CHECKLIST
+                        opcoes_estado = ESTADOS_CHECKLIST
                         
                         # --- LÓGICA DE 2 COLUNAS NA UI (LADO A LADO) ---
                         mid = math.ceil(len(itens_checklist) / 2)
@@ -627,22 +383,17 @@ try:
 
                         submitted = st.form_submit_button("Gerar PDF do Termo", use_container_width=True, type="primary")
                         if submitted:
-                            logo_string = carregar_logo_base64()
-                            if logo_string:
-                                pdf_bytes = gerar_pdf_termo(dados_termo_editaveis, checklist_data, logo_string)
-                                
-                                # --- REGISTAR O LOG DO TERMO ---
-                                registrar_log(
-                                    tipo_documento="Termo de Responsabilidade",
-                                    alvo=dados_termo_editaveis.get('nome_completo', 'Desconhecido'),
-                                    detalhes=f"Movimentação ID {mov_id_termo}"
+                            if verificar_logo():
+                                pedir_documento(
+                                    "termo", (dados_termo_editaveis, checklist_data),
+                                    download={"filename": nome_ficheiro("termo", dados_termo_editaveis), "type": "termo"},
+                                    # --- REGISTAR O LOG DO TERMO ---
+                                    log={
+                                        "tipo_documento": "Termo de Responsabilidade",
+                                        "alvo": dados_termo_editaveis.get('nome_completo', 'Desconhecido'),
+                                        "detalhes": f"Movimentação ID {mov_id_termo}",
+                                    },
                                 )
-                                
-                                safe_name = "".join(c for c in dados_termo_editaveis.get('nome_completo', 'termo') if c.isalnum() or c in " ").rstrip()
-                                pdf_filename = f"Termo_{safe_name.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.pdf"
-                                
-                                st.session_state['pdf_para_download'] = {"data": pdf_bytes, "filename": pdf_filename, "type": "termo"}
-                                st.rerun()
 
     elif option == "Gerar Etiquetas":
         st.header("Gerar Etiqueta do Ativo")
@@ -677,22 +428,164 @@ try:
                     })
 
                     if st.button("Gerar PDF da Etiqueta", use_container_width=True, type="primary"):
-                        logo_string = carregar_logo_base64()
-                        if logo_string:
-                            pdf_bytes = gerar_pdf_etiqueta(dados_etiqueta, logo_string)
-                            
-                            # --- REGISTAR O LOG DA ETIQUETA ---
-                            registrar_log(
-                                tipo_documento="Etiqueta de Ativo",
-                                alvo=dados_etiqueta.get('numero_serie', 'Desconhecido'),
-                                detalhes=f"Movimentação ID {mov_id_etiqueta}"
+                        if verificar_logo():
+                            pedir_documento(
+                                "etiqueta", (dados_etiqueta,),
+                                download={"filename": nome_ficheiro("etiqueta", dados_etiqueta), "type": "etiqueta"},
+                                # --- REGISTAR O LOG DA ETIQUETA ---
+                                log={
+                                    "tipo_documento": "Etiqueta de Ativo",
+                                    "alvo": dados_etiqueta.get('numero_serie', 'Desconhecido'),
+                                    "detalhes": f"Movimentação ID {mov_id_etiqueta}",
+                                },
                             )
 
-                            safe_ns = "".join(c for c in dados_etiqueta.get('numero_serie', 'etiqueta') if c.isalnum()).rstrip()
-                            pdf_filename = f"Etiqueta_{safe_ns}_{datetime.now().strftime('%Y%m%d')}.pdf"
-                            
-                            st.session_state['pdf_para_download'] = {"data": pdf_bytes, "filename": pdf_filename, "type": "etiqueta"}
-                            st.rerun()
+    elif option == "Documentos em Lote":
+        st.header("Gerar Documentos em Lote")
+        st.info("Gera os termos ou as etiquetas de várias entregas de uma só vez (ex.: a integração de uma equipa), num único PDF ou num ZIP.")
+
+        tipo_lote = st.radio("Documento:", options=list(TIPOS_DOCUMENTO), format_func=TIPOS_DOCUMENTO.get, horizontal=True, key="lote_tipo")
+        criterio_lote = st.radio("Selecionar as movimentações por:", ("Período", "IDs das Movimentações"), horizontal=True, key="lote_criterio")
+
+        ids_pedidos = ()
+        if criterio_lote == "Período":
+            col1, col2 = st.columns(2)
+            with col1:
+                lote_inicio = st.date_input("De:", value=date.today(), format="DD/MM/YYYY", key="lote_inicio")
+            with col2:
+                lote_fim = st.date_input("Até:", value=date.today(), format="DD/MM/YYYY", key="lote_fim")
+            registos_lote = buscar_dados_lote(data_inicio=lote_inicio, data_fim=lote_fim) if lote_inicio and lote_fim else []
+        else:
+            ids_texto = st.text_area("IDs das movimentações (separados por vírgula, espaço ou linha):", key="lote_ids")
+            ids_pedidos = tuple(sorted({int(i) for i in re.findall(r"\d+", ids_texto)}))
+            registos_lote = buscar_dados_lote(ids=ids_pedidos) if ids_pedidos else []
+
+        if ids_pedidos:
+            encontrados = {r['protocolo'] for r in registos_lote}
+            em_falta = [str(i) for i in ids_pedidos if i not in encontrados]
+            if em_falta:
+                st.warning(f"Movimentações não encontradas (ou sem colaborador): {', '.join(em_falta)}.")
+
+        if not registos_lote:
+            st.info("Nenhuma movimentação encontrada para os critérios indicados.")
+        else:
+            st.write(f"**{len(registos_lote)}** documento(s) a gerar:")
+            st.dataframe(
+                pd.DataFrame(registos_lote)[['protocolo', 'data_movimentacao', 'nome_completo', 'nome_setor', 'numero_serie']],
+                use_container_width=True, hide_index=True,
+                column_config={
+                    "protocolo": "ID Movimentação",
+                    "data_movimentacao": st.column_config.DatetimeColumn("Data", format="DD/MM/YYYY HH:mm"),
+                    "nome_completo": "Colaborador", "nome_setor": "Setor", "numero_serie": "N/S",
+                }
+            )
+
+            checklist_lote = None
+            if tipo_lote == "termo":
+                st.markdown("##### Checklist (aplicado a todos os termos)")
+                df_checklist = st.data_editor(
+                    pd.DataFrame({"item": ITENS_CHECKLIST, "entregue": True, "estado": ESTADOS_CHECKLIST[0]}),
+                    use_container_width=True, hide_index=True, disabled=["item"], key="lote_checklist",
+                    column_config={
+                        "item": "Item",
+                        "entregue": st.column_config.CheckboxColumn("Entregue"),
+                        "estado": st.column_config.SelectboxColumn("Estado", options=ESTADOS_CHECKLIST, required=True),
+                    }
+                )
+                checklist_lote = {r['item']: {'entregue': bool(r['entregue']), 'estado': r['estado']} for r in df_checklist.to_dict('records')}
+
+            formato_lote = st.radio("Formato:", options=list(FORMATOS_LOTE), horizontal=True, key="lote_formato")
+
+            if st.button(f"Gerar {len(registos_lote)} Documento(s)", use_container_width=True, type="primary"):
+                if verificar_logo():
+                    extensao = FORMATOS_LOTE[formato_lote]
+                    prefixo = "Termos" if tipo_lote == "termo" else "Etiquetas"
+                    pedir_documento(
+                        "lote", (tipo_lote, registos_lote, checklist_lote, extensao),
+                        download={
+                            "filename": f"{prefixo}_{datetime.now().strftime('%Y%m%d_%H%M')}.{extensao}",
+                            "type": "lote",
+                            "mime": "application/zip" if extensao == "zip" else "application/pdf",
+                        },
+                        log={
+                            "tipo_documento": f"{TIPOS_DOCUMENTO[tipo_lote]} (Lote)",
+                            "alvo": f"{len(registos_lote)} documento(s)",
+                            "detalhes": f"Movimentações IDs {', '.join(str(r['protocolo']) for r in registos_lote)}",
+                        },
+                    )
+
+    elif option == "Folha de Etiquetas":
+        st.header("Folha de Etiquetas")
+        st.info("Imprime as etiquetas de vários aparelhos em folhas A4 de etiquetas autocolantes (ex.: um lote de compra inteiro).")
+
+        criterio_folha = st.radio("Aparelhos:", ("Lote de Compra", "Modelo", "Status", "Lista de N/S"), horizontal=True, key="folha_criterio")
+        aparelhos_folha, descricao_folha, series_pedidas = [], "", ()
+        if criterio_folha == "Lote de Compra":
+            compras = carregar_compras_etiquetas()
+            compras_dict = {f"#{c['id']} - {c['data_compra'].strftime('%d/%m/%Y')} - {c['modelo']} ({c['quantidade']} un.) - {c['loja'] or 'N/A'}": c['id'] for c in compras}
+            compra_str = st.selectbox("Compra:", options=list(compras_dict), index=None, placeholder="Selecione uma compra...", key="folha_compra")
+            if compra_str:
+                aparelhos_folha = carregar_aparelhos_etiquetas(compra_id=compras_dict[compra_str])
+                descricao_folha = f"Compra ID {compras_dict[compra_str]}"
+        elif criterio_folha == "Modelo":
+            modelos_map = mapa_ids("modelos")
+            modelo_str = st.selectbox("Modelo:", options=list(modelos_map), index=None, placeholder="Selecione um modelo...", key="folha_modelo")
+            if modelo_str:
+                aparelhos_folha = carregar_aparelhos_etiquetas(modelo_id=modelos_map[modelo_str])
+                descricao_folha = f"Modelo {modelo_str}"
+        elif criterio_folha == "Status":
+            status_map = mapa_ids("status")
+            status_str = st.selectbox("Status:", options=list(status_map), index=None, placeholder="Selecione um status...", key="folha_status")
+            if status_str:
+                aparelhos_folha = carregar_aparelhos_etiquetas(status_id=status_map[status_str])
+                descricao_folha = f"Status {status_str}"
+        else:
+            series_texto = st.text_area("Números de série (um por linha, ou separados por vírgula ou espaço):", key="folha_series")
+            series_pedidas = tuple(dict.fromkeys(ns for ns in re.split(r"[\s,;]+", series_texto) if ns))
+            if series_pedidas:
+                aparelhos_folha = carregar_aparelhos_etiquetas(numeros_serie=series_pedidas)
+                descricao_folha = f"{len(series_pedidas)} N/S indicados"
+                em_falta = set(series_pedidas) - {a['numero_serie'] for a in aparelhos_folha}
+                if em_falta:
+                    st.warning(f"N/S não encontrados: {', '.join(sorted(em_falta))}.")
+
+        if not aparelhos_folha:
+            if descricao_folha:
+                st.info("Nenhum aparelho encontrado para o critério indicado.")
+        else:
+            col1, col2, col3 = st.columns([2, 2, 1])
+            with col1:
+                modelo_folha = st.selectbox("Folha:", options=list(MODELOS_FOLHA), key="folha_modelo_folha")
+            with col2:
+                conteudo_folha = st.selectbox("Conteúdo da etiqueta:", options=list(CONTEUDOS_ETIQUETA), key="folha_conteudo")
+            por_pagina = MODELOS_FOLHA[modelo_folha]["colunas"] * MODELOS_FOLHA[modelo_folha]["linhas"]
+            with col3:
+                posicao_inicial = st.number_input("Começar na posição:", min_value=1, max_value=por_pagina, value=1, key="folha_inicio",
+                                                  help="Para aproveitar uma folha já usada: as posições anteriores ficam em branco.")
+            contornos = st.checkbox("Desenhar o contorno das etiquetas (para testar o alinhamento numa folha normal)", key="folha_contornos")
+
+            paginas = -(-(len(aparelhos_folha) + posicao_inicial - 1) // por_pagina)
+            st.write(f"**{len(aparelhos_folha)}** etiqueta(s) em **{paginas}** folha(s):")
+            st.dataframe(
+                pd.DataFrame(aparelhos_folha)[['numero_serie', 'nome_marca', 'nome_modelo', 'imei1', 'nome_status', 'responsavel']],
+                use_container_width=True, hide_index=True,
+                column_config={
+                    "numero_serie": "N/S", "nome_marca": "Marca", "nome_modelo": "Modelo", "imei1": "IMEI 1",
+                    "nome_status": "Status", "responsavel": "Responsável",
+                }
+            )
+
+            if st.button(f"Gerar Folha com {len(aparelhos_folha)} Etiqueta(s)", use_container_width=True, type="primary"):
+                if verificar_logo():
+                    pedir_documento(
+                        "folha_etiquetas", (aparelhos_folha, modelo_folha, conteudo_folha, posicao_inicial - 1, contornos),
+                        download={"filename": f"Folha_Etiquetas_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf", "type": "folha"},
+                        log={
+                            "tipo_documento": "Folha de Etiquetas",
+                            "alvo": f"{len(aparelhos_folha)} aparelho(s)",
+                            "detalhes": f"{descricao_folha} - {modelo_folha}",
+                        },
+                    )
 
     elif option == "Histórico de Documentos":
         st.header("Histórico de Documentos Gerados")
@@ -706,7 +599,7 @@ try:
             detalhes_filtro = st.text_input("Filtrar por Detalhes (ex: ID Movimentação):", key="log_detalhes")
 
         if st.button("Atualizar Histórico"):
-            st.cache_data.clear()
+            carregar_logs_documentos.limpar()
             st.rerun()
 
         df_logs = carregar_logs_documentos(
@@ -733,18 +626,48 @@ try:
             st.warning("Nenhum histórico encontrado.")
 
 
+    # Recolhe o documento pedido ao serviço de PDF: consulta o estado do trabalho até estar pronto.
+    if st.session_state.get('documento_pendente'):
+        pendente = st.session_state.pop('documento_pendente')
+        with st.spinner("A gerar o documento..."):
+            estado = aguardar_documento(pendente['trabalho'])
+        if estado is None:
+            st.error("O pedido de geração do documento já não existe. Tente gerar novamente.")
+        elif estado['estado'] != ESTADO_CONCLUIDO:
+            st.error(f"Não foi possível gerar o documento: {estado['erro'] or 'tempo de espera esgotado.'}")
+        else:
+            resultado = estado['resultado']
+            download = dict(pendente['download'])
+            if isinstance(resultado, tuple):  # lotes e folhas de etiquetas devolvem também as estatísticas
+                download['data'], download['estatisticas'] = resultado
+            else:
+                download['data'] = resultado
+            download['do_cache'] = estado['do_cache']
+            registrar_log(**pendente['log'])
+            st.session_state['pdf_para_download'] = download
+
     # Lógica de download unificada fora das abas
     if 'pdf_para_download' in st.session_state and st.session_state['pdf_para_download']:
         pdf_info = st.session_state.pop('pdf_para_download')
         doc_type = pdf_info.get("type", "documento").capitalize()
+        estatisticas = pdf_info.get("estatisticas")
+        if pdf_info.get("do_cache"):
+            st.success("Documento idêntico já gerado: servido da cache, sem nova renderização.")
+        elif estatisticas:
+            st.success(
+                f"{estatisticas['documentos']} {estatisticas.get('unidade', 'documento(s)')} gerados em {estatisticas['duracao_s']:.1f}s "
+                f"({estatisticas['documentos_por_segundo']:.1f} por segundo)."
+            )
         st.download_button(
             label=f"{doc_type} Gerado! Clique para Baixar",
             data=pdf_info['data'],
             file_name=pdf_info['filename'],
-            mime="application/pdf",
+            mime=pdf_info.get("mime", "application/pdf"),
             use_container_width=True
         )
 
 except Exception as e:
     st.error(f"Ocorreu um erro ao carregar a página: {e}")
     st.info("Verifique se o banco de dados está inicializado e se há movimentações do tipo 'Em uso' registadas.")
+
+concluir_perfil()
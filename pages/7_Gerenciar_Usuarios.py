@@ -2,6 +2,10 @@ import streamlit as st
 import pandas as pd
 from auth import show_login_form, hash_password # Importa a função de hash
 from sqlalchemy import text
+from alteracoes_utils import calcular_alteracoes, salvar_alteracoes
+from db_utils import consultar, get_db_connection
+from perfil_utils import iniciar_perfil, concluir_perfil
+from cache_utils import cache_tabelas, invalidar_tabelas
 
 # --- Autenticação e Permissão ---
 if 'logged_in' not in st.session_state or not st.session_state['logged_in']:
@@ -74,16 +78,13 @@ with st.sidebar:
         from auth import logout
         logout()
     st.markdown("---")
+    iniciar_perfil()
 
 # --- Configurações da Página ---
 st.title("Gerenciamento de Usuários")
 st.markdown("---")
 
 # --- Funções do Banco de Dados (MODIFICADAS PARA POSTGRESQL) ---
-def get_db_connection():
-    """Retorna uma conexão ao banco de dados Supabase."""
-    return st.connection("supabase", type="sql")
-
 def adicionar_usuario(nome, login, senha, cargo):
     """Adiciona um novo usuário ao banco de dados."""
     if not all([nome, login, senha, cargo]):
@@ -97,34 +98,19 @@ def adicionar_usuario(nome, login, senha, cargo):
             s.execute(query, {"nome": nome, "login": login, "senha": senha_hashed, "cargo": cargo})
             s.commit()
         st.success(f"Usuário '{login}' criado com sucesso!")
-        st.cache_data.clear()
+        invalidar_tabelas("usuarios")
     except Exception as e:
         if 'unique constraint' in str(e).lower() and 'usuarios_login_key' in str(e).lower():
             st.error(f"O login '{login}' já existe.")
         else:
             st.error(f"Ocorreu um erro ao criar o usuário: {e}")
 
-@st.cache_data(ttl=30)
+@cache_tabelas("usuarios", ttl=30)
 def carregar_usuarios():
     """Carrega a lista de usuários do banco de dados."""
-    conn = get_db_connection()
-    df = conn.query("SELECT id, nome, login, cargo FROM usuarios ORDER BY nome")
+    df = consultar("SELECT id, nome, login, cargo FROM usuarios ORDER BY nome")
     return df
 
-def atualizar_usuario(user_id, nome, cargo):
-    """Atualiza os dados de um usuário existente."""
-    try:
-        conn = get_db_connection()
-        with conn.session as s:
-            query = text("UPDATE usuarios SET nome = :nome, cargo = :cargo WHERE id = :id")
-            s.execute(query, {"nome": nome, "cargo": cargo, "id": user_id})
-            s.commit()
-        st.cache_data.clear()
-        return True
-    except Exception as e:
-        st.error(f"Erro ao atualizar o usuário ID {user_id}: {e}")
-        return False
-
 def atualizar_senha_usuario(user_id, nova_senha):
     """Atualiza a senha de um usuário específico."""
     if not nova_senha:
@@ -137,31 +123,20 @@ def atualizar_senha_usuario(user_id, nova_senha):
             query = text("UPDATE usuarios SET senha = :senha WHERE id = :id")
             s.execute(query, {"senha": nova_senha_hashed, "id": user_id})
             s.commit()
-        st.cache_data.clear() # Limpa o cache para futuras operações
+        invalidar_tabelas("usuarios") # Limpa o cache para futuras operações
         return True
     except Exception as e:
         st.error(f"Erro ao atualizar a senha do usuário ID {user_id}: {e}")
         return False
 
 
-def excluir_usuario(user_id):
-    """Exclui um usuário do banco de dados."""
+def validar_alteracoes_usuarios(s, alterados_df, ids_excluidos):
+    """Impede que o utilizador atual exclua a própria conta."""
     # --- REGRA DE NEGÓCIO: IMPEDIR AUTOEXCLUSÃO ---
-    if user_id == st.session_state.get('user_id'):
-        st.error("Ação bloqueada: Não é possível excluir o seu próprio utilizador.")
-        return False
-        
-    try:
-        conn = get_db_connection()
-        with conn.session as s:
-            query = text("DELETE FROM usuarios WHERE id = :id")
-            s.execute(query, {"id": user_id})
-            s.commit()
-        st.cache_data.clear()
-        return True
-    except Exception as e:
-        st.error(f"Erro ao excluir o usuário ID {user_id}: {e}")
-        return False
+    user_id_atual = st.session_state.get('user_id')
+    if user_id_atual in ids_excluidos:
+        return {user_id_atual: "Ação bloqueada: Não é possível excluir o seu próprio utilizador."}
+    return {}
 
 # --- Interface do Usuário com Radio Buttons ---
 try:
@@ -213,34 +188,32 @@ try:
         )
 
         if st.button("Salvar Alterações de Nome/Cargo", use_container_width=True):
-            changes_made = False
             original_df = st.session_state.original_users_df
+            ids_excluidos, alterados_df = calcular_alteracoes(original_df, edited_df, ['nome', 'cargo'])
 
-            # Lógica para Exclusão
-            deleted_ids = set(original_df['id']) - set(edited_df['id'])
-            for user_id in deleted_ids:
-                if excluir_usuario(user_id):
-                    st.toast(f"Utilizador ID {user_id} excluído!", icon="🗑️")
-                    changes_made = True
-            
-            # Lógica para Atualização
-            original_df_indexed = original_df.set_index('id')
-            edited_df_indexed = edited_df.set_index('id')
-            common_ids = original_df_indexed.index.intersection(edited_df_indexed.index)
-            
-            for user_id in common_ids:
-                original_row = original_df_indexed.loc[user_id]
-                edited_row = edited_df_indexed.loc[user_id]
-                if not original_row.equals(edited_row):
-                    if atualizar_usuario(user_id, edited_row['nome'], edited_row['cargo']):
-                        st.toast(f"Utilizador '{edited_row['nome']}' atualizado!", icon="✅")
-                        changes_made = True
-
-            if changes_made:
-                del st.session_state.original_users_df # Limpa para forçar recarregamento
-                st.rerun()
-            else:
+            if not ids_excluidos and alterados_df.empty:
                 st.info("Nenhuma alteração foi detetada.")
+            else:
+                try:
+                    resultado = salvar_alteracoes(
+                        "usuarios", {"nome": "TEXT", "cargo": "TEXT"}, alterados_df, ids_excluidos,
+                        validar=validar_alteracoes_usuarios, conn=get_db_connection()
+                    )
+                except Exception as e:
+                    st.error(f"Erro ao salvar as alterações dos usuários: {e}")
+                else:
+                    if resultado['excluidos']:
+                        st.toast(f"{resultado['excluidos']} utilizador(es) excluído(s)!", icon="🗑️")
+                    if resultado['atualizados']:
+                        st.toast(f"{resultado['atualizados']} utilizador(es) atualizado(s)!", icon="✅")
+                    for mensagem in resultado['erros'].values():
+                        st.error(mensagem)
+
+                    if resultado['excluidos'] or resultado['atualizados']:
+                        invalidar_tabelas("usuarios")
+                        del st.session_state.original_users_df # Limpa para forçar recarregamento
+                        if not resultado['erros']:
+                            st.rerun()
 
         st.markdown("---")
         
@@ -270,4 +243,4 @@ except Exception as e:
     st.error(f"Ocorreu um erro ao carregar a página de utilizadores: {e}")
     st.info("Se esta é a primeira configuração, por favor, vá até a página 'Configurações' e clique em 'Inicializar Banco de Dados' para criar as tabelas necessárias.")
 
-
+concluir_perfil()
@@ -6,7 +6,15 @@ from sqlalchemy import text, exc
 import traceback
 import numpy as np
 # Importamos as funções de e-mail
-from email_utils import enviar_email, montar_layout_base
+from email_utils import enviar_email
+from envio_massa_utils import html_relatorio_manutencoes, emails_manutencoes_por_colaborador, enviar_por_colaborador, mostrar_estado_envio
+from posse_utils import inserir_movimentacao
+from alteracoes_utils import calcular_alteracoes, salvar_alteracoes
+from db_utils import consultar, get_db_connection
+from perfil_utils import iniciar_perfil, concluir_perfil
+from pesquisa_utils import seletor_registo, limpar_seletor
+from cache_utils import cache_tabelas, invalidar_tabelas
+from referencias_utils import exigir_id_referencia, id_referencia
 
 # --- Autenticação ---
 if 'logged_in' not in st.session_state or not st.session_state['logged_in']:
@@ -74,6 +82,7 @@ with st.sidebar:
         from auth import logout
         logout()
     st.markdown("---")
+    iniciar_perfil()
     st.markdown(
         f"""
         <div class="sidebar-footer">
@@ -85,42 +94,17 @@ with st.sidebar:
     )
 
 # --- Funções do DB ---
-def get_db_connection():
-    return st.connection("supabase", type="sql")
-
-@st.cache_data(ttl=30)
+@cache_tabelas("manutencoes", ttl=30)
 def carregar_dados_para_selects_manutencao():
-    conn = get_db_connection()
-    # Aparelhos que não estão em manutenção ou baixados
-    aparelhos_df = conn.query("""
-        WITH UltimoHistorico AS (
-            SELECT
-                aparelho_id, colaborador_id, colaborador_snapshot,
-                ROW_NUMBER() OVER(PARTITION BY aparelho_id ORDER BY data_movimentacao DESC) as rn
-            FROM historico_movimentacoes
-        )
-        SELECT
-            a.id, a.numero_serie, mo.nome_modelo, ma.nome_marca,
-            COALESCE(uh.colaborador_snapshot, c.nome_completo) as ultimo_colaborador
-        FROM aparelhos a
-        JOIN modelos mo ON a.modelo_id = mo.id
-        JOIN marcas ma ON mo.marca_id = ma.id
-        LEFT JOIN UltimoHistorico uh ON a.id = uh.aparelho_id AND uh.rn = 1
-        LEFT JOIN colaboradores c ON uh.colaborador_id = c.id
-        WHERE a.status_id NOT IN (
-            SELECT id FROM status WHERE nome_status IN ('Em manutenção', 'Baixado/Inutilizado')
-        )
-        ORDER BY ma.nome_marca, mo.nome_modelo;
-    """)
+    # Os aparelhos disponíveis para manutenção são pesquisados com seletor_registo("aparelhos_manutencao").
     # Colaboradores para o filtro do histórico
-    colaboradores_df = conn.query("SELECT DISTINCT colaborador_snapshot FROM manutencoes WHERE colaborador_snapshot IS NOT NULL ORDER BY colaborador_snapshot;")
+    colaboradores_df = consultar("SELECT DISTINCT colaborador_snapshot FROM manutencoes WHERE colaborador_snapshot IS NOT NULL ORDER BY colaborador_snapshot;")
     # Status de manutenção para o filtro do histórico
-    status_manutencao_df = conn.query("SELECT DISTINCT status_manutencao FROM manutencoes ORDER BY status_manutencao;")
+    status_manutencao_df = consultar("SELECT DISTINCT status_manutencao FROM manutencoes ORDER BY status_manutencao;")
     # Responsabilidade de Custo para o filtro do histórico
-    responsabilidade_df = conn.query("SELECT DISTINCT responsabilidade_custo FROM manutencoes WHERE responsabilidade_custo IS NOT NULL ORDER BY responsabilidade_custo;")
+    responsabilidade_df = consultar("SELECT DISTINCT responsabilidade_custo FROM manutencoes WHERE responsabilidade_custo IS NOT NULL ORDER BY responsabilidade_custo;")
     
     return (
-        aparelhos_df.to_dict('records'), 
         ["Todos"] + colaboradores_df['colaborador_snapshot'].tolist(),
         ["Todos"] + status_manutencao_df['status_manutencao'].tolist(),
         ["Todos"] + responsabilidade_df['responsabilidade_custo'].tolist()
@@ -140,7 +124,7 @@ def abrir_ordem_servico(aparelho_id, fornecedor, defeito):
             ultimo_colaborador_id = result_colab[0] if result_colab else None
             ultimo_colaborador_snapshot = result_colab[1] if result_colab else "N/A"
 
-            status_manutencao_id = s.execute(text("SELECT id FROM status WHERE nome_status = 'Em manutenção'")).scalar_one()
+            status_manutencao_id = exigir_id_referencia("status", "Em manutenção")
 
             query_insert_manut = text("""
                 INSERT INTO manutencoes (aparelho_id, colaborador_id_no_envio, fornecedor, data_envio, defeito_reportado, status_manutencao, colaborador_snapshot)
@@ -154,15 +138,11 @@ def abrir_ordem_servico(aparelho_id, fornecedor, defeito):
             s.execute(text("UPDATE aparelhos SET status_id = :status_id WHERE id = :ap_id"), 
                       {"status_id": status_manutencao_id, "ap_id": aparelho_id})
 
-            query_insert_hist = text("""
-                INSERT INTO historico_movimentacoes (data_movimentacao, aparelho_id, colaborador_id, status_id, localizacao_atual, observacoes, colaborador_snapshot)
-                VALUES (:data, :ap_id, :col_id, :status_id, :loc, :obs, :col_snap)
-            """)
-            s.execute(query_insert_hist, {
-                "data": datetime.now(), "ap_id": aparelho_id, "col_id": ultimo_colaborador_id, 
-                "status_id": status_manutencao_id, "loc": f"Assistência: {fornecedor}", "obs": f"Defeito: {defeito}",
-                "col_snap": ultimo_colaborador_snapshot
-            })
+            inserir_movimentacao(
+                s, aparelho_id, status_manutencao_id, datetime.now(), colaborador_id=ultimo_colaborador_id,
+                colaborador_snapshot=ultimo_colaborador_snapshot, localizacao=f"Assistência: {fornecedor}",
+                observacoes=f"Defeito: {defeito}"
+            )
             
             s.commit()
             st.success("Ordem de Serviço aberta e aparelho enviado para manutenção!")
@@ -171,9 +151,8 @@ def abrir_ordem_servico(aparelho_id, fornecedor, defeito):
         st.error(f"Erro ao abrir a Ordem de Serviço: {e}")
         return False
 
-@st.cache_data(ttl=30)
+@cache_tabelas("manutencoes", "aparelhos", "modelos", ttl=30)
 def carregar_manutencoes_em_andamento(order_by="m.data_envio ASC"):
-    conn = get_db_connection()
     query = f"""
         SELECT m.id, a.numero_serie, mo.nome_modelo, m.fornecedor, m.data_envio, m.defeito_reportado
         FROM manutencoes m
@@ -182,7 +161,7 @@ def carregar_manutencoes_em_andamento(order_by="m.data_envio ASC"):
         WHERE m.status_manutencao = 'Em Andamento'
         ORDER BY {order_by};
     """
-    df = conn.query(query)
+    df = consultar(query)
     for col in ['fornecedor', 'defeito_reportado']:
         df[col] = df[col].fillna('')
     return df
@@ -202,7 +181,7 @@ def fechar_ordem_servico(manutencao_id, solucao, custo, novo_status_nome, respon
 
             aparelho_id, colab_snapshot = manut_result
             
-            novo_status_id_result = s.execute(text("SELECT id FROM status WHERE nome_status = :nome"), {"nome": novo_status_nome}).scalar()
+            novo_status_id_result = id_referencia("status", novo_status_nome)
             if novo_status_id_result is None:
                 st.error(f"Status '{novo_status_nome}' não encontrado no sistema.")
                 s.rollback()
@@ -231,15 +210,10 @@ def fechar_ordem_servico(manutencao_id, solucao, custo, novo_status_nome, respon
                 f"Custo: R${custo or 0:.2f} ({responsabilidade_custo})."
             )
             
-            query_insert_hist = text("""
-                INSERT INTO historico_movimentacoes (data_movimentacao, aparelho_id, colaborador_id, status_id, localizacao_atual, observacoes, colaborador_snapshot)
-                VALUES (:data, :ap_id, NULL, :status_id, 'Estoque Interno', :obs, :col_snap)
-            """)
-            s.execute(query_insert_hist, {
-                "data": datetime.now(), "ap_id": aparelho_id, "status_id": novo_status_id,
-                "obs": obs_historico,
-                "col_snap": colab_snapshot
-            })
+            inserir_movimentacao(
+                s, aparelho_id, novo_status_id, datetime.now(), colaborador_snapshot=colab_snapshot,
+                localizacao="Estoque Interno", observacoes=obs_historico
+            )
             
             s.commit()
             st.success("Ordem de Serviço fechada com sucesso!")
@@ -252,26 +226,15 @@ def fechar_ordem_servico(manutencao_id, solucao, custo, novo_status_nome, respon
         st.error(f"Erro ao fechar a Ordem de Serviço: {e}")
         return False
 
-def atualizar_manutencao(manutencao_id, fornecedor, defeito):
-    conn = get_db_connection()
-    try:
-        with conn.session as s:
-            query = text("UPDATE manutencoes SET fornecedor = :forn, defeito_reportado = :defeito WHERE id = :id")
-            s.execute(query, {"forn": fornecedor, "defeito": defeito, "id": manutencao_id})
-            s.commit()
-        return True
-    except Exception as e:
-        st.error(f"Erro ao atualizar manutenção: {e}")
-        return False
-
-@st.cache_data(ttl=30)
+@cache_tabelas("manutencoes", "aparelhos", "modelos", "marcas", "colaboradores", "setores", ttl=30)
 def carregar_historico_manutencoes(status_filter=None, colaborador_filter=None, responsabilidade_filter=None, start_date=None, end_date=None, start_date_retorno=None, end_date_retorno=None):
-    conn = get_db_connection()
     # Query ajustada para trazer Marca e Setor para o relatório completo
     query = """
         SELECT 
             m.id, a.numero_serie, ma.nome_marca, mo.nome_modelo, 
             m.colaborador_snapshot as colaborador,
+            m.colaborador_id_no_envio as colaborador_id,
+            c.gmail as colaborador_gmail,
             s.nome_setor as setor,
             m.data_envio, m.data_retorno, m.custo_reparo, m.responsabilidade_custo, 
             m.status_manutencao, m.fornecedor,
@@ -309,92 +272,19 @@ def carregar_historico_manutencoes(status_filter=None, colaborador_filter=None,
     if where_clauses:
         query += " WHERE " + " AND ".join(where_clauses)
     query += " ORDER BY m.data_envio DESC"
-    df = conn.query(query, params=params)
+    df = consultar(query, params=params)
     return df
 
 # --- FUNÇÃO: Gerar HTML de Manutenção para E-mail ---
 def gerar_conteudo_email_historico_manutencao(df_selecionado):
-    # Calcula o total
-    total_custo = df_selecionado['custo_reparo'].fillna(0).sum()
-    
-    linhas_html = ""
-    for index, row in df_selecionado.iterrows():
-        # Formata datas e valores
-        data_ida = row['data_envio'].strftime('%d/%m/%Y') if pd.notnull(row['data_envio']) else "-"
-        data_volta = row['data_retorno'].strftime('%d/%m/%Y') if pd.notnull(row['data_retorno']) else "-"
-        valor = f"R$ {float(row['custo_reparo']):.2f}" if pd.notnull(row['custo_reparo']) else "R$ 0.00"
-        
-        # Formata strings compostas
-        aparelho = f"{row['nome_marca']} {row['nome_modelo']} (S/N: {row['numero_serie']})"
-        # Se não houver setor, assume N/A
-        setor_str = row['setor'] if row['setor'] else 'N/A'
-        responsavel = f"{setor_str} - {row['colaborador']}"
-        
-        # Constrói a linha da tabela
-        linhas_html += f"""
-        <tr>
-            <td style="padding: 8px; border-bottom: 1px solid #eeeeee; font-family: Arial; font-size: 11px;">{row['id']}</td>
-            <td style="padding: 8px; border-bottom: 1px solid #eeeeee; font-family: Arial; font-size: 11px;">{aparelho}</td>
-            <td style="padding: 8px; border-bottom: 1px solid #eeeeee; font-family: Arial; font-size: 11px;">{responsavel}</td>
-            <td style="padding: 8px; border-bottom: 1px solid #eeeeee; font-family: Arial; font-size: 11px;">{row['fornecedor'] or '-'}</td>
-            <td style="padding: 8px; border-bottom: 1px solid #eeeeee; font-family: Arial; font-size: 11px;">{data_ida}<br/>{data_volta}</td>
-            <td style="padding: 8px; border-bottom: 1px solid #eeeeee; font-family: Arial; font-size: 11px;">{row['defeito_reportado']}</td>
-            <td style="padding: 8px; border-bottom: 1px solid #eeeeee; font-family: Arial; font-size: 11px;">{row['solucao_aplicada'] or '-'}</td>
-            <td style="padding: 8px; border-bottom: 1px solid #eeeeee; font-family: Arial; font-size: 11px;">{row['responsabilidade_custo'] or '-'}</td>
-            <td style="padding: 8px; border-bottom: 1px solid #eeeeee; font-family: Arial; font-size: 11px; white-space: nowrap;">{valor}</td>
-        </tr>
-        """
-    
-    # Miolo da tabela HTML (sem as tags <html>, <body>, pois o montar_layout_base faz isso)
-    miolo_tabela = f"""
-    <table border="0" cellpadding="0" cellspacing="0" width="100%">
-        <thead>
-            <tr bgcolor="#f2f2f2">
-                <th align="left" style="padding: 8px; border-bottom: 2px solid #003366; font-family: Arial; font-size: 11px; color: #003366;">O.S.</th>
-                <th align="left" style="padding: 8px; border-bottom: 2px solid #003366; font-family: Arial; font-size: 11px; color: #003366;">Aparelho</th>
-                <th align="left" style="padding: 8px; border-bottom: 2px solid #003366; font-family: Arial; font-size: 11px; color: #003366;">Setor - Responsável</th>
-                <th align="left" style="padding: 8px; border-bottom: 2px solid #003366; font-family: Arial; font-size: 11px; color: #003366;">Prestador</th>
-                <th align="left" style="padding: 8px; border-bottom: 2px solid #003366; font-family: Arial; font-size: 11px; color: #003366;">Datas</th>
-                <th align="left" style="padding: 8px; border-bottom: 2px solid #003366; font-family: Arial; font-size: 11px; color: #003366;">Defeito</th>
-                <th align="left" style="padding: 8px; border-bottom: 2px solid #003366; font-family: Arial; font-size: 11px; color: #003366;">Solução</th>
-                <th align="left" style="padding: 8px; border-bottom: 2px solid #003366; font-family: Arial; font-size: 11px; color: #003366;">Resp. Custo</th>
-                <th align="left" style="padding: 8px; border-bottom: 2px solid #003366; font-family: Arial; font-size: 11px; color: #003366;">Valor</th>
-            </tr>
-        </thead>
-        <tbody>
-            {linhas_html}
-        </tbody>
-        <tfoot>
-            <tr>
-                <td colspan="8" align="right" style="padding: 10px; font-weight: bold; font-family: Arial; font-size: 12px;">TOTAL:</td>
-                <td style="padding: 10px; font-weight: bold; font-family: Arial; font-size: 12px; white-space: nowrap;">R$ {total_custo:.2f}</td>
-            </tr>
-        </tfoot>
-    </table>
-    """
-    
-    # Envolve o miolo no layout padrão (cabeçalho preto, rodapé, etc.)
-    miolo_completo = f"""
-    <tr>
-        <td style="color: #003366; font-family: Arial, sans-serif; font-size: 20px; font-weight: bold; padding-bottom: 15px;">
-            Relatório de Manutenções Selecionadas
-        </td>
-    </tr>
-    <tr>
-        <td>
-            {miolo_tabela}
-        </td>
-    </tr>
-    """
-    
-    return montar_layout_base("Relatório de Manutenções", miolo_completo)
+    return html_relatorio_manutencoes(df_selecionado.to_dict('records'))
 
 # --- UI ---
 st.title("Fluxo de Manutenção")
 st.markdown("---")
 
 try:
-    aparelhos_list, colaboradores_options, status_manutencao_options, responsabilidade_options = carregar_dados_para_selects_manutencao()
+    colaboradores_options, status_manutencao_options, responsabilidade_options = carregar_dados_para_selects_manutencao()
 
     option = st.radio(
         "Selecione a operação:",
@@ -407,25 +297,19 @@ try:
 
     if option == "Abrir Ordem de Serviço":
         st.subheader("1. Enviar Aparelho para Manutenção")
-        aparelhos_dict = {f"{ap['nome_marca']} {ap['nome_modelo']} (S/N: {ap['numero_serie']}) - [Com: {ap['ultimo_colaborador'] or 'Ninguém'}]": ap['id'] for ap in aparelhos_list}
-        if not aparelhos_dict:
-            st.info("Nenhum aparelho disponível para enviar para manutenção.")
-        else:
-            with st.form("form_nova_os", clear_on_submit=True):
-                aparelho_selecionado_str = st.selectbox(
-                    "Selecione o Aparelho*", options=aparelhos_dict.keys(),
-                    index=None, placeholder="Selecione...", help="Clique na lista e comece a digitar para pesquisar."
-                )
-                fornecedor = st.text_input("Fornecedor / Assistência Técnica*")
-                defeito = st.text_area("Defeito Reportado*")
-                if st.form_submit_button("Abrir Ordem de Serviço", use_container_width=True, type="primary"):
-                    if not all([aparelho_selecionado_str, fornecedor, defeito]):
-                        st.error("Todos os campos são obrigatórios.")
-                    else:
-                        aparelho_id = aparelhos_dict[aparelho_selecionado_str]
-                        if abrir_ordem_servico(aparelho_id, fornecedor, defeito):
-                            st.cache_data.clear()
-                            st.rerun()
+        # Fora do formulário: o seletor pesquisa no servidor (N/S ou IMEI) enquanto se escreve.
+        aparelho_id = seletor_registo("aparelhos_manutencao", "Selecione o Aparelho* (N/S ou IMEI)", key="os_aparelho")
+        with st.form("form_nova_os", clear_on_submit=True):
+            fornecedor = st.text_input("Fornecedor / Assistência Técnica*")
+            defeito = st.text_area("Defeito Reportado*")
+            if st.form_submit_button("Abrir Ordem de Serviço", use_container_width=True, type="primary"):
+                if not all([aparelho_id, fornecedor, defeito]):
+                    st.error("Todos os campos são obrigatórios.")
+                else:
+                    if abrir_ordem_servico(aparelho_id, fornecedor, defeito):
+                        invalidar_tabelas("manutencoes", "aparelhos", "historico_movimentacoes")
+                        limpar_seletor("os_aparelho")
+                        st.rerun()
 
     elif option == "Acompanhar e Fechar O.S.":
         st.subheader("2. Ordens de Serviço em Andamento")
@@ -452,26 +336,23 @@ try:
                 )
                 
                 if st.button("Salvar Alterações nas O.S.", use_container_width=True, key="save_os_changes"):
-                    changes_made = False
                     original_df = st.session_state[session_state_key]
-                    original_df_indexed = original_df.set_index('id')
-                    edited_df_indexed = edited_df.set_index('id')
-                    common_ids = original_df_indexed.index.intersection(edited_df_indexed.index)
-
-                    for manut_id in common_ids:
-                        original_row = original_df_indexed.loc[manut_id]
-                        edited_row = edited_df_indexed.loc[manut_id]
-                        if not original_row.equals(edited_row):
-                            if atualizar_manutencao(manut_id, edited_row['fornecedor'], edited_row['defeito_reportado']):
-                                st.toast(f"O.S. Nº {manut_id} atualizada!", icon="✅")
-                                changes_made = True
-                    
-                    if changes_made:
-                        st.cache_data.clear()
-                        del st.session_state[session_state_key]
-                        st.rerun()
-                    else:
+                    _, alterados_df = calcular_alteracoes(original_df, edited_df, ['fornecedor', 'defeito_reportado'])
+
+                    if alterados_df.empty:
                         st.info("Nenhuma alteração foi detetada.")
+                    else:
+                        try:
+                            resultado = salvar_alteracoes(
+                                "manutencoes", {"fornecedor": "TEXT", "defeito_reportado": "TEXT"}, alterados_df,
+                                conn=get_db_connection()
+                            )
+                            st.toast(f"{resultado['atualizados']} O.S. atualizada(s)!", icon="✅")
+                            invalidar_tabelas("manutencoes")
+                            del st.session_state[session_state_key]
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"Erro ao atualizar manutenção: {e}")
 
         st.markdown("---")
         st.subheader("3. Fechar Ordem de Serviço")
@@ -502,7 +383,7 @@ try:
                     else:
                         os_id = os_dict[os_selecionada_str]
                         if fechar_ordem_servico(os_id, solucao, custo, novo_status_final, responsabilidade):
-                            st.cache_data.clear()
+                            invalidar_tabelas("manutencoes", "aparelhos", "historico_movimentacoes")
                             if 'original_manutencoes_df' in st.session_state:
                                 del st.session_state.original_manutencoes_df
                             st.rerun()
@@ -587,10 +468,10 @@ try:
                     if destinatarios_str:
                         destinatarios_list = [email.strip() for email in destinatarios_str.split(',') if email.strip()]
                         if destinatarios_list:
-                            with st.spinner("A gerar e enviar relatório..."):
+                            with st.spinner("A gerar o relatório..."):
                                 html_email = gerar_conteudo_email_historico_manutencao(selecionados)
-                                if enviar_email(destinatarios_list, "AssetFlow - Relatório de Manutenções", html_email, "Consulte a versão HTML para ver o relatório."):
-                                    st.success("Relatório enviado com sucesso!")
+                                if enviar_email(destinatarios_list, "AssetFlow - Relatório de Manutenções", html_email, "Consulte a versão HTML para ver o relatório.", origem="relatorio_manutencoes"):
+                                    st.success("Relatório colocado na fila de envio!")
                                 else:
                                     st.error("Falha ao enviar e-mail.")
                         else:
@@ -598,7 +479,20 @@ try:
                     else:
                         st.warning("Preencha o campo de destinatários.")
 
+                st.markdown("---")
+                st.markdown("###### Envio em Massa: um e-mail por colaborador")
+                para_colaborador = st.checkbox("Enviar para o Gmail de cada colaborador", value=True, key="manut_massa_colab")
+                st.caption("Os destinatários acima, se preenchidos, recebem uma cópia de cada e-mail.")
+                if st.button("Enviar um E-mail por Colaborador"):
+                    copia = [email.strip() for email in (destinatarios_str or "").split(',') if email.strip()]
+                    with st.spinner("A gerar os e-mails..."):
+                        emails, sem_destinatario = emails_manutencoes_por_colaborador(selecionados, copia, para_colaborador)
+                    enviar_por_colaborador(emails, sem_destinatario, "relatorio_manutencoes_massa", "lote_email_manutencoes")
+                mostrar_estado_envio("lote_email_manutencoes")
+
 except Exception as e:
     st.error(f"Ocorreu um erro ao carregar a página de manutenções: {e}")
     st.info("Verifique se o banco de dados está a funcionar corretamente.")
     traceback.print_exc()
+
+concluir_perfil()
@@ -4,8 +4,15 @@ from datetime import datetime, date
 import json
 from auth import show_login_form, logout
 from sqlalchemy import text
-# ATENÇÃO: Adicionamos 'montar_layout_base' à importação
-from email_utils import enviar_email, montar_layout_base 
+from email_utils import enviar_email
+from templates_email_utils import renderizar_email
+from envio_massa_utils import emails_devolucoes_por_colaborador, enviar_por_colaborador, mostrar_estado_envio
+from posse_utils import inserir_movimentacao
+from db_utils import consultar, get_db_connection
+from perfil_utils import iniciar_perfil, concluir_perfil
+from pesquisa_utils import seletor_registo, detalhes_registo, limpar_seletor
+from cache_utils import cache_tabelas, invalidar_tabelas
+from referencias_utils import exigir_id_referencia
 
 # --- Verificação de Autenticação ---
 if 'logged_in' not in st.session_state or not st.session_state['logged_in']:
@@ -63,41 +70,10 @@ with st.sidebar:
     if st.button("Logout", key="devolucoes_logout"):
         logout()
     st.markdown("---")
+    iniciar_perfil()
     # Adicione o footer da barra lateral se desejar
 
 # --- Funções de Banco de Dados ---
-def get_db_connection():
-    return st.connection("supabase", type="sql")
-
-@st.cache_data(ttl=30)
-def carregar_aparelhos_em_uso():
-    conn = get_db_connection()
-    # Query ajustada para buscar também marca_id e modelo_id
-    query = """
-        WITH UltimaMovimentacao AS (
-            SELECT
-                h.aparelho_id, h.colaborador_id,
-                ROW_NUMBER() OVER(PARTITION BY h.aparelho_id ORDER BY h.data_movimentacao DESC) as rn
-            FROM historico_movimentacoes h
-        )
-        SELECT
-            a.id as aparelho_id, a.numero_serie, 
-            mo.id as modelo_id, mo.nome_modelo, 
-            ma.id as marca_id, ma.nome_marca,
-            c.id as colaborador_id, c.nome_completo as colaborador_nome, c.codigo as colaborador_codigo, s.nome_setor as colaborador_setor
-        FROM aparelhos a
-        JOIN status st ON a.status_id = st.id
-        LEFT JOIN UltimaMovimentacao um ON a.id = um.aparelho_id AND um.rn = 1
-        LEFT JOIN colaboradores c ON um.colaborador_id = c.id
-        LEFT JOIN setores s ON c.setor_id = s.id
-        JOIN modelos mo ON a.modelo_id = mo.id
-        JOIN marcas ma ON mo.marca_id = ma.id
-        WHERE st.nome_status = 'Em uso' AND c.id IS NOT NULL AND c.status = 'Ativo' -- Garante que o colaborador está ativo
-        ORDER BY c.nome_completo;
-    """
-    df = conn.query(query)
-    return df.to_dict('records')
-
 def processar_devolucao(aparelho_id, colaborador_id, nome_colaborador_devolveu, checklist_data, destino_final, observacoes):
     conn = get_db_connection()
     try:
@@ -116,19 +92,13 @@ def processar_devolucao(aparelho_id, colaborador_id, nome_colaborador_devolveu,
                 novo_status_nome = "Baixado/Inutilizado"
                 localizacao = "Descarte"
 
-            novo_status_id = s.execute(text("SELECT id FROM status WHERE nome_status = :nome"), {"nome": novo_status_nome}).scalar_one()
+            novo_status_id = exigir_id_referencia("status", novo_status_nome)
             checklist_json = json.dumps(checklist_data)
 
-            query_hist = text("""
-                INSERT INTO historico_movimentacoes 
-                (data_movimentacao, aparelho_id, colaborador_id, status_id, localizacao_atual, observacoes, checklist_devolucao, colaborador_snapshot)
-                VALUES (:data, :ap_id, NULL, :status_id, :loc, :obs, :checklist, :col_snap)
-            """)
-            s.execute(query_hist, {
-                "data": data_movimentacao_atual, "ap_id": aparelho_id, "status_id": novo_status_id,
-                "loc": localizacao, "obs": observacoes, "checklist": checklist_json, 
-                "col_snap": nome_colaborador_devolveu
-            })
+            inserir_movimentacao(
+                s, aparelho_id, novo_status_id, data_movimentacao_atual, colaborador_snapshot=nome_colaborador_devolveu,
+                localizacao=localizacao, observacoes=observacoes, checklist_json=checklist_json
+            )
 
             s.execute(text("UPDATE aparelhos SET status_id = :status_id WHERE id = :ap_id"), 
                       {"status_id": novo_status_id, "ap_id": aparelho_id})
@@ -153,9 +123,8 @@ def processar_devolucao(aparelho_id, colaborador_id, nome_colaborador_devolveu,
         return False, None, None
 
 
-@st.cache_data(ttl=30)
+@cache_tabelas("historico_movimentacoes", "aparelhos", "status", "modelos", "marcas", "colaboradores", "setores", ttl=30)
 def carregar_historico_devolucoes(start_date=None, end_date=None, ns_search=None, colaborador_search=None):
-    conn = get_db_connection()
     # --- Query Aprimorada ---
     # Busca mais dados para permitir o reenvio do e-mail com informações completas
     query = """
@@ -171,7 +140,9 @@ def carregar_historico_devolucoes(start_date=None, end_date=None, ns_search=None
             ma.nome_marca, mo.nome_modelo,
             a.numero_serie,
             h_prev.colaborador_snapshot AS colaborador_devolveu,
+            h_prev.prev_colaborador_id AS colaborador_id,
             c.codigo as colaborador_codigo,
+            c.gmail as colaborador_gmail,
             s_colab.nome_setor as colaborador_setor,
             s_ap.nome_status AS destino_final,
             h_prev.localizacao_atual, h_prev.observacoes, h_prev.checklist_devolucao
@@ -204,7 +175,7 @@ def carregar_historico_devolucoes(start_date=None, end_date=None, ns_search=None
 
     query += " ORDER BY h_prev.data_movimentacao DESC"
     
-    df = conn.query(query, params=params)
+    df = consultar(query, params=params)
     
     if not df.empty:
         # Cria a coluna 'aparelho' para exibição
@@ -215,137 +186,14 @@ def carregar_historico_devolucoes(start_date=None, end_date=None, ns_search=None
         )
     return df
 
-# --- FUNÇÃO ATUALIZADA: Usando montar_layout_base ---
 def gerar_conteudo_email_devolucao(dados_aparelho, checklist_data, destino_final, observacoes, data_devolucao):
     assunto = f"Devolução do aparelho - {dados_aparelho.get('colaborador_nome', 'N/A')}"
-
-    # Monta as linhas da tabela de checklist em HTML
-    checklist_rows = ""
-    if isinstance(checklist_data, dict):
-        for item, details in checklist_data.items():
-            entregue = "Sim" if details.get('entregue', False) else "Não"
-            estado = details.get('estado', 'N/A')
-            checklist_rows += f"""
-            <tr>
-                <td style="padding: 6px; border-bottom: 1px solid #eeeeee; font-family: Arial, sans-serif; font-size: 13px; color: #333;">{item}</td>
-                <td style="padding: 6px; border-bottom: 1px solid #eeeeee; font-family: Arial, sans-serif; font-size: 13px; color: #333;">{entregue}</td>
-                <td style="padding: 6px; border-bottom: 1px solid #eeeeee; font-family: Arial, sans-serif; font-size: 13px; color: #333;">{estado}</td>
-            </tr>
-            """
-
-    checklist_html_table = f"""
-    <table border="0" cellpadding="0" cellspacing="0" width="100%" style="border-collapse: collapse;">
-        <thead>
-            <tr bgcolor="#f2f2f2">
-                <th align="left" style="padding: 8px; border-bottom: 2px solid #cccccc; font-family: Arial, sans-serif; font-size: 13px; color: #333;">Item</th>
-                <th align="left" style="padding: 8px; border-bottom: 2px solid #cccccc; font-family: Arial, sans-serif; font-size: 13px; color: #333;">Entregue</th>
-                <th align="left" style="padding: 8px; border-bottom: 2px solid #cccccc; font-family: Arial, sans-serif; font-size: 13px; color: #333;">Estado</th>
-            </tr>
-        </thead>
-        <tbody>
-            {checklist_rows}
-        </tbody>
-    </table>
-    """
-
-    # Constrói o "miolo" do e-mail que será injetado no template base
-    # Usamos tabelas em vez de divs e margins para compatibilidade com Outlook
-    miolo_html = f"""
-    <tr>
-        <td style="color: #003366; font-family: Arial, sans-serif; font-size: 22px; font-weight: bold; padding-bottom: 5px; border-bottom: 2px solid #003366;">
-            Relatório de Devolução de Ativo
-        </td>
-    </tr>
-    <tr><td height="15" style="font-size:0px; line-height:0px;">&nbsp;</td></tr>
-    
-    <tr>
-        <td style="font-family: Arial, sans-serif; font-size: 14px; color: #333333;">
-            <strong>Data da Devolução:</strong> {data_devolucao.strftime('%d/%m/%Y %H:%M')}
-        </td>
-    </tr>
-    <tr><td height="25" style="font-size:0px; line-height:0px;">&nbsp;</td></tr>
-
-    <!-- Seção Colaborador -->
-    <tr>
-        <td style="color: #003366; font-family: Arial, sans-serif; font-size: 16px; font-weight: bold; padding-bottom: 5px;">
-            Dados do Colaborador
-        </td>
-    </tr>
-    <tr>
-        <td style="font-family: Arial, sans-serif; font-size: 14px; color: #333333; line-height: 1.6;">
-            <strong>Nome Completo:</strong> {dados_aparelho.get('colaborador_nome', 'N/A')}<br/>
-            <strong>Código:</strong> {dados_aparelho.get('colaborador_codigo', 'N/A')}<br/>
-            <strong>Função (Setor):</strong> {dados_aparelho.get('colaborador_setor', 'N/A')}
-        </td>
-    </tr>
-    <tr><td height="20" style="font-size:0px; line-height:0px;">&nbsp;</td></tr>
-
-    <!-- Seção Aparelho -->
-    <tr>
-        <td style="color: #003366; font-family: Arial, sans-serif; font-size: 16px; font-weight: bold; padding-bottom: 5px;">
-            Dados do Aparelho
-        </td>
-    </tr>
-    <tr>
-        <td style="font-family: Arial, sans-serif; font-size: 14px; color: #333333; line-height: 1.6;">
-            <strong>Aparelho:</strong> {dados_aparelho.get('nome_marca', '')} {dados_aparelho.get('nome_modelo', '')}<br/>
-            <strong>N°/S do Aparelho:</strong> {dados_aparelho.get('numero_serie', 'N/A')}
-        </td>
-    </tr>
-    <tr><td height="20" style="font-size:0px; line-height:0px;">&nbsp;</td></tr>
-
-    <!-- Seção Informações -->
-    <tr>
-        <td style="color: #003366; font-family: Arial, sans-serif; font-size: 16px; font-weight: bold; padding-bottom: 5px;">
-            Informações da Devolução
-        </td>
-    </tr>
-    <tr>
-        <td style="font-family: Arial, sans-serif; font-size: 14px; color: #333333; line-height: 1.6;">
-            <strong>Destino Final do Aparelho:</strong> {destino_final}<br/>
-            <strong>Observações:</strong> {observacoes if observacoes else 'Nenhuma observação registada.'}
-        </td>
-    </tr>
-    <tr><td height="20" style="font-size:0px; line-height:0px;">&nbsp;</td></tr>
-
-    <!-- Seção Checklist -->
-    <tr>
-        <td style="color: #003366; font-family: Arial, sans-serif; font-size: 16px; font-weight: bold; padding-bottom: 10px;">
-            Detalhes do Checklist da Devolução
-        </td>
-    </tr>
-    <tr>
-        <td>
-            {checklist_html_table}
-        </td>
-    </tr>
-    """
-    
-    # Usa a função base para envolver o miolo na estrutura compatível com Outlook
-    html_completo = montar_layout_base(assunto, miolo_html)
-
-    # Texto puro como fallback
-    corpo_texto = f"""
-    Relatório de Devolução de Ativo
-
-    Data da Devolução: {data_devolucao.strftime('%d/%m/%Y %H:%M')}
-
-    Dados do Colaborador:
-    Nome Completo: {dados_aparelho.get('colaborador_nome', 'N/A')}
-    Código: {dados_aparelho.get('colaborador_codigo', 'N/A')}
-    Função (Setor): {dados_aparelho.get('colaborador_setor', 'N/A')}
-
-    Dados do Aparelho:
-    Aparelho: {dados_aparelho.get('nome_marca', '')} {dados_aparelho.get('nome_modelo', '')}
-    N°/S do Aparelho: {dados_aparelho.get('numero_serie', 'N/A')}
-
-    Informações da Devolução:
-    Destino Final do Aparelho: {destino_final}
-    Observações: {observacoes if observacoes else 'Nenhuma observação registada.'}
-
-    Checklist: (Ver e-mail em HTML para tabela formatada)
-    """
-    
+    # Template compilado uma vez por processo (templates_email/devolucao.html e devolucao.txt)
+    html_completo, corpo_texto = renderizar_email(
+        "devolucao", titulo=assunto, aparelho=dados_aparelho,
+        checklist=checklist_data if isinstance(checklist_data, dict) else {},
+        destino_final=destino_final, observacoes=observacoes, data_devolucao=data_devolucao,
+    )
     return assunto, html_completo, corpo_texto
 
 # --- Interface Principal ---
@@ -370,76 +218,64 @@ try:
         # Se a devolução NÃO foi concluída, mostra o formulário normal
         if not st.session_state.devolucao_concluida:
             st.subheader("1. Selecione o Aparelho a Ser Devolvido")
-            aparelhos_em_uso = carregar_aparelhos_em_uso()
-
-            if not aparelhos_em_uso:
-                st.info("Não há aparelhos com o status 'Em uso' para serem devolvidos no momento.")
-            else:
-                aparelhos_dict = {
-                    f"{ap['colaborador_nome']} - {ap['nome_marca']} {ap['nome_modelo']} (S/N: {ap['numero_serie']})": ap
-                    for ap in aparelhos_em_uso
-                }
-                
-                aparelho_selecionado_str = st.selectbox(
-                    "Selecione o aparelho e colaborador:",
-                    options=list(aparelhos_dict.keys()),
-                    index=None,
-                    placeholder="Clique ou digite para pesquisar...",
-                    key="sb_aparelho_devolucao"
-                )
-                
-                if aparelho_selecionado_str:
-                    aparelho_selecionado_data = aparelhos_dict[aparelho_selecionado_str]
+            # Pesquisa no servidor (N/S, IMEI ou nome do colaborador) e lê apenas o aparelho escolhido.
+            aparelho_selecionado_id = seletor_registo(
+                "aparelhos_em_uso", "Selecione o aparelho e colaborador:",
+                placeholder="Digite o N/S, IMEI ou nome do colaborador...", key="sb_aparelho_devolucao"
+            )
+            aparelho_selecionado_data = detalhes_registo("aparelhos_em_uso", aparelho_selecionado_id) if aparelho_selecionado_id else None
+            if aparelho_selecionado_data:
                     
-                    st.markdown("---")
-                    st.subheader("2. Realize a Inspeção e Decida o Destino Final")
-                    with st.form("form_devolucao"):
-                        st.markdown("##### Checklist de Devolução")
+                st.markdown("---")
+                st.subheader("2. Realize a Inspeção e Decida o Destino Final")
+                with st.form("form_devolucao"):
+                    st.markdown("##### Checklist de Devolução")
                         
-                        checklist_data_input = {}
-                        itens_checklist = ["Tela", "Carcaça", "Bateria", "Botões", "USB", "Chip", "Carregador", "Cabo USB", "Capa", "Película"]
-                        opcoes_estado = ["Bom", "Riscado", "Quebrado", "Faltando", "Permanece"]
+                    checklist_data_input = {}
+                    itens_checklist = ["Tela", "Carcaça", "Bateria", "Botões", "USB", "Chip", "Carregador", "Cabo USB", "Capa", "Película"]
+                    opcoes_estado = ["Bom", "Riscado", "Quebrado", "Faltando", "Permanece"]
                         
-                        cols = st.columns(2)
-                        for i, item in enumerate(itens_checklist):
-                            with cols[i % 2]:
-                                entregue = st.checkbox(f"{item}", value=True, key=f"entregue_{item}_{aparelho_selecionado_data['aparelho_id']}")
-                                estado = st.selectbox(f"Estado de {item}", options=opcoes_estado, key=f"estado_{item}_{aparelho_selecionado_data['aparelho_id']}", label_visibility="collapsed")
-                                checklist_data_input[item] = {'entregue': entregue, 'estado': estado}
+                    cols = st.columns(2)
+                    for i, item in enumerate(itens_checklist):
+                        with cols[i % 2]:
+                            entregue = st.checkbox(f"{item}", value=True, key=f"entregue_{item}_{aparelho_selecionado_data['aparelho_id']}")
+                            estado = st.selectbox(f"Estado de {item}", options=opcoes_estado, key=f"estado_{item}_{aparelho_selecionado_data['aparelho_id']}", label_visibility="collapsed")
+                            checklist_data_input[item] = {'entregue': entregue, 'estado': estado}
                         
-                        observacoes_input = st.text_area("Observações Gerais da Devolução", placeholder="Ex: Tela com risco profundo no canto superior direito.")
+                    observacoes_input = st.text_area("Observações Gerais da Devolução", placeholder="Ex: Tela com risco profundo no canto superior direito.")
                         
-                        st.markdown("---")
-                        st.markdown("##### Destino Final do Aparelho")
-                        destino_final_input = st.radio(
-                            "Selecione o destino do aparelho após a inspeção:",
-                            ["Devolver ao Estoque", "Enviar para Manutenção", "Baixar/Inutilizado"],
-                            horizontal=True, key="destino_final"
+                    st.markdown("---")
+                    st.markdown("##### Destino Final do Aparelho")
+                    destino_final_input = st.radio(
+                        "Selecione o destino do aparelho após a inspeção:",
+                        ["Devolver ao Estoque", "Enviar para Manutenção", "Baixar/Inutilizado"],
+                        horizontal=True, key="destino_final"
+                    )
+
+                    submitted = st.form_submit_button("Processar Devolução", use_container_width=True, type="primary")
+                    if submitted:
+                        sucesso, novo_status, data_mov = processar_devolucao(
+                            aparelho_selecionado_data['aparelho_id'], 
+                            aparelho_selecionado_data['colaborador_id'], 
+                            aparelho_selecionado_data['colaborador_nome'], 
+                            checklist_data_input, 
+                            destino_final_input, 
+                            observacoes_input
                         )
-
-                        submitted = st.form_submit_button("Processar Devolução", use_container_width=True, type="primary")
-                        if submitted:
-                            sucesso, novo_status, data_mov = processar_devolucao(
-                                aparelho_selecionado_data['aparelho_id'], 
-                                aparelho_selecionado_data['colaborador_id'], 
-                                aparelho_selecionado_data['colaborador_nome'], 
-                                checklist_data_input, 
-                                destino_final_input, 
-                                observacoes_input
-                            )
-                            if sucesso:
-                                st.session_state.devolucao_concluida = True
-                                # Guarda os dados necessários para o e-mail
-                                st.session_state.email_data = {
-                                    "dados_aparelho": aparelho_selecionado_data,
-                                    "checklist_data": checklist_data_input,
-                                    "destino_final": destino_final_input,
-                                    "observacoes": observacoes_input,
-                                    "data_devolucao": data_mov,
-                                    "novo_status": novo_status
-                                }
-                                st.cache_data.clear()
-                                st.rerun() # Recarrega para mostrar a secção de e-mail
+                        if sucesso:
+                            st.session_state.devolucao_concluida = True
+                            # Guarda os dados necessários para o e-mail
+                            st.session_state.email_data = {
+                                "dados_aparelho": aparelho_selecionado_data,
+                                "checklist_data": checklist_data_input,
+                                "destino_final": destino_final_input,
+                                "observacoes": observacoes_input,
+                                "data_devolucao": data_mov,
+                                "novo_status": novo_status
+                            }
+                            invalidar_tabelas("aparelhos", "historico_movimentacoes", "manutencoes")
+                            limpar_seletor("sb_aparelho_devolucao")
+                            st.rerun() # Recarrega para mostrar a secção de e-mail
 
         # Se a devolução FOI concluída, mostra a secção de e-mail opcional
         else:
@@ -461,7 +297,7 @@ try:
                         if destinatarios_str:
                             destinatarios_list = [email.strip() for email in destinatarios_str.split(',') if email.strip()]
                             if destinatarios_list:
-                                with st.spinner("A gerar e enviar o e-mail..."):
+                                with st.spinner("A gerar o e-mail..."):
                                     assunto, corpo_html, corpo_texto = gerar_conteudo_email_devolucao(
                                         email_data['dados_aparelho'], 
                                         email_data['checklist_data'], 
@@ -469,8 +305,8 @@ try:
                                         email_data['observacoes'],
                                         email_data['data_devolucao']
                                     )
-                                    if enviar_email(destinatarios_list, assunto, corpo_html, corpo_texto):
-                                        st.success("E-mail de notificação enviado com sucesso!")
+                                    if enviar_email(destinatarios_list, assunto, corpo_html, corpo_texto, origem="devolucao"):
+                                        st.success("E-mail de notificação colocado na fila de envio!")
                                         # Limpa o estado após o envio
                                         del st.session_state.email_data
                                         st.session_state.devolucao_concluida = False
@@ -513,7 +349,7 @@ try:
         if historico_df.empty:
             st.warning("Nenhum registo de devolução encontrado para os filtros selecionados.")
         else:
-            df_para_exibir = historico_df.drop(columns=['id', 'checklist_devolucao', 'checklist_detalhes'], errors='ignore').copy()
+            df_para_exibir = historico_df.drop(columns=['id', 'checklist_devolucao', 'checklist_detalhes', 'colaborador_id', 'colaborador_gmail'], errors='ignore').copy()
             df_para_exibir.rename(columns={
                 'data_movimentacao': 'Data da Devolução', 'aparelho': 'Aparelho',
                 'numero_serie': 'N/S do Aparelho', 'colaborador_devolveu': 'Devolvido por',
@@ -526,6 +362,19 @@ try:
                 "Data da Devolução": st.column_config.DatetimeColumn(format="DD/MM/YYYY HH:mm")
             })
 
+            # --- ENVIO EM MASSA: um e-mail por colaborador com as suas devoluções ---
+            with st.expander("Enviar Resumo a Cada Colaborador"):
+                n_colaboradores = historico_df['colaborador_devolveu'].fillna("Sem colaborador").nunique()
+                st.write(f"**{len(historico_df)} devoluções filtradas, de {n_colaboradores} colaborador(es).** Cada colaborador recebe apenas as suas.")
+                para_colaborador = st.checkbox("Enviar para o Gmail de cada colaborador", value=True, key="dev_massa_colab")
+                copia_str = st.text_input("Cópia para (separados por vírgula, opcional):", key="dev_massa_copia")
+                if st.button("Enviar Resumos", type="primary"):
+                    copia = [email.strip() for email in copia_str.split(',') if email.strip()]
+                    with st.spinner("A gerar os e-mails..."):
+                        emails, sem_destinatario = emails_devolucoes_por_colaborador(historico_df, copia, para_colaborador)
+                    enviar_por_colaborador(emails, sem_destinatario, "devolucoes_massa", "lote_email_devolucoes")
+                mostrar_estado_envio("lote_email_devolucoes")
+
             st.markdown("---")
             st.markdown("<h5>Detalhes do Checklist da Devolução</h5>", unsafe_allow_html=True)
 
@@ -566,7 +415,7 @@ try:
                                 if destinatarios_str:
                                     destinatarios_list = [email.strip() for email in destinatarios_str.split(',') if email.strip()]
                                     if destinatarios_list:
-                                        with st.spinner("A gerar e reenviar o e-mail..."):
+                                        with st.spinner("A gerar o e-mail..."):
                                             # Prepara o dicionário de dados do aparelho
                                             dados_aparelho_email = {
                                                 'colaborador_nome': linha_selecionada_data['colaborador_devolveu'],
@@ -585,8 +434,8 @@ try:
                                                 linha_selecionada_data['data_movimentacao']
                                             )
                                             
-                                            if enviar_email(destinatarios_list, assunto, corpo_html, corpo_texto):
-                                                st.success("E-mail de notificação reenviado com sucesso!")
+                                            if enviar_email(destinatarios_list, assunto, corpo_html, corpo_texto, origem="devolucao"):
+                                                st.success("E-mail de notificação colocado na fila de envio!")
                                             else:
                                                 st.error("Falha ao reenviar o e-mail.")
                                     else:
@@ -600,3 +449,5 @@ try:
 except Exception as e:
     st.error(f"Ocorreu um erro ao carregar a página de devoluções: {e}")
     st.info("Verifique se o banco de dados está a funcionar corretamente.")
+
+concluir_perfil()
@@ -3,6 +3,7 @@ from sqlalchemy import text
 from datetime import datetime
 # Importa a mesma função de hash usada no login e o logout para limpar a sessão se necessário
 from auth import hash_password, logout
+from db_utils import get_db_connection
 
 # --- BLOCO DE REDIRECIONAMENTO INTELIGENTE ---
 # Se o utilizador já estiver logado, esta página não deve ser para ele.
@@ -12,9 +13,6 @@ if st.session_state.get('logged_in', False):
 
 
 # --- Funções do DB ---
-def get_db_connection():
-    return st.connection("supabase", type="sql")
-
 def validar_token_e_redefinir_senha(token, nova_senha):
     """
     Verifica se o token é válido e, em caso afirmativo, redefine a senha do utilizador.
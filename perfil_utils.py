@@ -0,0 +1,141 @@
+import cProfile
+import contextvars
+import marshal
+import os
+import pstats
+import sys
+import time
+from collections import deque
+from datetime import datetime
+import pandas as pd
+import streamlit as st
+from diagnostico_utils import ao_medir
+
+# --- Perfil por Execução (apenas Administradores) ---
+# O Streamlit volta a correr todo o script da página a cada interação. Com o modo de perfil ligado
+# na barra lateral, cada execução corre sob o cProfile e, no fim da página, é mostrado o tempo gasto
+# por categoria (banco de dados, pandas, PDF/e-mail, widgets do Streamlit e código da aplicação), as
+# funções mais pesadas e um ficheiro .prof para download (abre no snakeviz ou converte-se num
+# flamegraph com o flameprof). O cProfile só vê a thread do script; o tempo total das instruções SQL,
+# incluindo as das threads do dashboard, vem da instrumentação do diagnostico_utils.
+# Uso numa página: iniciar_perfil() no fim do bloco da barra lateral e concluir_perfil() no fim do script.
+
+MAX_PERFIS = 5
+TOP_FUNCOES = 25
+
+# Categoria -> fragmentos do caminho do módulo (ou do nome das funções em C, ex.: métodos do psycopg2).
+CATEGORIAS = (
+    ("Banco de dados", ("/sqlalchemy/", "/psycopg2/", "psycopg2.")),
+    ("pandas", ("/pandas/", "/numpy/", "pandas.", "numpy.")),
+    ("PDF/E-mail", ("/weasyprint/", "/pydyf/", "/fontTools/", "/tinycss2/", "/cssselect2/", "/html5lib/",
+                    "/smtplib.py", "/email/", "email_utils.py")),
+    ("Widgets (Streamlit)", ("/streamlit/", "/pyarrow/", "/google/protobuf/", "/plotly/", "pyarrow.")),
+)
+CATEGORIA_APLICACAO = "Aplicação e outros"
+
+_perfil_atual = contextvars.ContextVar("perfil_atual", default=None)
+
+def _somar_sql(duracao_ms, linhas):
+    perfil = _perfil_atual.get()
+    if perfil is not None:
+        perfil["sql_ms"] += duracao_ms
+        perfil["instrucoes"] += 1
+
+ao_medir(_somar_sql)
+
+def _categoria(arquivo, funcao):
+    texto = f"{arquivo} {funcao}".replace("\\", "/")
+    for nome, fragmentos in CATEGORIAS:
+        if any(fragmento in texto for fragmento in fragmentos):
+            return nome
+    return CATEGORIA_APLICACAO
+
+def _nome_curto(arquivo, linha, funcao):
+    if arquivo == "~":
+        return funcao
+    partes = arquivo.replace("\\", "/").split("/")
+    return f"{'/'.join(partes[-2:])}:{linha}({funcao})"
+
+def iniciar_perfil():
+    """Mostra o interruptor do modo de perfil na barra lateral e, se estiver ligado, começa a perfilar a execução."""
+    _perfil_atual.set(None)
+    if st.session_state.get('user_role') != 'Administrador':
+        return
+    # Uma execução anterior interrompida (st.stop, st.rerun ou erro) não chegou ao concluir_perfil().
+    pendente = st.session_state.pop('_perfil_pendente', None)
+    if pendente is not None:
+        pendente["profiler"].disable()
+
+    ativo = st.sidebar.toggle("Perfilar execuções", value=st.session_state.get('perfil_ativo', False),
+                              help="Mede cada execução desta página (banco, pandas, PDF/e-mail e widgets).")
+    st.session_state['perfil_ativo'] = ativo
+    if not ativo:
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        st.sidebar.warning("Outra execução está a ser perfilada neste processo. Tente novamente.")
+        return
+    perfil = {
+        "pagina": os.path.basename(sys._getframe(1).f_code.co_filename),
+        "inicio": time.perf_counter(), "profiler": profiler, "sql_ms": 0.0, "instrucoes": 0,
+    }
+    _perfil_atual.set(perfil)
+    st.session_state['_perfil_pendente'] = perfil
+
+def concluir_perfil():
+    """Termina o perfil da execução atual (se houver) e mostra o resultado no fim da página."""
+    perfil = st.session_state.pop('_perfil_pendente', None)
+    _perfil_atual.set(None)
+    if perfil is None:
+        return
+    perfil["profiler"].disable()
+    total_ms = (time.perf_counter() - perfil["inicio"]) * 1000
+
+    estatisticas = pstats.Stats(perfil["profiler"])
+    categorias = {nome: 0.0 for nome, _ in CATEGORIAS}
+    categorias[CATEGORIA_APLICACAO] = 0.0
+    funcoes = []
+    for (arquivo, linha, funcao), (_, chamadas, proprio, acumulado, _) in estatisticas.stats.items():
+        categoria = _categoria(arquivo, funcao)
+        categorias[categoria] += proprio * 1000
+        funcoes.append({
+            "Função": _nome_curto(arquivo, linha, funcao), "Categoria": categoria, "Chamadas": chamadas,
+            "Tempo próprio (ms)": round(proprio * 1000, 1), "Tempo acumulado (ms)": round(acumulado * 1000, 1),
+        })
+    resumo = {
+        "pagina": perfil["pagina"], "momento": datetime.now(), "total_ms": total_ms,
+        "categorias": categorias, "sql_ms": perfil["sql_ms"], "instrucoes": perfil["instrucoes"],
+        "funcoes": pd.DataFrame(funcoes).sort_values("Tempo próprio (ms)", ascending=False).head(TOP_FUNCOES),
+        "dump": marshal.dumps(estatisticas.stats),
+    }
+    perfis = st.session_state.setdefault('perfis_execucao', deque(maxlen=MAX_PERFIS))
+    perfis.appendleft(resumo)
+    _mostrar_perfil(resumo, list(perfis))
+
+def _mostrar_perfil(resumo, perfis):
+    st.markdown("---")
+    with st.expander(f"Perfil desta execução: {resumo['total_ms']:.0f} ms ({resumo['pagina']})", expanded=True):
+        colunas = st.columns(len(resumo["categorias"]))
+        for coluna, (nome, ms) in zip(colunas, resumo["categorias"].items()):
+            coluna.metric(nome, f"{ms:.0f} ms")
+        st.caption(
+            f"Tempo próprio das funções na thread do script, por categoria. Instruções SQL medidas: "
+            f"{resumo['instrucoes']} ({resumo['sql_ms']:.0f} ms, incluindo as executadas em paralelo). "
+            "O desenho dos widgets no navegador não entra nestes tempos."
+        )
+        st.dataframe(resumo["funcoes"], hide_index=True, use_container_width=True)
+        st.download_button(
+            "Baixar perfil (.prof)", data=resumo["dump"],
+            file_name=f"perfil_{os.path.splitext(resumo['pagina'])[0]}_{resumo['momento']:%Y%m%d_%H%M%S}.prof",
+            mime="application/octet-stream",
+            help="Compatível com pstats, snakeviz e flameprof (flamegraph).",
+        )
+        if len(perfis) > 1:
+            st.subheader("Execuções Anteriores")
+            st.dataframe(pd.DataFrame([
+                {"Página": p["pagina"], "Momento": p["momento"].strftime("%H:%M:%S"), "Total (ms)": round(p["total_ms"]),
+                 **{nome: round(ms) for nome, ms in p["categorias"].items()}, "SQL medido (ms)": round(p["sql_ms"])}
+                for p in perfis
+            ]), hide_index=True, use_container_width=True)
@@ -0,0 +1,203 @@
+import streamlit as st
+from db_utils import consultar, para_python
+from cache_utils import cache_tabelas
+
+try:
+    from streamlit_searchbox import st_searchbox
+except ImportError:  # componente opcional: sem ele a pesquisa só corre ao carregar Enter
+    st_searchbox = None
+
+# --- Pesquisa com Sugestões (search-as-you-type) ---
+# Cada fonte declara as colunas pesquisáveis. Cada coluna é pesquisada num ramo próprio do UNION,
+# para que o PostgreSQL use o índice de trigramas dessa coluna (migracoes_utils, versão 3) em vez de
+# percorrer a tabela. O ramo aceita ocorrências do termo (ILIKE '%termo%') e termos parecidos
+# (operador <% do pg_trgm, tolerante a erros de digitação). Os resultados são ordenados pela
+# semelhança, com prioridade para os que começam pelo termo e para os que o contêm.
+# Sem a extensão pg_trgm a pesquisa continua a funcionar, só com ILIKE e sem semelhança.
+# As fontes cujo valor é o ID do registo (com "detalhes") alimentam os seletores dos formulários:
+# em vez de enviar para o navegador todos os aparelhos e colaboradores numa selectbox, o seletor
+# pesquisa no servidor enquanto se escreve e, no fim, lê apenas o registo escolhido.
+
+MIN_CARACTERES = 3       # abaixo de 3 caracteres não há trigramas e o índice não ajuda
+LIMITE_SUGESTOES = 10
+ESPERA_DIGITACAO_MS = 300
+
+FONTES_PESQUISA = {
+    "aparelhos": {
+        "from": "aparelhos a LEFT JOIN modelos mo ON a.modelo_id = mo.id LEFT JOIN marcas ma ON mo.marca_id = ma.id",
+        "colunas": ["a.numero_serie", "a.imei1", "a.imei2"],
+        "valor": "a.numero_serie",
+        "rotulo": "a.numero_serie || COALESCE(' · ' || ma.nome_marca || ' ' || mo.nome_modelo, '')",
+    },
+    "colaboradores": {
+        "from": "colaboradores c",
+        "colunas": ["c.nome_completo", "c.codigo", "c.gmail"],
+        "valor": "c.nome_completo",
+        "rotulo": "COALESCE(c.codigo || ' - ', '') || c.nome_completo || COALESCE(' · ' || c.gmail, '')",
+    },
+    "contas_gmail": {
+        "from": "contas_gmail cg LEFT JOIN colaboradores c ON cg.colaborador_id = c.id",
+        "colunas": ["cg.email", "c.nome_completo"],
+        "valor": "cg.email",
+        "rotulo": "cg.email || COALESCE(' · ' || c.nome_completo, '')",
+    },
+    # --- Seletores dos formulários (o valor é o ID) ---
+    "aparelhos_movimentacao": {
+        "from": """aparelhos a JOIN modelos mo ON a.modelo_id = mo.id JOIN marcas ma ON mo.marca_id = ma.id
+                   JOIN status s ON a.status_id = s.id""",
+        "where": "s.nome_status != 'Baixado/Inutilizado'",
+        "colunas": ["a.numero_serie", "a.imei1", "a.imei2"],
+        "valor": "a.id",
+        "rotulo": "ma.nome_marca || ' ' || mo.nome_modelo || ' (S/N: ' || a.numero_serie || ') — Status: ' || s.nome_status",
+    },
+    "aparelhos_manutencao": {
+        "from": """aparelhos a JOIN modelos mo ON a.modelo_id = mo.id JOIN marcas ma ON mo.marca_id = ma.id
+                   JOIN status s ON a.status_id = s.id
+                   LEFT JOIN aparelho_posse_atual uh ON a.id = uh.aparelho_id
+                   LEFT JOIN colaboradores c ON uh.colaborador_id = c.id""",
+        "where": "s.nome_status NOT IN ('Em manutenção', 'Baixado/Inutilizado')",
+        "colunas": ["a.numero_serie", "a.imei1", "a.imei2"],
+        "valor": "a.id",
+        "rotulo": """ma.nome_marca || ' ' || mo.nome_modelo || ' (S/N: ' || a.numero_serie || ') - [Com: '
+                     || COALESCE(uh.colaborador_snapshot, c.nome_completo, 'Ninguém') || ']'""",
+    },
+    "aparelhos_em_uso": {
+        "from": """aparelhos a JOIN modelos mo ON a.modelo_id = mo.id JOIN marcas ma ON mo.marca_id = ma.id
+                   JOIN status st ON a.status_id = st.id
+                   JOIN aparelho_posse_atual um ON a.id = um.aparelho_id
+                   JOIN colaboradores c ON um.colaborador_id = c.id""",
+        "where": "st.nome_status = 'Em uso' AND c.status = 'Ativo'",
+        "colunas": ["a.numero_serie", "a.imei1", "a.imei2", "c.nome_completo"],
+        "valor": "a.id",
+        "rotulo": "c.nome_completo || ' - ' || ma.nome_marca || ' ' || mo.nome_modelo || ' (S/N: ' || a.numero_serie || ')'",
+        "detalhes": """
+            SELECT
+                a.id as aparelho_id, a.numero_serie,
+                mo.id as modelo_id, mo.nome_modelo,
+                ma.id as marca_id, ma.nome_marca,
+                c.id as colaborador_id, c.nome_completo as colaborador_nome, c.codigo as colaborador_codigo, s.nome_setor as colaborador_setor
+            FROM aparelhos a
+            JOIN modelos mo ON a.modelo_id = mo.id
+            JOIN marcas ma ON mo.marca_id = ma.id
+            LEFT JOIN aparelho_posse_atual um ON a.id = um.aparelho_id
+            LEFT JOIN colaboradores c ON um.colaborador_id = c.id
+            LEFT JOIN setores s ON c.setor_id = s.id
+            WHERE a.id = :id
+        """,
+    },
+    "colaboradores_ativos": {
+        "from": "colaboradores c",
+        "where": "c.status = 'Ativo'",
+        "colunas": ["c.nome_completo", "c.codigo"],
+        "valor": "c.id",
+        "rotulo": "c.nome_completo || COALESCE(' (' || c.codigo || ')', '')",
+        "detalhes": "SELECT id, codigo, nome_completo, gmail, setor_id FROM colaboradores WHERE id = :id",
+    },
+}
+
+def _escapar_like(termo):
+    return termo.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+@cache_tabelas("schema_migrations", ttl=300)
+def trigramas_disponiveis():
+    return not consultar("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'").empty
+
+def _sql_pesquisa(fonte, com_trigramas):
+    definicao = FONTES_PESQUISA[fonte]
+    ramos = []
+    for coluna in definicao["colunas"]:
+        pontuacao = f"CASE WHEN {coluna} ILIKE :prefixo THEN 2 WHEN {coluna} ILIKE :padrao THEN 1 ELSE 0 END"
+        condicao = f"{coluna} ILIKE :padrao"
+        if com_trigramas:
+            pontuacao += f" + word_similarity(:termo, {coluna})"
+            condicao += f" OR :termo <% {coluna}"
+        if definicao.get("where"):
+            condicao = f"({condicao}) AND {definicao['where']}"
+        ramos.append(f"""
+            (SELECT {definicao['valor']} AS valor, {definicao['rotulo']} AS rotulo, {pontuacao} AS pontuacao
+             FROM {definicao['from']}
+             WHERE {condicao}
+             ORDER BY pontuacao DESC LIMIT :limite)
+        """)
+    return f"""
+        SELECT valor, rotulo, MAX(pontuacao) AS pontuacao
+        FROM ({' UNION ALL '.join(ramos)}) r
+        WHERE valor IS NOT NULL
+        GROUP BY valor, rotulo
+        ORDER BY pontuacao DESC, valor
+        LIMIT :limite
+    """
+
+_TABELAS_PESQUISA = ("aparelhos", "modelos", "marcas", "status", "colaboradores", "setores", "contas_gmail", "historico_movimentacoes")
+
+@cache_tabelas(*_TABELAS_PESQUISA, ttl=30)
+def pesquisar(fonte, termo, limite=LIMITE_SUGESTOES):
+    """
+    Devolve até `limite` pares (rótulo, valor) da fonte (ver FONTES_PESQUISA), os mais parecidos
+    com o termo primeiro. Termos com menos de MIN_CARACTERES devolvem uma lista vazia.
+    """
+    termo = (termo or "").strip()
+    if len(termo) < MIN_CARACTERES:
+        return []
+    params = {"termo": termo, "padrao": f"%{_escapar_like(termo)}%", "prefixo": f"{_escapar_like(termo)}%", "limite": int(limite)}
+    df = consultar(_sql_pesquisa(fonte, trigramas_disponiveis()), params=params)
+    return [(rotulo, para_python(valor)) for rotulo, valor in zip(df["rotulo"], df["valor"])]
+
+@cache_tabelas(*_TABELAS_PESQUISA, ttl=30)
+def detalhes_registo(fonte, id_registo):
+    """Lê apenas o registo escolhido num seletor (dict com as colunas de "detalhes" da fonte) ou None."""
+    df = consultar(FONTES_PESQUISA[fonte]["detalhes"], params={"id": int(id_registo)})
+    return df.to_dict('records')[0] if not df.empty else None
+
+def caixa_pesquisa(fonte, rotulo, key, placeholder="", limite=LIMITE_SUGESTOES):
+    """
+    Caixa de pesquisa com sugestões enquanto se escreve (com espera de ESPERA_DIGITACAO_MS entre
+    teclas). Devolve o valor da sugestão escolhida ou, sem escolha, o texto escrito ("" se vazia).
+    Sem o componente streamlit-searchbox instalado, usa um st.text_input normal.
+    """
+    if st_searchbox is None:
+        return st.text_input(rotulo, placeholder=placeholder, key=key)
+
+    def sugestoes(termo):
+        try:
+            return pesquisar(fonte, termo, limite)
+        except Exception as e:
+            st.error(f"Erro na pesquisa: {e}")
+            return []
+
+    return st_searchbox(
+        sugestoes, label=rotulo, placeholder=placeholder, key=key,
+        debounce=ESPERA_DIGITACAO_MS, default_use_searchterm=True,
+    ) or ""
+
+def seletor_registo(fonte, rotulo, key, placeholder="Digite para pesquisar...", limite=LIMITE_SUGESTOES):
+    """
+    Seletor de um registo com pesquisa no servidor (ex.: N/S, IMEI ou nome do colaborador).
+    Devolve o ID escolhido ou None. Não pode ficar dentro de um st.form, pois cada tecla tem de
+    chegar ao servidor; coloque-o antes do formulário.
+    """
+    if st_searchbox is not None:
+        def sugestoes(termo):
+            try:
+                return pesquisar(fonte, termo, limite)
+            except Exception as e:
+                st.error(f"Erro na pesquisa: {e}")
+                return []
+
+        return st_searchbox(sugestoes, label=rotulo, placeholder=placeholder, key=key, debounce=ESPERA_DIGITACAO_MS)
+
+    # Sem o componente: o termo é enviado com Enter e as sugestões aparecem numa selectbox curta.
+    termo = st.text_input(rotulo, placeholder=placeholder, key=f"{key}_termo")
+    opcoes = dict(pesquisar(fonte, termo, limite)) if termo else {}
+    if not opcoes:
+        if termo and len(termo.strip()) >= MIN_CARACTERES:
+            st.caption("Nenhum registo encontrado.")
+        return None
+    escolhido = st.selectbox("Resultados", options=list(opcoes), index=None, placeholder="Selecione...",
+                             key=f"{key}_opcao", label_visibility="collapsed")
+    return opcoes.get(escolhido)
+
+def limpar_seletor(key):
+    """Esvazia o seletor (ex.: depois de gravar o formulário que o usa)."""
+    for chave in (key, f"{key}_termo", f"{key}_opcao"):
+        st.session_state.pop(chave, None)
@@ -0,0 +1,115 @@
+import csv
+import hashlib
+import io
+from datetime import datetime
+from itertools import islice
+import pandas as pd
+
+# --- Leitura de Planilhas em Blocos ---
+# Lê CSV e XLSX linha a linha (o XLSX com o modo read_only do openpyxl, que percorre o XML da
+# folha sem o carregar inteiro) e entrega DataFrames de tamanho fixo. Assim uma planilha com
+# centenas de milhares de linhas nunca está toda em memória como DataFrame.
+# Tal como o antigo pd.read_excel(dtype=str).fillna(''), todas as células chegam como texto.
+
+TAMANHO_BLOCO = 5000
+LINHAS_AMOSTRA = 100
+
+def _eh_csv(nome_arquivo):
+    return nome_arquivo.lower().endswith(".csv")
+
+def _celula_texto(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))  # códigos e IMEIs guardados como número não ganham ".0"
+    if isinstance(valor, datetime):
+        return valor.strftime("%Y-%m-%d %H:%M:%S") if (valor.hour, valor.minute, valor.second) != (0, 0, 0) else valor.strftime("%Y-%m-%d")
+    return str(valor)
+
+def _linhas_csv(arquivo):
+    texto = io.TextIOWrapper(arquivo, encoding="utf-8-sig", newline="")
+    try:
+        amostra = texto.read(64 * 1024)
+        texto.seek(0)
+        try:
+            dialeto = csv.Sniffer().sniff(amostra, delimiters=",;\t|")
+        except csv.Error:
+            dialeto = csv.excel
+        yield from csv.reader(texto, dialeto)
+    finally:
+        texto.detach()  # não fecha o ficheiro enviado pelo utilizador
+
+def _linhas_xlsx(arquivo):
+    from openpyxl import load_workbook
+
+    livro = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        for linha in livro.worksheets[0].iter_rows(values_only=True):
+            yield [_celula_texto(v) for v in linha]
+    finally:
+        livro.close()
+
+def _iterar_linhas(arquivo, nome_arquivo):
+    """Devolve (cabeçalho, iterador das linhas de dados), ignorando linhas totalmente vazias."""
+    arquivo.seek(0)
+    linhas = _linhas_csv(arquivo) if _eh_csv(nome_arquivo) else _linhas_xlsx(arquivo)
+    cabecalho = [c.strip() for c in next(linhas, [])]
+    # Remove colunas vazias no fim do cabeçalho (comuns em folhas com formatação residual).
+    while cabecalho and not cabecalho[-1]:
+        cabecalho.pop()
+    largura = len(cabecalho)
+
+    def dados():
+        for linha in linhas:
+            linha = (list(linha) + [""] * largura)[:largura]
+            if any(c.strip() for c in linha):
+                yield linha
+    return cabecalho, dados()
+
+def ler_em_blocos(arquivo, nome_arquivo, tamanho_bloco=TAMANHO_BLOCO, pular=0):
+    """
+    Gera DataFrames de no máximo tamanho_bloco linhas, com todas as colunas em texto.
+    O índice de cada bloco é a posição da linha de dados na planilha (0 = primeira linha após o
+    cabeçalho), para que as mensagens de erro indiquem a linha certa. pular ignora as primeiras linhas
+    de dados (usado para retomar uma importação).
+    """
+    cabecalho, linhas = _iterar_linhas(arquivo, nome_arquivo)
+    inicio = pular
+    linhas = islice(linhas, pular, None)
+    while True:
+        bloco = list(islice(linhas, tamanho_bloco))
+        if not bloco:
+            return
+        yield pd.DataFrame(bloco, columns=cabecalho, index=range(inicio, inicio + len(bloco)))
+        inicio += len(bloco)
+
+def amostra_planilha(arquivo, nome_arquivo, linhas=LINHAS_AMOSTRA):
+    """Primeiras linhas da planilha para pré-visualização (mantém as colunas mesmo sem dados)."""
+    cabecalho, dados = _iterar_linhas(arquivo, nome_arquivo)
+    return pd.DataFrame(list(islice(dados, linhas)), columns=cabecalho)
+
+def estimar_linhas(arquivo, nome_arquivo):
+    """Estimativa do número de linhas de dados, usada apenas na barra de progresso (None se desconhecida)."""
+    arquivo.seek(0)
+    if _eh_csv(nome_arquivo):
+        total = sum(bloco.count(b"\n") for bloco in iter(lambda: arquivo.read(1024 * 1024), b""))
+        arquivo.seek(0)
+        return max(total - 1, 0)
+
+    from openpyxl import load_workbook
+
+    livro = load_workbook(arquivo, read_only=True)
+    try:
+        max_row = livro.worksheets[0].max_row  # vem da dimensão gravada no ficheiro; pode faltar
+    finally:
+        livro.close()
+    return max_row - 1 if max_row else None
+
+def hash_arquivo(arquivo):
+    """SHA-256 do conteúdo, usado para reconhecer a mesma planilha ao retomar uma importação."""
+    arquivo.seek(0)
+    sha = hashlib.sha256()
+    for bloco in iter(lambda: arquivo.read(1024 * 1024), b""):
+        sha.update(bloco)
+    arquivo.seek(0)
+    return sha.hexdigest()
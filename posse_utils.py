@@ -0,0 +1,136 @@
+import argparse
+from sqlalchemy import text
+
+# --- Projeção "Posse Atual" dos Aparelhos ---
+# A tabela aparelho_posse_atual guarda, para cada aparelho, a sua movimentação mais recente
+# (colaborador, nome registado no momento, ID da movimentação e data). Ela é mantida na mesma
+# transação de cada INSERT em historico_movimentacoes, para que as páginas não precisem de
+# ordenar todo o histórico com ROW_NUMBER() a cada consulta.
+# Atenção: a posse é a da última movimentação, com ou sem colaborador. O ROW_NUMBER() anterior só
+# considerava movimentações com colaborador_id, ou seja, o último colaborador que teve o aparelho;
+# agora, depois de uma devolução ao estoque ou de um envio para manutenção, a posse fica sem
+# colaborador. Por isso as páginas só mostram o responsável enquanto o status é "Em uso".
+# A tabela é criada e preenchida pela migração 4 (migracoes_utils). Quando a movimentação registada
+# como posse atual é apagada, um gatilho recalcula a posse a partir do histórico que resta (a chave
+# estrangeira é verificada só no fim da transação, depois do gatilho); sem histórico, a linha sai.
+
+DDL_POSSE_ATUAL = """
+    CREATE TABLE IF NOT EXISTS aparelho_posse_atual (
+        aparelho_id BIGINT PRIMARY KEY REFERENCES aparelhos(id) ON DELETE CASCADE,
+        colaborador_id BIGINT REFERENCES colaboradores(id) ON DELETE SET NULL,
+        colaborador_snapshot TEXT,
+        movimentacao_id BIGINT NOT NULL,
+        data_movimentacao TIMESTAMP NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_posse_atual_colaborador ON aparelho_posse_atual (colaborador_id);
+    CREATE INDEX IF NOT EXISTS idx_posse_atual_movimentacao ON aparelho_posse_atual (movimentacao_id);
+    ALTER TABLE aparelho_posse_atual DROP CONSTRAINT IF EXISTS aparelho_posse_atual_movimentacao_id_fkey;
+    ALTER TABLE aparelho_posse_atual ADD CONSTRAINT aparelho_posse_atual_movimentacao_id_fkey
+        FOREIGN KEY (movimentacao_id) REFERENCES historico_movimentacoes(id) DEFERRABLE INITIALLY DEFERRED;
+
+    CREATE OR REPLACE FUNCTION recalcular_posse_apos_remocao() RETURNS trigger AS $$
+    BEGIN
+        DELETE FROM aparelho_posse_atual p USING removidas r WHERE p.movimentacao_id = r.id;
+        INSERT INTO aparelho_posse_atual (aparelho_id, colaborador_id, colaborador_snapshot, movimentacao_id, data_movimentacao)
+        SELECT DISTINCT ON (h.aparelho_id)
+            h.aparelho_id, h.colaborador_id, h.colaborador_snapshot, h.id, h.data_movimentacao
+        FROM historico_movimentacoes h
+        WHERE h.aparelho_id IN (SELECT aparelho_id FROM removidas)
+        ORDER BY h.aparelho_id, h.data_movimentacao DESC, h.id DESC
+        ON CONFLICT (aparelho_id) DO NOTHING;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS trg_posse_apos_remocao ON historico_movimentacoes;
+    CREATE TRIGGER trg_posse_apos_remocao
+        AFTER DELETE ON historico_movimentacoes
+        REFERENCING OLD TABLE AS removidas
+        FOR EACH STATEMENT EXECUTE FUNCTION recalcular_posse_apos_remocao();
+"""
+
+# Só substitui a posse se a movimentação recebida for igual ou mais recente que a já registada.
+_UPSERT_POSSE = """
+    ON CONFLICT (aparelho_id) DO UPDATE SET
+        colaborador_id = EXCLUDED.colaborador_id,
+        colaborador_snapshot = EXCLUDED.colaborador_snapshot,
+        movimentacao_id = EXCLUDED.movimentacao_id,
+        data_movimentacao = EXCLUDED.data_movimentacao
+    WHERE aparelho_posse_atual.data_movimentacao <= EXCLUDED.data_movimentacao
+"""
+
+QUERY_INSERIR_MOVIMENTACAO = text(f"""
+    WITH nova AS (
+        INSERT INTO historico_movimentacoes
+            (data_movimentacao, aparelho_id, colaborador_id, status_id, localizacao_atual, observacoes, colaborador_snapshot, checklist_devolucao)
+        VALUES (:data, :ap_id, :col_id, :status_id, :loc, :obs, :col_snap, :checklist)
+        RETURNING id, aparelho_id, colaborador_id, colaborador_snapshot, data_movimentacao
+    ), posse AS (
+        INSERT INTO aparelho_posse_atual (aparelho_id, colaborador_id, colaborador_snapshot, movimentacao_id, data_movimentacao)
+        SELECT aparelho_id, colaborador_id, colaborador_snapshot, id, data_movimentacao FROM nova
+        {_UPSERT_POSSE}
+    )
+    SELECT id FROM nova;
+""")
+
+_SELECT_ULTIMA_MOVIMENTACAO = """
+    SELECT DISTINCT ON (h.aparelho_id)
+        h.aparelho_id, h.colaborador_id, h.colaborador_snapshot, h.id, h.data_movimentacao
+    FROM historico_movimentacoes h
+"""
+
+def inserir_movimentacao(s, aparelho_id, status_id, data_movimentacao, colaborador_id=None,
+                         colaborador_snapshot=None, localizacao=None, observacoes=None, checklist_json=None):
+    """
+    Insere uma movimentação no histórico e atualiza a posse atual do aparelho num único comando.
+    Deve ser chamada dentro da transação da operação; devolve o ID da nova movimentação.
+    """
+    return s.execute(QUERY_INSERIR_MOVIMENTACAO, {
+        "data": data_movimentacao, "ap_id": aparelho_id, "col_id": colaborador_id, "status_id": status_id,
+        "loc": localizacao, "obs": observacoes, "col_snap": colaborador_snapshot, "checklist": checklist_json
+    }).scalar_one()
+
+def atualizar_posse_aparelhos(s, aparelho_ids):
+    """Recalcula a posse atual de um conjunto de aparelhos (usado após inserções em lote no histórico)."""
+    aparelho_ids = [int(ap_id) for ap_id in aparelho_ids]
+    if not aparelho_ids:
+        return
+    s.execute(text(f"""
+        INSERT INTO aparelho_posse_atual (aparelho_id, colaborador_id, colaborador_snapshot, movimentacao_id, data_movimentacao)
+        {_SELECT_ULTIMA_MOVIMENTACAO}
+        WHERE h.aparelho_id = ANY(:ids)
+        ORDER BY h.aparelho_id, h.data_movimentacao DESC, h.id DESC
+        {_UPSERT_POSSE}
+    """), {"ids": aparelho_ids})
+
+_PREENCHER_POSSE = f"""
+    INSERT INTO aparelho_posse_atual (aparelho_id, colaborador_id, colaborador_snapshot, movimentacao_id, data_movimentacao)
+    {_SELECT_ULTIMA_MOVIMENTACAO}
+    ORDER BY h.aparelho_id, h.data_movimentacao DESC, h.id DESC
+    {_UPSERT_POSSE}
+"""
+
+# Migração 4 de migracoes_utils: cria a tabela e o gatilho e preenche a projeção a partir do histórico.
+INSTRUCOES_MIGRACAO = [DDL_POSSE_ATUAL, _PREENCHER_POSSE]
+
+def reconstruir_posse_atual(s):
+    """Cria a tabela (se necessário) e reconstrói toda a projeção a partir do histórico. Devolve o total de aparelhos."""
+    s.execute(text(DDL_POSSE_ATUAL))
+    s.execute(text("TRUNCATE aparelho_posse_atual"))
+    s.execute(text(_PREENCHER_POSSE))
+    return s.execute(text("SELECT COUNT(*) FROM aparelho_posse_atual")).scalar_one()
+
+if __name__ == "__main__":
+    from db_utils import criar_engine_cli
+
+    parser = argparse.ArgumentParser(description="Manutenção da tabela aparelho_posse_atual.")
+    parser.add_argument("--reconstruir", action="store_true", help="Recria a projeção a partir de historico_movimentacoes.")
+    args = parser.parse_args()
+
+    if not args.reconstruir:
+        parser.print_help()
+    else:
+        engine = criar_engine_cli()
+        with engine.begin() as conexao:
+            total = reconstruir_posse_atual(conexao)
+        print(f"Posse atual reconstruída para {total} aparelhos.")
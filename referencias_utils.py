@@ -0,0 +1,155 @@
+import threading
+import time
+from cache_utils import ao_invalidar
+from db_utils import consultar, para_python
+
+# --- Registo de Dados de Referência (status, setores, marcas e modelos) ---
+# Tabelas pequenas e quase estáticas, mas consultadas em quase todas as páginas e dentro das
+# transações de escrita (ex.: "SELECT id FROM status WHERE nome_status = 'Em uso'"). O registo
+# carrega as quatro de uma só vez (uma única ida ao banco) e guarda no processo, partilhado por
+# todas as sessões, os mapas nome -> ID e ID -> nome. Só volta a carregar quando uma dessas tabelas
+# é invalidada com invalidar_tabelas(), quando o ttl expira (alterações feitas por outro processo)
+# ou quando se procura um nome/ID que não conhece. Cada recarga incrementa a versão do registo.
+# Os modelos são identificados pelo nome completo "Marca - Modelo", como nas caixas de seleção.
+
+TABELAS_REFERENCIA = ("status", "setores", "marcas", "modelos")
+TTL_REFERENCIAS = 300
+INTERVALO_MIN_RECARGA = 5   # segundos entre recargas provocadas por um nome/ID desconhecido
+
+SQL_REFERENCIAS = """
+    SELECT 'status' AS tabela, id, nome_status AS nome FROM status
+    UNION ALL SELECT 'setores', id, nome_setor FROM setores
+    UNION ALL SELECT 'marcas', id, nome_marca FROM marcas
+    UNION ALL SELECT 'modelos', mo.id, ma.nome_marca || ' - ' || mo.nome_modelo
+              FROM modelos mo JOIN marcas ma ON mo.marca_id = ma.id
+    ORDER BY tabela, nome
+"""
+
+def _chave_nome(nome):
+    return " ".join(str(nome).split()).casefold()
+
+class RegistoReferencias:
+    def __init__(self, ttl=TTL_REFERENCIAS):
+        self._lock = threading.Lock()           # protege o estado abaixo
+        self._lock_carga = threading.Lock()     # uma única carga de cada vez
+        self._ttl = ttl
+        self._dados = None                      # tabela -> {"registos", "por_nome", "por_nome_min", "por_id"}
+        self._versao = 0
+        self._geracao = 0                       # incrementa a cada invalidação
+        self._geracao_carregada = -1
+        self._carregado_em = 0.0
+
+    def _atual(self):
+        return (self._dados is not None and self._geracao_carregada == self._geracao
+                and time.monotonic() - self._carregado_em < self._ttl)
+
+    def _carregar(self, conn, forcar=False):
+        with self._lock_carga:
+            with self._lock:
+                if self._atual() and not forcar:
+                    return
+                geracao = self._geracao
+            df = consultar(SQL_REFERENCIAS, conn=conn)
+            dados = {tabela: {"registos": [], "por_nome": {}, "por_nome_min": {}, "por_id": {}} for tabela in TABELAS_REFERENCIA}
+            for tabela, id_registo, nome in zip(df["tabela"], df["id"], df["nome"]):
+                id_registo = para_python(id_registo)
+                d = dados[tabela]
+                d["registos"].append({"id": id_registo, "nome": nome})
+                d["por_nome"][nome] = id_registo
+                d["por_nome_min"].setdefault(_chave_nome(nome), id_registo)
+                d["por_id"][id_registo] = nome
+            with self._lock:
+                self._dados = dados
+                # Uma invalidação durante a leitura deixa o registo marcado para nova carga.
+                self._geracao_carregada = geracao
+                self._carregado_em = time.monotonic()
+                self._versao += 1
+
+    def _obter(self, tabela, conn=None):
+        if tabela not in TABELAS_REFERENCIA:
+            raise KeyError(f"'{tabela}' não é uma tabela de referência ({', '.join(TABELAS_REFERENCIA)}).")
+        with self._lock:
+            atual = self._atual()
+        if not atual:
+            self._carregar(conn)
+        with self._lock:
+            return self._dados[tabela]
+
+    def _recarregar_se_desconhecido(self, conn):
+        """Um nome/ID desconhecido pode ter sido criado por outro processo; recarrega, mas não a cada pedido."""
+        with self._lock:
+            recente = time.monotonic() - self._carregado_em < INTERVALO_MIN_RECARGA
+        if not recente:
+            self._carregar(conn, forcar=True)
+        return not recente
+
+    def id_por_nome(self, tabela, nome, conn=None):
+        if nome is None:
+            return None
+        for tentativa in range(2):
+            d = self._obter(tabela, conn)
+            id_registo = d["por_nome"].get(nome)
+            if id_registo is None:
+                id_registo = d["por_nome_min"].get(_chave_nome(nome))
+            if id_registo is not None or tentativa or not self._recarregar_se_desconhecido(conn):
+                return id_registo
+
+    def nome_por_id(self, tabela, id_registo, conn=None):
+        if id_registo is None:
+            return None
+        id_registo = para_python(id_registo)
+        for tentativa in range(2):
+            nome = self._obter(tabela, conn)["por_id"].get(id_registo)
+            if nome is not None or tentativa or not self._recarregar_se_desconhecido(conn):
+                return nome
+
+    def registos(self, tabela, conn=None):
+        return [dict(r) for r in self._obter(tabela, conn)["registos"]]
+
+    def ids_por_nome(self, tabela, conn=None):
+        return dict(self._obter(tabela, conn)["por_nome"])
+
+    def nomes_por_id(self, tabela, conn=None):
+        return dict(self._obter(tabela, conn)["por_id"])
+
+    def invalidar(self, tabelas):
+        if any(t in TABELAS_REFERENCIA for t in tabelas):
+            with self._lock:
+                self._geracao += 1
+
+    def versao(self):
+        with self._lock:
+            return self._versao
+
+_registo = RegistoReferencias()
+ao_invalidar(_registo.invalidar)
+
+def id_referencia(tabela, nome, conn=None):
+    """ID do registo com esse nome (sem distinguir maiúsculas nem espaços extra) ou None."""
+    return _registo.id_por_nome(tabela, nome, conn)
+
+def exigir_id_referencia(tabela, nome, conn=None):
+    """Como id_referencia(), mas lança LookupError se o nome não existir (para uso dentro de transações)."""
+    id_registo = _registo.id_por_nome(tabela, nome, conn)
+    if id_registo is None:
+        raise LookupError(f"'{nome}' não encontrado na tabela {tabela}.")
+    return id_registo
+
+def nome_referencia(tabela, id_registo, conn=None):
+    return _registo.nome_por_id(tabela, id_registo, conn)
+
+def opcoes_referencia(tabela, conn=None):
+    """Lista de dicts {"id", "nome"} ordenada pelo nome, para as caixas de seleção."""
+    return _registo.registos(tabela, conn)
+
+def mapa_ids(tabela, conn=None):
+    """Dicionário nome -> ID."""
+    return _registo.ids_por_nome(tabela, conn)
+
+def mapa_nomes(tabela, conn=None):
+    """Dicionário ID -> nome."""
+    return _registo.nomes_por_id(tabela, conn)
+
+def versao_referencias():
+    """Número de cargas do registo neste processo (muda sempre que os dados de referência são relidos)."""
+    return _registo.versao()
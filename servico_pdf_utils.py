@@ -0,0 +1,271 @@
+import logging
+import math
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import documentos_utils
+from cache_documentos_utils import CacheDocumentos, chave_documento
+
+# --- Serviço de Geração de PDF (pool de processos) ---
+# O WeasyPrint ocupa o CPU durante toda a renderização e, corrido na thread do script do
+# Streamlit, atrasa as outras sessões servidas pelo mesmo processo (o GIL é partilhado). O serviço
+# envia cada pedido para um pool de processos (um por CPU disponível, no máximo MAX_PROCESSOS) e a página
+# só consulta o estado do trabalho até estar pronto, sem ocupar o CPU enquanto espera.
+# Os pedidos esperam numa fila própria (no máximo MAX_FILA) e só passam para o pool quando há um
+# processo livre, por isso o tempo de um trabalho no pool é o tempo de renderização. Um trabalho que
+# ultrapassa TEMPO_LIMITE_S é dado como expirado: os processos do pool são terminados e os outros
+# trabalhos que estavam em curso voltam ao início da fila, num pool novo.
+# Antes de ir para a fila, cada pedido é procurado na cache de documentos (cache_documentos_utils):
+# um pedido idêntico a um já gerado fica concluído de imediato, sem passar pelo pool.
+# O serviço é criado uma vez por processo e partilhado por todas as sessões.
+
+def _cpus_disponiveis():
+    """
+    CPUs que o processo pode realmente usar: as da afinidade e, num contentor, a quota do cgroup
+    (os.cpu_count() devolve os núcleos da máquina inteira e sobrecarregaria o pool).
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # sched_getaffinity não existe no Windows nem no macOS
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:  # cgroup v2: "quota período" ou "max período"
+            quota, periodo = f.read().split()[:2]
+        if quota != "max":
+            cpus = min(cpus, math.ceil(int(quota) / int(periodo)))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+MAX_PROCESSOS = int(os.environ.get("ASSETFLOW_PDF_PROCESSOS", _cpus_disponiveis()))
+MAX_FILA = int(os.environ.get("ASSETFLOW_PDF_FILA", 50))
+TEMPO_LIMITE_S = float(os.environ.get("ASSETFLOW_PDF_TEMPO_LIMITE", 120))
+RETENCAO_S = 600              # tempo que um resultado fica disponível para ser consultado
+INTERVALO_CONSULTA_S = 0.2
+
+ESTADO_NA_FILA = "na_fila"
+ESTADO_A_GERAR = "a_gerar"
+ESTADO_CONCLUIDO = "concluido"
+ESTADO_FALHOU = "falhou"
+ESTADO_EXPIRADO = "expirado"
+ESTADOS_FINAIS = (ESTADO_CONCLUIDO, ESTADO_FALHOU, ESTADO_EXPIRADO)
+
+TAREFAS = {
+    "termo": documentos_utils.gerar_pdf_termo,
+    "etiqueta": documentos_utils.gerar_pdf_etiqueta,
+    "lote": documentos_utils.gerar_lote,
+    "folha_etiquetas": documentos_utils.gerar_folha_etiquetas,
+}
+
+logger = logging.getLogger("assetflow.pdf")
+
+def _executar(tarefa, argumentos):
+    """Corre num processo do pool."""
+    return TAREFAS[tarefa](*argumentos)
+
+def _terminar_processos(executor):
+    # O ProcessPoolExecutor não interrompe um trabalho em curso; os processos são terminados à mão.
+    for processo in list((getattr(executor, "_processes", None) or {}).values()):
+        processo.terminate()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+class ServicoPDF:
+    def __init__(self, max_processos=MAX_PROCESSOS, max_fila=MAX_FILA, tempo_limite=TEMPO_LIMITE_S):
+        self._lock = threading.RLock()
+        self.max_processos = max(1, max_processos)
+        self.max_fila = max_fila
+        self.tempo_limite = tempo_limite
+        self._executor = None
+        self._fila = deque()          # IDs dos trabalhos à espera de um processo livre
+        self._em_curso = set()        # IDs dos trabalhos entregues ao pool
+        self._trabalhos = {}          # ID -> dict com o estado do trabalho
+        self.cache = CacheDocumentos()
+        self.metricas = {"submetidos": 0, "concluidos": 0, "falhados": 0, "expirados": 0, "rejeitados": 0,
+                         "reinicios_pool": 0, "da_cache": 0, "tempo_geracao_s": 0.0}
+
+    def _pool(self):
+        if self._executor is None:
+            # "spawn": o servidor do Streamlit tem várias threads e um fork copiaria os seus locks.
+            self._executor = ProcessPoolExecutor(max_workers=self.max_processos, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def submeter(self, tarefa, *argumentos):
+        """Coloca o trabalho na fila e devolve o seu ID. Lança RuntimeError se a fila estiver cheia."""
+        if tarefa not in TAREFAS:
+            raise KeyError(f"Tarefa de PDF desconhecida: {tarefa}")
+        chave = chave_documento(documentos_utils.VERSAO_DOCUMENTOS, tarefa, argumentos)
+        inicio = time.perf_counter()
+        encontrado, resultado = self.cache.obter(chave)
+        if encontrado and isinstance(resultado, tuple):
+            # As estatísticas guardadas são as da renderização original; o tempo passa a ser o da leitura da cache.
+            conteudo, estatisticas = resultado
+            duracao = time.perf_counter() - inicio
+            resultado = conteudo, dict(estatisticas, duracao_s=duracao,
+                                       documentos_por_segundo=estatisticas["documentos"] / duracao if duracao else None)
+        with self._lock:
+            if encontrado:
+                id_trabalho = uuid.uuid4().hex
+                agora = time.monotonic()
+                self._trabalhos[id_trabalho] = {
+                    "tarefa": tarefa, "argumentos": None, "chave": chave, "do_cache": True,
+                    "estado": ESTADO_CONCLUIDO, "future": None, "submetido_em": agora, "iniciado_em": agora,
+                    "concluido_em": agora, "resultado": resultado, "erro": None,
+                }
+                self.metricas["submetidos"] += 1
+                self.metricas["da_cache"] += 1
+                return id_trabalho
+            self._verificar()
+            if len(self._fila) + len(self._em_curso) >= self.max_fila:
+                self.metricas["rejeitados"] += 1
+                raise RuntimeError("A fila de geração de documentos está cheia. Tente novamente dentro de instantes.")
+            id_trabalho = uuid.uuid4().hex
+            self._trabalhos[id_trabalho] = {
+                "tarefa": tarefa, "argumentos": argumentos, "chave": chave, "do_cache": False,
+                "estado": ESTADO_NA_FILA, "future": None,
+                "submetido_em": time.monotonic(), "iniciado_em": None, "concluido_em": None,
+                "resultado": None, "erro": None,
+            }
+            self._fila.append(id_trabalho)
+            self.metricas["submetidos"] += 1
+            self._despachar()
+        return id_trabalho
+
+    def _despachar(self):
+        while self._fila and len(self._em_curso) < self.max_processos:
+            id_trabalho = self._fila.popleft()
+            trabalho = self._trabalhos[id_trabalho]
+            trabalho["estado"] = ESTADO_A_GERAR
+            trabalho["iniciado_em"] = time.monotonic()
+            try:
+                future = self._enviar_ao_pool(trabalho)
+            except Exception as e:  # ex.: o interpretador está a terminar
+                trabalho.update(estado=ESTADO_FALHOU, erro=str(e), concluido_em=time.monotonic(), argumentos=None)
+                self.metricas["falhados"] += 1
+                continue
+            trabalho["future"] = future
+            self._em_curso.add(id_trabalho)
+            future.add_done_callback(lambda f, i=id_trabalho: self._concluir(i, f))
+
+    def _enviar_ao_pool(self, trabalho):
+        try:
+            return self._pool().submit(_executar, trabalho["tarefa"], trabalho["argumentos"])
+        except BrokenProcessPool:
+            # Um processo do pool morreu (ex.: sem memória); o pool fica inutilizável e é recriado.
+            self._executor = None
+            self.metricas["reinicios_pool"] += 1
+            return self._pool().submit(_executar, trabalho["tarefa"], trabalho["argumentos"])
+
+    def _concluir(self, id_trabalho, future):
+        with self._lock:
+            trabalho = self._trabalhos.get(id_trabalho)
+            # Trabalhos expirados ou reenviados para um pool novo já não dependem deste future.
+            if trabalho is None or trabalho["future"] is not future or trabalho["estado"] != ESTADO_A_GERAR:
+                return
+            self._em_curso.discard(id_trabalho)
+            trabalho["concluido_em"] = time.monotonic()
+            trabalho["argumentos"] = None
+            erro = None if future.cancelled() else future.exception()
+            if future.cancelled() or erro is not None:
+                trabalho["estado"] = ESTADO_FALHOU
+                trabalho["erro"] = str(erro) if erro is not None else "Trabalho cancelado."
+                self.metricas["falhados"] += 1
+                logger.warning("Falha ao gerar o documento (%s): %s", trabalho["tarefa"], trabalho["erro"])
+            else:
+                trabalho["estado"] = ESTADO_CONCLUIDO
+                trabalho["resultado"] = future.result()
+                self.cache.guardar(trabalho["chave"], trabalho["resultado"])
+                self.metricas["concluidos"] += 1
+                self.metricas["tempo_geracao_s"] += trabalho["concluido_em"] - trabalho["iniciado_em"]
+            self._despachar()
+
+    def _verificar(self):
+        """Expira os trabalhos em curso há mais de tempo_limite e descarta os resultados antigos."""
+        agora = time.monotonic()
+        expirados = [i for i in self._em_curso if agora - self._trabalhos[i]["iniciado_em"] > self.tempo_limite]
+        if expirados:
+            for id_trabalho in expirados:
+                trabalho = self._trabalhos[id_trabalho]
+                trabalho.update(estado=ESTADO_EXPIRADO, concluido_em=agora, argumentos=None,
+                                erro=f"A geração do documento excedeu o tempo limite de {self.tempo_limite:.0f}s.")
+                self._em_curso.discard(id_trabalho)
+                self.metricas["expirados"] += 1
+                logger.warning("Documento (%s) expirado após %.0fs; o pool de processos vai ser reiniciado.",
+                               trabalho["tarefa"], self.tempo_limite)
+            executor, self._executor = self._executor, None
+            # Os restantes trabalhos em curso perdem o processo; voltam ao início da fila.
+            for id_trabalho in sorted(self._em_curso, key=lambda i: self._trabalhos[i]["iniciado_em"], reverse=True):
+                self._trabalhos[id_trabalho].update(estado=ESTADO_NA_FILA, future=None, iniciado_em=None)
+                self._fila.appendleft(id_trabalho)
+            self._em_curso.clear()
+            if executor is not None:
+                _terminar_processos(executor)
+            self.metricas["reinicios_pool"] += 1
+            self._despachar()
+        antigos = [i for i, t in self._trabalhos.items()
+                   if t["estado"] in ESTADOS_FINAIS and agora - t["concluido_em"] > RETENCAO_S]
+        for id_trabalho in antigos:
+            del self._trabalhos[id_trabalho]
+
+    def estado(self, id_trabalho):
+        """Estado do trabalho: dict com estado, posicao na fila, resultado, erro e duracao_s (ou None se não existir)."""
+        with self._lock:
+            self._verificar()
+            trabalho = self._trabalhos.get(id_trabalho)
+            if trabalho is None:
+                return None
+            fim = trabalho["concluido_em"] or time.monotonic()
+            return {
+                "estado": trabalho["estado"],
+                "posicao": self._fila.index(id_trabalho) + 1 if trabalho["estado"] == ESTADO_NA_FILA else None,
+                "resultado": trabalho["resultado"],
+                "erro": trabalho["erro"],
+                "do_cache": trabalho["do_cache"],
+                "duracao_s": fim - trabalho["iniciado_em"] if trabalho["iniciado_em"] else None,
+            }
+
+    def aguardar(self, id_trabalho, tempo_max=None):
+        """Consulta o estado a cada INTERVALO_CONSULTA_S até o trabalho terminar (ou até tempo_max)."""
+        limite = time.monotonic() + (tempo_max or self.tempo_limite * 2 + 5)
+        while True:
+            estado = self.estado(id_trabalho)
+            if estado is None or estado["estado"] in ESTADOS_FINAIS or time.monotonic() > limite:
+                return estado
+            time.sleep(INTERVALO_CONSULTA_S)
+
+    def resumo(self):
+        with self._lock:
+            metricas = dict(self.metricas)
+            tempo = metricas.pop("tempo_geracao_s")
+            metricas.update(
+                na_fila=len(self._fila), em_curso=len(self._em_curso), max_processos=self.max_processos,
+                segundos_por_documento=round(tempo / metricas["concluidos"], 3) if metricas["concluidos"] else None,
+                cache=self.cache.estatisticas(),
+            )
+            return metricas
+
+_servico = None
+_lock_servico = threading.Lock()
+
+def servico_pdf():
+    """Serviço de geração de PDF deste processo (criado no primeiro pedido)."""
+    global _servico
+    with _lock_servico:
+        if _servico is None:
+            _servico = ServicoPDF()
+        return _servico
+
+def submeter_documento(tarefa, *argumentos):
+    """Envia a geração para o pool (uma das TAREFAS, com os argumentos de documentos_utils) e devolve o ID."""
+    return servico_pdf().submeter(tarefa, *argumentos)
+
+def aguardar_documento(id_trabalho, tempo_max=None):
+    return servico_pdf().aguardar(id_trabalho, tempo_max)
+
+def metricas_servico_pdf():
+    """Totais do serviço deste processo ou None se ainda não houve pedidos."""
+    return _servico.resumo() if _servico is not None else None
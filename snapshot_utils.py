@@ -0,0 +1,281 @@
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import zipfile
+from datetime import date, datetime
+from sqlalchemy import text
+from db_utils import get_db_connection
+from exportacao_utils import TAMANHO_LOTE, cursor_servidor
+
+# --- Snapshots Colunares (Parquet / Arrow IPC) para BI ---
+# Cada tabela é exportada com os tipos do PostgreSQL (inteiros, decimais, datas, timestamps)
+# em vez de texto de planilha. O histórico de movimentações é particionado por mês
+# (historico_movimentacoes/mes=AAAA-MM/) e só os meses cuja assinatura mudou são reescritos: a
+# contagem, o maior ID e a soma dos IDs apanham inserções e remoções, e a soma de um hash de 64 bits
+# do conteúdo de cada linha apanha as alterações feitas com UPDATE (ex.: colaborador_id a NULL
+# quando um colaborador é excluído). O manifest.json lista cada ficheiro com o número de linhas,
+# o SHA-256 e a data da última escrita, para que os consumidores carreguem apenas as partições novas.
+# A página de exportação mantém o seu snapshot em PASTA_SNAPSHOT (só acessível ao utilizador da
+# aplicação) e cada pedido atualiza-o e devolve um .zip com os ficheiros do manifesto, para que as
+# partições inalteradas também sejam reaproveitadas entre cliques.
+
+TABELAS_SNAPSHOT = ["aparelhos", "colaboradores", "manutencoes"]
+TABELA_PARTICIONADA = "historico_movimentacoes"
+COLUNA_PARTICAO = "data_movimentacao"
+NOME_MANIFESTO = "manifest.json"
+VERSAO_MANIFESTO = 1
+
+EXTENSOES = {"parquet": ".parquet", "arrow": ".arrow"}
+
+PASTA_SNAPSHOT = os.environ.get("ASSETFLOW_SNAPSHOT_PASTA") or os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "assetflow", "snapshot")
+_lock_snapshot = threading.Lock()  # duas sessões não atualizam a mesma pasta ao mesmo tempo
+
+QUERY_COLUNAS = """
+    SELECT column_name, data_type, numeric_precision, numeric_scale
+    FROM information_schema.columns
+    WHERE table_schema = 'public' AND table_name = :tabela
+    ORDER BY ordinal_position
+"""
+
+QUERY_MESES_HISTORICO = f"""
+    SELECT to_char(date_trunc('month', h.{COLUNA_PARTICAO}), 'YYYY-MM') AS mes,
+           COUNT(*) AS linhas, MAX(h.id) AS max_id, SUM(h.id) AS soma_ids,
+           CAST(SUM(CAST(CAST(CAST('x' || left(md5(CAST(h AS TEXT)), 16) AS BIT(64)) AS BIGINT) AS NUMERIC)) AS TEXT) AS hash_linhas
+    FROM {TABELA_PARTICIONADA} h
+    GROUP BY 1
+    ORDER BY 1
+"""
+
+def _tipo_arrow(pa, data_type, precisao, escala):
+    """Tipo Arrow correspondente ao tipo da coluna em information_schema. Devolve (tipo, conversor ou None)."""
+    inteiros = {"bigint": pa.int64(), "integer": pa.int32(), "smallint": pa.int16()}
+    if data_type in inteiros:
+        return inteiros[data_type], None
+    if data_type == "numeric":
+        if precisao:
+            return pa.decimal128(int(precisao), int(escala or 0)), None
+        return pa.float64(), lambda v: None if v is None else float(v)
+    if data_type in ("real", "double precision"):
+        return pa.float64(), None
+    if data_type == "boolean":
+        return pa.bool_(), None
+    if data_type == "date":
+        return pa.date32(), None
+    if data_type == "timestamp without time zone":
+        return pa.timestamp("us"), None
+    if data_type == "timestamp with time zone":
+        return pa.timestamp("us", tz="UTC"), None
+    if data_type in ("json", "jsonb"):
+        return pa.string(), lambda v: None if v is None else (v if isinstance(v, str) else json.dumps(v, ensure_ascii=False))
+    return pa.string(), lambda v: None if v is None else str(v)
+
+def _schema_tabela(pa, tabela, conexao):
+    colunas = conexao.execute(text(QUERY_COLUNAS), {"tabela": tabela}).fetchall()
+    if not colunas:
+        raise RuntimeError(f"A tabela '{tabela}' não existe no banco de dados.")
+    campos, conversores = [], []
+    for nome, data_type, precisao, escala in colunas:
+        tipo, conversor = _tipo_arrow(pa, data_type, precisao, escala)
+        campos.append(pa.field(nome, tipo))
+        conversores.append(conversor)
+    return pa.schema(campos), conversores
+
+def _lote_arrow(pa, schema, conversores, linhas):
+    colunas = list(zip(*linhas))
+    arrays = []
+    for valores, campo, conversor in zip(colunas, schema, conversores):
+        if conversor:
+            valores = [conversor(v) for v in valores]
+        arrays.append(pa.array(valores, type=campo.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def _sha256(caminho):
+    sha = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+def _escrever_arquivos(sql, params, schema, conversores, destino, caminho_base, formatos, conn):
+    """
+    Lê a consulta em lotes e escreve-a em cada formato pedido, sem juntar o resultado em memória.
+    Os ficheiros são escritos com um nome temporário e só depois movidos para o lugar final.
+    Devolve {formato: (caminho relativo, linhas)}.
+    """
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    caminhos = {formato: caminho_base + EXTENSOES[formato] for formato in formatos}
+    escritores, temporarios = {}, {}
+    for formato, relativo in caminhos.items():
+        absoluto = os.path.join(destino, relativo)
+        os.makedirs(os.path.dirname(absoluto), exist_ok=True)
+        temporarios[formato] = absoluto + ".tmp"
+        if formato == "parquet":
+            escritores[formato] = pyarrow.parquet.ParquetWriter(temporarios[formato], schema, compression="zstd")
+        else:
+            escritores[formato] = pyarrow.ipc.new_file(temporarios[formato], schema)
+
+    linhas = 0
+    try:
+        with cursor_servidor(sql, params, conn=conn) as (_, resultado):
+            for lote in resultado.partitions(TAMANHO_LOTE):
+                batch = _lote_arrow(pa, schema, conversores, lote)
+                for escritor in escritores.values():
+                    escritor.write_batch(batch)
+                linhas += len(lote)
+    finally:
+        for escritor in escritores.values():
+            escritor.close()
+
+    for formato, relativo in caminhos.items():
+        os.replace(temporarios[formato], os.path.join(destino, relativo))
+    return {formato: (relativo.replace(os.sep, "/"), linhas) for formato, relativo in caminhos.items()}
+
+def escrever_tabela_colunar(tabela, sql, params, destino, caminho_base, formatos=("parquet",), conn=None):
+    """Escreve o resultado de uma consulta sobre a tabela em Parquet/Arrow, com os tipos das colunas da tabela."""
+    import pyarrow as pa
+
+    conn = conn or get_db_connection()
+    with conn.engine.connect() as conexao:
+        schema, conversores = _schema_tabela(pa, tabela, conexao)
+    return _escrever_arquivos(sql, params, schema, conversores, destino, caminho_base, formatos, conn)
+
+def _entrada_manifesto(destino, relativo, linhas, formato, **extras):
+    return {
+        "caminho": relativo, "formato": formato, "linhas": linhas,
+        "sha256": _sha256(os.path.join(destino, relativo)),
+        "atualizado_em": datetime.now().isoformat(timespec="seconds"),
+        **extras,
+    }
+
+def ler_manifesto(destino):
+    caminho = os.path.join(destino, NOME_MANIFESTO)
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f)
+
+def _gravar_manifesto(destino, manifesto):
+    caminho = os.path.join(destino, NOME_MANIFESTO)
+    with open(caminho + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+    os.replace(caminho + ".tmp", caminho)
+
+def _mes_seguinte(mes):
+    ano, numero = (int(p) for p in mes.split("-"))
+    return date(ano + numero // 12, numero % 12 + 1, 1)
+
+def gerar_snapshot(destino, formatos=("parquet",), conn=None):
+    """
+    Gera (ou atualiza) o snapshot no diretório indicado e devolve o manifesto.
+    As tabelas pequenas são sempre reescritas; as partições mensais do histórico só quando mudaram.
+    """
+    import pyarrow as pa
+
+    conn = conn or get_db_connection()
+    formatos = list(formatos)
+    os.makedirs(destino, exist_ok=True)
+    anterior = ler_manifesto(destino) or {}
+    tabelas_anteriores = anterior.get("tabelas", {})
+
+    with conn.engine.connect() as conexao:
+        schemas = {tabela: _schema_tabela(pa, tabela, conexao) for tabela in TABELAS_SNAPSHOT + [TABELA_PARTICIONADA]}
+        meses = conexao.execute(text(QUERY_MESES_HISTORICO)).mappings().all()
+
+    manifesto = {"versao": VERSAO_MANIFESTO, "gerado_em": datetime.now().isoformat(timespec="seconds"), "tabelas": {}}
+
+    for tabela in TABELAS_SNAPSHOT:
+        schema, conversores = schemas[tabela]
+        escritos = _escrever_arquivos(f"SELECT * FROM {tabela} ORDER BY id", {}, schema, conversores, destino, tabela, formatos, conn)
+        manifesto["tabelas"][tabela] = {
+            "particionada": False,
+            "colunas": [{"nome": campo.name, "tipo": str(campo.type)} for campo in schema],
+            "arquivos": [_entrada_manifesto(destino, relativo, linhas, formato) for formato, (relativo, linhas) in escritos.items()],
+        }
+
+    # Histórico particionado por mês: reaproveita as partições cuja assinatura não mudou.
+    schema, conversores = schemas[TABELA_PARTICIONADA]
+    particoes_anteriores = {
+        (arquivo["particao"], arquivo["formato"]): arquivo
+        for arquivo in tabelas_anteriores.get(TABELA_PARTICIONADA, {}).get("arquivos", [])
+    }
+    arquivos, em_uso = [], set()
+    for mes in meses:
+        assinatura = {"max_id": int(mes["max_id"]), "soma_ids": int(mes["soma_ids"]), "hash_linhas": mes["hash_linhas"]}
+        base = f"{TABELA_PARTICIONADA}/mes={mes['mes']}/dados"
+        reaproveitaveis = {
+            formato: particoes_anteriores.get((mes["mes"], formato)) for formato in formatos
+        }
+        if all(
+            a and a["linhas"] == mes["linhas"] and all(a.get(campo) == valor for campo, valor in assinatura.items())
+            and os.path.exists(os.path.join(destino, a["caminho"]))
+            for a in reaproveitaveis.values()
+        ):
+            arquivos.extend(reaproveitaveis.values())
+        else:
+            escritos = _escrever_arquivos(
+                f"SELECT * FROM {TABELA_PARTICIONADA} WHERE {COLUNA_PARTICAO} >= :inicio AND {COLUNA_PARTICAO} < :fim ORDER BY {COLUNA_PARTICAO}, id",
+                {"inicio": date.fromisoformat(mes["mes"] + "-01"), "fim": _mes_seguinte(mes["mes"])},
+                schema, conversores, destino, base, formatos, conn
+            )
+            arquivos.extend(
+                _entrada_manifesto(destino, relativo, linhas, formato, particao=mes["mes"], **assinatura)
+                for formato, (relativo, linhas) in escritos.items()
+            )
+        em_uso.update(base + EXTENSOES[formato] for formato in formatos)
+
+    # Partições de meses que deixaram de ter movimentações (ou de formatos não pedidos) são removidas.
+    for arquivo in particoes_anteriores.values():
+        if arquivo["caminho"] not in em_uso:
+            caminho = os.path.join(destino, arquivo["caminho"])
+            if os.path.exists(caminho):
+                os.remove(caminho)
+
+    manifesto["tabelas"][TABELA_PARTICIONADA] = {
+        "particionada": True,
+        "chave_particao": "mes",
+        "colunas": [{"nome": campo.name, "tipo": str(campo.type)} for campo in schema],
+        "arquivos": arquivos,
+    }
+    _gravar_manifesto(destino, manifesto)
+    return manifesto
+
+def gerar_snapshot_zip(formatos=("parquet",), conn=None, destino=PASTA_SNAPSHOT):
+    """
+    Atualiza o snapshot persistente em destino (só as partições alteradas são reescritas) e devolve o
+    caminho de um .zip temporário com os ficheiros do manifesto. Quem chama é responsável por apagá-lo.
+    """
+    with _lock_snapshot:
+        os.makedirs(destino, mode=0o700, exist_ok=True)
+        os.chmod(destino, 0o700)  # makedirs não altera uma pasta que já existia
+        manifesto = gerar_snapshot(destino, formatos, conn=conn)
+        descritor, caminho = tempfile.mkstemp(prefix="assetflow_snapshot_", suffix=".zip")
+        try:
+            with os.fdopen(descritor, "wb") as arquivo, zipfile.ZipFile(arquivo, "w", zipfile.ZIP_DEFLATED) as zf:
+                for dados in manifesto["tabelas"].values():
+                    for entrada in dados["arquivos"]:
+                        zf.write(os.path.join(destino, entrada["caminho"]), entrada["caminho"])
+                zf.write(os.path.join(destino, NOME_MANIFESTO), NOME_MANIFESTO)
+        except Exception:
+            os.remove(caminho)
+            raise
+    return caminho
+
+if __name__ == "__main__":
+    from db_utils import criar_engine_cli
+
+    parser = argparse.ArgumentParser(description="Gera snapshots Parquet/Arrow das tabelas principais para BI.")
+    parser.add_argument("--destino", required=True, help="Diretório do snapshot (as partições inalteradas são reaproveitadas).")
+    parser.add_argument("--formato", choices=["parquet", "arrow", "ambos"], default="parquet")
+    args = parser.parse_args()
+
+    formatos = ["parquet", "arrow"] if args.formato == "ambos" else [args.formato]
+    manifesto = gerar_snapshot(args.destino, formatos, conn=criar_engine_cli())
+    for tabela, dados in manifesto["tabelas"].items():
+        print(f"{tabela}: {sum(a['linhas'] for a in dados['arquivos'] if a['formato'] == formatos[0])} linhas, {len(dados['arquivos'])} ficheiros")
@@ -0,0 +1,124 @@
+import functools
+import os
+import re
+from datetime import datetime
+from jinja2 import Environment, FileSystemLoader, Undefined, select_autoescape
+from markupsafe import Markup
+
+# --- Templates dos E-mails ---
+# Os e-mails são templates Jinja2 na pasta templates_email/ (layout_base.html e um template por
+# e-mail, com a versão em texto puro no .txt do mesmo nome). Cada template é compilado uma única
+# vez por processo e fica em cache no Environment; renderizar só preenche o contexto.
+# Os templates usam classes de templates_email/estilos.css. Como os clientes de e-mail ignoram
+# <style>, as classes são convertidas em style="..." ao carregar o template, antes de ser compilado,
+# e não a cada envio. Os valores do contexto são escapados (autoescape) nos templates .html.
+
+PASTA_TEMPLATES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates_email")
+ARQUIVO_CSS = "estilos.css"
+
+_RE_COMENTARIO_CSS = re.compile(r"/\*.*?\*/", re.S)
+_RE_REGRA_CSS = re.compile(r"\.([\w-]+)\s*\{([^}]*)\}")
+_RE_TAG_COM_CLASSE = re.compile(r"<[a-zA-Z][^<>]*?\sclass=\"[^\"]*\"[^<>]*>")
+_RE_CLASSE = re.compile(r"\sclass=\"([^\"]*)\"")
+_RE_ESTILO = re.compile(r"\sstyle=\"([^\"]*)\"")
+
+def _declaracoes(bloco):
+    return "; ".join(d.strip() for d in bloco.split(";") if d.strip())
+
+@functools.lru_cache(maxsize=None)
+def regras_css():
+    """Dicionário classe -> declarações, lido de estilos.css (apenas seletores de uma classe)."""
+    with open(os.path.join(PASTA_TEMPLATES, ARQUIVO_CSS), encoding="utf-8") as f:
+        css = _RE_COMENTARIO_CSS.sub("", f.read())
+    return {classe: _declaracoes(bloco) for classe, bloco in _RE_REGRA_CSS.findall(css)}
+
+def inline_css(html, regras):
+    """
+    Substitui o atributo class de cada tag pelas declarações das classes, num atributo style.
+    Um style já presente na tag é mantido depois das classes (tem prioridade, como no CSS).
+    """
+    def substituir(m):
+        tag = m.group(0)
+        declaracoes = []
+        for classe in _RE_CLASSE.search(tag).group(1).split():
+            if classe not in regras:
+                raise ValueError(f"Classe CSS desconhecida no template de e-mail: .{classe}")
+            declaracoes.append(regras[classe])
+        tag = _RE_CLASSE.sub("", tag, count=1)
+        existente = _RE_ESTILO.search(tag)
+        if existente:
+            declaracoes.append(_declaracoes(existente.group(1)))
+            return f'{tag[:existente.start()]} style="{"; ".join(declaracoes)};"{tag[existente.end():]}'
+        fim = -2 if tag.endswith("/>") else -1
+        return f'{tag[:fim]} style="{"; ".join(declaracoes)};"{tag[fim:]}'
+    return _RE_TAG_COM_CLASSE.sub(substituir, html)
+
+class _CarregadorComCSS(FileSystemLoader):
+    """Lê os templates da pasta e aplica o inline_css aos .html antes da compilação."""
+
+    def get_source(self, environment, template):
+        fonte, caminho, atualizado = super().get_source(environment, template)
+        if template.endswith(".html"):
+            fonte = inline_css(fonte, regras_css())
+        return fonte, caminho, atualizado
+
+# --- Filtros usados nos templates ---
+def _vazio(valor):
+    if valor is None or isinstance(valor, Undefined):
+        return True
+    return valor == "" or valor != valor  # valor != valor: NaN e NaT
+
+def _filtro_ou(valor, alternativa="-"):
+    return alternativa if _vazio(valor) else valor
+
+def _filtro_data(valor, formato="%d/%m/%Y"):
+    if _vazio(valor):
+        return "-"
+    if isinstance(valor, str):
+        try:
+            valor = datetime.fromisoformat(valor)
+        except ValueError:
+            return valor
+    return valor.strftime(formato)
+
+def _filtro_moeda(valor):
+    return f"R$ {0.0 if _vazio(valor) else float(valor):.2f}"
+
+_ambiente = Environment(
+    loader=_CarregadorComCSS(PASTA_TEMPLATES, encoding="utf-8"),
+    autoescape=select_autoescape(enabled_extensions=("html",), default_for_string=False),
+    auto_reload=False,   # compilados uma vez por processo
+    cache_size=-1,       # sem limite: são poucos templates
+    trim_blocks=True,
+    lstrip_blocks=True,
+)
+_ambiente.filters.update(ou=_filtro_ou, data=_filtro_data, moeda=_filtro_moeda)
+
+def templates_disponiveis():
+    return [t for t in _ambiente.list_templates() if t != ARQUIVO_CSS]
+
+def compilar_todos():
+    """Compila (e guarda em cache) todos os templates; devolve quantos foram compilados."""
+    nomes = templates_disponiveis()
+    for nome in nomes:
+        _ambiente.get_template(nome)
+    return len(nomes)
+
+def renderizar(nome, **contexto):
+    """Renderiza o template (ex.: "devolucao.html") com o contexto; "ano" é preenchido se não for indicado."""
+    contexto.setdefault("ano", datetime.now().year)
+    return _ambiente.get_template(nome).render(**contexto)
+
+@functools.lru_cache(maxsize=None)
+def _tem_versao_texto(nome):
+    return f"{nome}.txt" in _ambiente.list_templates()
+
+def renderizar_email(nome, **contexto):
+    """Devolve (html, texto) do e-mail nome (sem extensão); o texto é "" se não houver nome.txt."""
+    html = renderizar(f"{nome}.html", **contexto)
+    texto = renderizar(f"{nome}.txt", **contexto) if _tem_versao_texto(nome) else ""
+    return html, texto
+
+def html_seguro(html):
+    """Marca HTML já montado (ex.: o miolo passado ao montar_layout_base) para não ser escapado."""
+    return Markup(html)